@@ -5,51 +5,200 @@ import base64
 import nacl.signing
 import time  # 添加這行
 import sys
-from typing import Optional
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
 from logger import setup_logger
 
 logger = setup_logger("api.auth")
 
-def create_signature(secret_key: str, params: dict, instruction: str = "orderExecute", window: int = 5000) -> Optional[str]:
-    """生成API簽名"""
-    try:
-        timestamp = int(time.time() * 1000)
-        
-        # 排序參數並轉換為查詢字符串
-        if isinstance(params, dict):
-            # 轉換布爾值
-            params_copy = params.copy()
-            for k, v in params_copy.items():
-                if isinstance(v, bool):
-                    params_copy[k] = str(v).lower()
-            
-            # 按字母順序排序
-            sorted_params = sorted(params_copy.items())
-            param_str = "&".join([f"{k}={v}" for k, v in sorted_params])
+# 緩存上限，防止參數組合無限增長
+SHAPE_CACHE_SIZE = 256
+PARAM_CACHE_SIZE = 1024
+# 每次請求取值都不同的參數，帶有這些參數時不緩存消息前綴（不會命中，只會擠掉可復用的條目）
+UNCACHED_PARAM_KEYS = ("clientId",)
+
+
+def _local_time_ms() -> int:
+    return int(time.time() * 1000)
+
+
+# 默認時間戳來源，時鐘同步服務啟動後替換為校正後的服務器時間
+_time_source: Callable[[], int] = _local_time_ms
+
+
+def set_time_source(source: Optional[Callable[[], int]]):
+    """設置簽名默認使用的毫秒時間戳來源，傳入 None 恢復本地時間"""
+    global _time_source
+    _time_source = source or _local_time_ms
+
+
+def current_timestamp() -> int:
+    """簽名用的當前毫秒時間戳"""
+    return int(_time_source())
+
+
+def _format_value(value) -> str:
+    """將參數值轉為簽名字符串中的形式（布爾值轉小寫）"""
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
+
+
+class RequestSigner:
+    """
+    ED25519請求簽名器
+
+    私鑰只在創建時解碼一次；按參數鍵集合緩存排序結果，
+    並對完全相同的參數緩存規範化字符串，避免每次請求重複排序和拼接。
+    """
+
+    def __init__(self, secret_key: str, window: int = 5000):
+        self.window = int(window)
+        self._signing_key = nacl.signing.SigningKey(base64.b64decode(secret_key))
+        # 參數鍵集合 -> 排序後的鍵
+        self._shape_cache: "OrderedDict[Tuple[str, ...], Tuple[str, ...]]" = OrderedDict()
+        # (指令, (鍵, 值類型, 值)...) -> 簽名消息前綴
+        self._param_cache: "OrderedDict[Tuple, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def canonical_params(self, params: Union[Dict, str, None]) -> str:
+        """將參數轉換為按鍵排序的查詢字符串"""
+        if not params:
+            return ""
+        if not isinstance(params, dict):
+            return str(params)
+
+        shape = tuple(params)
+        with self._lock:
+            sorted_keys = self._shape_cache.get(shape)
+            if sorted_keys is not None:
+                self._shape_cache.move_to_end(shape)
+        if sorted_keys is None:
+            sorted_keys = tuple(sorted(shape))
+            with self._lock:
+                self._shape_cache[shape] = sorted_keys
+                if len(self._shape_cache) > SHAPE_CACHE_SIZE:
+                    self._shape_cache.popitem(last=False)
+
+        return "&".join(f"{k}={_format_value(params[k])}" for k in sorted_keys)
+
+    def _message_prefix(self, instruction: str, params: Union[Dict, str, None]) -> str:
+        """構建不含時間戳和窗口的簽名消息前綴"""
+        if isinstance(params, dict) and any(key in params for key in UNCACHED_PARAM_KEYS):
+            # 下單時每筆訂單都帶唯一的 clientId
+            cache_key = None
         else:
-            param_str = params
-        
-        # 構建簽名消息
-        message = f"instruction={instruction}&{param_str}&timestamp={timestamp}&window={window}"
-        
-        # 使用PyNaCl生成ED25519簽名
-        import nacl.signing
-        import base64
-        
-        # 解碼私鑰
-        private_key_bytes = base64.b64decode(secret_key)
-        signing_key = nacl.signing.SigningKey(private_key_bytes)
-        
-        # 簽名
-        signed = signing_key.sign(message.encode('ascii'))
-        signature = base64.b64encode(signed.signature).decode()
-        
-        # 返回簽名、時間戳和窗口
+            try:
+                # 鍵中帶上值的類型：1、1.0 和 True 相等且哈希相同，但簽名字符串分別是 1、1.0 和 true
+                cache_key = (instruction, tuple((k, type(v), v) for k, v in params.items())
+                             if isinstance(params, dict) else params)
+                hash(cache_key)
+            except TypeError:
+                # 參數中含有不可哈希的值（列表等），不緩存
+                cache_key = None
+
+        if cache_key is not None:
+            with self._lock:
+                prefix = self._param_cache.get(cache_key)
+                if prefix is not None:
+                    self._param_cache.move_to_end(cache_key)
+                    return prefix
+
+        param_str = self.canonical_params(params)
+        prefix = f"instruction={instruction}&{param_str}" if param_str else f"instruction={instruction}"
+
+        if cache_key is not None:
+            with self._lock:
+                self._param_cache[cache_key] = prefix
+                if len(self._param_cache) > PARAM_CACHE_SIZE:
+                    self._param_cache.popitem(last=False)
+        return prefix
+
+    def sign(self, instruction: str, params: Union[Dict, str, None] = None,
+             timestamp: Optional[int] = None, window: Optional[int] = None) -> Dict[str, str]:
+        """
+        對單個請求簽名
+
+        Args:
+            instruction: API指令，例如 orderExecute
+            params: 請求參數
+            timestamp: 毫秒時間戳，默認使用同步後的服務器時間
+            window: 接收窗口（毫秒）
+
+        Returns:
+            包含 signature、timestamp、window 的字典
+        """
+        timestamp = current_timestamp() if timestamp is None else int(timestamp)
+        window = self.window if window is None else int(window)
+        message = f"{self._message_prefix(instruction, params)}&timestamp={timestamp}&window={window}"
+        signed = self._signing_key.sign(message.encode('ascii'))
         return {
-            "signature": signature,
+            "signature": base64.b64encode(signed.signature).decode(),
             "timestamp": str(timestamp),
             "window": str(window)
         }
+
+    def sign_batch(self, requests: Iterable[Tuple[str, Union[Dict, str, None]]],
+                   timestamp: Optional[int] = None, window: Optional[int] = None) -> List[Dict[str, str]]:
+        """
+        批量簽名，同一批請求共用一個時間戳
+
+        Args:
+            requests: (指令, 參數) 列表
+            timestamp: 毫秒時間戳，默認使用同步後的服務器時間
+            window: 接收窗口（毫秒）
+
+        Returns:
+            與輸入順序一致的簽名字典列表
+        """
+        timestamp = current_timestamp() if timestamp is None else int(timestamp)
+        return [self.sign(instruction, params, timestamp, window) for instruction, params in requests]
+
+    def sign_compound(self, requests: Iterable[Tuple[str, Union[Dict, str, None]]],
+                      timestamp: Optional[int] = None, window: Optional[int] = None) -> Dict[str, str]:
+        """
+        為批量端點生成單個簽名
+
+        各請求的 instruction=...&參數 依次以 & 連接，最後附加時間戳和窗口，
+        例如批量下單 POST /api/v1/orders。
+
+        Returns:
+            包含 signature、timestamp、window 的字典
+        """
+        timestamp = current_timestamp() if timestamp is None else int(timestamp)
+        window = self.window if window is None else int(window)
+        body = "&".join(self._message_prefix(instruction, params) for instruction, params in requests)
+        message = f"{body}&timestamp={timestamp}&window={window}"
+        signed = self._signing_key.sign(message.encode('ascii'))
+        return {
+            "signature": base64.b64encode(signed.signature).decode(),
+            "timestamp": str(timestamp),
+            "window": str(window)
+        }
+
+
+_signers: Dict[Tuple[str, int], RequestSigner] = {}
+_signers_lock = threading.Lock()
+
+
+def get_signer(secret_key: str, window: int = 5000) -> RequestSigner:
+    """獲取（必要時創建）對應私鑰的共享簽名器"""
+    key = (secret_key, int(window))
+    signer = _signers.get(key)
+    if signer is None:
+        with _signers_lock:
+            signer = _signers.get(key)
+            if signer is None:
+                signer = RequestSigner(secret_key, window)
+                _signers[key] = signer
+    return signer
+
+
+def create_signature(secret_key: str, params: dict, instruction: str = "orderExecute", window: int = 5000) -> Optional[str]:
+    """生成API簽名"""
+    try:
+        return get_signer(secret_key, window).sign(instruction, params)
     except Exception as e:
         logger.error(f"簽名生成失敗: {str(e)}")
         return None
@@ -10,82 +10,122 @@ import nacl.signing
 import aiohttp
 import asyncio
 import websockets
+import threading
 from datetime import datetime
 
+from api.auth import get_signer
+from api.clock import get_clock
+from api.history import (
+    DEFAULT_PAGE_SIZE, DEFAULT_PREFETCH, PAGE_RETRIES, RETRY_BACKOFF, HistoryFetchError, fill_key, paginate
+)
+from api.http_pool import HttpSessionPool, DEFAULT_LIMIT_PER_HOST, DEFAULT_REQUEST_TIMEOUT
+from api.loop_thread import get_loop_thread
+from api.market_catalog import get_market_catalog
+from api.order_index import ACCEPTED, PENDING, UNKNOWN, ClientOrderIndex
+from api.public_cache import get_public_cache
+from api.rate_limiter import PriorityRateLimiter
+from models import Order
+from config import API_URL, WS_URL
+
 
 # 配置常量
-API_URL = "https://api.backpack.exchange"
 API_VERSION = "v1"
 DEFAULT_WINDOW = 5000
+DEFAULT_BATCH_CONCURRENCY = 4  # 批量下單退化為逐單提交時的並發上限
+RESOLVE_DELAY = 0.5            # 下單結果不明時，首次按 clientId 查詢前的等待（秒），讓交易所完成處理
+RESOLVE_ATTEMPTS = 3           # 按 clientId 確認訂單狀態的查詢次數
+RESOLVE_HISTORY_LIMIT = 100    # 訂單已不在掛單中時，在最近多少條訂單歷史中查找
+RESOLVE_QUERY_TIMEOUT = 2 * DEFAULT_REQUEST_TIMEOUT  # 單次確認的上限（查掛單 + 查一頁訂單歷史）
+# 下單最壞耗時：請求超時 + 逐次等待 + 每次確認查詢超時
+SUBMIT_WORST_CASE = (DEFAULT_REQUEST_TIMEOUT
+                     + sum(RESOLVE_DELAY * (attempt + 1) for attempt in range(RESOLVE_ATTEMPTS))
+                     + RESOLVE_ATTEMPTS * RESOLVE_QUERY_TIMEOUT)
+# 同步接口等待單個請求的最長時間（秒），須長於下單最壞耗時，否則調用方在確認完成前就按失敗處理
+DEFAULT_FACADE_TIMEOUT = SUBMIT_WORST_CASE + 10
+
+# K線週期別名及其對應秒數
+KLINE_INTERVAL_ALIASES = {"1H": "1h", "4H": "4h", "1D": "1d", "1W": "1w", "1M": "1month"}
+KLINE_INTERVAL_SECONDS = {
+    "1m": 60, "3m": 180, "5m": 300, "15m": 900, "30m": 1800,
+    "1h": 3600, "2h": 7200, "4h": 14400, "6h": 21600, "8h": 28800, "12h": 43200,
+    "1d": 86400, "3d": 259200, "1w": 604800, "1month": 2592000
+}
 
 logger = logging.getLogger(__name__)
 
 class BackpackAPIClient:
-    def __init__(self, api_key=None, secret_key=None, symbol=None):
+    def __init__(self, api_key=None, secret_key=None, symbol=None, limit_per_host=DEFAULT_LIMIT_PER_HOST,
+                 rate_limiter=None, public_cache=None):
         self.api_key = api_key
         self.secret_key = secret_key
         self.base_url = API_URL  # 確保使用正確的變數名
         self.default_window = DEFAULT_WINDOW
         self.symbol = symbol
-        self.time_offset = 0
         self.logger = logging.getLogger(__name__)
-        self._sync_server_time()
+        self._signer = None
+        self.batch_orders_supported = True
+        # 客戶端限頻器，可傳入共享實例讓同一API密鑰的多個客戶端共用額度
+        self.rate_limiter = rate_limiter or PriorityRateLimiter()
+        # 公共行情緩存，默認進程內共享，合併策略、面板和CLI的相同請求
+        self.public_cache = public_cache or get_public_cache()
+        # clientId 索引：每筆訂單帶客戶端ID，重試和超時確認據此去重
+        self.order_index = ClientOrderIndex()
+        # 長連接會話池，所有請求共用，避免每次重新建立TCP/TLS連接
+        self._http = HttpSessionPool(self.base_url, limit_per_host=limit_per_host)
+        # 共享時鐘同步服務：後台同步並定期校正，簽名的時間戳和接收窗口都取自這裡
+        self.clock = get_clock(self.base_url)
         
+    async def warmup(self, connections=2):
+        """預熱異步連接池（應在事件循環啟動後調用一次）"""
+        return await self._http.warmup(connections=connections)
+    
+    async def close(self):
+        """關閉所有HTTP會話"""
+        await self._http.close()
+    
+    def close_sync(self):
+        """關閉同步HTTP會話（無事件循環時使用）"""
+        self._http.close_sync()
+    
+    def get_rate_limit_metrics(self):
+        """獲取限頻器各通道的排隊深度和等待時間"""
+        return self.rate_limiter.metrics()
+    
+    def get_api_metrics(self):
+        """獲取各端點的延遲分位數和錯誤分類計數"""
+        return self._http.metrics.snapshot()
+    
+    def dump_api_metrics(self, path=None):
+        """導出REST指標到JSON文件，返回文件路徑"""
+        return self._http.metrics.dump(path)
+    
+    async def __aenter__(self):
+        await self.warmup()
+        return self
+    
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+    
+    @property
+    def time_offset(self):
+        """本地時鐘與服務器時間的偏移（毫秒），由共享時鐘同步服務維護"""
+        return self.clock.offset
     
     def _sync_server_time(self):
-        """同步服務器時間"""
-        try:
-            response = requests.get(f"{self.base_url}/api/v1/time")
-            if response.status_code == 200:
-                data = response.json()
-                if isinstance(data, dict) and 'serverTime' in data:
-                    self.time_offset = data['serverTime'] - int(time.time() * 1000)
-                    return True
-            return False
-        except Exception as e:
-            logger.error(f"時間同步失敗: {str(e)}")
-            return False
+        """立即同步一次服務器時間"""
+        return self.clock.sync()
+    
+    @property
+    def window(self):
+        """簽名接收窗口（毫秒）：時鐘同步後按觀測到的RTT和同步誤差取建議值，否則用默認窗口"""
+        return self.clock.recommended_window() or self.default_window
 
     def _generate_signature(self, params, instruction="orderExecute"):
         try:
-            timestamp = str(int(time.time() * 1000))
-            window = str(self.default_window)
-            
-            # 排序參數並轉換為查詢字符串
-            if isinstance(params, dict):
-                # 轉換布爾值
-                params_copy = params.copy()
-                for k, v in params_copy.items():
-                    if isinstance(v, bool):
-                        params_copy[k] = str(v).lower()
-                
-                # 按字母順序排序
-                sorted_params = sorted(params_copy.items())
-                param_str = "&".join([f"{k}={v}" for k, v in sorted_params])
-            else:
-                param_str = params
-            
-            # 構建簽名消息
-            message = f"instruction={instruction}&{param_str}&timestamp={timestamp}&window={window}"
-            
-            # 使用PyNaCl生成ED25519簽名
-            import nacl.signing
-            import base64
-            
-            # 解碼私鑰
-            private_key_bytes = base64.b64decode(self.secret_key)
-            signing_key = nacl.signing.SigningKey(private_key_bytes)
-            
-            # 簽名
-            signed = signing_key.sign(message.encode('ascii'))
-            signature = base64.b64encode(signed.signature).decode()
-            
-            # 返回簽名、時間戳和窗口
-            return {
-                "signature": signature,
-                "timestamp": timestamp,
-                "window": window
-            }
+            # 共享簽名器：私鑰只解碼一次，參數規範化結果有緩存
+            if self._signer is None:
+                self._signer = get_signer(self.secret_key, self.default_window)
+            return self._signer.sign(instruction, params, timestamp=self.clock.now_ms(), window=self.window)
         except Exception as e:
             self.logger.error(f"簽名生成失敗: {str(e)}")
             return None
@@ -104,23 +144,45 @@ class BackpackAPIClient:
         }
         return headers
         
-    async def public_request(self, endpoint, params=None):
-        """發送公共API請求"""
+    async def public_request(self, endpoint, params=None, cache_key=None):
+        """
+        發送公共API請求
+        
+        按端點配置的TTL緩存結果，並發的相同請求只發出一次。
+        
+        Args:
+            endpoint: 端點名，例如 ticker、depth、klines
+            params: 查詢參數
+            cache_key: 自定義緩存鍵（參數中含時間戳等每次都不同的值時使用）
+        """
+        if cache_key is None:
+            cache_key = (endpoint, tuple(sorted(params.items())) if params else ())
+        return await self.public_cache.get(
+            endpoint,
+            (self.base_url,) + tuple(cache_key),
+            lambda: self._public_request(endpoint, params)
+        )
+    
+    async def _public_request(self, endpoint, params=None):
+        """發送公共API請求（不經過緩存）"""
         try:
+            await self.rate_limiter.acquire_for("public")
             url = f"{self.base_url}/api/v1/{endpoint}"
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=params) as response:
-                    if response.status == 200:
-                        return await response.json()
-                    else:
-                        self.logger.error(f"公共請求失敗: {response.status}, {await response.text()}")
-                        return None
+            session = await self._http.get_session()
+            async with session.get(url, params=params) as response:
+                if response.status == 200:
+                    return await response.json()
+                else:
+                    self.logger.error(f"公共請求失敗: {response.status}, {await response.text()}")
+                    return None
         except Exception as e:
             self.logger.error(f"公共請求異常: {e}")
             return None
         
-    async def get_order(self, order_id, symbol):
-        """獲取訂單狀態"""
+    async def get_order(self, order_id, symbol, client_id=None):
+        """獲取訂單狀態（order_id 為 None 時按 client_id 查詢）"""
+        if order_id is None:
+            return await self._get_order_by_client_id(client_id, symbol)
         try:
             # 嘗試獲取單個訂單
             endpoint = "/api/v1/order"
@@ -129,41 +191,120 @@ class BackpackAPIClient:
             
             headers = self._generate_headers(instruction, params)
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"{self.base_url}{endpoint}", params=params, headers=headers) as response:
-                    if response.status == 200:
-                        return await response.json()
-                    elif response.status == 404:
-                        # 如果訂單不存在，嘗試從訂單歷史中查詢
-                        return await self.get_order_from_history(order_id, symbol)
-                    else:
-                        error_msg = f"狀態碼: {response.status}, 消息: {await response.text()}"
-                        self.logger.warning(f"獲取訂單失敗: {error_msg}")
-                        return None
+            session = await self._http.get_session()
+            async with session.get(f"{self.base_url}{endpoint}", params=params, headers=headers) as response:
+                if response.status == 200:
+                    return await response.json()
+                elif response.status == 404:
+                    # 如果訂單不存在，嘗試從訂單歷史中查詢
+                    return await self.get_order_from_history(order_id, symbol)
+                else:
+                    error_msg = f"狀態碼: {response.status}, 消息: {await response.text()}"
+                    self.logger.warning(f"獲取訂單失敗: {error_msg}")
+                    return None
         except Exception as e:
             self.logger.error(f"獲取訂單異常: {str(e)}")
             return None
         
-    async def get_order_from_history(self, order_id, symbol):
-        """從訂單歷史中查詢訂單"""
+    async def _get_order_by_client_id(self, client_id, symbol):
+        """
+        按 clientId 查詢訂單：先查掛單，不在掛單中時查最近的訂單歷史
+
+        Returns:
+            找到時返回訂單；確認不存在返回 None；查詢失敗返回 {"error": ...}
+        """
+        endpoint = "/api/v1/order"
+        instruction = "orderQuery"
+        params = {"clientId": str(client_id), "symbol": symbol}
+        await self.rate_limiter.acquire_for(instruction)
+        headers = self._generate_headers(instruction, params)
         try:
-            endpoint = "/api/v1/orders/history"
-            params = {"orderId": order_id, "symbol": symbol}
-            instruction = "orderHistoryQueryAll"
-            
-            headers = self._generate_headers(instruction, params)
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"{self.base_url}{endpoint}", params=params, headers=headers) as response:
-                    if response.status == 200:
-                        orders = await response.json()
-                        for order in orders:
-                            if order.get('id') == order_id:
-                                return order
-                    return None
+            session = await self._http.get_session()
+            async with session.get(f"{self.base_url}{endpoint}", params=params, headers=headers) as response:
+                if response.status == 200:
+                    return await response.json()
+                if response.status != 404:
+                    return {"error": f"狀態碼: {response.status}, 消息: {await response.text()}"}
         except Exception as e:
-            self.logger.error(f"獲取訂單歷史異常: {str(e)}")
+            return {"error": str(e) or type(e).__name__}
+        
+        # 已成交或已撤銷的訂單只出現在歷史中
+        history = await self.get_order_history(symbol, limit=RESOLVE_HISTORY_LIMIT)
+        if history is None:
+            return {"error": "查詢訂單歷史失敗"}
+        for order in history:
+            if str(order.get('clientId')) == str(client_id):
+                return order
+        return None
+    
+    async def resolve_client_order(self, symbol, client_id):
+        """
+        確認一筆結果不明（超時、連接中斷、5xx）的下單是否已生效
+        
+        多次按 clientId 查詢：找到即記為已接受並返回訂單；連續確認不存在時記為未生效，
+        之後可以用同一 clientId 安全重發；無法確認時保持未知狀態，不允許重發。
+        
+        Returns:
+            找到時返回訂單；確認不存在返回 None；無法確認返回 {"error": ...}
+        """
+        result = {"error": "未查詢"}
+        for attempt in range(RESOLVE_ATTEMPTS):
+            await asyncio.sleep(RESOLVE_DELAY * (attempt + 1))
+            try:
+                result = await asyncio.wait_for(self._get_order_by_client_id(client_id, symbol),
+                                                RESOLVE_QUERY_TIMEOUT)
+            except asyncio.TimeoutError:
+                result = {"error": "按clientId查詢訂單超時"}
+            if result is None or "error" not in result:
+                break
+        
+        if result is None:
+            self.order_index.mark_rejected(client_id, "確認訂單未生效", resolved=True)
+            self.logger.info(f"clientId {client_id} 已確認未生效，可以重發")
             return None
+        if "error" in result:
+            self.order_index.mark_unknown(client_id, result["error"])
+            self.logger.error(f"無法確認 clientId {client_id} 的訂單狀態: {result['error']}")
+            return result
+        self.order_index.mark_accepted(client_id, result, resolved=True)
+        self.logger.info(f"clientId {client_id} 已確認生效，訂單ID {result.get('id')}")
+        return result
+    
+    async def _resolve_submit(self, symbol, client_id, error_msg):
+        """下單結果不明時按 clientId 確認，代替盲目重發"""
+        self.logger.warning(f"下單結果不明 (clientId {client_id}): {error_msg}，按clientId確認訂單狀態")
+        result = await self.resolve_client_order(symbol, client_id)
+        if result is None:
+            return {"error": f"{error_msg}（已確認訂單未生效）"}
+        if "error" in result:
+            return {"error": f"{error_msg}（訂單狀態未知: {result['error']}）"}
+        return result
+    
+    def _check_submitted(self, order_details):
+        """
+        檢查 clientId 是否已經提交過
+        
+        Returns:
+            (已知結果, 是否需要先按 clientId 確認)；已知結果不為 None 時不應重發
+        """
+        entry = self.order_index.get(order_details['clientId'])
+        if entry is None:
+            return None, False
+        if entry.state == ACCEPTED:
+            self.order_index.count_deduplicated()
+            self.logger.info(f"clientId {entry.client_id} 已被接受（訂單ID {entry.order_id}），不再重發")
+            return entry.order, False
+        if entry.state == PENDING:
+            return {"error": f"clientId {entry.client_id} 的訂單正在提交中"}, False
+        return None, entry.state == UNKNOWN
+    
+    async def get_order_from_history(self, order_id, symbol):
+        """從訂單歷史中查詢訂單"""
+        orders = await self.get_order_history(symbol, order_id=order_id)
+        for order in orders or []:
+            if str(order.get('id')) == str(order_id):
+                return order
+        return None
         
     async def get_all_orders(self, symbol):
         """獲取所有訂單（包括活動和歷史）"""
@@ -182,21 +323,7 @@ class BackpackAPIClient:
     
     async def get_ticker(self, symbol):
         """獲取指定交易對的行情信息"""
-        try:
-            # 直接使用requests而非依賴public_request
-            url = f"{self.base_url}/api/v1/ticker"
-            params = {"symbol": symbol}
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=params) as response:
-                    if response.status == 200:
-                        return await response.json()
-                    else:
-                        self.logger.error(f"獲取行情失敗: {response.status}, {await response.text()}")
-                        return None
-        except Exception as e:
-            self.logger.error(f"獲取行情異常: {e}")
-            return None
+        return await self.public_request("ticker", {"symbol": symbol.replace('-', '_').upper()})
     
     async def place_order(self, symbol, side, order_type, price=None, size=None):
         """兼容性方法，內部調用execute_order"""
@@ -216,34 +343,24 @@ class BackpackAPIClient:
         return await self.execute_order(order_details)
     
     def get_market_limits(self, symbol):
-        """獲取市場限制"""
-        endpoint = "/api/v1/markets"
-        try:
-            response = requests.get(f"{self.base_url}{endpoint}")
-            if response.status_code == 200:
-                normalized_symbol = symbol.replace('-', '_').upper()
-                for market in response.json():
-                    if market.get('symbol') == normalized_symbol:
-                        return {
-                            'base_precision': int(market.get('basePrecision', 8)),
-                            'quote_precision': int(market.get('quotePrecision', 8)),
-                            'min_order_size': float(market.get('minOrderSize', 0.00001)),
-                            'tick_size': float(market.get('tickSize', 0.0001))
-                        }
-                logger.error(f"未找到交易對 {normalized_symbol}")
-            return {}
-        except Exception as e:
-            logger.error(f"市場限制解析異常: {str(e)}")
+        """獲取市場限制（來自本地市場目錄，無需每次下載完整市場列表）"""
+        limits = get_market_catalog(self.base_url).get_limits(symbol)
+        if not limits:
+            logger.error(f"未找到交易對 {symbol.replace('-', '_').upper()}")
             return {}
+        return limits
     
-    async def execute_order(self, order_details):
-        """執行訂單（異步方法）"""
-        endpoint = "/api/v1/order"
-        instruction = "orderExecute"
-        
+    def _prepare_order(self, order_details):
+        """規範化訂單參數（交易對格式、數值轉字符串等）"""
         # 確保交易對格式正確
         order_details['symbol'] = order_details['symbol'].replace('-', '_').upper()
         
+        # 每筆訂單帶客戶端ID；重試時沿用同一個ID，由索引判斷是否已經生效
+        if order_details.get('clientId') is None:
+            order_details['clientId'] = self.order_index.new_client_id()
+        else:
+            order_details['clientId'] = int(order_details['clientId'])
+        
         # 市價單處理
         if order_details.get('orderType') == 'Market':
             order_details.pop('price', None)
@@ -262,29 +379,211 @@ class BackpackAPIClient:
             # 移除postOnly參數，看看是否能解決問題
             del order_details['postOnly']
         
+        return order_details
+    
+    async def execute_order(self, order_details):
+        """
+        執行訂單（異步方法）
+        
+        訂單帶 clientId：同一參數字典重試時，已被接受的訂單直接返回原結果；
+        超時、連接中斷或5xx時按 clientId 查詢確認，而不是重發。
+        提交過程不受調用方取消影響（見 _shielded_submit）。
+        """
+        order_details = self._prepare_order(order_details)
+        symbol = order_details['symbol']
+        client_id = order_details['clientId']
+        
+        known, needs_resolve = self._check_submitted(order_details)
+        if known is not None:
+            return known
+        if needs_resolve:
+            # 上次提交結果未知，先確認；已生效則不重發，仍無法確認則放棄本次重發
+            resolved = await self.resolve_client_order(symbol, client_id)
+            if resolved is not None:
+                return resolved
+        
+        self.order_index.begin(client_id, symbol)
+        return await self._shielded_submit(self._submit_order(order_details), [client_id])
+    
+    async def _submit_order(self, order_details):
+        """發送單筆下單請求並記錄結果（調用方已在索引中標記為在途）"""
+        endpoint = "/api/v1/order"
+        instruction = "orderExecute"
+        symbol = order_details['symbol']
+        client_id = order_details['clientId']
+        
+        # 先排隊取令牌再簽名，避免等待期間時間戳過期
+        await self.rate_limiter.acquire_for(instruction)
+        
         # 生成請求頭
         headers = self._generate_headers(instruction, order_details)
         
         try:
             # 使用aiohttp進行異步請求
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    f"{self.base_url}{endpoint}",
-                    json=order_details,
-                    headers=headers
-                ) as response:
-                    if response.status == 200:
-                        return await response.json()
-                    else:
-                        error_msg = f"狀態碼: {response.status}, 消息: {await response.text()}"
-                        self.logger.warning(f"請求失敗 (1/3): {error_msg}")
-                        return {"error": error_msg}
-                    
+            session = await self._http.get_session()
+            async with session.post(
+                f"{self.base_url}{endpoint}",
+                json=order_details,
+                headers=headers
+            ) as response:
+                if response.status == 200:
+                    result = await response.json()
+                    self.order_index.mark_accepted(client_id, result)
+                    return result
+                error_msg = f"狀態碼: {response.status}, 消息: {await response.text()}"
         except Exception as e:
-            self.logger.error(f"訂單執行失敗: {str(e)}")
-            return {"error": str(e)}
+            error_msg = str(e) or type(e).__name__
+            self.logger.error(f"訂單執行失敗: {error_msg}")
+            return await self._resolve_submit(symbol, client_id, error_msg)
+        
+        if response.status >= 500:
+            # 網關錯誤時訂單可能已經到達撮合引擎
+            return await self._resolve_submit(symbol, client_id, error_msg)
+        self.logger.warning(f"請求失敗: {error_msg}")
+        self.order_index.mark_rejected(client_id, error_msg)
+        return {"error": error_msg}
+    
+    async def execute_orders(self, orders, max_concurrency=DEFAULT_BATCH_CONCURRENCY, typed=False):
+        """
+        批量執行訂單（整個買賣梯度一次提交）
+        
+        交易所支持批量下單時通過 POST /api/v1/orders 一次發送；
+        不支持時退化為有並發上限的逐單提交。
+        
+        Args:
+            orders: 訂單參數列表
+            max_concurrency: 逐單提交時的最大並發數
+            typed: 為 True 時成功的結果解析為 Order
+            
+        Returns:
+            與輸入順序一致的結果列表，失敗的訂單為 {"error": ...}
+        """
+        if not orders:
+            return []
+        
+        orders = [self._prepare_order(order) for order in orders]
+        
+        # 重試同一批訂單時，已提交過的（已接受、在途或狀態未知）交給逐單路徑處理
+        fresh = [order for order in orders if self.order_index.get(order['clientId']) is None]
+        if self.batch_orders_supported and len(fresh) > 1 and len(fresh) == len(orders):
+            results = await self._shielded_submit(self._execute_order_batch(orders),
+                                                  [order['clientId'] for order in orders])
+            if results is not None:
+                return _to_orders(results) if typed else results
+        
+        # 逐單提交，限制並發避免觸發交易所限頻
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        
+        async def _submit(order):
+            async with semaphore:
+                return await self.execute_order(order)
+        
+        results = await asyncio.gather(*[_submit(order) for order in orders], return_exceptions=True)
+        results = [{"error": str(r)} if isinstance(r, Exception) else r for r in results]
+        return _to_orders(results) if typed else results
+    
+    async def _execute_order_batch(self, orders):
+        """
+        通過批量端點提交訂單
+        
+        Returns:
+            結果列表；端點不可用或整批被拒絕時返回 None，由調用方退化為逐單提交
+        """
+        endpoint = "/api/v1/orders"
+        instruction = "orderExecute"
+        
+        await self.rate_limiter.acquire_for(instruction, weight=len(orders))
+        
+        def reject_all(error_msg):
+            # 整批確定未生效，逐單提交時用同一 clientId 重發
+            for order in orders:
+                self.order_index.mark_rejected(order['clientId'], error_msg)
+        
+        for order in orders:
+            self.order_index.begin(order['clientId'], order['symbol'])
+        
+        try:
+            if self._signer is None:
+                self._signer = get_signer(self.secret_key, self.default_window)
+            sig_data = self._signer.sign_compound([(instruction, order) for order in orders],
+                                                  timestamp=self.clock.now_ms(), window=self.window)
+        except Exception as e:
+            self.logger.error(f"批量簽名生成失敗: {str(e)}")
+            reject_all(str(e))
+            return None
+        
+        headers = {
+            "X-API-KEY": self.api_key,
+            "X-SIGNATURE": sig_data["signature"],
+            "X-TIMESTAMP": sig_data["timestamp"],
+            "X-WINDOW": sig_data["window"],
+            "Content-Type": "application/json"
+        }
+        
+        try:
+            session = await self._http.get_session()
+            async with session.post(
+                f"{self.base_url}{endpoint}",
+                json=orders,
+                headers=headers
+            ) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    if not isinstance(data, list) or len(data) != len(orders):
+                        # 訂單可能已部分生效，不能再逐單重發，按 clientId 逐個確認
+                        self.logger.warning(f"批量下單返回格式無法識別: {data}")
+                        return await self._resolve_batch(orders, f"無法識別的批量下單返回: {data}")
+                    results = []
+                    for order, item in zip(orders, data):
+                        if isinstance(item, dict) and "id" in item:
+                            self.order_index.mark_accepted(order['clientId'], item)
+                            results.append(item)
+                        else:
+                            self.order_index.mark_rejected(order['clientId'], str(item))
+                            results.append({"error": str(item)})
+                    return results
+                
+                error_text = await response.text()
+                if response.status >= 500:
+                    return await self._resolve_batch(orders, f"狀態碼: {response.status}, 消息: {error_text}")
+                reject_all(error_text)
+                if response.status in (404, 405):
+                    # 交易所未開放批量端點，之後直接逐單提交
+                    self.batch_orders_supported = False
+                    self.logger.warning(f"批量下單端點不可用 ({response.status})，改為逐單提交")
+                else:
+                    self.logger.warning(f"批量下單失敗: 狀態碼: {response.status}, 消息: {error_text}，改為逐單提交")
+                return None
+        except Exception as e:
+            # 超時等情況下無法確定訂單是否已被接受，不能盲目逐單重發
+            error_msg = str(e) or type(e).__name__
+            self.logger.error(f"批量下單異常: {error_msg}")
+            return await self._resolve_batch(orders, error_msg)
+    
+    async def _shielded_submit(self, coro, client_ids):
+        """
+        保護已發出的下單請求不被調用方取消
+        
+        調用方（如同步接口超時）取消時，請求和超時確認在後台繼續完成並在索引中記錄最終狀態；
+        事件循環關閉等情況下提交本身仍被取消時，把在途的 clientId 標記為未知，重發前必須先確認。
+        """
+        async def _guarded():
+            try:
+                return await coro
+            except asyncio.CancelledError:
+                for client_id in client_ids:
+                    self.order_index.abandon(client_id, "下單請求被取消")
+                raise
+        
+        return await asyncio.shield(_guarded())
+    
+    async def _resolve_batch(self, orders, error_msg):
+        """批量下單結果不明時，按 clientId 並發確認每筆訂單"""
+        return list(await asyncio.gather(*[
+            self._resolve_submit(order['symbol'], order['clientId'], error_msg) for order in orders
+        ]))
     
-    def get_balance(self, asset=None):
+    async def get_balance(self, asset=None):
         """獲取賬戶餘額"""
         endpoint = "/api/v1/balance"
         instruction = "balanceQuery"
@@ -292,91 +591,209 @@ class BackpackAPIClient:
         if asset:
             params["asset"] = asset
         
+        await self.rate_limiter.acquire_for(instruction)
         headers = self._generate_headers(instruction, params)
         
         try:
-            response = requests.get(
+            session = await self._http.get_session()
+            async with session.get(
                 f"{self.base_url}{endpoint}",
                 headers=headers,
                 params=params
-            )
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                error_msg = f"狀態碼: {response.status_code}, 消息: {response.text}"
-                logger.warning(f"請求失敗: {error_msg}")
-                return {"error": error_msg}
+            ) as response:
+                if response.status == 200:
+                    return await response.json()
+                else:
+                    error_msg = f"狀態碼: {response.status}, 消息: {await response.text()}"
+                    logger.warning(f"請求失敗: {error_msg}")
+                    return {"error": error_msg}
                 
         except Exception as e:
             logger.error(f"獲取餘額失敗: {str(e)}")
             return {"error": str(e)}
         
-    async def get_order_history(self, symbol, order_id=None):
-        """獲取訂單歷史"""
+    async def get_order_history(self, symbol=None, order_id=None, limit=100, offset=0):
+        """獲取一頁訂單歷史（新到舊），遍歷全部歷史請使用 iter_order_history"""
+        params = {"limit": str(limit), "offset": str(offset)}
+        if symbol:
+            params["symbol"] = symbol
+        if order_id:
+            params["orderId"] = str(order_id)
         try:
-            endpoint = "/api/v1/order/history"  # 嘗試這個端點
-            params = {"symbol": symbol}
-            if order_id:
-                params["orderId"] = order_id
-            
-            instruction = "orderHistoryQuery"  # 使用orderHistoryQuery而不是orderHistoryQueryAll
-            
-            # 生成請求頭
+            return await self._fetch_history_page("/wapi/v1/history/orders", "orderHistoryQueryAll", params)
+        except HistoryFetchError as e:
+            self.logger.warning(f"獲取訂單歷史失敗: {e}")
+            return None
+    
+    async def _fetch_history_page(self, endpoint, instruction, params):
+        """
+        拉取一頁私有歷史數據
+        
+        限頻、5xx和網絡錯誤按指數退避重試（每次重新簽名）；重試耗盡或遇到其他錯誤時
+        拋出 HistoryFetchError，分頁器不會把失敗的頁當作末尾而靜默截斷結果。
+        """
+        last_error = None
+        for attempt in range(PAGE_RETRIES + 1):
+            if attempt:
+                await asyncio.sleep(RETRY_BACKOFF * (2 ** (attempt - 1)))
+            await self.rate_limiter.acquire_for(instruction)
             headers = self._generate_headers(instruction, params)
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    f"{self.base_url}{endpoint}",
-                    params=params,
-                    headers=headers
-                ) as response:
+            try:
+                session = await self._http.get_session()
+                async with session.get(f"{self.base_url}{endpoint}", params=params, headers=headers) as response:
                     if response.status == 200:
                         result = await response.json()
-                        self.logger.info(f"獲取訂單歷史成功: {result}")
+                        if not isinstance(result, list):
+                            raise HistoryFetchError(f"{endpoint} 返回了意外的格式: {str(result)[:200]}")
                         return result
-                    else:
-                        error_msg = f"狀態碼: {response.status}, 消息: {await response.text()}"
-                        self.logger.warning(f"獲取訂單歷史失敗: {error_msg}")
-                        return None
-        except Exception as e:
-            self.logger.error(f"獲取訂單歷史異常: {str(e)}")
-            return None
-
+                    last_error = f"狀態碼: {response.status}, 消息: {await response.text()}"
+                    if response.status != 429 and response.status < 500:
+                        break
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                last_error = str(e) or type(e).__name__
+        raise HistoryFetchError(f"{endpoint} offset={params.get('offset')}: {last_error}")
     
-    def get_open_orders(self, symbol=None):
-        """獲取未成交訂單"""
+    def iter_fills(self, symbol=None, since_ms=None, until_ms=None, order_id=None,
+                   page_size=DEFAULT_PAGE_SIZE, prefetch=DEFAULT_PREFETCH):
+        """
+        按時間窗口流式遍歷成交歷史（新到舊）
+        
+        窗口上界默認固定為調用時刻，遍歷期間新產生的成交不會移動偏移，分頁結果保持穩定。
+        某頁重試後仍失敗時拋出 HistoryFetchError。
+        
+        用法:
+            async for fill in client.iter_fills("SOL_USDC", since_ms=last_sync_ms):
+                ...
+        """
+        params = {"to": str(int(until_ms if until_ms is not None else self.clock.now_ms()))}
+        if symbol:
+            params["symbol"] = symbol
+        if since_ms is not None:
+            params["from"] = str(int(since_ms))
+        if order_id:
+            params["orderId"] = str(order_id)
+        
+        def fetch(offset, limit):
+            page_params = dict(params, limit=str(limit), offset=str(offset))
+            return self._fetch_history_page("/wapi/v1/history/fills", "fillHistoryQueryAll", page_params)
+        
+        return paginate(fetch, page_size, prefetch, key=fill_key)
+    
+    def iter_order_history(self, symbol=None, after_id=None, page_size=DEFAULT_PAGE_SIZE, prefetch=DEFAULT_PREFETCH):
+        """
+        按ID游標流式遍歷訂單歷史（新到舊）
+        
+        訂單歷史接口不支持時間過濾，訂單ID單調遞增，因此遇到不大於 after_id 的訂單即停止。
+        遍歷期間新增的訂單會讓後續頁與前一頁重疊，重複項按ID跳過。
+        """
+        params = {}
+        if symbol:
+            params["symbol"] = symbol
+        
+        def fetch(offset, limit):
+            page_params = dict(params, limit=str(limit), offset=str(offset))
+            return self._fetch_history_page("/wapi/v1/history/orders", "orderHistoryQueryAll", page_params)
+        
+        stop = None
+        if after_id is not None:
+            stop = lambda order: int(order.get('id', 0)) <= int(after_id)
+        return paginate(fetch, page_size, prefetch, key=lambda order: order.get('id'), stop=stop)
+    
+    async def get_open_orders(self, symbol=None, typed=False):
+        """獲取未成交訂單，typed 為 True 時解析為 Order 列表"""
         endpoint = "/api/v1/orders"
         instruction = "orderQueryAll"
         params = {}
         if symbol:
             params["symbol"] = symbol.replace('-', '_').upper()
         
+        await self.rate_limiter.acquire_for(instruction)
         headers = self._generate_headers(instruction, params)
         
         try:
-            response = requests.get(
+            session = await self._http.get_session()
+            async with session.get(
                 f"{self.base_url}{endpoint}",
                 headers=headers,
                 params=params
-            )
-            
-            if response.status_code == 200:
-                return response.json()
-            else:
-                error_msg = f"狀態碼: {response.status_code}, 消息: {response.text}"
-                logger.warning(f"請求失敗: {error_msg}")
-                return {"error": error_msg}
+            ) as response:
+                if response.status == 200:
+                    result = await response.json()
+                    if typed and isinstance(result, list):
+                        return [Order.from_rest(order) for order in result]
+                    return result
+                else:
+                    error_msg = f"狀態碼: {response.status}, 消息: {await response.text()}"
+                    logger.warning(f"請求失敗: {error_msg}")
+                    return {"error": error_msg}
                 
         except Exception as e:
             logger.error(f"獲取未成交訂單失敗: {str(e)}")
             return {"error": str(e)}
         
-    def get_order_book(symbol, limit=20):
-        """獲取市場深度"""
-        endpoint = f"/api/{API_VERSION}/depth"
-        params = {"symbol": symbol, "limit": str(limit)}
-        return make_request("GET", endpoint, params=params)
+    async def get_order_book(self, symbol, limit=20):
+        """獲取市場深度（交易所返回完整深度，本地按 limit 截斷）"""
+        depth = await self.public_request("depth", {"symbol": symbol.replace('-', '_').upper()})
+        if not isinstance(depth, dict):
+            return {"error": "獲取市場深度失敗"}
+        # 緩存中的對象可能被其他調用方共享，不能原地修改
+        depth = dict(depth)
+        if limit:
+            # 賣單按價格升序、買單按價格降序取最優的 limit 檔
+            depth["asks"] = sorted(depth.get("asks", []), key=lambda x: float(x[0]))[:limit]
+            depth["bids"] = sorted(depth.get("bids", []), key=lambda x: float(x[0]), reverse=True)[:limit]
+        return depth
+    
+    async def get_klines(self, symbol, interval="1h", limit=100):
+        """
+        獲取K線數據
+        
+        Args:
+            symbol: 交易對
+            interval: K線週期，例如 1m、15m、1h、1d
+            limit: 最近的K線數量
+            
+        Returns:
+            K線字典列表（含 start、open、high、low、close、volume 等字段）
+        """
+        interval = KLINE_INTERVAL_ALIASES.get(interval, interval)
+        seconds = KLINE_INTERVAL_SECONDS.get(interval)
+        if seconds is None:
+            return {"error": f"不支持的K線週期: {interval}"}
+        
+        end_time = int(time.time())
+        params = {
+            "symbol": symbol.replace('-', '_').upper(),
+            "interval": interval,
+            "startTime": end_time - seconds * int(limit),
+            "endTime": end_time
+        }
+        # 起止時間每次都不同，按交易對、週期和數量緩存
+        klines = await self.public_request("klines", params, cache_key=("klines", params["symbol"], interval, int(limit)))
+        if klines is None:
+            return {"error": "獲取K線數據失敗"}
+        return klines[-int(limit):] if isinstance(klines, list) else klines
+    
+    async def get_deposit_address(self, blockchain):
+        """獲取存款地址"""
+        endpoint = "/wapi/v1/capital/deposit/address"
+        instruction = "depositAddressQuery"
+        params = {"blockchain": blockchain}
+        
+        await self.rate_limiter.acquire_for(instruction)
+        headers = self._generate_headers(instruction, params)
+        
+        try:
+            session = await self._http.get_session()
+            async with session.get(f"{self.base_url}{endpoint}", params=params, headers=headers) as response:
+                if response.status == 200:
+                    return await response.json()
+                error_msg = f"狀態碼: {response.status}, 消息: {await response.text()}"
+                self.logger.warning(f"獲取存款地址失敗: {error_msg}")
+                return {"error": error_msg}
+        except Exception as e:
+            self.logger.error(f"獲取存款地址異常: {str(e)}")
+            return {"error": str(e)}
     
     async def cancel_all_orders(self, symbol):
         """取消指定交易對的所有未成交訂單"""
@@ -385,23 +802,25 @@ class BackpackAPIClient:
             payload = {"symbol": symbol}
             instruction = "orderCancelAll"
             
+            await self.rate_limiter.acquire_for(instruction)
+            
             # 生成請求頭
             headers = self._generate_headers(instruction, payload)
             
             # 使用aiohttp進行異步請求
-            async with aiohttp.ClientSession() as session:
-                async with session.delete(
-                    f"{self.base_url}{endpoint}",
-                    json=payload,  # 使用json參數
-                    headers=headers
-                ) as response:
-                    if response.status == 200:
-                        return await response.json()  # 確保返回的是協程
-                    else:
-                        error_msg = f"狀態碼: {response.status}, 消息: {await response.text()}"
-                        self.logger.warning(f"取消所有訂單失敗: {error_msg}")
-                        return None
-                                                        
+            session = await self._http.get_session()
+            async with session.delete(
+                f"{self.base_url}{endpoint}",
+                json=payload,  # 使用json參數
+                headers=headers
+            ) as response:
+                if response.status == 200:
+                    return await response.json()  # 確保返回的是協程
+                else:
+                    error_msg = f"狀態碼: {response.status}, 消息: {await response.text()}"
+                    self.logger.warning(f"取消所有訂單失敗: {error_msg}")
+                    return None
+                                                    
         except Exception as e:
             self.logger.error(f"取消所有訂單異常: {str(e)}")
             return None
@@ -416,61 +835,60 @@ class BackpackAPIClient:
             }
             instruction = "orderCancel"
             
+            await self.rate_limiter.acquire_for(instruction)
+            
             # 生成請求頭
             headers = self._generate_headers(instruction, payload)
             
             # 使用aiohttp進行異步請求
-            async with aiohttp.ClientSession() as session:
-                async with session.delete(
-                    f"{self.base_url}{endpoint}",
-                    json=payload,  # 使用json參數
-                    headers=headers
-                ) as response:
-                    if response.status == 200:
-                        return await response.json()  # 確保返回的是協程
-                    else:
-                        error_msg = f"狀態碼: {response.status}, 消息: {await response.text()}"
-                        self.logger.warning(f"取消訂單失敗: {error_msg}")
-                        return None
-                                                    
+            session = await self._http.get_session()
+            async with session.delete(
+                f"{self.base_url}{endpoint}",
+                json=payload,  # 使用json參數
+                headers=headers
+            ) as response:
+                if response.status == 200:
+                    return await response.json()  # 確保返回的是協程
+                else:
+                    error_msg = f"狀態碼: {response.status}, 消息: {await response.text()}"
+                    self.logger.warning(f"取消訂單失敗: {error_msg}")
+                    return None
+                                                
         except Exception as e:
             self.logger.error(f"取消訂單異常: {str(e)}")
             return None
     
-    async def get_fill_history(self, symbol, order_id=None):
-        """獲取成交歷史"""
+    async def cancel_orders(self, order_ids, symbol, max_concurrency=DEFAULT_BATCH_CONCURRENCY):
+        """
+        並發取消多個訂單
+        
+        Returns:
+            與 order_ids 順序一致的結果列表，失敗的訂單為 None
+        """
+        semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        
+        async def _cancel(order_id):
+            async with semaphore:
+                return await self.cancel_order(order_id, symbol)
+        
+        results = await asyncio.gather(*[_cancel(order_id) for order_id in order_ids], return_exceptions=True)
+        return [None if isinstance(r, Exception) else r for r in results]
+    
+    async def get_fill_history(self, symbol=None, order_id=None, limit=100):
+        """獲取最近 limit 條成交（新到舊），超過單頁上限時自動分頁"""
+        fills = []
+        pages = self.iter_fills(symbol, order_id=order_id, page_size=min(limit, DEFAULT_PAGE_SIZE), prefetch=0)
         try:
-            endpoint = "/wapi/v1/history/fills"  # 成交歷史端點
-            params = {}
-            if symbol:
-                params["symbol"] = symbol
-            if order_id:
-                params["orderId"] = order_id
-            
-            instruction = "fillHistoryQueryAll"
-            
-            # 生成請求頭
-            headers = self._generate_headers(instruction, params)
-            
-            self.logger.info(f"獲取成交歷史，參數: {params}")
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    f"{self.base_url}{endpoint}",
-                    params=params,
-                    headers=headers
-                ) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        self.logger.info(f"獲取成交歷史成功: {result}")
-                        return result
-                    else:
-                        error_msg = f"狀態碼: {response.status}, 消息: {await response.text()}"
-                        self.logger.warning(f"獲取成交歷史失敗: {error_msg}")
-                        return None
-        except Exception as e:
-            self.logger.error(f"獲取成交歷史異常: {str(e)}")
+            async for fill in pages:
+                fills.append(fill)
+                if len(fills) >= limit:
+                    break
+        except HistoryFetchError as e:
+            self.logger.warning(f"獲取成交歷史失敗: {e}")
             return None
+        finally:
+            await pages.aclose()
+        return fills
         
     async def get_market_info(self, symbol):
         """獲取市場資訊，包括精度"""
@@ -478,99 +896,19 @@ class BackpackAPIClient:
             endpoint = "/api/v1/market"
             params = {"symbol": symbol}
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(f"{self.base_url}{endpoint}", params=params) as response:
-                    if response.status == 200:
-                        return await response.json()
-                    else:
-                        self.logger.error(f"獲取市場資訊失敗: {response.status}, {await response.text()}")
-                        return None
+            session = await self._http.get_session()
+            async with session.get(f"{self.base_url}{endpoint}", params=params) as response:
+                if response.status == 200:
+                    return await response.json()
+                else:
+                    self.logger.error(f"獲取市場資訊失敗: {response.status}, {await response.text()}")
+                    return None
         except Exception as e:
             self.logger.error(f"獲取市場資訊異常: {e}")
             return None
         
     
     
-    async def connect_websocket(self, symbol, callback=None):
-        """建立WebSocket連接並訂閱訂單更新"""
-        try:
-            ws_url = "wss://ws.backpack.exchange"
-            self.logger.info(f"正在連接WebSocket: {ws_url}")
-            
-            async with websockets.connect(ws_url) as websocket:
-                # 生成訂閱參數
-                timestamp = int(time.time() * 1000)
-                window = 5000  # 默認窗口值
-                
-                # 準備訂閱數據
-                params = [f"account.orderUpdate.{symbol}"]
-                
-                # 計算簽名
-                signature = self._generate_signature({}, timestamp, "subscribe", window)
-                
-                subscription_data = {
-                    "method": "SUBSCRIBE",
-                    "params": [
-                        f"{channel}.{symbol}",
-                        self.api_key,
-                        signature,
-                        str(timestamp),
-                        str(window)
-                    ]
-                }
-                
-                # 發送訂閱請求
-                await websocket.send(json.dumps(subscription_data))
-                self.logger.info(f"已訂閱訂單更新: {params}")
-                
-                # 處理接收到的消息
-                while True:
-                    response = await websocket.recv()
-                    data = json.loads(response)
-                    self.logger.info(f"收到WebSocket消息: {data}")
-                    
-                    # 處理訂單成交消息
-                    if data.get("e") == "orderFill":
-                        self.logger.info(f"訂單成交: {data}")
-                        if callback:
-                            await callback(data)
-        except Exception as e:
-            self.logger.error(f"WebSocket連接錯誤: {e}")
-            
-    async def get_fill_history(self, symbol, order_id=None):
-        """獲取成交歷史"""
-        try:
-            endpoint = "/api/v1/history/fills"
-            params = {"symbol": symbol}
-            if order_id:
-                params["orderId"] = order_id
-            
-            instruction = "fillHistoryQueryAll"
-            
-            # 生成請求頭
-            headers = self._generate_headers(instruction, params)
-            
-            self.logger.info(f"獲取成交歷史，參數: {params}")
-            
-            # 添加HTTP請求部分
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    f"{self.base_url}{endpoint}",
-                    params=params,
-                    headers=headers
-                ) as response:
-                    if response.status == 200:
-                        result = await response.json()
-                        self.logger.info(f"獲取成交歷史成功: {result}")
-                        return result
-                    else:
-                        error_msg = f"狀態碼: {response.status}, 消息: {await response.text()}"
-                        self.logger.warning(f"獲取成交歷史失敗: {error_msg}")
-                        return None
-        except Exception as e:
-            self.logger.error(f"獲取成交歷史異常: {str(e)}")
-            return None
-            
     async def get_positions(self, symbol=None):
         """獲取當前持倉"""
         try:
@@ -583,20 +921,20 @@ class BackpackAPIClient:
             
             headers = self._generate_headers(instruction, params)
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    f"{self.base_url}{endpoint}",
-                    params=params,
-                    headers=headers
-                ) as response:
-                    if response.status == 200:
-                        positions = await response.json()
-                        self.logger.info(f"當前持倉: {positions}")
-                        return positions
-                    else:
-                        error_msg = f"狀態碼: {response.status}, 消息: {await response.text()}"
-                        self.logger.warning(f"獲取持倉失敗: {error_msg}")
-                        return None
+            session = await self._http.get_session()
+            async with session.get(
+                f"{self.base_url}{endpoint}",
+                params=params,
+                headers=headers
+            ) as response:
+                if response.status == 200:
+                    positions = await response.json()
+                    self.logger.info(f"當前持倉: {positions}")
+                    return positions
+                else:
+                    error_msg = f"狀態碼: {response.status}, 消息: {await response.text()}"
+                    self.logger.warning(f"獲取持倉失敗: {error_msg}")
+                    return None
         except Exception as e:
             self.logger.error(f"獲取持倉異常: {str(e)}")
             return None
@@ -610,88 +948,191 @@ class BackpackAPIClient:
             
             headers = self._generate_headers(instruction, params)
             
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    f"{self.base_url}{endpoint}",
-                    params=params,
-                    headers=headers
-                ) as response:
-                    if response.status == 200:
-                        return await response.json()
-                    else:
-                        error_msg = f"狀態碼: {response.status}, 消息: {await response.text()}"
-                        self.logger.warning(f"獲取賬戶餘額失敗: {error_msg}")
-                        return None
+            session = await self._http.get_session()
+            async with session.get(
+                f"{self.base_url}{endpoint}",
+                params=params,
+                headers=headers
+            ) as response:
+                if response.status == 200:
+                    return await response.json()
+                else:
+                    error_msg = f"狀態碼: {response.status}, 消息: {await response.text()}"
+                    self.logger.warning(f"獲取賬戶餘額失敗: {error_msg}")
+                    return None
         except Exception as e:
             self.logger.error(f"獲取賬戶餘額異常: {str(e)}")
             return None
         
     def connect_websocket(self, symbol, callback=None):
-        """建立WebSocket連接並訂閱訂單更新"""
-        def on_message(ws, message):
+        """
+        建立WebSocket連接並訂閱訂單更新
+        
+        經 BackpackWebSocket 訂閱私有數據流（共享連接，斷線自動重連並恢復訂閱）。
+        訂單成交時在投遞線程中調用 callback(data)；協程回調提交到共享事件循環執行。
+        
+        Returns:
+            BackpackWebSocket 實例，調用其 close() 取消訂閱；連接或訂閱失敗時返回 None
+        """
+        # ws_client 依賴 api 包，在這裡導入避免循環引用
+        from ws_client.client import BackpackWebSocket
+        
+        def on_message(stream, data):
             """處理接收到的WebSocket消息"""
-            data = json.loads(message)
-            self.logger.info(f"收到WebSocket消息: {data}")
-            
             # 處理訂單成交消息
-            if data.get("e") == "orderFill":
-                self.logger.info(f"訂單成交: {data}")
-                if callback:
-                    # 使用asyncio.create_task處理異步回調
-                    import asyncio
-                    asyncio.create_task(callback(data))
-        
-        def on_error(ws, error):
-            """處理WebSocket錯誤"""
-            self.logger.error(f"WebSocket錯誤: {error}")
-        
-        def on_close(ws, close_status_code, close_msg):
-            """處理WebSocket連接關閉"""
-            self.logger.info(f"WebSocket連接關閉: {close_status_code} {close_msg}")
-        
-        def on_open(ws):
-            """處理WebSocket連接建立"""
-            self.logger.info("WebSocket連接已建立")
-            
-            # 生成訂閱參數
-            timestamp = int(time.time() * 1000)
-            window = self.default_window
-            
-            # 準備訂閱數據
-            params = [f"account.orderUpdate.{symbol}" if symbol else "account.orderUpdate"]
-            
-            # 計算簽名
-            signature = self._generate_signature({}, timestamp, "subscribe", window)
-            
-            subscription_data = {
-                "method": "SUBSCRIBE",
-                "params": params,
-                "signature": [
-                    self.api_key,
-                    signature,
-                    str(timestamp),
-                    str(window)
-                ]
-            }
-            
-            # 發送訂閱請求
-            ws.send(json.dumps(subscription_data))
-            self.logger.info(f"已訂閱訂單更新: {params}")
-        
-        # 創建WebSocket連接
-        ws_url = "wss://ws.backpack.exchange"
-        ws = websocket.WebSocketApp(ws_url,
-                                  on_open=on_open,
-                                  on_message=on_message,
-                                  on_error=on_error,
-                                  on_close=on_close)
-        
-        # 在新線程中運行WebSocket連接
-        wst = threading.Thread(target=ws.run_forever)
-        wst.daemon = True  # 設置為守護線程，主線程結束時自動結束
-        wst.start()
+            if not isinstance(data, dict) or data.get("e") != "orderFill":
+                return
+            self.logger.info(f"訂單成交: {data}")
+            if callback is None:
+                return
+            if asyncio.iscoroutinefunction(callback):
+                get_loop_thread().submit(callback(data))
+            else:
+                callback(data)
         
+        ws = BackpackWebSocket(self.api_key, self.secret_key, symbol, on_message=on_message)
+        stream = f"account.orderUpdate.{symbol}" if symbol else "account.orderUpdate"
+        if not ws.connect() or not ws.private_subscribe(stream):
+            self.logger.error(f"WebSocket訂閱訂單更新失敗: {stream}")
+            ws.close()
+            return None
+        self.logger.info(f"已訂閱訂單更新: {stream}")
         return ws
+
+
+def _to_orders(results):
+    """把下單結果中成功的訂單解析為 Order，失敗項保持 {"error": ...}"""
+    return [
+        Order.from_rest(r) if isinstance(r, dict) and "error" not in r and "id" in r else r
+        for r in results
+    ]
+
+
+# ---------------------------------------------------------------------------
+# 同步接口：供舊版同步代碼（策略、CLI、面板）調用
+# 所有請求都在共享的後台事件循環上執行，每組API密鑰對應一個長期存在的異步客戶端
+# ---------------------------------------------------------------------------
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(api_key=None, secret_key=None):
+    """獲取（必要時創建）對應API密鑰的共享異步客戶端"""
+    key = (api_key, secret_key)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = BackpackAPIClient(api_key=api_key, secret_key=secret_key)
+                _clients[key] = client
+    return client
+
+
+def run_sync(coro, timeout=DEFAULT_FACADE_TIMEOUT):
+    """在共享的後台事件循環上執行協程並等待結果"""
+    return get_loop_thread().run(coro, timeout)
+
+
+def _call(coro, error_msg, timeout=DEFAULT_FACADE_TIMEOUT):
+    """執行協程，把 None 和異常統一轉換為 {"error": ...}"""
+    try:
+        result = run_sync(coro, timeout)
+    except Exception as e:
+        logger.error(f"{error_msg}: {str(e)}")
+        return {"error": str(e) or error_msg}
+    if result is None:
+        return {"error": error_msg}
+    return result
+
+
+def get_balance(api_key, secret_key):
+    """獲取賬戶餘額"""
+    return _call(get_client(api_key, secret_key).get_balance(), "獲取餘額失敗")
+
+
+def _with_client_id(client, order_details):
+    """
+    複製訂單參數並帶上 clientId，同時把 clientId 寫回調用方的字典
     
-    
+    調用方用同一字典重試時沿用同一 clientId，由訂單索引去重，不會重複下單。
+    """
+    if order_details.get('clientId') is None:
+        order_details['clientId'] = client.order_index.new_client_id()
+    return dict(order_details)
+
+
+def execute_order(api_key, secret_key, order_details):
+    """執行訂單（生成的 clientId 寫回 order_details）"""
+    client = get_client(api_key, secret_key)
+    return _call(client.execute_order(_with_client_id(client, order_details)), "訂單執行失敗")
+
+
+def execute_orders(api_key, secret_key, orders):
+    """批量執行訂單，返回與輸入順序一致的結果列表（生成的 clientId 寫回各訂單參數）"""
+    client = get_client(api_key, secret_key)
+    orders = [_with_client_id(client, order) for order in orders]
+    try:
+        return run_sync(client.execute_orders(orders))
+    except Exception as e:
+        logger.error(f"批量下單失敗: {str(e)}")
+        return [{"error": str(e)} for _ in orders]
+
+
+def get_open_orders(api_key, secret_key, symbol=None, typed=False):
+    """獲取未成交訂單"""
+    return _call(get_client(api_key, secret_key).get_open_orders(symbol, typed=typed), "獲取未成交訂單失敗")
+
+
+def cancel_all_orders(api_key, secret_key, symbol):
+    """取消所有訂單"""
+    return _call(get_client(api_key, secret_key).cancel_all_orders(symbol), "取消所有訂單失敗")
+
+
+def cancel_order(api_key, secret_key, order_id, symbol):
+    """取消指定訂單"""
+    return _call(get_client(api_key, secret_key).cancel_order(order_id, symbol), f"取消訂單 {order_id} 失敗")
+
+
+def get_fill_history(api_key, secret_key, symbol=None, limit=100):
+    """獲取歷史成交記錄"""
+    return _call(get_client(api_key, secret_key).get_fill_history(symbol, limit=limit), "獲取成交歷史失敗")
+
+
+def get_deposit_address(api_key, secret_key, blockchain):
+    """獲取存款地址"""
+    return _call(get_client(api_key, secret_key).get_deposit_address(blockchain), "獲取存款地址失敗")
+
+
+def get_ticker(symbol):
+    """獲取市場價格"""
+    return _call(get_client().get_ticker(symbol), "獲取行情失敗")
+
+
+def get_order_book(symbol, limit=20):
+    """獲取市場深度"""
+    return _call(get_client().get_order_book(symbol, limit), "獲取市場深度失敗")
+
+
+def get_klines(symbol, interval="1h", limit=100):
+    """獲取K線數據"""
+    return _call(get_client().get_klines(symbol, interval, limit), "獲取K線數據失敗")
+
+
+def get_markets():
+    """獲取所有市場信息（使用本地市場目錄緩存）"""
+    catalog = get_market_catalog(API_URL)
+    markets = catalog.markets()
+    if not markets:
+        return {"error": "無法獲取市場列表"}
+    return markets
+
 
+def get_market_limits(symbol):
+    """獲取交易對的下單限制（精度、最小下單量、價格步長）"""
+    limits = get_market_catalog(API_URL).get_limits(symbol)
+    if not limits:
+        logger.error(f"未找到交易對 {symbol.replace('-', '_').upper()}")
+        return None
+    return limits
@@ -0,0 +1,219 @@
+"""
+時鐘同步模塊，持續估計本地時鐘與交易所服務器時間的偏移
+"""
+import statistics
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from api.auth import set_time_source
+from api.http_pool import HttpSessionPool
+from config import API_URL
+from logger import setup_logger
+
+logger = setup_logger("api.clock")
+
+# 時鐘同步默認配置
+DEFAULT_SAMPLES = 5             # 每輪同步的 /time 採樣次數
+DEFAULT_SYNC_INTERVAL = 60.0    # 後台同步間隔（秒）
+HISTORY_SIZE = 30               # 用於估計漂移的歷史同步結果數量
+MAX_DRIFT = 0.001               # 漂移率上限（1ms/s），超出視為異常採樣
+MIN_WINDOW = 1000               # 建議接收窗口下限（毫秒）
+MAX_WINDOW = 60000              # 建議接收窗口上限（毫秒），交易所允許的最大值
+WINDOW_SAFETY_FACTOR = 3        # 建議接收窗口 = 安全係數 × (RTT + 不確定度)
+
+
+def _local_ms() -> float:
+    return time.time() * 1000
+
+
+class ClockSync:
+    """
+    服務器時間同步服務
+
+    每輪取若干次 /api/v1/time 樣本，以請求往返的中點作為服務器時間對應的本地時刻，
+    並選取 RTT 最小的樣本（排隊延遲最少，誤差上限為 RTT/2）。
+    多輪同步結果用於估計本地時鐘漂移，兩次同步之間按漂移率外推。
+    """
+
+    def __init__(self, base_url: str = API_URL, samples: int = DEFAULT_SAMPLES,
+                 interval: float = DEFAULT_SYNC_INTERVAL, http_pool: Optional[HttpSessionPool] = None):
+        self.base_url = base_url
+        self.samples = max(1, int(samples))
+        self.interval = interval
+        self._http = http_pool or HttpSessionPool(base_url)
+        self._lock = threading.Lock()
+
+        self._offset = 0.0          # 最近一次同步時的偏移（毫秒）
+        self._anchor = 0.0          # 最近一次同步的本地時刻（毫秒）
+        self._drift = 0.0           # 漂移率（偏移毫秒數 / 本地毫秒數）
+        self._uncertainty = None    # 最近一次同步的誤差上限（毫秒）
+        self._history = deque(maxlen=HISTORY_SIZE)
+        self._rtts = deque(maxlen=HISTORY_SIZE * DEFAULT_SAMPLES)
+        self._window = None         # 建議接收窗口（毫秒），每輪同步後更新
+        self._synced = False
+        self._failures = 0
+
+        self._thread = None
+        self._stop = threading.Event()
+
+    def _sample(self):
+        """取一次樣本，返回 (偏移, RTT)，失敗返回 None"""
+        session = self._http.get_sync_session()
+        start_wall = _local_ms()
+        start = time.perf_counter()
+        response = session.get(f"{self.base_url}/api/v1/time", timeout=self._http.request_timeout)
+        rtt = (time.perf_counter() - start) * 1000
+        if response.status_code != 200:
+            return None
+
+        data = response.json()
+        server_time = data.get('serverTime') if isinstance(data, dict) else data
+        server_time = float(server_time)
+        # 假設請求和響應單程耗時相同，服務器時間對應往返的中點
+        return server_time - (start_wall + rtt / 2), rtt
+
+    def sync(self) -> bool:
+        """
+        執行一輪同步
+
+        Returns:
+            是否成功獲得至少一個有效樣本
+        """
+        results = []
+        for _ in range(self.samples):
+            try:
+                result = self._sample()
+                if result is not None:
+                    results.append(result)
+            except Exception as e:
+                logger.debug(f"時間採樣失敗: {e}")
+
+        if not results:
+            with self._lock:
+                self._failures += 1
+            logger.error("時間同步失敗: 沒有有效樣本")
+            return False
+
+        offset, rtt = min(results, key=lambda r: r[1])
+        now = _local_ms()
+
+        with self._lock:
+            self._rtts.extend(r[1] for r in results)
+            self._history.append((now, offset))
+            self._drift = self._estimate_drift()
+            self._offset = offset
+            self._anchor = now
+            self._uncertainty = rtt / 2
+            self._window = self._estimate_window()
+            self._synced = True
+            self._failures = 0
+
+        logger.debug(f"時間同步完成 | 偏移量: {offset:.1f}ms, RTT: {rtt:.1f}ms, 漂移: {self._drift * 1e6:.1f}ppm")
+        return True
+
+    def _estimate_drift(self) -> float:
+        """對歷史 (本地時刻, 偏移) 做最小二乘擬合，斜率即漂移率"""
+        if len(self._history) < 3:
+            return 0.0
+        xs = [h[0] for h in self._history]
+        ys = [h[1] for h in self._history]
+        mean_x = sum(xs) / len(xs)
+        mean_y = sum(ys) / len(ys)
+        var_x = sum((x - mean_x) ** 2 for x in xs)
+        if var_x <= 0:
+            return 0.0
+        slope = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / var_x
+        return max(-MAX_DRIFT, min(MAX_DRIFT, slope))
+
+    @property
+    def offset(self) -> float:
+        """當前估計的偏移（服務器時間 - 本地時間，毫秒），含漂移外推"""
+        with self._lock:
+            if not self._synced:
+                return 0.0
+            return self._offset + self._drift * (_local_ms() - self._anchor)
+
+    def now_ms(self) -> int:
+        """估計的當前服務器時間（毫秒時間戳），用於請求簽名"""
+        return int(_local_ms() + self.offset)
+
+    def _estimate_window(self) -> int:
+        """按 RTT 的 p99 和同步誤差計算接收窗口（調用方持有鎖）"""
+        rtts = sorted(self._rtts)
+        p99 = rtts[min(len(rtts) - 1, int(len(rtts) * 0.99))]
+        return int(min(MAX_WINDOW, max(MIN_WINDOW, WINDOW_SAFETY_FACTOR * (p99 + self._uncertainty))))
+
+    def recommended_window(self) -> Optional[int]:
+        """
+        根據觀測到的 RTT 和同步誤差給出可安全使用的接收窗口（毫秒）
+
+        每輪同步後更新，簽名時直接讀取；尚未同步成功時返回 None，由調用方使用默認窗口。
+        """
+        return self._window
+
+    def status(self) -> Dict:
+        """獲取同步狀態"""
+        with self._lock:
+            rtts = list(self._rtts)
+            return {
+                "synced": self._synced,
+                "offset_ms": round(self._offset, 3),
+                "drift_ppm": round(self._drift * 1e6, 3),
+                "uncertainty_ms": None if self._uncertainty is None else round(self._uncertainty, 3),
+                "window_ms": self._window,
+                "rtt_median_ms": round(statistics.median(rtts), 3) if rtts else None,
+                "last_sync_age_s": round((_local_ms() - self._anchor) / 1000, 3) if self._synced else None,
+                "consecutive_failures": self._failures,
+            }
+
+    def start(self):
+        """啟動後台同步線程（重複調用無副作用）"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="clock-sync", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """停止後台同步線程"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self._http.request_timeout * self.samples)
+            self._thread = None
+
+    def _run(self):
+        # 啟動後立即同步一次，之後按間隔校正
+        while True:
+            try:
+                self.sync()
+            except Exception as e:
+                logger.error(f"後台時間同步異常: {e}")
+            if self._stop.wait(self.interval):
+                break
+
+
+_clocks: Dict[str, ClockSync] = {}
+_clocks_lock = threading.Lock()
+
+
+def get_clock(base_url: str = API_URL) -> ClockSync:
+    """
+    獲取進程內共享的時鐘同步服務
+
+    首次調用時啟動後台線程（立即完成第一輪同步，不阻塞調用方），同時註冊為簽名器的默認時間源，
+    因此 REST、WebSocket 和馬丁客戶端的簽名都使用校正後的時間；第一輪同步完成前使用本地時間。
+    """
+    clock = _clocks.get(base_url)
+    if clock is None:
+        with _clocks_lock:
+            clock = _clocks.get(base_url)
+            if clock is None:
+                clock = ClockSync(base_url)
+                clock.start()
+                if base_url == API_URL:
+                    set_time_source(clock.now_ms)
+                _clocks[base_url] = clock
+    return clock
@@ -0,0 +1,128 @@
+"""
+歷史數據分頁模塊：按時間窗口或ID游標流式拉取成交和訂單歷史，並增量回填到數據庫
+"""
+import asyncio
+from collections import deque
+from typing import AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional
+
+from logger import setup_logger
+from models import Fill
+
+logger = setup_logger("api.history")
+
+DEFAULT_PAGE_SIZE = 1000        # 交易所歷史接口的單頁上限
+DEFAULT_PREFETCH = 2            # 在消費當前頁時預取的後續頁數
+PAGE_RETRIES = 3                # 單頁失敗（限頻、5xx、網絡錯誤）的重試次數
+RETRY_BACKOFF = 0.5             # 重試退避基數（秒）
+BACKFILL_TIMEOUT = 600          # 同步代碼等待一次完整回填的最長時間（秒）
+HWM_OVERLAP_MS = 60 * 1000      # 增量回填時向前重疊的時間，覆蓋交易所入庫延遲；重複成交由 trade_id 去重
+
+
+class HistoryFetchError(Exception):
+    """分頁在重試後仍然失敗，調用方據此得知結果不完整，而不是被靜默截斷"""
+
+
+def fill_key(fill: Dict) -> Hashable:
+    """成交記錄的唯一鍵（缺少 tradeId 時退化為訂單ID、時間和數量的組合）"""
+    trade_id = fill.get("tradeId")
+    if trade_id is not None:
+        return trade_id
+    return fill.get("orderId"), fill.get("timestamp"), fill.get("price"), fill.get("quantity")
+
+
+async def paginate(fetch_page: Callable[[int, int], Awaitable[List[Dict]]],
+                   page_size: int = DEFAULT_PAGE_SIZE,
+                   prefetch: int = DEFAULT_PREFETCH,
+                   key: Optional[Callable[[Dict], Hashable]] = None,
+                   stop: Optional[Callable[[Dict], bool]] = None) -> AsyncIterator[Dict]:
+    """
+    按偏移分頁並預取後續頁的異步生成器
+
+    消費當前頁時最多有 prefetch 個後續頁請求在途，頁面按順序產出；
+    某頁不足 page_size 條即視為到達末尾。
+
+    Args:
+        fetch_page: (offset, limit) -> 該頁記錄，失敗時拋出 HistoryFetchError
+        page_size: 每頁條數
+        prefetch: 預取頁數，0 表示逐頁串行
+        key: 記錄的唯一鍵。遍歷期間有新記錄插入頭部時，後續頁會與前一頁重疊，按鍵跳過重複
+        stop: 遇到使其返回 True 的記錄時停止（用於ID游標）
+    """
+    pending = deque()
+    next_offset = 0
+    previous_keys = set()
+    try:
+        while True:
+            while len(pending) <= prefetch:
+                pending.append(asyncio.ensure_future(fetch_page(next_offset, page_size)))
+                next_offset += page_size
+            page = await pending.popleft()
+
+            page_keys = set()
+            for item in page:
+                if key is not None:
+                    item_key = key(item)
+                    if item_key in previous_keys or item_key in page_keys:
+                        continue
+                    page_keys.add(item_key)
+                if stop is not None and stop(item):
+                    return
+                yield item
+            if len(page) < page_size:
+                return
+            # 只需要與相鄰頁比較：頭部插入只會把記錄往後推，不會跳過
+            previous_keys = page_keys
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def backfill_fills(client, db, symbol: str, on_fill: Optional[Callable[[Fill], None]] = None,
+                         page_size: int = DEFAULT_PAGE_SIZE, prefetch: int = DEFAULT_PREFETCH,
+                         trade_type: str = "manual") -> int:
+    """
+    把成交歷史增量回填到數據庫
+
+    從數據庫中記錄的高水位（減去重疊窗口）開始，按頁流式寫入，不在內存中緩存全部歷史；
+    重複的成交由 trade_id 唯一索引忽略。整個窗口成功寫完後才推進高水位，
+    中途失敗時下次會重新拉取同一窗口。
+
+    Args:
+        client: BackpackAPIClient
+        db: Database
+        symbol: 交易對
+        on_fill: 每條新寫入的成交的回調（用於更新內存統計）
+
+    Returns:
+        新寫入的成交數
+    """
+    state_key = f"fills:{symbol}"
+    high_water = db.get_sync_state(state_key)
+    since_ms = max(0, int(high_water) - HWM_OVERLAP_MS) if high_water else None
+    until_ms = client.clock.now_ms()
+
+    inserted_total = 0
+    batch = []
+
+    def flush():
+        nonlocal inserted_total
+        inserted = db.insert_fills(batch, trade_type)
+        inserted_total += len(inserted)
+        if on_fill is not None:
+            for row in inserted:
+                on_fill(row)
+        batch.clear()
+
+    async for fill in client.iter_fills(symbol, since_ms=since_ms, until_ms=until_ms,
+                                        page_size=page_size, prefetch=prefetch):
+        batch.append(Fill.from_rest(fill, symbol))
+        if len(batch) >= page_size:
+            flush()
+    if batch:
+        flush()
+
+    db.set_sync_state(state_key, str(until_ms))
+    logger.info(f"{symbol} 成交歷史回填完成: 新增 {inserted_total} 條，高水位 {until_ms}")
+    return inserted_total
@@ -0,0 +1,252 @@
+"""
+HTTP連接池模塊，為API客戶端提供長連接會話
+"""
+import asyncio
+import threading
+import time
+from typing import Dict, Optional
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+
+from api.metrics import ApiMetrics, classify_error, get_api_metrics, route_of
+from logger import setup_logger
+
+logger = setup_logger("api.http_pool")
+
+# 連接池默認配置
+DEFAULT_POOL_LIMIT = 100            # 所有主機的總連接數上限
+DEFAULT_LIMIT_PER_HOST = 20         # 單個主機的連接數上限
+DEFAULT_KEEPALIVE_TIMEOUT = 60      # 空閒連接保持時間（秒）
+DEFAULT_REQUEST_TIMEOUT = 10        # 單次請求超時（秒）
+DEFAULT_WARMUP_PATH = "/api/v1/time"
+
+
+class _MeteredAdapter(HTTPAdapter):
+    """
+    記錄每次同步請求延遲和錯誤分類的 HTTPAdapter
+
+    非流式請求在這裡先讀完響應體再記錄（Session 之後讀取的是緩存），延遲包含響應體傳輸。
+    """
+
+    def __init__(self, metrics: ApiMetrics, *args, **kwargs):
+        self.metrics = metrics
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, *args, **kwargs):
+        start = time.perf_counter()
+        endpoint, instruction = route_of(request.method, request.url)
+        try:
+            response = super().send(request, *args, **kwargs)
+            if not kwargs.get("stream"):
+                response.content
+        except Exception as e:
+            self.metrics.record(endpoint, instruction, (time.perf_counter() - start) * 1000, classify_error(exception=e))
+            raise
+        error = classify_error(response.status_code, response.text if response.status_code >= 400 else "")
+        self.metrics.record(endpoint, instruction, (time.perf_counter() - start) * 1000, error)
+        return response
+
+
+class _MeteredResponse(aiohttp.ClientResponse):
+    """
+    讀完響應體時記錄延遲的 aiohttp 響應
+
+    on_request_end 在收到響應頭時觸發，此時記錄的延遲不含響應體傳輸；因此那裡只登記起始時間，
+    在 read()（json()、text() 都經過它）完成時記錄。響應體未被讀取時在釋放或關閉響應時記錄。
+    """
+
+    _metric = None      # (指標收集器, 端點, 指令, 請求開始時刻)，由追蹤配置在收到響應頭時設置
+
+    def _record(self, error: Optional[str]):
+        metric, self._metric = self._metric, None
+        if metric is not None:
+            metrics, endpoint, instruction, start = metric
+            metrics.record(endpoint, instruction, (time.perf_counter() - start) * 1000, error)
+
+    async def read(self) -> bytes:
+        try:
+            body = await super().read()
+        except Exception as e:
+            self._record(classify_error(exception=e))
+            raise
+        if self._metric is not None:
+            text = body.decode("utf-8", "replace") if self.status >= 400 else ""
+            self._record(classify_error(self.status, text))
+        return body
+
+    def release(self):
+        self._record(classify_error(self.status))
+        return super().release()
+
+    def close(self):
+        self._record(classify_error(self.status))
+        super().close()
+
+
+def _build_trace_config(metrics: ApiMetrics) -> aiohttp.TraceConfig:
+    """
+    為 aiohttp 會話創建記錄延遲和錯誤分類的追蹤配置
+
+    記錄的延遲從發出請求到讀完響應體（見 _MeteredResponse）；請求失敗時記錄到失敗為止。
+    """
+    trace_config = aiohttp.TraceConfig()
+
+    async def on_request_start(session, ctx, params):
+        ctx.start = time.perf_counter()
+
+    async def on_request_end(session, ctx, params):
+        endpoint, instruction = route_of(params.method, params.url)
+        params.response._metric = (metrics, endpoint, instruction, ctx.start)
+
+    async def on_request_exception(session, ctx, params):
+        latency = (time.perf_counter() - ctx.start) * 1000
+        endpoint, instruction = route_of(params.method, params.url)
+        metrics.record(endpoint, instruction, latency, classify_error(exception=params.exception))
+
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_request_exception.append(on_request_exception)
+    return trace_config
+
+
+class HttpSessionPool:
+    """
+    每個客戶端持有一個的長連接會話池
+
+    異步路徑使用 aiohttp.ClientSession（按事件循環各自維護一個），
+    同步路徑使用掛載了連接池的 requests.Session，避免每次請求重新建立TCP/TLS連接。
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        limit: int = DEFAULT_POOL_LIMIT,
+        limit_per_host: int = DEFAULT_LIMIT_PER_HOST,
+        keepalive_timeout: float = DEFAULT_KEEPALIVE_TIMEOUT,
+        request_timeout: float = DEFAULT_REQUEST_TIMEOUT,
+        metrics: Optional[ApiMetrics] = None
+    ):
+        self.base_url = base_url
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.request_timeout = request_timeout
+        # 請求延遲和錯誤分類統計，默認進程內共享
+        self.metrics = metrics or get_api_metrics()
+
+        # aiohttp 會話綁定在創建它的事件循環上，因此按循環分別保存
+        self._sessions: Dict[asyncio.AbstractEventLoop, aiohttp.ClientSession] = {}
+        self._sync_session: Optional[requests.Session] = None
+        self._lock = threading.Lock()
+
+    def get_sync_session(self) -> requests.Session:
+        """獲取同步請求使用的 requests.Session"""
+        with self._lock:
+            if self._sync_session is None:
+                session = requests.Session()
+                adapter = _MeteredAdapter(
+                    self.metrics,
+                    pool_connections=4,
+                    pool_maxsize=self.limit_per_host,
+                    max_retries=0
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._sync_session = session
+            return self._sync_session
+
+    async def get_session(self) -> aiohttp.ClientSession:
+        """獲取當前事件循環對應的 aiohttp 會話，不存在時創建"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            # 清理已關閉事件循環遺留的會話
+            for stale_loop in [l for l in self._sessions if l.is_closed()]:
+                self._sessions.pop(stale_loop, None)
+
+            session = self._sessions.get(loop)
+            if session is None or session.closed:
+                connector = aiohttp.TCPConnector(
+                    limit=self.limit,
+                    limit_per_host=self.limit_per_host,
+                    keepalive_timeout=self.keepalive_timeout,
+                    ttl_dns_cache=300
+                )
+                session = aiohttp.ClientSession(
+                    connector=connector,
+                    timeout=aiohttp.ClientTimeout(total=self.request_timeout),
+                    trace_configs=[_build_trace_config(self.metrics)],
+                    response_class=_MeteredResponse
+                )
+                self._sessions[loop] = session
+            return session
+
+    async def warmup(self, path: str = DEFAULT_WARMUP_PATH, connections: int = 2) -> int:
+        """
+        預熱異步連接池
+
+        Args:
+            path: 用於預熱的公共端點
+            connections: 預先建立的連接數
+
+        Returns:
+            成功預熱的連接數
+        """
+        session = await self.get_session()
+        url = f"{self.base_url}{path}"
+
+        async def _touch():
+            async with session.get(url) as response:
+                await response.read()
+                return response.status < 500
+
+        results = await asyncio.gather(
+            *[_touch() for _ in range(max(1, connections))],
+            return_exceptions=True
+        )
+        warmed = sum(1 for r in results if r is True)
+        if warmed < len(results):
+            logger.warning(f"連接池預熱部分失敗: {warmed}/{len(results)}")
+        else:
+            logger.debug(f"連接池預熱完成: {warmed} 個連接")
+        return warmed
+
+    def warmup_sync(self, path: str = DEFAULT_WARMUP_PATH) -> bool:
+        """預熱同步連接池"""
+        try:
+            response = self.get_sync_session().get(f"{self.base_url}{path}", timeout=self.request_timeout)
+            return response.status_code < 500
+        except Exception as e:
+            logger.warning(f"同步連接池預熱失敗: {e}")
+            return False
+
+    async def close(self):
+        """關閉所有會話"""
+        try:
+            current_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            current_loop = None
+
+        with self._lock:
+            sessions = list(self._sessions.items())
+            self._sessions.clear()
+
+        for loop, session in sessions:
+            if session.closed:
+                continue
+            if loop is current_loop:
+                await session.close()
+            elif loop.is_running():
+                # 會話屬於其他線程上的事件循環，交由該循環關閉
+                asyncio.run_coroutine_threadsafe(session.close(), loop)
+
+        self.close_sync()
+
+    def close_sync(self):
+        """關閉同步會話"""
+        with self._lock:
+            session = self._sync_session
+            self._sync_session = None
+        if session is not None:
+            session.close()
@@ -0,0 +1,366 @@
+"""
+K線存儲模塊：分塊並發下載歷史K線，按交易對和週期以列式二進制文件持久化，讀取時內存映射
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from api.client import KLINE_INTERVAL_ALIASES, KLINE_INTERVAL_SECONDS, get_client
+from api.loop_thread import get_loop_thread
+from config import KLINE_CACHE_DIR, KLINE_CHUNK_BARS, KLINE_DOWNLOAD_CONCURRENCY
+from logger import setup_logger
+from models import Kline
+from utils.helpers import url_namespace
+
+logger = setup_logger("api.kline_store")
+
+# 列名 -> 數據類型（小端序，文件可跨平台直接映射）
+COLUMNS: Dict[str, str] = {
+    "start": "<i8",           # 開盤時間（毫秒）
+    "open": "<f8",
+    "high": "<f8",
+    "low": "<f8",
+    "close": "<f8",
+    "volume": "<f8",
+    "quote_volume": "<f8",
+    "trades": "<i8",
+}
+DEFAULT_FETCH_TIMEOUT = 120     # 同步讀取時等待下載完成的最長時間（秒）
+
+
+class KlineSeries:
+    """
+    一段K線的列式只讀視圖
+
+    每列都是 numpy 數組（通常是文件的內存映射），例如 series.close[-24:]；
+    按時間截取使用 between()。
+    """
+
+    __slots__ = ("symbol", "interval") + tuple(COLUMNS)
+
+    def __init__(self, symbol: str, interval: str, columns: Dict[str, np.ndarray]):
+        self.symbol = symbol
+        self.interval = interval
+        for name in COLUMNS:
+            setattr(self, name, columns[name])
+
+    def __len__(self) -> int:
+        return len(self.start)
+
+    def tail(self, bars: int) -> "KlineSeries":
+        """最近 bars 根K線"""
+        return KlineSeries(self.symbol, self.interval, {name: getattr(self, name)[-bars:] for name in COLUMNS})
+
+    def between(self, start_ms: Optional[int] = None, end_ms: Optional[int] = None) -> "KlineSeries":
+        """開盤時間位於 [start_ms, end_ms) 的K線"""
+        lo = 0 if start_ms is None else int(np.searchsorted(self.start, start_ms, side="left"))
+        hi = len(self) if end_ms is None else int(np.searchsorted(self.start, end_ms, side="left"))
+        return KlineSeries(self.symbol, self.interval, {name: getattr(self, name)[lo:hi] for name in COLUMNS})
+
+    def to_models(self) -> List[Kline]:
+        """轉換為 Kline 列表（會複製數據，只用於少量K線）"""
+        return [
+            Kline(int(self.start[i]), float(self.open[i]), float(self.high[i]), float(self.low[i]),
+                  float(self.close[i]), float(self.volume[i]), float(self.quote_volume[i]), int(self.trades[i]))
+            for i in range(len(self))
+        ]
+
+
+class _SeriesFile:
+    """
+    單個 (交易對, 週期) 的磁盤存儲
+
+    每列一個只追加的二進制文件，meta.json 記錄已提交的行數和文件代號；
+    追加時先寫列文件再原子替換 meta.json，崩潰後多出的字節會在下次寫入時截掉。
+    已返回的內存映射只覆蓋當時的行數，追加不會改變其內容。
+    """
+
+    def __init__(self, directory: str, base_url: Optional[str] = None):
+        self.directory = directory
+        self.meta_path = os.path.join(directory, "meta.json")
+        self.meta = {"count": 0, "generation": 0, "first_start": None, "last_start": None, "checked_from": None,
+                     "base_url": base_url}
+        if os.path.exists(self.meta_path):
+            try:
+                with open(self.meta_path, "r", encoding="utf-8") as f:
+                    self.meta.update(json.load(f))
+            except (OSError, ValueError) as e:
+                logger.warning(f"K線元數據損壞，將重新下載: {self.meta_path}, {e}")
+        if base_url is not None and self.meta["base_url"] != base_url:
+            # 目錄按主機分開後仍可能被拷貝或手動指向別處；來源不同的數據不能與當前交易所的K線拼接
+            logger.info(f"K線緩存來自 {self.meta['base_url']}，與當前地址 {base_url} 不一致，將重新下載: {directory}")
+            self.meta.update(count=0, generation=self.meta["generation"] + 1, first_start=None,
+                             last_start=None, checked_from=None, base_url=base_url)
+
+    def _column_path(self, name: str, generation: Optional[int] = None) -> str:
+        if generation is None:
+            generation = self.meta["generation"]
+        return os.path.join(self.directory, f"{name}.{generation}.bin")
+
+    def read(self) -> Dict[str, np.ndarray]:
+        count = self.meta["count"]
+        columns = {}
+        for name, dtype in COLUMNS.items():
+            if count:
+                columns[name] = np.memmap(self._column_path(name), dtype=dtype, mode="r", shape=(count,))
+            else:
+                columns[name] = np.empty(0, dtype=dtype)
+        return columns
+
+    def _write_meta(self):
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def append(self, rows: Dict[str, np.ndarray]):
+        """追加新K線（開盤時間必須晚於已存的最後一根）"""
+        added = len(rows["start"])
+        if not added:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        count = self.meta["count"]
+        for name, dtype in COLUMNS.items():
+            with open(self._column_path(name), "ab") as f:
+                f.truncate(count * np.dtype(dtype).itemsize)
+                f.write(np.ascontiguousarray(rows[name], dtype=dtype).tobytes())
+        self.meta["count"] = count + added
+        if self.meta["first_start"] is None:
+            self.meta["first_start"] = int(rows["start"][0])
+        self.meta["last_start"] = int(rows["start"][-1])
+        self._write_meta()
+
+    def prepend(self, rows: Dict[str, np.ndarray]):
+        """在頭部插入更早的K線（需要重寫整列，只在向前擴展歷史時發生）"""
+        added = len(rows["start"])
+        if not added:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        count = self.meta["count"]
+        existing = self.read()
+        # 寫入新一代文件再切換 meta.json：其他線程持有的舊映射內容保持不變，
+        # 中途崩潰時 meta.json 仍指向完整的舊文件
+        generation = self.meta["generation"] + 1
+        for name, dtype in COLUMNS.items():
+            with open(self._column_path(name, generation), "wb") as f:
+                f.write(np.asarray(rows[name], dtype=dtype).tobytes())
+                f.write(np.ascontiguousarray(existing[name]).tobytes())
+        previous = self.meta["generation"]
+        self.meta["generation"] = generation
+        self.meta["count"] = count + added
+        self.meta["first_start"] = int(rows["start"][0])
+        if self.meta["last_start"] is None:
+            self.meta["last_start"] = int(rows["start"][-1])
+        self._write_meta()
+        del existing
+        for name in COLUMNS:
+            try:
+                os.remove(self._column_path(name, previous))
+            except OSError:
+                # Windows 上仍被映射的文件無法刪除；殘留的舊一代文件不會再被讀取
+                pass
+
+    def set_checked_from(self, start_ms: int):
+        """記錄已經向前查詢到的最早時間（更早的區間交易所沒有數據時避免重複查詢）"""
+        if self.meta["checked_from"] is None or start_ms < self.meta["checked_from"]:
+            self.meta["checked_from"] = int(start_ms)
+            os.makedirs(self.directory, exist_ok=True)
+            self._write_meta()
+
+
+def _to_columns(klines: List[Kline]) -> Dict[str, np.ndarray]:
+    return {name: np.array([getattr(k, name) for k in klines], dtype=dtype) for name, dtype in COLUMNS.items()}
+
+
+class KlineStore:
+    """
+    歷史K線存儲
+
+    首次請求時把所需區間按 KLINE_CHUNK_BARS 根一塊並發下載，寫入
+    <cache_dir>/<主機>/<交易對>/<週期>/ 下的列文件；之後只補拉缺失的尾部（以及需要時更早的頭部）。
+    只持久化已收盤的K線，正在形成的K線不寫入。主機取自客戶端的 base_url（與市場緩存相同的命名方式），
+    meta.json 同時記錄 base_url，與當前地址不一致的數據丟棄重下，本地模擬交易所的K線不會混入正式數據。
+
+    用法:
+        series = get_kline_store().load("SOL_USDC", "1h", bars=24)
+        closes = series.close
+    """
+
+    def __init__(self, cache_dir: str = KLINE_CACHE_DIR, client=None,
+                 chunk_bars: int = KLINE_CHUNK_BARS, concurrency: int = KLINE_DOWNLOAD_CONCURRENCY,
+                 base_url: Optional[str] = None):
+        self.cache_dir = cache_dir
+        self._client = client
+        self._base_url = base_url
+        self.chunk_bars = chunk_bars
+        self.concurrency = concurrency
+        self._files: Dict[Tuple[str, str], _SeriesFile] = {}
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+        self._files_lock = threading.Lock()
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_client()
+        return self._client
+
+    @property
+    def base_url(self) -> str:
+        """K線所屬的服務地址，未指定時取客戶端的 base_url"""
+        if self._base_url is None:
+            self._base_url = self.client.base_url
+        return self._base_url
+
+    @staticmethod
+    def _normalize(symbol: str, interval: str) -> Tuple[str, str, int]:
+        symbol = symbol.replace('-', '_').upper()
+        interval = KLINE_INTERVAL_ALIASES.get(interval, interval)
+        seconds = KLINE_INTERVAL_SECONDS.get(interval)
+        if seconds is None:
+            raise ValueError(f"不支持的K線週期: {interval}")
+        return symbol, interval, seconds * 1000
+
+    def _file(self, symbol: str, interval: str) -> _SeriesFile:
+        key = (symbol, interval)
+        with self._files_lock:
+            series_file = self._files.get(key)
+            if series_file is None:
+                base_url = self.base_url
+                series_file = _SeriesFile(os.path.join(self.cache_dir, url_namespace(base_url), symbol, interval),
+                                          base_url)
+                self._files[key] = series_file
+            return series_file
+
+    def read(self, symbol: str, interval: str) -> KlineSeries:
+        """只讀取磁盤上已有的K線，不發起網絡請求"""
+        symbol, interval, _ = self._normalize(symbol, interval)
+        return KlineSeries(symbol, interval, self._file(symbol, interval).read())
+
+    async def _fetch_chunk(self, symbol: str, interval: str, start_ms: int, end_ms: int,
+                           semaphore: asyncio.Semaphore) -> List[Kline]:
+        params = {
+            "symbol": symbol,
+            "interval": interval,
+            "startTime": start_ms // 1000,
+            "endTime": end_ms // 1000,
+        }
+        async with semaphore:
+            # 歷史區間不經過公共行情緩存，每塊只會請求一次
+            result = await self.client._public_request("klines", params)
+        if not isinstance(result, list):
+            raise RuntimeError(f"下載K線失敗: {symbol} {interval} {start_ms}-{end_ms}")
+        return [Kline.from_rest(item) for item in result]
+
+    async def _download(self, symbol: str, interval: str, step_ms: int, start_ms: int, end_ms: int) -> List[Kline]:
+        """並發下載 [start_ms, end_ms) 內的K線，按開盤時間排序去重"""
+        if end_ms <= start_ms:
+            return []
+        chunk_ms = step_ms * self.chunk_bars
+        semaphore = asyncio.Semaphore(max(1, self.concurrency))
+        chunks = await asyncio.gather(*[
+            self._fetch_chunk(symbol, interval, chunk_start, min(chunk_start + chunk_ms, end_ms), semaphore)
+            for chunk_start in range(start_ms, end_ms, chunk_ms)
+        ])
+        by_start = {}
+        for chunk in chunks:
+            for kline in chunk:
+                if start_ms <= kline.start < end_ms:
+                    by_start[kline.start] = kline
+        return [by_start[start] for start in sorted(by_start)]
+
+    async def ensure(self, symbol: str, interval: str, bars: Optional[int] = None,
+                     start_ms: Optional[int] = None) -> KlineSeries:
+        """
+        確保本地存有到最近一根已收盤K線為止的數據，返回完整序列
+
+        Args:
+            symbol: 交易對
+            interval: K線週期
+            bars: 至少覆蓋最近多少根K線
+            start_ms: 至少從這個時間開始（與 bars 取更早者）
+        """
+        symbol, interval, step_ms = self._normalize(symbol, interval)
+        key = (symbol, interval)
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+
+        async with lock:
+            series_file = self._file(symbol, interval)
+            meta = series_file.meta
+            now_ms = int(time.time() * 1000)
+            # 最後一根已收盤K線之後的邊界
+            end_ms = now_ms - now_ms % step_ms
+
+            wanted_from = None
+            if bars:
+                wanted_from = end_ms - step_ms * int(bars)
+            if start_ms is not None:
+                start_ms = int(start_ms) - int(start_ms) % step_ms
+                wanted_from = start_ms if wanted_from is None else min(wanted_from, start_ms)
+
+            if meta["count"] == 0:
+                # 冷啟動：整段並發下載
+                from_ms = wanted_from if wanted_from is not None else end_ms - step_ms * self.chunk_bars
+                klines = await self._download(symbol, interval, step_ms, from_ms, end_ms)
+                series_file.append(_to_columns(klines))
+                series_file.set_checked_from(from_ms)
+                if klines:
+                    logger.info(f"K線已下載: {symbol} {interval} {len(klines)} 根")
+            else:
+                # 頭部：請求的起點早於已查詢過的最早時間
+                checked_from = meta["checked_from"] if meta["checked_from"] is not None else meta["first_start"]
+                head_task = None
+                if wanted_from is not None and wanted_from < checked_from:
+                    head_task = self._download(symbol, interval, step_ms, wanted_from, meta["first_start"])
+                # 尾部：最後一根之後新收盤的K線
+                tail_task = self._download(symbol, interval, step_ms, meta["last_start"] + step_ms, end_ms)
+
+                head, tail = await asyncio.gather(head_task or asyncio.sleep(0, result=[]), tail_task)
+                if head:
+                    series_file.prepend(_to_columns(head))
+                if head_task is not None:
+                    series_file.set_checked_from(wanted_from)
+                if tail:
+                    series_file.append(_to_columns(tail))
+                if head or tail:
+                    logger.debug(f"K線已增量更新: {symbol} {interval} 頭部 {len(head)} 根, 尾部 {len(tail)} 根")
+
+            return KlineSeries(symbol, interval, series_file.read())
+
+    def load(self, symbol: str, interval: str = "1h", bars: Optional[int] = None,
+             start_ms: Optional[int] = None, timeout: float = DEFAULT_FETCH_TIMEOUT) -> KlineSeries:
+        """
+        同步接口：補齊數據後返回序列（bars 指定時只返回最近 bars 根）
+
+        下載失敗時退回磁盤上已有的數據。
+        """
+        try:
+            series = get_loop_thread().run(self.ensure(symbol, interval, bars=bars, start_ms=start_ms), timeout)
+        except Exception as e:
+            logger.warning(f"更新K線失敗，使用本地緩存: {symbol} {interval}, {e}")
+            series = self.read(symbol, interval)
+        if start_ms is not None:
+            series = series.between(start_ms=start_ms)
+        elif bars:
+            series = series.tail(bars)
+        return series
+
+
+_kline_store: Optional[KlineStore] = None
+_kline_store_lock = threading.Lock()
+
+
+def get_kline_store() -> KlineStore:
+    """獲取進程內共享的K線存儲"""
+    global _kline_store
+    if _kline_store is None:
+        with _kline_store_lock:
+            if _kline_store is None:
+                _kline_store = KlineStore()
+    return _kline_store
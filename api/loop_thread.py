@@ -0,0 +1,105 @@
+"""
+後台事件循環線程，供同步代碼調用異步客戶端
+"""
+import asyncio
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+from typing import Any, Awaitable, Optional
+
+from logger import setup_logger
+
+logger = setup_logger("api.loop_thread")
+
+
+class EventLoopThread:
+    """
+    在獨立守護線程中運行的 asyncio 事件循環
+
+    同步調用方通過 run() 阻塞等待協程結果，或通過 submit() 拿到 Future 後自行等待。
+    所有協程跑在同一個循環上，因此 aiohttp 會話和連接池在調用之間得以複用。
+    """
+
+    def __init__(self, name: str = "api-loop"):
+        self.name = name
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        self.start()
+        return self._loop
+
+    def start(self):
+        """啟動循環線程（重複調用無副作用）"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._ready.clear()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+        self._ready.wait()
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._ready.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            pending = asyncio.all_tasks(self._loop)
+            for task in pending:
+                task.cancel()
+            if pending:
+                self._loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            self._loop.close()
+
+    def in_loop_thread(self) -> bool:
+        """當前是否就在循環線程內（此時不能阻塞等待，否則死鎖）"""
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, coro: Awaitable) -> Future:
+        """提交協程，返回 concurrent.futures.Future"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro: Awaitable, timeout: Optional[float] = None) -> Any:
+        """
+        提交協程並阻塞等待結果
+
+        超時時取消協程再拋出 TimeoutError。取消只作用於協程中尚未受保護的部分：
+        下單等已經發出的請求由協程自己用 asyncio.shield 保護，在後台完成並記錄最終狀態，
+        調用方收到超時後應按結果未知處理（例如用同一 clientId 重試，由訂單索引去重）。
+        """
+        if self.in_loop_thread():
+            raise RuntimeError("不能在事件循環線程內同步等待協程")
+        future = self.submit(coro)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise
+
+    def stop(self):
+        """停止循環線程"""
+        with self._lock:
+            if self._loop is None or self._thread is None:
+                return
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+            self._thread = None
+            self._loop = None
+
+
+_default_loop_thread: Optional[EventLoopThread] = None
+_default_lock = threading.Lock()
+
+
+def get_loop_thread() -> EventLoopThread:
+    """獲取進程內共享的後台事件循環線程"""
+    global _default_loop_thread
+    if _default_loop_thread is None:
+        with _default_lock:
+            if _default_loop_thread is None:
+                _default_loop_thread = EventLoopThread()
+    return _default_loop_thread
@@ -0,0 +1,240 @@
+"""
+市場元數據目錄模塊，按交易對索引並持久化到磁盤
+"""
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from api.http_pool import HttpSessionPool
+from config import API_URL, MARKET_CACHE_PATH, MARKET_CACHE_TTL
+from logger import setup_logger
+from utils.helpers import url_namespace
+
+logger = setup_logger("api.market_catalog")
+
+# 查不到交易對時強制刷新的最小間隔（秒），避免錯誤輸入反復打到交易所
+MISS_REFRESH_INTERVAL = 60
+
+
+def _decimals(value: str) -> int:
+    """根據步長字符串計算小數位數，例如 '0.001' -> 3"""
+    value = str(value).rstrip('0') if '.' in str(value) else str(value)
+    return len(value.split('.')[-1]) if '.' in value else 0
+
+
+def normalize_symbol(symbol: str) -> str:
+    """統一交易對格式，例如 sol-usdc -> SOL_USDC"""
+    return symbol.replace('-', '_').upper()
+
+
+def parse_market_limits(market: Dict) -> Dict:
+    """從 /api/v1/markets 的單個市場數據中提取下單限制"""
+    filters = market.get('filters') or {}
+    price_filter = filters.get('price') or {}
+    quantity_filter = filters.get('quantity') or {}
+
+    tick_size = price_filter.get('tickSize') or market.get('tickSize') or '0.0001'
+    min_order_size = quantity_filter.get('minQuantity') or market.get('minOrderSize') or '0.00001'
+    step_size = quantity_filter.get('stepSize') or min_order_size
+
+    base_precision = market.get('basePrecision')
+    quote_precision = market.get('quotePrecision')
+
+    return {
+        'base_asset': market.get('baseSymbol'),
+        'quote_asset': market.get('quoteSymbol'),
+        'base_precision': int(base_precision) if base_precision is not None else _decimals(step_size),
+        'quote_precision': int(quote_precision) if quote_precision is not None else _decimals(tick_size),
+        'min_order_size': float(min_order_size),
+        'tick_size': float(tick_size)
+    }
+
+
+class MarketCatalog:
+    """
+    市場目錄
+
+    啟動時先讀取磁盤緩存，緩存未過期則完全不訪問網絡；
+    過期後重新拉取 /api/v1/markets，拉取失敗時繼續使用舊數據。
+    查詢按交易對建立字典索引，下單限制在建索引時預先解析。
+
+    緩存文件按服務地址分開（markets.json -> markets.<主機>.json），並在內容中記錄 base_url，
+    讀取時地址不一致的緩存直接丟棄，模擬交易所的市場數據不會被正式環境使用。
+    """
+
+    def __init__(self, base_url: str = API_URL, cache_path: Optional[str] = None,
+                 ttl: float = MARKET_CACHE_TTL, http_pool: Optional[HttpSessionPool] = None):
+        self.base_url = base_url
+        if cache_path is None and MARKET_CACHE_PATH:
+            root, ext = os.path.splitext(MARKET_CACHE_PATH)
+            cache_path = f"{root}.{url_namespace(base_url)}{ext}"
+        self.cache_path = cache_path
+        self.ttl = ttl
+        self._http = http_pool or HttpSessionPool(base_url)
+        self._lock = threading.RLock()
+        # 串行化「檢查是否過期 -> 拉取」，並發查詢只觸發一次拉取
+        self._refresh_lock = threading.Lock()
+
+        self._markets: List[Dict] = []
+        self._by_symbol: Dict[str, Dict] = {}
+        self._limits: Dict[str, Dict] = {}
+        self._fetched_at = 0.0
+        self._last_miss_refresh = 0.0
+
+        self._load_from_disk()
+
+    def _index(self, markets: List[Dict], fetched_at: float):
+        """重建交易對索引"""
+        by_symbol = {}
+        limits = {}
+        for market in markets:
+            symbol = market.get('symbol')
+            if not symbol:
+                continue
+            by_symbol[symbol] = market
+            try:
+                limits[symbol] = parse_market_limits(market)
+            except (TypeError, ValueError) as e:
+                logger.warning(f"解析 {symbol} 市場限制失敗: {e}")
+
+        with self._lock:
+            self._markets = markets
+            self._by_symbol = by_symbol
+            self._limits = limits
+            self._fetched_at = fetched_at
+
+    def _load_from_disk(self):
+        """讀取磁盤緩存"""
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                cached = json.load(f)
+            if cached.get('base_url') != self.base_url:
+                logger.info(f"市場緩存來自 {cached.get('base_url')}，與當前地址 {self.base_url} 不一致，已忽略")
+                return
+            self._index(cached.get('markets', []), float(cached.get('fetched_at', 0)))
+            logger.debug(f"已從緩存載入 {len(self._markets)} 個市場")
+        except Exception as e:
+            logger.warning(f"讀取市場緩存失敗: {e}")
+
+    def _save_to_disk(self):
+        """寫入磁盤緩存（先寫臨時文件再替換，避免寫到一半被讀取）"""
+        if not self.cache_path:
+            return
+        try:
+            directory = os.path.dirname(self.cache_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp_path = f"{self.cache_path}.tmp"
+            with self._lock:
+                payload = {'base_url': self.base_url, 'fetched_at': self._fetched_at, 'markets': self._markets}
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(payload, f, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_path)
+        except Exception as e:
+            logger.warning(f"寫入市場緩存失敗: {e}")
+
+    def is_fresh(self) -> bool:
+        """緩存是否在有效期內"""
+        return bool(self._markets) and (time.time() - self._fetched_at) < self.ttl
+
+    def refresh(self, force: bool = False) -> bool:
+        """
+        重新拉取市場列表
+
+        Args:
+            force: 即使緩存未過期也強制刷新
+
+        Returns:
+            是否有可用數據
+        """
+        if not force and self.is_fresh():
+            return True
+
+        with self._refresh_lock:
+            # 等鎖期間其他線程可能已經刷新完成
+            if not force and self.is_fresh():
+                return True
+            return self._fetch()
+
+    def _fetch(self) -> bool:
+        try:
+            response = self._http.get_sync_session().get(
+                f"{self.base_url}/api/v1/markets",
+                timeout=self._http.request_timeout
+            )
+            if response.status_code == 200:
+                markets = response.json()
+                if isinstance(markets, list):
+                    self._index(markets, time.time())
+                    self._save_to_disk()
+                    logger.info(f"市場目錄已更新: {len(markets)} 個市場")
+                    return True
+            logger.error(f"獲取市場列表失敗: 狀態碼: {response.status_code}, 消息: {response.text}")
+        except Exception as e:
+            logger.error(f"獲取市場列表異常: {str(e)}")
+
+        if self._markets:
+            logger.warning("市場列表刷新失敗，繼續使用緩存數據")
+            return True
+        return False
+
+    def get(self, symbol: str) -> Optional[Dict]:
+        """按交易對查詢原始市場數據"""
+        self.refresh()
+        symbol = normalize_symbol(symbol)
+        market = self._by_symbol.get(symbol)
+        if market is None and self._refresh_on_miss():
+            market = self._by_symbol.get(symbol)
+        return market
+
+    def get_limits(self, symbol: str) -> Optional[Dict]:
+        """按交易對查詢下單限制（精度、最小下單量、價格步長）"""
+        self.refresh()
+        symbol = normalize_symbol(symbol)
+        limits = self._limits.get(symbol)
+        if limits is None and self._refresh_on_miss():
+            limits = self._limits.get(symbol)
+        return dict(limits) if limits else None
+
+    def _refresh_on_miss(self) -> bool:
+        """查不到交易對時（可能是新上線）限頻地強制刷新一次"""
+        now = time.time()
+        if now - self._last_miss_refresh < MISS_REFRESH_INTERVAL:
+            return False
+        self._last_miss_refresh = now
+        return self.refresh(force=True)
+
+    def markets(self, market_type: Optional[str] = None) -> List[Dict]:
+        """獲取全部市場，可按 marketType 過濾（例如 SPOT）"""
+        self.refresh()
+        markets = self._markets
+        if market_type:
+            markets = [m for m in markets if m.get('marketType') == market_type]
+        return list(markets)
+
+    def symbols(self, market_type: Optional[str] = None) -> List[str]:
+        """獲取交易對列表"""
+        return [m.get('symbol') for m in self.markets(market_type)]
+
+    def __contains__(self, symbol: str) -> bool:
+        return self.get(symbol) is not None
+
+
+_catalogs: Dict[str, MarketCatalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_market_catalog(base_url: str = API_URL) -> MarketCatalog:
+    """獲取進程內共享的市場目錄"""
+    catalog = _catalogs.get(base_url)
+    if catalog is None:
+        with _catalogs_lock:
+            catalog = _catalogs.get(base_url)
+            if catalog is None:
+                catalog = MarketCatalog(base_url)
+                _catalogs[base_url] = catalog
+    return catalog
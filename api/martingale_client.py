@@ -8,7 +8,12 @@ import requests
 import base64
 import hmac
 from typing import Dict, List
-from cryptography.hazmat.primitives.asymmetric.ed25519 import Ed25519PrivateKey
+from api import client as api_client
+from api.auth import get_signer
+from api.clock import get_clock
+from api.http_pool import HttpSessionPool
+from api.kline_store import get_kline_store
+from config import API_URL
 from logger import setup_logger
 
 logger = setup_logger("martingale_api")
@@ -17,43 +22,40 @@ class MartingaleAPIClient:
     def __init__(self):
         self.api_key = os.getenv('MARTINGALE_API_KEY')
         self.secret_key = os.getenv('MARTINGALE_SECRET_KEY')
-        self.time_offset = 0
-        self.base_url = "https://api.backpack.exchange"
-        self._sync_server_time()
+        self.base_url = API_URL
+        # 长连接会话池
+        self._http = HttpSessionPool(self.base_url)
+        self.session = self._http.get_sync_session()
+        # 共享时钟同步服务（RTT中点估计，后台定期校正）
+        self.clock = get_clock(self.base_url)
+
+    def close(self):
+        """关闭HTTP会话"""
+        self._http.close_sync()
+
+    @property
+    def time_offset(self):
+        """本地时钟与服务器时间的偏移（毫秒）"""
+        return self.clock.offset
 
     def _sync_server_time(self):
-        """同步交易所服务器时间"""
-        try:
-            response = requests.get(f"{self.base_url}/api/v1/time")
-            server_time = response.json()['serverTime']
-            local_time = int(time.time() * 1000)
-            self.time_offset = server_time - local_time
-            logger.debug(f"时间同步完成 | 偏移量: {self.time_offset}ms")
-        except Exception as e:
-            logger.error(f"时间同步失败: {str(e)}")
-            self.time_offset = 0
+        """立即同步一次交易所服务器时间"""
+        if self.clock.sync():
+            logger.debug(f"时间同步完成 | 偏移量: {self.time_offset:.1f}ms")
 
     def _generate_signature(self, instruction: str, params: dict = None) -> dict:
         """生成API请求签名头"""
-        timestamp = str(int(time.time() * 1000) + self.time_offset)
-        window = "5000"
-        
-        # 构建签名消息
-        message = f"instruction={instruction}"
-        if params:
-            sorted_params = sorted(params.items())
-            param_str = "&".join([f"{k}={v}" for k, v in sorted_params])
-            message += f"&{param_str}"
-        message += f"&timestamp={timestamp}&window={window}"
+        timestamp = self.clock.now_ms()
 
         try:
-            private_key = Ed25519PrivateKey.from_private_bytes(base64.b64decode(self.secret_key))
-            signature = base64.b64encode(private_key.sign(message.encode())).decode()
+            # 共享签名器：私钥只解码一次
+            sig_data = get_signer(self.secret_key).sign(instruction, params, timestamp=timestamp,
+                                                         window=self.clock.recommended_window())
             return {
                 "X-API-KEY": self.api_key,
-                "X-SIGNATURE": signature,
-                "X-TIMESTAMP": timestamp,
-                "X-WINDOW": window
+                "X-SIGNATURE": sig_data["signature"],
+                "X-TIMESTAMP": sig_data["timestamp"],
+                "X-WINDOW": sig_data["window"]
             }
         except Exception as e:
             logger.error(f"签名生成失败: {str(e)}")
@@ -65,9 +67,10 @@ class MartingaleAPIClient:
         headers = self._generate_signature("balanceQuery")
         
         try:
-            response = requests.get(
+            response = self.session.get(
                 f"{self.base_url}{endpoint}",
-                headers=headers
+                headers=headers,
+                timeout=self._http.request_timeout
             )
             if response.status_code == 200:
                 for balance in response.json().get('balances', []):
@@ -82,39 +85,28 @@ class MartingaleAPIClient:
             return {'total': 0.0, 'available': 0.0}
 
     def get_historical_klines(self, symbol: str, interval: str = "1h", limit: int = 100) -> List[Dict]:
-        """获取K线数据（马丁策略专用版本）"""
-        endpoint = "/api/v1/klines"
-        params = {
-            "symbol": symbol,
-            "interval": interval,
-            "limit": limit  # 修正参数名为limit
-        }
-        
+        """获取K线数据（马丁策略专用版本，经本地K线存储增量更新）"""
         try:
-            headers = self._generate_signature("klinesQuery", params)
-            response = requests.get(
-                f"{self.base_url}{endpoint}",
-                params=params,
-                headers=headers
-            )
-            
-            if response.status_code == 200:
-                return [{
-                    'timestamp': kline[0],
-                    'open': float(kline[1]),
-                    'high': float(kline[2]),
-                    'low': float(kline[3]),
-                    'close': float(kline[4]),
-                    'volume': float(kline[5])
-                } for kline in response.json()]
-            return []
+            series = get_kline_store().load(symbol, interval, bars=limit)
+            return [{
+                'timestamp': int(series.start[i]),
+                'open': float(series.open[i]),
+                'high': float(series.high[i]),
+                'low': float(series.low[i]),
+                'close': float(series.close[i]),
+                'volume': float(series.volume[i])
+            } for i in range(len(series))]
         except Exception as e:
             logger.error(f"K线获取异常: {str(e)}")
             return []
 
     def execute_martingale_order(self, order_details: Dict) -> Dict:
-        """执行马丁策略订单"""
-        endpoint = "/api/v1/order"
+        """
+        执行马丁策略订单
+
+        经共享客户端下单：订单带 clientId（写回 order_details），超时或5xx时按 clientId
+        确认而不是重发；用同一参数字典重试不会重复下单。
+        """
         required_params = ["symbol", "side", "orderType", "quantity"]
         
         # 验证必要参数
@@ -122,19 +114,7 @@ class MartingaleAPIClient:
             logger.error("缺失必要订单参数")
             return {"error": "Missing required parameters"}
         
-        # 生成签名
-        headers = self._generate_signature("orderExecute", order_details)
-        
-        try:
-            response = requests.post(
-                f"{self.base_url}{endpoint}",
-                json=order_details,
-                headers=headers
-            )
-            return response.json()
-        except Exception as e:
-            logger.error(f"订单执行异常: {str(e)}")
-            return {"error": str(e)}
+        return api_client.execute_order(self.api_key, self.secret_key, order_details)
 
     def get_order_book(self, symbol: str, depth: int = 20) -> Dict:
         """获取市场深度数据"""
@@ -142,9 +122,10 @@ class MartingaleAPIClient:
         params = {"symbol": symbol, "limit": depth}
         
         try:
-            response = requests.get(
+            response = self.session.get(
                 f"{self.base_url}{endpoint}",
-                params=params
+                params=params,
+                timeout=self._http.request_timeout
             )
             return response.json()
         except Exception as e:
@@ -157,9 +138,10 @@ class MartingaleAPIClient:
         params = {"symbol": symbol}
         
         try:
-            response = requests.get(
+            response = self.session.get(
                 f"{self.base_url}{endpoint}",
-                params=params
+                params=params,
+                timeout=self._http.request_timeout
             )
             return float(response.json()['lastPrice'])
         except Exception as e:
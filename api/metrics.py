@@ -0,0 +1,252 @@
+"""
+REST請求指標模塊：按端點和指令統計延遲直方圖及錯誤分類
+"""
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+from logger import setup_logger
+
+logger = setup_logger("api.metrics")
+
+SUB_BUCKET_BITS = 5                     # 每個2的冪區間細分為32個桶，相對誤差約3%
+SUB_BUCKET_COUNT = 1 << SUB_BUCKET_BITS
+DEFAULT_DUMP_DIR = "metrics"
+
+# (HTTP方法, 路徑) -> 指令，用於把請求歸類到簽名指令
+ROUTE_INSTRUCTIONS: Dict[Tuple[str, str], str] = {
+    ("POST", "/api/v1/order"): "orderExecute",
+    ("POST", "/api/v1/orders"): "orderExecute",
+    ("GET", "/api/v1/order"): "orderQuery",
+    ("GET", "/api/v1/orders"): "orderQueryAll",
+    ("DELETE", "/api/v1/order"): "orderCancel",
+    ("DELETE", "/api/v1/orders"): "orderCancelAll",
+    ("GET", "/api/v1/balance"): "balanceQuery",
+    ("GET", "/api/v1/capital"): "balanceQuery",
+    ("GET", "/api/v1/positions"): "positionQuery",
+    ("GET", "/api/v1/order/history"): "orderHistoryQuery",
+    ("GET", "/api/v1/orders/history"): "orderHistoryQueryAll",
+    ("GET", "/wapi/v1/history/orders"): "orderHistoryQueryAll",
+    ("GET", "/api/v1/history/fills"): "fillHistoryQueryAll",
+    ("GET", "/wapi/v1/history/fills"): "fillHistoryQueryAll",
+    ("GET", "/wapi/v1/capital/deposit/address"): "depositAddressQuery",
+}
+
+
+class LatencyHistogram:
+    """
+    HDR風格的對數線性延遲直方圖（單位：微秒）
+
+    小於32微秒的值精確記錄，之後每個2的冪區間等分為32個桶，
+    因此任意量級的分位數相對誤差都在約3%以內，記錄操作為 O(1)。
+    """
+
+    __slots__ = ("counts", "count", "total", "min", "max")
+
+    def __init__(self):
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    @staticmethod
+    def _index(value_us: int) -> int:
+        if value_us < SUB_BUCKET_COUNT:
+            return value_us
+        shift = value_us.bit_length() - 1 - SUB_BUCKET_BITS
+        return SUB_BUCKET_COUNT * (shift + 1) + ((value_us >> shift) - SUB_BUCKET_COUNT)
+
+    @staticmethod
+    def _value(index: int) -> int:
+        """桶的代表值（桶區間中點）"""
+        if index < SUB_BUCKET_COUNT:
+            return index
+        shift = index // SUB_BUCKET_COUNT - 1
+        mantissa = index % SUB_BUCKET_COUNT + SUB_BUCKET_COUNT
+        return (mantissa << shift) + ((1 << shift) >> 1)
+
+    def record(self, value_ms: float):
+        value_us = max(0, int(value_ms * 1000))
+        index = self._index(value_us)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value_us
+        self.min = value_us if self.min is None else min(self.min, value_us)
+        self.max = value_us if self.max is None else max(self.max, value_us)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """第 p 百分位延遲（毫秒）"""
+        if not self.count:
+            return None
+        target = max(1, int(round(self.count * p / 100.0)))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self._value(index), self.max) / 1000.0
+        return self.max / 1000.0
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean_ms": round(self.total / self.count / 1000.0, 3),
+            "min_ms": round(self.min / 1000.0, 3),
+            "p50_ms": round(self.percentile(50), 3),
+            "p90_ms": round(self.percentile(90), 3),
+            "p99_ms": round(self.percentile(99), 3),
+            "p999_ms": round(self.percentile(99.9), 3),
+            "max_ms": round(self.max / 1000.0, 3),
+        }
+
+
+def classify_error(status: Optional[int] = None, body: str = "", exception: Optional[BaseException] = None) -> Optional[str]:
+    """
+    錯誤分類
+
+    Returns:
+        timeout、transport、POST_ONLY_TAKER、4xx:<狀態碼>、5xx，成功時返回 None
+    """
+    if exception is not None:
+        name = type(exception).__name__
+        if "Timeout" in name:
+            return "timeout"
+        return "transport"
+    if status is None or status < 400:
+        return None
+    if body and "POST_ONLY_TAKER" in body:
+        return "POST_ONLY_TAKER"
+    if status >= 500:
+        return "5xx"
+    return f"4xx:{status}"
+
+
+def route_of(method: str, url: str) -> Tuple[str, str]:
+    """把請求URL歸一化為 (端點, 指令)"""
+    path = urlsplit(str(url)).path or "/"
+    method = method.upper()
+    instruction = ROUTE_INSTRUCTIONS.get((method, path), "public" if path.startswith("/api/v1/") else "-")
+    return f"{method} {path}", instruction
+
+
+class ApiMetrics:
+    """
+    進程內REST指標收集器
+
+    按 (端點, 指令) 維護延遲直方圖、請求數和錯誤分類計數，
+    可隨時通過 snapshot() 查詢、top() 找出拖慢迭代的端點，或 dump() 導出到文件。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, str], LatencyHistogram] = {}
+        self._errors: Dict[Tuple[str, str], Dict[str, int]] = {}
+        self.started_at = time.time()
+
+    def record(self, endpoint: str, instruction: str, latency_ms: float, error: Optional[str] = None):
+        """記錄一次請求"""
+        key = (endpoint, instruction)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = LatencyHistogram()
+            histogram.record(latency_ms)
+            if error:
+                counters = self._errors.setdefault(key, {})
+                counters[error] = counters.get(error, 0) + 1
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """
+        當前指標快照
+
+        Returns:
+            {"<端點> [<指令>]": {count, mean_ms, p50_ms, ..., errors: {分類: 次數}}}
+        """
+        with self._lock:
+            result = {}
+            for (endpoint, instruction), histogram in self._histograms.items():
+                entry = histogram.summary()
+                entry["endpoint"] = endpoint
+                entry["instruction"] = instruction
+                entry["errors"] = dict(self._errors.get((endpoint, instruction), {}))
+                result[f"{endpoint} [{instruction}]"] = entry
+            return result
+
+    def error_totals(self) -> Dict[str, int]:
+        """按錯誤分類匯總（跨所有端點）"""
+        totals: Dict[str, int] = {}
+        with self._lock:
+            for counters in self._errors.values():
+                for name, count in counters.items():
+                    totals[name] = totals.get(name, 0) + count
+        return totals
+
+    def top(self, percentile: float = 99, limit: int = 5):
+        """按指定分位延遲從高到低排列的端點，用於定位迭代中的長尾來源"""
+        with self._lock:
+            rows = [
+                (f"{endpoint} [{instruction}]", histogram.percentile(percentile), histogram.count)
+                for (endpoint, instruction), histogram in self._histograms.items()
+                if histogram.count
+            ]
+        rows.sort(key=lambda row: row[1], reverse=True)
+        return rows[:limit]
+
+    def format_table(self) -> str:
+        """格式化為便於日誌輸出的表格"""
+        lines = [f"{'端點 [指令]':<48} {'次數':>7} {'p50':>9} {'p99':>9} {'max':>9}  錯誤"]
+        for name, entry in sorted(self.snapshot().items()):
+            errors = ", ".join(f"{k}={v}" for k, v in sorted(entry["errors"].items())) or "-"
+            lines.append(
+                f"{name:<48} {entry['count']:>7} {entry['p50_ms']:>8.2f}ms {entry['p99_ms']:>8.2f}ms "
+                f"{entry['max_ms']:>8.2f}ms  {errors}"
+            )
+        return "\n".join(lines)
+
+    def dump(self, path: Optional[str] = None) -> str:
+        """
+        導出指標到JSON文件
+
+        Returns:
+            寫入的文件路徑
+        """
+        if path is None:
+            path = os.path.join(DEFAULT_DUMP_DIR, f"api_metrics_{time.strftime('%Y%m%d_%H%M%S')}.json")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        payload = {
+            "started_at": self.started_at,
+            "dumped_at": time.time(),
+            "endpoints": self.snapshot(),
+            "error_totals": self.error_totals(),
+        }
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False, indent=2)
+        logger.info(f"API指標已導出: {path}")
+        return path
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._errors.clear()
+            self.started_at = time.time()
+
+
+_api_metrics: Optional[ApiMetrics] = None
+_api_metrics_lock = threading.Lock()
+
+
+def get_api_metrics() -> ApiMetrics:
+    """獲取進程內共享的REST指標收集器"""
+    global _api_metrics
+    if _api_metrics is None:
+        with _api_metrics_lock:
+            if _api_metrics is None:
+                _api_metrics = ApiMetrics()
+    return _api_metrics
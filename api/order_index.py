@@ -0,0 +1,154 @@
+"""
+客戶端訂單ID模塊：為每筆訂單生成 clientId 並在內存中跟蹤提交狀態，使重試和超時處理不會產生重複訂單
+"""
+import random
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from logger import setup_logger
+
+logger = setup_logger("api.order_index")
+
+CLIENT_ID_MAX = 2 ** 32 - 1     # 交易所 clientId 為 uint32
+MAX_ENTRIES = 10000             # 索引保留的訂單數上限，超出時淘汰最早的已完結記錄
+
+# 提交狀態
+PENDING = "pending"             # 請求在途
+ACCEPTED = "accepted"           # 交易所已接受（返回了訂單ID）
+REJECTED = "rejected"           # 確認未生效（明確拒絕，或超時後查詢確認不存在），可用同一 clientId 重發
+UNKNOWN = "unknown"             # 超時後仍無法確認，重發前必須先查詢
+
+
+class OrderEntry:
+    """單個 clientId 的提交記錄"""
+
+    __slots__ = ("client_id", "symbol", "state", "order", "error", "attempts", "updated")
+
+    def __init__(self, client_id: int, symbol: str):
+        self.client_id = client_id
+        self.symbol = symbol
+        self.state = PENDING
+        self.order: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.attempts = 0
+        self.updated = time.monotonic()
+
+    @property
+    def order_id(self) -> Optional[str]:
+        if self.order is None:
+            return None
+        return str(self.order.get("id"))
+
+    def __repr__(self):
+        return f"OrderEntry({self.client_id} {self.symbol} {self.state} order={self.order_id})"
+
+
+class ClientOrderIndex:
+    """
+    clientId 索引
+
+    起始ID隨機選取，之後遞增，降低多個進程共用同一賬戶時的衝突概率；
+    生成時跳過索引中仍在使用的ID。所有方法線程安全。
+    """
+
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[int, OrderEntry]" = OrderedDict()
+        self._next_id = random.randint(1, CLIENT_ID_MAX)
+        self._lock = threading.Lock()
+        self._stats = {"submitted": 0, "deduplicated": 0, "resolved_accepted": 0,
+                       "resolved_absent": 0, "unresolved": 0}
+
+    def new_client_id(self) -> int:
+        """生成一個未被佔用的 clientId"""
+        with self._lock:
+            while True:
+                client_id = self._next_id
+                self._next_id = self._next_id % CLIENT_ID_MAX + 1
+                if client_id not in self._entries:
+                    return client_id
+
+    def get(self, client_id) -> Optional[OrderEntry]:
+        with self._lock:
+            return self._entries.get(int(client_id))
+
+    def begin(self, client_id, symbol: str) -> OrderEntry:
+        """標記一次提交開始（首次提交或確認未生效後重發）"""
+        client_id = int(client_id)
+        with self._lock:
+            entry = self._entries.get(client_id)
+            if entry is None:
+                entry = OrderEntry(client_id, symbol)
+                self._entries[client_id] = entry
+                self._evict()
+            entry.state = PENDING
+            entry.error = None
+            entry.attempts += 1
+            entry.updated = time.monotonic()
+            self._stats["submitted"] += 1
+            return entry
+
+    def mark_accepted(self, client_id, order: Dict, resolved: bool = False):
+        self._set(client_id, ACCEPTED, order=order)
+        if resolved:
+            self._count("resolved_accepted")
+
+    def mark_rejected(self, client_id, error: str, resolved: bool = False):
+        self._set(client_id, REJECTED, error=error)
+        if resolved:
+            self._count("resolved_absent")
+
+    def mark_unknown(self, client_id, error: str):
+        self._set(client_id, UNKNOWN, error=error)
+        self._count("unresolved")
+
+    def abandon(self, client_id, error: str):
+        """在途的提交被中斷、結果未知時標記為未知；已有結果的記錄不變"""
+        with self._lock:
+            entry = self._entries.get(int(client_id))
+            if entry is None or entry.state != PENDING:
+                return
+            entry.state = UNKNOWN
+            entry.error = error
+            entry.updated = time.monotonic()
+            self._stats["unresolved"] += 1
+
+    def count_deduplicated(self):
+        self._count("deduplicated")
+
+    def stats(self) -> Dict[str, int]:
+        """各狀態的訂單數和去重/超時確認計數"""
+        with self._lock:
+            result = dict(self._stats)
+            for state in (PENDING, ACCEPTED, REJECTED, UNKNOWN):
+                result[state] = 0
+            for entry in self._entries.values():
+                result[entry.state] += 1
+            return result
+
+    def _set(self, client_id, state: str, order: Optional[Dict] = None, error: Optional[str] = None):
+        with self._lock:
+            entry = self._entries.get(int(client_id))
+            if entry is None:
+                return
+            entry.state = state
+            if order is not None:
+                entry.order = order
+            entry.error = error
+            entry.updated = time.monotonic()
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _evict(self):
+        """淘汰最早的已完結記錄（調用方持有鎖）；在途和未確認的記錄不淘汰"""
+        if len(self._entries) <= self.max_entries:
+            return
+        for client_id in list(self._entries):
+            if len(self._entries) <= self.max_entries:
+                break
+            if self._entries[client_id].state in (ACCEPTED, REJECTED):
+                del self._entries[client_id]
@@ -0,0 +1,135 @@
+"""
+公共行情數據緩存模塊，合併並發請求並在後台重新驗證過期數據
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+from config import PUBLIC_CACHE_STALE, PUBLIC_CACHE_TTL
+from logger import setup_logger
+
+logger = setup_logger("api.public_cache")
+
+MAX_ENTRIES = 1024  # 緩存條目上限（交易對 × 端點 × 參數）
+
+
+class PublicDataCache:
+    """
+    公共數據緩存（singleflight + stale-while-revalidate）
+
+    - 未過期（age < ttl）：直接返回緩存值
+    - 輕微過期（age < ttl + stale）：返回舊值，同時在後台發起一次重新驗證
+    - 完全過期或未命中：發起請求；同一時刻相同的請求只會真正發出一次，其餘調用方共享結果
+
+    TTL 按端點配置，未配置或 TTL 為 0 的端點不緩存。失敗（None）的結果不寫入緩存。
+    """
+
+    def __init__(self, ttls: Optional[Dict[str, float]] = None, stale: Optional[Dict[str, float]] = None):
+        self.ttls = dict(PUBLIC_CACHE_TTL if ttls is None else ttls)
+        self.stale = dict(PUBLIC_CACHE_STALE if stale is None else stale)
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        # (事件循環, 緩存鍵) -> 進行中的請求任務；任務綁定在創建它的循環上
+        self._inflight: Dict[tuple, asyncio.Task] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "stale_hits": 0, "misses": 0, "coalesced": 0, "revalidations": 0, "errors": 0}
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    async def get(self, endpoint: str, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        獲取公共數據
+
+        Args:
+            endpoint: 端點名（用於查找 TTL），例如 ticker、depth
+            key: 緩存鍵，應包含請求參數
+            fetch: 無參協程函數，真正發出請求
+        """
+        ttl = self.ttls.get(endpoint, 0)
+        if ttl <= 0:
+            return await fetch()
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, fetched_at = entry
+            age = time.monotonic() - fetched_at
+            if age < ttl:
+                self._count("hits")
+                return value
+            if age < ttl + self.stale.get(endpoint, 0):
+                self._count("stale_hits")
+                self._start_flight(key, fetch, revalidate=True)
+                return value
+
+        self._count("misses")
+        # shield：單個調用方被取消時不影響共享同一請求的其他調用方
+        return await asyncio.shield(self._start_flight(key, fetch))
+
+    def _start_flight(self, key: Hashable, fetch: Callable[[], Awaitable[Any]], revalidate: bool = False) -> asyncio.Task:
+        loop = asyncio.get_running_loop()
+        flight_key = (loop, key)
+        with self._lock:
+            task = self._inflight.get(flight_key)
+            if task is not None:
+                if not revalidate:
+                    self._stats["coalesced"] += 1
+                return task
+            task = loop.create_task(self._fetch(flight_key, key, fetch))
+            self._inflight[flight_key] = task
+            if revalidate:
+                self._stats["revalidations"] += 1
+        return task
+
+    async def _fetch(self, flight_key: tuple, key: Hashable, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        try:
+            value = await fetch()
+        except Exception as e:
+            logger.error(f"公共數據請求異常: {e}")
+            value = None
+        finally:
+            with self._lock:
+                self._inflight.pop(flight_key, None)
+
+        if value is None:
+            self._count("errors")
+            return None
+
+        with self._lock:
+            self._entries[key] = (value, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > MAX_ENTRIES:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """清除指定鍵或全部緩存"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, int]:
+        """命中、過期命中、未命中、合併請求數等統計"""
+        with self._lock:
+            result = dict(self._stats)
+            result["entries"] = len(self._entries)
+            result["inflight"] = len(self._inflight)
+            return result
+
+
+_public_cache: Optional[PublicDataCache] = None
+_public_cache_lock = threading.Lock()
+
+
+def get_public_cache() -> PublicDataCache:
+    """獲取進程內共享的公共數據緩存"""
+    global _public_cache
+    if _public_cache is None:
+        with _public_cache_lock:
+            if _public_cache is None:
+                _public_cache = PublicDataCache()
+    return _public_cache
@@ -0,0 +1,191 @@
+"""
+客戶端限頻模塊，基於令牌桶並按優先級通道排隊
+"""
+import asyncio
+import threading
+import time
+from enum import IntEnum
+from typing import Dict, Tuple
+
+from logger import setup_logger
+
+logger = setup_logger("api.rate_limiter")
+
+# 令牌桶默認配置
+DEFAULT_RATE = 10.0         # 每秒補充的令牌數
+DEFAULT_CAPACITY = 20.0     # 桶容量（允許的突發請求量）
+MAX_SLEEP = 0.05            # 單次等待上限（秒），保證高優先級請求能及時插隊
+
+
+class Lane(IntEnum):
+    """優先級通道，數值越小優先級越高"""
+    CANCEL = 0
+    PLACE = 1
+    PRIVATE_QUERY = 2
+    PUBLIC_QUERY = 3
+
+
+# 指令 -> (通道, 權重)
+ENDPOINT_WEIGHTS: Dict[str, Tuple[Lane, float]] = {
+    "orderCancel": (Lane.CANCEL, 1),
+    "orderCancelAll": (Lane.CANCEL, 1),
+    "orderExecute": (Lane.PLACE, 1),
+    "orderQuery": (Lane.PRIVATE_QUERY, 1),
+    "orderQueryAll": (Lane.PRIVATE_QUERY, 1),
+    "orderHistoryQuery": (Lane.PRIVATE_QUERY, 2),
+    "orderHistoryQueryAll": (Lane.PRIVATE_QUERY, 2),
+    "fillHistoryQueryAll": (Lane.PRIVATE_QUERY, 2),
+    "balanceQuery": (Lane.PRIVATE_QUERY, 1),
+    "positionQuery": (Lane.PRIVATE_QUERY, 1),
+    "public": (Lane.PUBLIC_QUERY, 1),
+}
+
+
+class PriorityRateLimiter:
+    """
+    帶優先級通道的令牌桶限頻器
+
+    取消 > 下單 > 私有查詢 > 公共查詢。只要有更高優先級的請求在排隊，
+    低優先級請求就不會拿到令牌，因此報價風暴不會餓死取消請求。
+    同時支持異步（acquire）和同步（acquire_sync）調用。
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE, capacity: float = DEFAULT_CAPACITY):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+        # 各通道當前排隊數和等待統計
+        self._waiting = {lane: 0 for lane in Lane}
+        self._stats = {
+            lane: {"acquired": 0, "throttled": 0, "total_wait": 0.0, "max_wait": 0.0}
+            for lane in Lane
+        }
+
+    @staticmethod
+    def lane_for(instruction: str) -> Tuple[Lane, float]:
+        """查詢指令對應的通道和權重"""
+        return ENDPOINT_WEIGHTS.get(instruction, (Lane.PRIVATE_QUERY, 1))
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def _try_acquire(self, lane: Lane, weight: float) -> float:
+        """嘗試取令牌，成功返回0，否則返回建議的等待秒數"""
+        with self._lock:
+            self._refill()
+            if any(self._waiting[higher] for higher in Lane if higher < lane):
+                return MAX_SLEEP
+            if self._tokens >= weight:
+                self._tokens -= weight
+                return 0.0
+            return (weight - self._tokens) / self.rate
+
+    def _enter_queue(self, lane: Lane):
+        with self._lock:
+            self._waiting[lane] += 1
+            self._stats[lane]["throttled"] += 1
+
+    def _leave_queue(self, lane: Lane):
+        with self._lock:
+            self._waiting[lane] -= 1
+
+    def _record(self, lane: Lane, waited: float):
+        with self._lock:
+            stats = self._stats[lane]
+            stats["acquired"] += 1
+            stats["total_wait"] += waited
+            stats["max_wait"] = max(stats["max_wait"], waited)
+
+    def _clamp_weight(self, weight: float) -> float:
+        # 權重超過桶容量時永遠拿不到令牌，按容量截斷
+        return min(float(weight), self.capacity)
+
+    async def acquire(self, lane: Lane, weight: float = 1) -> float:
+        """
+        異步等待令牌
+
+        Returns:
+            實際等待的秒數
+        """
+        weight = self._clamp_weight(weight)
+        start = time.monotonic()
+        queued = False
+        try:
+            while True:
+                wait = self._try_acquire(lane, weight)
+                if wait <= 0:
+                    break
+                if not queued:
+                    self._enter_queue(lane)
+                    queued = True
+                await asyncio.sleep(min(wait, MAX_SLEEP))
+        finally:
+            if queued:
+                self._leave_queue(lane)
+        waited = time.monotonic() - start
+        self._record(lane, waited)
+        return waited
+
+    def acquire_sync(self, lane: Lane, weight: float = 1) -> float:
+        """
+        同步等待令牌（阻塞當前線程）
+
+        Returns:
+            實際等待的秒數
+        """
+        weight = self._clamp_weight(weight)
+        start = time.monotonic()
+        queued = False
+        try:
+            while True:
+                wait = self._try_acquire(lane, weight)
+                if wait <= 0:
+                    break
+                if not queued:
+                    self._enter_queue(lane)
+                    queued = True
+                time.sleep(min(wait, MAX_SLEEP))
+        finally:
+            if queued:
+                self._leave_queue(lane)
+        waited = time.monotonic() - start
+        self._record(lane, waited)
+        return waited
+
+    async def acquire_for(self, instruction: str, weight: float = None) -> float:
+        """按指令異步取令牌"""
+        lane, default_weight = self.lane_for(instruction)
+        return await self.acquire(lane, default_weight if weight is None else weight)
+
+    def acquire_for_sync(self, instruction: str, weight: float = None) -> float:
+        """按指令同步取令牌"""
+        lane, default_weight = self.lane_for(instruction)
+        return self.acquire_sync(lane, default_weight if weight is None else weight)
+
+    def metrics(self) -> Dict[str, Dict[str, float]]:
+        """
+        獲取各通道的排隊深度和等待時間統計
+
+        Returns:
+            {通道名: {queue_depth, acquired, throttled, avg_wait_ms, max_wait_ms}}，
+            另含 tokens 表示當前剩餘令牌
+        """
+        with self._lock:
+            self._refill()
+            result = {"tokens": round(self._tokens, 3)}
+            for lane in Lane:
+                stats = self._stats[lane]
+                acquired = stats["acquired"]
+                result[lane.name.lower()] = {
+                    "queue_depth": self._waiting[lane],
+                    "acquired": acquired,
+                    "throttled": stats["throttled"],
+                    "avg_wait_ms": (stats["total_wait"] / acquired * 1000) if acquired else 0.0,
+                    "max_wait_ms": stats["max_wait"] * 1000,
+                }
+            return result
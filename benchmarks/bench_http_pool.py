@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+"""
+HTTP連接池基準測試
+
+在本地啟動一個支持 keep-alive 的樁服務器，比較每次請求新建會話與
+使用 HttpSessionPool 長連接時的單次請求延遲。
+
+用法:
+    python benchmarks/bench_http_pool.py --requests 500
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import aiohttp
+import requests
+
+from api.http_pool import HttpSessionPool
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """模擬 /api/v1/time 的最小樁服務"""
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        body = json.dumps({"serverTime": int(time.time() * 1000)}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server():
+    """啟動樁服務器並返回 (server, base_url)"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    host, port = server.server_address
+    return server, f"http://{host}:{port}"
+
+
+def summarize(name, samples):
+    """打印延遲統計（毫秒）"""
+    samples = sorted(samples)
+    p50 = samples[len(samples) // 2]
+    p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+    print(f"{name:<28} mean={statistics.mean(samples):7.3f}ms  p50={p50:7.3f}ms  p99={p99:7.3f}ms")
+    return statistics.mean(samples)
+
+
+def bench_sync(base_url, n):
+    url = f"{base_url}/api/v1/time"
+
+    fresh = []
+    for _ in range(n):
+        start = time.perf_counter()
+        requests.get(url, timeout=5).json()
+        fresh.append((time.perf_counter() - start) * 1000)
+
+    pool = HttpSessionPool(base_url)
+    pool.warmup_sync()
+    session = pool.get_sync_session()
+    pooled = []
+    for _ in range(n):
+        start = time.perf_counter()
+        session.get(url, timeout=5).json()
+        pooled.append((time.perf_counter() - start) * 1000)
+    pool.close_sync()
+
+    before = summarize("requests.get (每次新連接)", fresh)
+    after = summarize("HttpSessionPool (同步)", pooled)
+    print(f"{'同步路徑延遲下降':<28} {(1 - after / before) * 100:6.1f}%\n")
+
+
+async def bench_async(base_url, n):
+    url = f"{base_url}/api/v1/time"
+
+    fresh = []
+    for _ in range(n):
+        start = time.perf_counter()
+        async with aiohttp.ClientSession() as session:
+            async with session.get(url) as response:
+                await response.json()
+        fresh.append((time.perf_counter() - start) * 1000)
+
+    pool = HttpSessionPool(base_url)
+    await pool.warmup()
+    pooled = []
+    for _ in range(n):
+        start = time.perf_counter()
+        session = await pool.get_session()
+        async with session.get(url) as response:
+            await response.json()
+        pooled.append((time.perf_counter() - start) * 1000)
+    await pool.close()
+
+    before = summarize("aiohttp (每次新會話)", fresh)
+    after = summarize("HttpSessionPool (異步)", pooled)
+    print(f"{'異步路徑延遲下降':<28} {(1 - after / before) * 100:6.1f}%\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HTTP連接池基準測試")
+    parser.add_argument("--requests", type=int, default=300, help="每種模式的請求次數")
+    args = parser.parse_args()
+
+    server, base_url = start_stub_server()
+    print(f"樁服務器: {base_url}, 每種模式 {args.requests} 次請求")
+    print("注意: 本地明文HTTP不包含TLS握手，真實環境下長連接的收益更大\n")
+    try:
+        bench_sync(base_url, args.requests)
+        asyncio.run(bench_async(base_url, args.requests))
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
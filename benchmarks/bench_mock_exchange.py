@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+"""
+模擬交易所壓測
+
+在本地啟動 MockExchangeServer（可注入延遲和錯誤），用多個隨機生成的賬戶
+並發執行「查詢行情 -> 批量掛單 -> 查詢掛單和深度 -> 全部撤單」的做市迭代，
+最後輸出各端點的延遲分位數、錯誤分類以及客戶端限頻器的排隊等待。
+
+用法:
+    python benchmarks/bench_mock_exchange.py --accounts 4 --iterations 50 --latency-ms 20 --error-rate 0.02
+"""
+import argparse
+import asyncio
+import base64
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import nacl.signing
+
+from mock_exchange import FaultConfig, MockExchangeServer
+
+
+def generate_keys():
+    """生成一對 ED25519 密鑰，返回 (api_key, secret_key)"""
+    signing_key = nacl.signing.SigningKey.generate()
+    return (
+        base64.b64encode(bytes(signing_key.verify_key)).decode(),
+        base64.b64encode(bytes(signing_key)).decode(),
+    )
+
+
+async def market_maker_loop(client, symbol, iterations, levels):
+    """一個賬戶的做市迭代，返回每輪耗時（毫秒）"""
+    durations = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        ticker = await client.get_ticker(symbol)
+        if not isinstance(ticker, dict) or "lastPrice" not in ticker:
+            durations.append((time.perf_counter() - started) * 1000)
+            continue
+        mid = float(ticker["lastPrice"])
+        orders = []
+        for i in range(1, levels + 1):
+            orders.append({"symbol": symbol, "side": "Bid", "orderType": "Limit", "postOnly": True,
+                           "price": f"{mid * (1 - 0.002 * i):.2f}", "quantity": "0.1"})
+            orders.append({"symbol": symbol, "side": "Ask", "orderType": "Limit", "postOnly": True,
+                           "price": f"{mid * (1 + 0.002 * i):.2f}", "quantity": "0.1"})
+        await client.execute_orders(orders)
+        await asyncio.gather(client.get_open_orders(symbol), client.get_order_book(symbol))
+        await client.cancel_all_orders(symbol)
+        durations.append((time.perf_counter() - started) * 1000)
+    return durations
+
+
+async def run(args, base_url):
+    from api.client import BackpackAPIClient
+    from api.metrics import get_api_metrics
+
+    clients = [BackpackAPIClient(*generate_keys(), symbol=args.symbol) for _ in range(args.accounts)]
+    started = time.perf_counter()
+    try:
+        results = await asyncio.gather(*(
+            market_maker_loop(client, args.symbol, args.iterations, args.levels) for client in clients
+        ))
+    finally:
+        for client in clients:
+            await client.close()
+    elapsed = time.perf_counter() - started
+    rate_limits = [client.get_rate_limit_metrics() for client in clients]
+
+    durations = sorted(d for result in results for d in result)
+    print(f"模擬交易所: {base_url}")
+    print(f"{args.accounts} 個賬戶 x {args.iterations} 輪，總耗時 {elapsed:.2f}s")
+    if durations:
+        print(f"每輪迭代 p50={durations[len(durations) // 2]:.2f}ms "
+              f"p99={durations[min(len(durations) - 1, int(len(durations) * 0.99))]:.2f}ms")
+    for lane in ("cancel", "place", "private_query", "public_query"):
+        throttled = sum(m[lane]["throttled"] for m in rate_limits)
+        max_wait = max(m[lane]["max_wait_ms"] for m in rate_limits)
+        print(f"限頻通道 {lane:<14} 被限流 {throttled:>5} 次，最長等待 {max_wait:.1f}ms")
+    print()
+    print(get_api_metrics().format_table())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="模擬交易所壓測")
+    parser.add_argument("--accounts", type=int, default=4, help="並發賬戶數")
+    parser.add_argument("--iterations", type=int, default=30, help="每個賬戶的迭代次數")
+    parser.add_argument("--levels", type=int, default=5, help="每側掛單檔數")
+    parser.add_argument("--symbol", default="SOL_USDC")
+    parser.add_argument("--latency-ms", type=float, default=5, help="REST 固定延遲")
+    parser.add_argument("--jitter-ms", type=float, default=10, help="REST 隨機延遲上限")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 503 的概率")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="返回 429 的概率")
+    args = parser.parse_args()
+
+    server = MockExchangeServer(faults=FaultConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+    )).start_in_background()
+    # 必須在導入 api.client 之前設置，config 在導入時讀取地址
+    os.environ["BACKPACK_API_URL"] = server.base_url
+    os.environ["BACKPACK_WS_URL"] = server.ws_url
+    try:
+        asyncio.run(run(args, server.base_url))
+    finally:
+        server.stop_background()
+
+
+if __name__ == "__main__":
+    main()
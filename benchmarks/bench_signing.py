@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""
+簽名吞吐量基準測試
+
+比較舊實現（每次解碼私鑰、重建 SigningKey、重新排序參數）與
+共享 RequestSigner 的每秒簽名數。
+
+用法:
+    python benchmarks/bench_signing.py --iterations 20000
+"""
+import argparse
+import base64
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import nacl.signing
+
+from api.auth import RequestSigner
+
+
+def legacy_sign(secret_key, params, instruction, window=5000):
+    """舊版簽名流程，保留用於對比"""
+    timestamp = str(int(time.time() * 1000))
+    params_copy = params.copy()
+    for k, v in params_copy.items():
+        if isinstance(v, bool):
+            params_copy[k] = str(v).lower()
+    sorted_params = sorted(params_copy.items())
+    param_str = "&".join([f"{k}={v}" for k, v in sorted_params])
+    message = f"instruction={instruction}&{param_str}&timestamp={timestamp}&window={window}"
+    signing_key = nacl.signing.SigningKey(base64.b64decode(secret_key))
+    signed = signing_key.sign(message.encode('ascii'))
+    return base64.b64encode(signed.signature).decode()
+
+
+def sample_payloads():
+    """模擬做市循環中的典型請求組合"""
+    orders = [{
+        "orderType": "Limit",
+        "price": str(150.00 + i * 0.01),
+        "quantity": "0.5",
+        "side": "Bid" if i % 2 else "Ask",
+        "symbol": "SOL_USDC",
+        "timeInForce": "GTC",
+        "postOnly": True
+    } for i in range(6)]
+    payloads = [("orderExecute", order) for order in orders]
+    payloads.append(("orderQueryAll", {"symbol": "SOL_USDC"}))
+    payloads.append(("orderCancelAll", {"symbol": "SOL_USDC"}))
+    payloads.append(("balanceQuery", {}))
+    return payloads
+
+
+def run(label, fn, payloads, iterations):
+    start = time.perf_counter()
+    for i in range(iterations):
+        instruction, params = payloads[i % len(payloads)]
+        fn(instruction, params)
+    elapsed = time.perf_counter() - start
+    rate = iterations / elapsed
+    print(f"{label:<24} {rate:10.0f} 簽名/秒")
+    return rate
+
+
+def main():
+    parser = argparse.ArgumentParser(description="簽名吞吐量基準測試")
+    parser.add_argument("--iterations", type=int, default=20000, help="簽名次數")
+    args = parser.parse_args()
+
+    secret_key = base64.b64encode(nacl.signing.SigningKey.generate().encode()).decode()
+    payloads = sample_payloads()
+    signer = RequestSigner(secret_key)
+
+    before = run("舊實現", lambda ins, p: legacy_sign(secret_key, p, ins), payloads, args.iterations)
+    after = run("RequestSigner.sign", signer.sign, payloads, args.iterations)
+
+    batch = [payloads[i % len(payloads)] for i in range(args.iterations)]
+    start = time.perf_counter()
+    signer.sign_batch(batch)
+    batch_rate = args.iterations / (time.perf_counter() - start)
+    print(f"{'RequestSigner.sign_batch':<24} {batch_rate:10.0f} 簽名/秒")
+    print(f"\n提升: {after / before:.2f}x (單個), {batch_rate / before:.2f}x (批量)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+"""
+行情磁帶錄製與回放基準測試
+
+在本地啟動帶行情模擬器的 MockExchangeServer，訂閱深度、最優報價、成交和私有訂單更新，
+錄製 --seconds 秒（期間隨機下市價單產生成交），然後：
+1. 盡可能快地回放到新的 BackpackWebSocketClient，輸出處理速率，並檢查回放後的本地訂單簿與錄製時一致
+2. 以 --speed 倍速回放，輸出實際耗時和最大落後時間
+
+用法:
+    python benchmarks/bench_tape_replay.py --seconds 10 --speed 5
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_mock_exchange import generate_keys
+from mock_exchange import MockExchangeServer
+
+
+async def record(args, server, directory):
+    from ws_client.client import BackpackWebSocketClient
+
+    api_key, secret_key = generate_keys()
+    client = BackpackWebSocketClient(api_key, secret_key, args.symbol)
+    client.start_recording(directory)
+    await client.initialize_orderbook()
+    await client.subscribe("bookTicker")
+    await client.subscribe("trade")
+    await client.subscribe_streams([f"account.orderUpdate.{args.symbol}"], signed=True)
+
+    rng = random.Random(7)
+    deadline = time.monotonic() + args.seconds
+    while time.monotonic() < deadline:
+        await asyncio.sleep(rng.uniform(0.05, 0.3))
+        server.engine.place_order(api_key, {
+            "symbol": args.symbol, "side": rng.choice(["Bid", "Ask"]), "orderType": "Market",
+            "quantity": f"{rng.uniform(0.1, 2):.2f}",
+        })
+    # 停止錄製後再比較，保證錄製內容和本地訂單簿處於同一時刻
+    client.stop_recording()
+    levels = client.orderbook.get_levels()
+    await client.disconnect()
+    return levels
+
+
+async def replay(args, directory, speed):
+    from ws_client.client import BackpackWebSocketClient
+    from ws_client.tape import TapeReader, TapeReplayer
+
+    client = BackpackWebSocketClient(None, None, args.symbol)
+    counts = {"depth": 0, "bookTicker": 0, "trade": 0, "account.orderUpdate": 0}
+    for name in counts:
+        client.on(name, lambda event, name=name: counts.__setitem__(name, counts[name] + 1))
+    stats = await TapeReplayer(TapeReader(directory), client, speed=speed).run()
+    await asyncio.to_thread(client.delivery.join)
+    return client, stats, counts
+
+
+async def run(args, server):
+    from ws_client.tape import TapeReader
+
+    directory = tempfile.mkdtemp(prefix="tape-")
+    try:
+        print(f"錄製 {args.seconds} 秒行情到 {directory} ...")
+        recorded_levels = await record(args, server, directory)
+        summary = TapeReader(directory).summary()
+        size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+        print(f"磁帶: {summary['records']} 條記錄, {size / 1024:.1f} KB, 各類型 {summary['kinds']}\n")
+
+        client, stats, counts = await replay(args, directory, None)
+        same = client.orderbook.get_levels() == recorded_levels
+        print(f"{'全速回放':<10} {stats['records']:8d} 條  {stats['elapsed']:7.3f}s  "
+              f"{stats['per_second']:10.0f} 條/秒  回調: {counts}")
+        print(f"{'':<12}回放後訂單簿與錄製時{'一致' if same else '不一致'} "
+              f"(更新ID {client.orderbook.last_update_id}, 快照 {stats['snapshots']} 份)")
+
+        _, stats, _ = await replay(args, directory, args.speed)
+        print(f"{f'{args.speed:g}x 回放':<10} {stats['records']:8d} 條  {stats['elapsed']:7.3f}s  "
+              f"(磁帶時長 {stats['tape_seconds']:.3f}s)  最大落後 {stats['max_behind_ms']:.2f} ms")
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="行情磁帶錄製與回放基準測試")
+    parser.add_argument("--seconds", type=float, default=10, help="錄製時長（秒）")
+    parser.add_argument("--speed", type=float, default=5, help="倍速回放的倍數")
+    parser.add_argument("--interval", type=float, default=0.02, help="行情模擬器的更新間隔（秒）")
+    parser.add_argument("--symbol", default="SOL_USDC")
+    args = parser.parse_args()
+
+    server = MockExchangeServer(simulate=True, simulator_options={"interval": args.interval})
+    server.start_in_background()
+    os.environ["BACKPACK_API_URL"] = server.base_url
+    os.environ["BACKPACK_WS_URL"] = server.ws_url
+    try:
+        from api.loop_thread import get_loop_thread
+        get_loop_thread().run(run(args, server))
+    finally:
+        server.stop_background()
+
+
+if __name__ == "__main__":
+    main()
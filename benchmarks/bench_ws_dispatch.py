@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+"""
+WebSocket 消息分發基準測試
+
+生成一批深度、最優報價和訂單更新消息（比例接近繁忙交易對的真實流量），
+分別交給舊版處理流程（每條消息格式化調試日誌、逐個 startswith 判斷、逐條 await 回調）
+和 BackpackWebSocketClient 的路由分發流程，比較每秒處理的消息數，並輸出各路由的統計。
+最後用一個每條耗時 --slow-ms 的訂單更新回調，比較讀取循環在內聯回調和投遞隊列下的吞吐量。
+
+用法:
+    python benchmarks/bench_ws_dispatch.py --messages 100000 --slow-ms 2 [--timing]
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import BookTicker, DepthDelta
+from ws_client.client import BackpackWebSocketClient
+
+SYMBOL = "SOL_USDC"
+
+
+def generate_burst(count, seed=7):
+    """生成 count 條消息：約 70% 深度增量、25% 最優報價、5% 訂單更新"""
+    rng = random.Random(seed)
+    messages = []
+    update_id = 1000
+    mid = 150.0
+    for i in range(count):
+        roll = rng.random()
+        now_us = 1700000000000000 + i * 1000
+        mid += rng.gauss(0, 0.01)
+        if roll < 0.70:
+            first = update_id + 1
+            update_id += 1
+            payload = {"stream": f"depth.{SYMBOL}", "data": {
+                "e": "depth", "E": now_us, "s": SYMBOL, "U": first, "u": update_id, "T": now_us,
+                "b": [[f"{mid - 0.01 * k:.2f}", f"{rng.uniform(0, 20):.2f}"] for k in range(rng.randint(1, 4))],
+                "a": [[f"{mid + 0.01 * k:.2f}", f"{rng.uniform(0, 20):.2f}"] for k in range(rng.randint(1, 4))],
+            }}
+        elif roll < 0.95:
+            payload = {"stream": f"bookTicker.{SYMBOL}", "data": {
+                "e": "bookTicker", "E": now_us, "s": SYMBOL, "u": update_id, "T": now_us,
+                "b": f"{mid - 0.01:.2f}", "B": f"{rng.uniform(1, 20):.2f}",
+                "a": f"{mid + 0.01:.2f}", "A": f"{rng.uniform(1, 20):.2f}",
+            }}
+        else:
+            payload = {"stream": f"account.orderUpdate.{SYMBOL}", "data": {
+                "e": "orderFill", "E": now_us, "s": SYMBOL, "i": str(i), "S": rng.choice(["Bid", "Ask"]),
+                "o": "LIMIT", "p": f"{mid:.2f}", "q": "0.5", "l": "0.5", "L": f"{mid:.2f}", "z": "0.5",
+                "Z": f"{mid * 0.5:.4f}", "X": "Filled", "m": True, "n": "0.001", "N": "USDC", "t": i, "T": now_us,
+            }}
+        messages.append(json.dumps(payload))
+    return messages
+
+
+async def legacy_handle(client, logger, message):
+    """舊版 _message_handler 的單條消息處理流程，保留用於對比"""
+    logger.debug(f"收到原始消息: {message}")
+    data = json.loads(message)
+    if isinstance(data, dict) and "ping" in data:
+        return
+    if "result" in data and data["result"] == "subscribed":
+        return
+    if "error" in data:
+        return
+    if "stream" in data and "data" in data:
+        stream = data["stream"]
+        event_data = data["data"]
+        if stream.startswith("account.orderUpdate"):
+            logger.info(f"收到訂單更新: {event_data}")
+            if "account.orderUpdate" in client.callbacks:
+                await client.callbacks["account.orderUpdate"](event_data)
+        elif stream.startswith("bookTicker."):
+            client.book_ticker = BookTicker.from_ws(event_data)
+            if "bookTicker" in client.callbacks:
+                await client.callbacks["bookTicker"](client.book_ticker)
+        elif stream.startswith("depth."):
+            delta = DepthDelta.from_ws(event_data)
+            if "depth" in client.callbacks:
+                await client.callbacks["depth"](delta)
+
+
+def make_client(async_callbacks, slow_seconds=0.0, timing=False):
+    client = BackpackWebSocketClient(None, None, SYMBOL)
+    client.router.timing = timing
+    # 只測分發本身：本地訂單簿不做快照同步，深度增量只進入緩存
+    client.orderbook.request_resync = lambda: None
+    counts = {"depth": 0, "bookTicker": 0, "account.orderUpdate": 0}
+
+    def counter(name):
+        if async_callbacks:
+            async def callback(event):
+                counts[name] += 1
+        else:
+            def callback(event):
+                counts[name] += 1
+                if slow_seconds and name == "account.orderUpdate":
+                    time.sleep(slow_seconds)
+        return callback
+
+    for name in counts:
+        client.on(name, counter(name))
+    return client, counts
+
+
+async def run(args):
+    messages = generate_burst(args.messages)
+    total_bytes = sum(len(m) for m in messages)
+    print(f"消息數: {len(messages)}, 總大小: {total_bytes / 1024 / 1024:.1f} MB\n")
+
+    # 舊版：模塊加載時把 backpack_ws 日誌級別設為 DEBUG，每條消息都會格式化
+    legacy_logger = logging.getLogger("bench_ws_legacy")
+    legacy_logger.setLevel(logging.DEBUG)
+    legacy_logger.propagate = False
+    legacy_logger.addHandler(logging.NullHandler())
+    client, _ = make_client(async_callbacks=True)
+    started = time.perf_counter()
+    for message in messages:
+        await legacy_handle(client, legacy_logger, message)
+    legacy_rate = len(messages) / (time.perf_counter() - started)
+    print(f"{'舊版處理流程':<20} {legacy_rate:10.0f} 條/秒")
+
+    quiet = logging.getLogger("bench_ws_dispatch")
+    quiet.setLevel(logging.INFO)
+    quiet.propagate = False
+    quiet.addHandler(logging.NullHandler())
+    results = {}
+    for label, async_callbacks in (("路由分發(協程回調)", True), ("路由分發(同步回調)", False)):
+        client, counts = make_client(async_callbacks, timing=args.timing)
+        client.logger = quiet
+        started = time.perf_counter()
+        for message in messages:
+            await client._process_message(message)
+        read_elapsed = time.perf_counter() - started
+        await asyncio.to_thread(client.delivery.join)
+        rate = len(messages) / (time.perf_counter() - started)
+        results[label] = (client, rate)
+        print(f"{label:<20} {rate:10.0f} 條/秒  ({rate / legacy_rate:.2f}x)  "
+              f"讀取循環 {len(messages) / read_elapsed:.0f} 條/秒  回調: {counts}")
+
+    client, _ = results["路由分發(同步回調)"]
+    print("\n各路由統計:")
+    for name, stats in client.get_stream_stats()["routes"].items():
+        timing = f"  解碼 {stats['decode_us']:6.2f} us  處理 {stats['handle_us']:6.2f} us" if args.timing else ""
+        print(f"  {name:<22} {stats['messages']:8d} 條  {stats['bytes'] / 1024:9.1f} KB{timing}")
+    delivery = client.get_delivery_stats()
+    print(f"\n投遞隊列: 最大長度 {delivery['max_depth']}, 平均延遲 {delivery['lag_ms']['avg']:.2f} ms")
+    for name, counters in delivery["routes"].items():
+        print(f"  {name:<22} {counters}")
+
+    if args.slow_ms <= 0:
+        return
+    slow = args.slow_ms / 1000
+    print(f"\n慢回調（每條訂單更新 {args.slow_ms} ms）:")
+    client, _ = make_client(async_callbacks=False, slow_seconds=slow)
+    client.logger = quiet
+    # 舊版行為：不經隊列，回調在讀取循環中內聯執行
+    client.delivery.put = lambda route, stream, payload: client._deliver(route, stream, payload)
+    started = time.perf_counter()
+    for message in messages:
+        await client._process_message(message)
+    inline_rate = len(messages) / (time.perf_counter() - started)
+    client, counts = make_client(async_callbacks=False, slow_seconds=slow)
+    client.logger = quiet
+    started = time.perf_counter()
+    for message in messages:
+        await client._process_message(message)
+    read_rate = len(messages) / (time.perf_counter() - started)
+    await asyncio.to_thread(client.delivery.join)
+    delivery = client.get_delivery_stats()
+    print(f"  {'內聯回調':<18} 讀取循環 {inline_rate:10.0f} 條/秒")
+    print(f"  {'投遞隊列':<18} 讀取循環 {read_rate:10.0f} 條/秒  ({read_rate / inline_rate:.1f}x)  "
+          f"最大延遲 {delivery['lag_ms']['max']:.0f} ms, 合併 "
+          f"{sum(c['conflated'] for c in delivery['routes'].values())} 條, 回調: {counts}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WebSocket 消息分發基準測試")
+    parser.add_argument("--messages", type=int, default=100000, help="消息數")
+    parser.add_argument("--slow-ms", type=float, default=2.0, help="慢回調場景中每條訂單更新的耗時（毫秒），0 表示跳過")
+    parser.add_argument("--timing", action="store_true", help="統計各路由的解碼和處理耗時（計時本身有開銷）")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -6,8 +6,10 @@ from datetime import datetime
 
 from api.client import (
     get_deposit_address, get_balance, get_markets, get_order_book, 
-    get_ticker, get_fill_history, get_klines
+    get_ticker, get_fill_history
 )
+from api.kline_store import get_kline_store
+from api.market_catalog import get_market_catalog
 from ws_client.client import BackpackWebSocket
 from strategies.market_maker import MarketMaker
 from utils.helpers import calculate_volatility
@@ -154,15 +156,7 @@ def get_orderbook_command(api_key, secret_key):
 def run_market_maker_command(api_key, secret_key):
     """執行做市策略命令"""
     symbol = input("請輸入要做市的交易對 (例如: SOL_USDC): ")
-    markets_info = get_markets()
-    valid_symbol = False
-    if isinstance(markets_info, list):
-        for market in markets_info:
-            if market.get('symbol') == symbol:
-                valid_symbol = True
-                break
-    
-    if not valid_symbol:
+    if symbol not in get_market_catalog():
         print(f"交易對 {symbol} 不存在或不可交易")
         return
     
@@ -324,123 +318,86 @@ def market_analysis_command(api_key, secret_key):
             
             # 獲取K線數據分析趨勢
             print("獲取歷史數據分析趨勢...")
-            klines = get_klines(symbol, "15m")
+            series = get_kline_store().load(symbol, "15m", bars=100)
             
-            # 添加調試信息查看數據結構
-            print("K線數據結構: ")
-            if isinstance(klines, dict) and "error" in klines:
-                print(f"獲取K線數據出錯: {klines['error']}")
+            if len(series) == 0:
+                print("獲取K線數據出錯: 本地和交易所都沒有可用的K線")
             else:
-                print(f"收到 {len(klines) if isinstance(klines, list) else type(klines)} 條K線數據")
+                print(f"收到 {len(series)} 條K線數據")
                 
-                # 檢查第一條記錄以確定結構
-                if isinstance(klines, list) and len(klines) > 0:
-                    print(f"第一條K線數據: {klines[0]}")
+                try:
+                    prices = series.close
                     
-                    # 根據實際結構提取收盤價
-                    try:
-                        if isinstance(klines[0], dict):
-                            if 'close' in klines[0]:
-                                # 如果是包含'close'字段的字典
-                                prices = [float(kline['close']) for kline in klines]
-                            elif 'c' in klines[0]:
-                                # 另一種常見格式
-                                prices = [float(kline['c']) for kline in klines]
-                            else:
-                                print(f"無法識別的字典K線格式，可用字段: {list(klines[0].keys())}")
-                                raise ValueError("無法識別的K線數據格式")
-                        elif isinstance(klines[0], list):
-                            # 如果是列表格式，打印元素數量和數據樣例
-                            print(f"K線列表格式，每條記錄有 {len(klines[0])} 個元素")
-                            if len(klines[0]) >= 5:
-                                # 通常第4或第5個元素是收盤價
-                                try:
-                                    # 嘗試第4個元素 (索引3)
-                                    prices = [float(kline[3]) for kline in klines]
-                                    print("使用索引3作為收盤價")
-                                except (ValueError, IndexError):
-                                    # 如果失敗，嘗試第5個元素 (索引4)
-                                    prices = [float(kline[4]) for kline in klines]
-                                    print("使用索引4作為收盤價")
-                            else:
-                                print("K線記錄元素數量不足")
-                                raise ValueError("K線數據格式不兼容")
-                        else:
-                            print(f"未知的K線數據類型: {type(klines[0])}")
-                            raise ValueError("未知的K線數據類型")
+                    # 計算移動平均
+                    short_ma = sum(prices[-5:]) / 5 if len(prices) >= 5 else sum(prices) / len(prices)
+                    medium_ma = sum(prices[-20:]) / 20 if len(prices) >= 20 else short_ma
+                    long_ma = sum(prices[-50:]) / 50 if len(prices) >= 50 else medium_ma
+                    
+                    # 判斷趨勢
+                    trend = "上漲" if short_ma > medium_ma > long_ma else "下跌" if short_ma < medium_ma < long_ma else "盤整"
+                    
+                    # 計算波動率
+                    volatility = calculate_volatility(prices)
+                    
+                    print("\n市場趨勢分析:")
+                    print(f"短期均價 (5週期): {short_ma:.6f}")
+                    print(f"中期均價 (20週期): {medium_ma:.6f}")
+                    print(f"長期均價 (50週期): {long_ma:.6f}")
+                    print(f"當前趨勢: {trend}")
+                    print(f"波動率: {volatility:.2f}%")
+                    
+                    # 獲取最新價格和波動性指標
+                    current_price = ws.get_current_price()
+                    liquidity_profile = ws.get_liquidity_profile()
+                    
+                    if current_price and liquidity_profile:
+                        print(f"\n當前價格: {current_price}")
+                        print(f"相對長期均價: {(current_price / long_ma - 1) * 100:.2f}%")
                         
-                        # 計算移動平均
-                        short_ma = sum(prices[-5:]) / 5 if len(prices) >= 5 else sum(prices) / len(prices)
-                        medium_ma = sum(prices[-20:]) / 20 if len(prices) >= 20 else short_ma
-                        long_ma = sum(prices[-50:]) / 50 if len(prices) >= 50 else medium_ma
+                        # 流動性分析
+                        buy_volume = liquidity_profile['bid_volume']
+                        sell_volume = liquidity_profile['ask_volume']
+                        imbalance = liquidity_profile['imbalance']
                         
-                        # 判斷趨勢
-                        trend = "上漲" if short_ma > medium_ma > long_ma else "下跌" if short_ma < medium_ma < long_ma else "盤整"
+                        print("\n市場流動性分析:")
+                        print(f"買單量: {buy_volume:.4f}")
+                        print(f"賣單量: {sell_volume:.4f}")
+                        print(f"買賣比例: {(buy_volume/sell_volume):.2f}" if sell_volume > 0 else "買賣比例: 無限")
                         
-                        # 計算波動率
-                        volatility = calculate_volatility(prices)
+                        # 判斷市場情緒
+                        sentiment = "買方壓力較大" if imbalance > 0.2 else "賣方壓力較大" if imbalance < -0.2 else "買賣壓力平衡"
+                        print(f"市場情緒: {sentiment} ({imbalance:.2f})")
                         
-                        print("\n市場趨勢分析:")
-                        print(f"短期均價 (5週期): {short_ma:.6f}")
-                        print(f"中期均價 (20週期): {medium_ma:.6f}")
-                        print(f"長期均價 (50週期): {long_ma:.6f}")
-                        print(f"當前趨勢: {trend}")
-                        print(f"波動率: {volatility:.2f}%")
+                        # 給出建議的做市參數
+                        print("\n建議做市參數:")
                         
-                        # 獲取最新價格和波動性指標
-                        current_price = ws.get_current_price()
-                        liquidity_profile = ws.get_liquidity_profile()
+                        # 根據波動率調整價差
+                        suggested_spread = max(0.2, min(2.0, volatility * 0.2))
+                        print(f"建議價差: {suggested_spread:.2f}%")
                         
-                        if current_price and liquidity_profile:
-                            print(f"\n當前價格: {current_price}")
-                            print(f"相對長期均價: {(current_price / long_ma - 1) * 100:.2f}%")
-                            
-                            # 流動性分析
-                            buy_volume = liquidity_profile['bid_volume']
-                            sell_volume = liquidity_profile['ask_volume']
-                            imbalance = liquidity_profile['imbalance']
-                            
-                            print("\n市場流動性分析:")
-                            print(f"買單量: {buy_volume:.4f}")
-                            print(f"賣單量: {sell_volume:.4f}")
-                            print(f"買賣比例: {(buy_volume/sell_volume):.2f}" if sell_volume > 0 else "買賣比例: 無限")
-                            
-                            # 判斷市場情緒
-                            sentiment = "買方壓力較大" if imbalance > 0.2 else "賣方壓力較大" if imbalance < -0.2 else "買賣壓力平衡"
-                            print(f"市場情緒: {sentiment} ({imbalance:.2f})")
-                            
-                            # 給出建議的做市參數
-                            print("\n建議做市參數:")
-                            
-                            # 根據波動率調整價差
-                            suggested_spread = max(0.2, min(2.0, volatility * 0.2))
-                            print(f"建議價差: {suggested_spread:.2f}%")
-                            
-                            # 根據流動性調整訂單數量
-                            liquidity_score = (buy_volume + sell_volume) / 2
-                            orders_suggestion = 3
-                            if liquidity_score > 10:
-                                orders_suggestion = 5
-                            elif liquidity_score < 1:
-                                orders_suggestion = 2
-                            print(f"建議訂單數: {orders_suggestion}")
-                            
-                            # 根據趨勢和情緒建議執行模式
-                            if trend == "上漲" and imbalance > 0:
-                                mode = "adaptive"
-                                print("建議執行模式: 自適應模式 (跟隨上漲趨勢)")
-                            elif trend == "下跌" and imbalance < 0:
-                                mode = "passive"
-                                print("建議執行模式: 被動模式 (降低下跌風險)")
-                            else:
-                                mode = "standard"
-                                print("建議執行模式: 標準模式")
-                    except Exception as e:
-                        print(f"處理K線數據時出錯: {e}")
-                        import traceback
-                        traceback.print_exc()
-                else:
-                    print("未收到有效的K線數據")
+                        # 根據流動性調整訂單數量
+                        liquidity_score = (buy_volume + sell_volume) / 2
+                        orders_suggestion = 3
+                        if liquidity_score > 10:
+                            orders_suggestion = 5
+                        elif liquidity_score < 1:
+                            orders_suggestion = 2
+                        print(f"建議訂單數: {orders_suggestion}")
+                        
+                        # 根據趨勢和情緒建議執行模式
+                        if trend == "上漲" and imbalance > 0:
+                            mode = "adaptive"
+                            print("建議執行模式: 自適應模式 (跟隨上漲趨勢)")
+                        elif trend == "下跌" and imbalance < 0:
+                            mode = "passive"
+                            print("建議執行模式: 被動模式 (降低下跌風險)")
+                        else:
+                            mode = "standard"
+                            print("建議執行模式: 標準模式")
+                except Exception as e:
+                    print(f"處理K線數據時出錯: {e}")
+                    import traceback
+                    traceback.print_exc()
         
         # 關閉WebSocket連接
         if ws:
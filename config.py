@@ -10,8 +10,9 @@ load_dotenv()
 # API配置
 API_KEY = os.getenv('API_KEY')
 SECRET_KEY = os.getenv('SECRET_KEY')
-API_URL = "https://api.backpack.exchange"
-WS_URL = "wss://ws.backpack.exchange"
+# 可通過環境變數指向其他環境，例如本地模擬交易所（python -m mock_exchange）
+API_URL = os.getenv('BACKPACK_API_URL', "https://api.backpack.exchange")
+WS_URL = os.getenv('BACKPACK_WS_URL', "wss://ws.backpack.exchange")
 API_VERSION = "v1"
 DEFAULT_WINDOW = "5000"
 
@@ -19,4 +20,52 @@ DEFAULT_WINDOW = "5000"
 DB_PATH = 'orders.db'
 
 # 日誌配置
-LOG_FILE = "market_maker.log"
\ No newline at end of file
+LOG_FILE = "market_maker.log"
+
+# 市場元數據緩存配置：實際文件按服務地址區分，例如 cache/markets.api.backpack.exchange.json
+MARKET_CACHE_PATH = os.getenv('MARKET_CACHE_PATH', 'cache/markets.json')
+MARKET_CACHE_TTL = 3600  # 秒
+
+# 歷史K線存儲配置
+KLINE_CACHE_DIR = os.getenv('KLINE_CACHE_DIR', 'cache/klines')
+KLINE_CHUNK_BARS = 1000           # 每個下載塊的K線根數
+KLINE_DOWNLOAD_CONCURRENCY = 4    # 同時在途的下載塊數
+
+# WebSocket 重連配置（秒）：首次重試在亞秒級，之後帶抖動指數退避到上限
+WS_RECONNECT_INITIAL_DELAY = 0.1
+WS_RECONNECT_MAX_DELAY = 30.0
+WS_RECONNECT_MAX_ATTEMPTS = 0     # 0 表示不限次數
+
+# WebSocket 回調投遞隊列：可丟棄消息的容量，以及回調延遲超過多少秒時告警
+WS_DELIVERY_QUEUE_SIZE = 10000
+WS_DELIVERY_LAG_WARNING = 1.0
+WS_DISPATCH_TIMING = False        # 是否統計各路由的解碼和處理耗時（每條消息兩次計時，默認關閉）
+
+# WebSocket 存活檢測（秒）：定期 ping 測量往返時間，pong 超時時重連；
+# 數據流靜默超過閾值時先 ping 確認連接，閾值 + WS_PING_TIMEOUT 內仍沒有 pong 才判定數據失效
+WS_LIVENESS_INTERVAL = 1.0        # 檢查間隔
+WS_PING_INTERVAL = 10.0           # ping 間隔，0 表示不發送
+WS_PING_TIMEOUT = 5.0             # 等待 pong 的最長時間，超時視為連接已失效
+WS_STALE_AFTER = {                # 靜默閾值：鍵為路由（depth）或完整數據流名稱（depth.SOL_USDC，優先），0 表示不判定；
+    "depth": 10.0,                # 未列出的路由（成交、訂單更新）按事件推送，不做判定
+    "bookTicker": 10.0,
+}
+WS_SHARED_FEED = True             # BackpackWebSocket 默認經 FeedManager 共用一個公共連接和一個私有連接
+
+# 行情磁帶（WebSocket 原始消息錄製）配置
+TAPE_DIR = os.getenv('TAPE_DIR', 'cache/tape')
+TAPE_SEGMENT_BYTES = 64 * 1024 * 1024   # 單個分段文件的大小上限
+TAPE_FLUSH_INTERVAL = 1.0               # 刷新到磁盤的最長間隔（秒）
+TAPE_INDEX_EVERY = 1000                 # 索引中每隔多少條記錄保存一個 (時間, 偏移) 標記
+
+# 公共行情緩存配置（秒）：TTL 內直接使用緩存，超出 TTL 但在 STALE 窗口內返回舊值並後台刷新
+PUBLIC_CACHE_TTL = {
+    "ticker": 1.0,
+    "depth": 0.5,
+    "klines": 15.0,
+}
+PUBLIC_CACHE_STALE = {
+    "ticker": 4.0,
+    "depth": 1.5,
+    "klines": 45.0,
+}
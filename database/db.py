@@ -2,7 +2,7 @@
 數據庫操作模塊
 """
 import sqlite3
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Dict, List, Tuple, Any, Optional
 from config import DB_PATH
 from logger import setup_logger
@@ -65,6 +65,17 @@ class Database:
                 """
             )
             
+            # 成交ID列用於歷史回填去重，舊數據庫在此自動遷移
+            columns = [row[1] for row in self.cursor.execute("PRAGMA table_info(completed_orders)")]
+            if "trade_id" not in columns:
+                self.cursor.execute("ALTER TABLE completed_orders ADD COLUMN trade_id TEXT")
+            self.cursor.execute(
+                """
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_completed_orders_trade_id 
+                ON completed_orders(trade_id)
+                """
+            )
+            
             # 統計表來跟蹤每日/每週成交量和利潤
             self.cursor.execute(
                 """
@@ -98,6 +109,17 @@ class Database:
                 """
             )
             
+            # 同步狀態表（歷史回填的高水位等）
+            self.cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    key TEXT PRIMARY KEY,
+                    value TEXT,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+                """
+            )
+            
             # 市場數據表
             self.cursor.execute(
                 """
@@ -252,10 +274,11 @@ class Database:
                 # 忽略"no transaction is active"錯誤
                 pass
                 
+            # 帶 trade_id 的成交重複寫入時忽略（WebSocket 推送與歷史回填可能重疊）
             query = """
-            INSERT INTO completed_orders 
-            (order_id, symbol, side, quantity, price, maker, fee, fee_asset, trade_type)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            INSERT OR IGNORE INTO completed_orders 
+            (order_id, symbol, side, quantity, price, maker, fee, fee_asset, trade_type, trade_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """
             params = (
                 order_data['order_id'],
@@ -266,7 +289,8 @@ class Database:
                 1 if order_data['maker'] else 0,
                 order_data['fee'],
                 order_data['fee_asset'],
-                order_data['trade_type']
+                order_data['trade_type'],
+                order_data.get('trade_id')
             )
             
             cursor = self.execute(query, params)
@@ -282,6 +306,111 @@ class Database:
                 pass
             return None
     
+    def insert_fills(self, fills, trade_type='manual'):
+        """
+        批量插入成交記錄，已存在的 trade_id 會被跳過
+        
+        Args:
+            fills: Fill 列表
+            trade_type: 交易類型（market_making、rebalance、manual）
+            
+        Returns:
+            實際新插入的成交列表；寫入失敗時拋出異常，使回填不推進高水位
+        """
+        if not fills:
+            return []
+        cursor = None
+        try:
+            try:
+                self.conn.commit()
+            except sqlite3.OperationalError:
+                pass
+            
+            cursor = self.conn.cursor()
+            trade_ids = [f.trade_id for f in fills if f.trade_id is not None]
+            existing = set()
+            # SQLite 單條語句的參數個數有限，分塊查詢
+            for i in range(0, len(trade_ids), 500):
+                chunk = trade_ids[i:i + 500]
+                cursor.execute(
+                    f"SELECT trade_id FROM completed_orders WHERE trade_id IN ({','.join('?' * len(chunk))})",
+                    chunk
+                )
+                existing.update(row[0] for row in cursor.fetchall())
+            
+            new_fills = []
+            seen = set()
+            for f in fills:
+                trade_id = f.trade_id
+                if trade_id is not None:
+                    if trade_id in existing or trade_id in seen:
+                        continue
+                    seen.add(trade_id)
+                new_fills.append(f)
+            
+            query = """
+            INSERT OR IGNORE INTO completed_orders 
+            (order_id, symbol, side, quantity, price, maker, fee, fee_asset, trade_type, trade_id, timestamp)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+            """
+            cursor.executemany(query, [
+                (
+                    f.order_id, f.symbol, f.side, f.quantity, f.price,
+                    1 if f.maker else 0, f.fee, f.fee_asset, trade_type, f.trade_id,
+                    None if f.timestamp is None else datetime.fromtimestamp(
+                        f.timestamp / 1000, tz=timezone.utc
+                    ).strftime("%Y-%m-%d %H:%M:%S")
+                )
+                for f in new_fills
+            ])
+            self.conn.commit()
+            return new_fills
+        except Exception as e:
+            logger.error(f"批量插入成交記錄時出錯: {e}")
+            try:
+                self.conn.rollback()
+            except sqlite3.OperationalError:
+                pass
+            raise
+        finally:
+            if cursor:
+                cursor.close()
+    
+    def get_sync_state(self, key):
+        """
+        讀取同步狀態
+        
+        Args:
+            key: 狀態鍵，例如 fills:SOL_USDC
+            
+        Returns:
+            字符串值，不存在時返回 None
+        """
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT value FROM sync_state WHERE key = ?", (key,))
+        row = cursor.fetchone()
+        cursor.close()
+        return row[0] if row else None
+    
+    def set_sync_state(self, key, value):
+        """
+        寫入同步狀態
+        
+        Args:
+            key: 狀態鍵
+            value: 字符串值
+        """
+        cursor = self.conn.cursor()
+        cursor.execute(
+            """
+            INSERT INTO sync_state (key, value, updated_at) VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at
+            """,
+            (key, value)
+        )
+        self.commit()
+        cursor.close()
+    
     def record_rebalance_order(self, order_id, symbol):
         """
         記錄重平衡訂單
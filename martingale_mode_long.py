@@ -13,6 +13,7 @@ from api.client import (
 )
 from ws_client.client import BackpackWebSocket
 from database.db import Database
+from models import Fill
 from utils.helpers import round_to_precision, round_to_tick_size, calculate_volatility
 from logger import setup_logger
 
@@ -237,13 +238,14 @@ class MartingaleLongTrader:
         
         # 批量插入準備
         for fill in fill_history:
-            price = float(fill.get('price', 0))
-            quantity = float(fill.get('quantity', 0))
-            side = fill.get('side')
-            maker = fill.get('maker', False)
-            fee = float(fill.get('fee', 0))
-            fee_asset = fill.get('feeAsset', '')
-            order_id = fill.get('orderId', '')
+            fill = Fill.from_rest(fill, self.symbol)
+            price = fill.price
+            quantity = fill.quantity
+            side = fill.side
+            maker = fill.maker
+            fee = fill.fee
+            fee_asset = fill.fee_asset
+            order_id = fill.order_id
             
             # 準備訂單數據
             order_data = {
@@ -295,21 +297,19 @@ class MartingaleLongTrader:
         """檢查並恢復WebSocket連接"""
         ws_connected = self.ws and self.ws.is_connected()
         
+        if not ws_connected and self.ws and getattr(self.ws, 'reconnecting', False):
+            # 連接自身的重連管理器正在重連並恢復訂閱，不重建連接
+            logger.info("WebSocket正在自動重連，等待恢復")
+            return False
+        
         if not ws_connected:
             logger.warning("WebSocket連接已斷開或不可用，嘗試重新連接...")
             
             # 嘗試關閉現有連接
             if self.ws:
                 try:
-                    if hasattr(self.ws, 'running') and self.ws.running:
-                        self.ws.running = False
-                    if hasattr(self.ws, 'ws') and self.ws.ws:
-                        try:
-                            self.ws.ws.close()
-                        except:
-                            pass
+                    # close() 在事件循環線程中關閉底層連接並停止自動重連，返回時已關閉
                     self.ws.close()
-                    time.sleep(0.5)
                 except Exception as e:
                     logger.error(f"關閉現有WebSocket時出錯: {e}")
             
@@ -372,13 +372,14 @@ class MartingaleLongTrader:
             # 「訂單成交」事件
             if event_type == 'orderFill':
                 try:
-                    side = data.get('S')
-                    quantity = float(data.get('l', '0'))  # 此次成交數量
-                    price = float(data.get('L', '0'))     # 此次成交價格
-                    order_id = data.get('i')             # 訂單 ID
-                    maker = data.get('m', False)         # 是否是 Maker
-                    fee = float(data.get('n', '0'))      # 手續費
-                    fee_asset = data.get('N', '')        # 手續費資產
+                    fill = Fill.from_ws(data)
+                    side = fill.side
+                    quantity = fill.quantity             # 此次成交數量
+                    price = fill.price                   # 此次成交價格
+                    order_id = fill.order_id             # 訂單 ID
+                    maker = fill.maker                   # 是否是 Maker
+                    fee = fill.fee                       # 手續費
+                    fee_asset = fill.fee_asset           # 手續費資產
 
                     logger.info(f"訂單成交: ID={order_id}, 方向={side}, 數量={quantity}, 價格={price}, Maker={maker}, 手續費={fee:.8f}")
                     
@@ -551,7 +552,10 @@ class MartingaleLongTrader:
             
             # 計算額外指標
             volatility = 0
-            if self.ws and hasattr(self.ws, 'historical_prices'):
+            if self.ws and hasattr(self.ws, 'price_history'):
+                # 增量維護的滑動窗口波動率，沿用 calculate_volatility 默認的日線口徑年化
+                volatility = self.ws.price_history.volatility(periods_per_year=252)
+            elif self.ws and hasattr(self.ws, 'historical_prices'):
                 volatility = calculate_volatility(self.ws.historical_prices)
             
             # 計算平均價差
@@ -1087,7 +1091,7 @@ class MartingaleLongTrader:
     
     def cancel_existing_orders(self):
         """取消所有現有訂單"""
-        open_orders = get_open_orders(self.api_key, self.secret_key, self.symbol)
+        open_orders = get_open_orders(self.api_key, self.secret_key, self.symbol, typed=True)
         
         if isinstance(open_orders, dict) and "error" in open_orders:
             logger.error(f"獲取訂單失敗: {open_orders['error']}")
@@ -1115,7 +1119,7 @@ class MartingaleLongTrader:
                     
                     # 提交取消訂單任務
                     for order in open_orders:
-                        order_id = order.get('id')
+                        order_id = order.id
                         if not order_id:
                             continue
                         
@@ -1161,7 +1165,7 @@ class MartingaleLongTrader:
     
     def check_order_fills(self):
         """檢查訂單成交情況"""
-        open_orders = get_open_orders(self.api_key, self.secret_key, self.symbol)
+        open_orders = get_open_orders(self.api_key, self.secret_key, self.symbol, typed=True)
         
         if isinstance(open_orders, dict) and "error" in open_orders:
             logger.error(f"獲取訂單失敗: {open_orders['error']}")
@@ -1171,9 +1175,8 @@ class MartingaleLongTrader:
         current_order_ids = set()
         if open_orders:
             for order in open_orders:
-                order_id = order.get('id')
-                if order_id:
-                    current_order_ids.add(order_id)
+                if order.id:
+                    current_order_ids.add(order.id)
         
         # 記錄更新前的訂單數量
         prev_buy_orders = len(self.active_buy_orders)
@@ -1185,28 +1188,26 @@ class MartingaleLongTrader:
         
         if open_orders:
             for order in open_orders:
-                if order.get('side') == 'Bid':
+                if order.side == 'Bid':
                     active_buy_orders.append(order)
-                elif order.get('side') == 'Ask':
+                elif order.side == 'Ask':
                     active_sell_orders.append(order)
         
         # 檢查買單成交
         filled_buy_orders = []
         for order in self.active_buy_orders:
-            order_id = order.get('id')
-            if order_id and order_id not in current_order_ids:
-                price = float(order.get('price', 0))
-                quantity = float(order.get('quantity', 0))
+            if order.id and order.id not in current_order_ids:
+                price = order.price or 0.0
+                quantity = order.quantity
                 logger.info(f"買單已成交: {price} x {quantity}")
                 filled_buy_orders.append(order)
         
         # 檢查賣單成交
         filled_sell_orders = []
         for order in self.active_sell_orders:
-            order_id = order.get('id')
-            if order_id and order_id not in current_order_ids:
-                price = float(order.get('price', 0))
-                quantity = float(order.get('quantity', 0))
+            if order.id and order.id not in current_order_ids:
+                price = order.price or 0.0
+                quantity = order.quantity
                 logger.info(f"賣單已成交: {price} x {quantity}")
                 filled_sell_orders.append(order)
         
@@ -1226,8 +1227,8 @@ class MartingaleLongTrader:
         avg_buy_price = 0
         total_buy_quantity = 0
         for order in self.active_buy_orders:
-            price = float(order.get('price', 0))
-            quantity = float(order.get('quantity', 0))
+            price = order.price or 0.0
+            quantity = order.quantity
             avg_buy_price += price * quantity
             total_buy_quantity += quantity
         
@@ -1237,8 +1238,8 @@ class MartingaleLongTrader:
         avg_sell_price = 0
         total_sell_quantity = 0
         for order in self.active_sell_orders:
-            price = float(order.get('price', 0))
-            quantity = float(order.get('quantity', 0))
+            price = order.price or 0.0
+            quantity = order.quantity
             avg_sell_price += price * quantity
             total_sell_quantity += quantity
         
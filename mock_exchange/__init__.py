@@ -0,0 +1,8 @@
+# mock_exchange/__init__.py
+"""
+本地模擬交易所，提供與 Backpack 相同的 REST 路由和 WebSocket 數據流，用於離線壓測
+"""
+from mock_exchange.engine import MatchingEngine
+from mock_exchange.server import FaultConfig, MockExchangeServer
+
+__all__ = ["MatchingEngine", "FaultConfig", "MockExchangeServer"]
@@ -0,0 +1,72 @@
+"""
+啟動本地模擬交易所
+
+用法:
+    python -m mock_exchange --port 8765 --latency-ms 20 --jitter-ms 30 --error-rate 0.01
+
+然後在另一個終端中把客戶端指向它:
+    BACKPACK_API_URL=http://127.0.0.1:8765 BACKPACK_WS_URL=ws://127.0.0.1:8765/ python run.py ...
+"""
+import argparse
+import asyncio
+
+from mock_exchange.engine import MatchingEngine
+from mock_exchange.server import FaultConfig, MockExchangeServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模擬 Backpack 交易所")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=0, help="REST 固定延遲")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="REST 隨機延遲上限")
+    parser.add_argument("--error-rate", type=float, default=0, help="返回 503 的概率")
+    parser.add_argument("--rate-limit-rate", type=float, default=0, help="返回 429 的概率")
+    parser.add_argument("--timeout-rate", type=float, default=0, help="掛起請求的概率")
+    parser.add_argument("--timeout-seconds", type=float, default=30, help="掛起時長")
+    parser.add_argument("--ws-latency-ms", type=float, default=0, help="WebSocket 推送延遲")
+    parser.add_argument("--ws-drop-rate", type=float, default=0, help="每秒斷開每個 WebSocket 連接的概率")
+    parser.add_argument("--ws-stall-rate", type=float, default=0, help="每秒讓每個 WebSocket 連接靜默的概率")
+    parser.add_argument("--clock-skew-ms", type=float, default=0, help="服務器時鐘偏移")
+    parser.add_argument("--no-verify", action="store_true", help="不驗證請求簽名")
+    parser.add_argument("--no-simulate", action="store_true", help="不運行模擬做市和吃單")
+    parser.add_argument("--interval", type=float, default=0.5, help="模擬行情週期（秒）")
+    parser.add_argument("--seed", type=int, default=None, help="模擬行情隨機種子")
+    args = parser.parse_args()
+
+    faults = FaultConfig(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        timeout_rate=args.timeout_rate,
+        timeout_seconds=args.timeout_seconds,
+        ws_latency_ms=args.ws_latency_ms,
+        ws_drop_rate=args.ws_drop_rate,
+        ws_stall_rate=args.ws_stall_rate,
+        clock_skew_ms=args.clock_skew_ms,
+    )
+    server = MockExchangeServer(
+        args.host, args.port, MatchingEngine(), faults,
+        verify_signatures=not args.no_verify,
+        simulate=not args.no_simulate,
+        simulator_options={"interval": args.interval, "seed": args.seed},
+    )
+
+    async def serve():
+        await server.start()
+        print(f"BACKPACK_API_URL={server.base_url}")
+        print(f"BACKPACK_WS_URL={server.ws_url}")
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await server.stop()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,674 @@
+"""
+模擬交易所撮合引擎
+
+價格-時間優先的限價訂單簿，支持限價/市價單、postOnly、IOC/FOK、
+賬戶餘額凍結與結算，並通過回調輸出 depth、bookTicker、trade 和訂單更新事件。
+引擎不是線程安全的，應只在服務器的事件循環內調用。
+"""
+import bisect
+import itertools
+import time
+from collections import deque
+from decimal import Decimal, InvalidOperation
+from typing import Callable, Dict, List, Optional, Tuple
+
+from logger import setup_logger
+
+logger = setup_logger("mock_exchange.engine")
+
+ZERO = Decimal("0")
+
+DEFAULT_MARKETS = {
+    "SOL_USDC": {"base": "SOL", "quote": "USDC", "tick_size": "0.01", "step_size": "0.01", "min_quantity": "0.01", "price": "150"},
+    "BTC_USDC": {"base": "BTC", "quote": "USDC", "tick_size": "0.1", "step_size": "0.00001", "min_quantity": "0.00001", "price": "60000"},
+    "ETH_USDC": {"base": "ETH", "quote": "USDC", "tick_size": "0.01", "step_size": "0.0001", "min_quantity": "0.0001", "price": "3000"},
+}
+
+DEFAULT_BALANCES = {"USDC": "100000", "SOL": "1000", "BTC": "2", "ETH": "30"}
+
+MAX_HISTORY = 100000    # 每個賬戶/交易對保留的成交和訂單歷史上限，避免長時間壓測內存無限增長
+
+
+class ExchangeError(Exception):
+    """下單或撤單被拒絕，code/message 與交易所錯誤返回格式一致"""
+
+    def __init__(self, code: str, message: str, status: int = 400):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.status = status
+
+    def to_dict(self) -> Dict[str, str]:
+        return {"code": self.code, "message": self.message}
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+def _dec(value, field: str) -> Decimal:
+    try:
+        result = Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        raise ExchangeError("INVALID_CLIENT_REQUEST", f"Invalid {field}: {value}")
+    if not result.is_finite():
+        raise ExchangeError("INVALID_CLIENT_REQUEST", f"Invalid {field}: {value}")
+    return result
+
+
+def _fmt(value: Decimal) -> str:
+    return format(value.normalize(), "f")
+
+
+class MockOrder:
+    """訂單簿中的一張訂單"""
+
+    __slots__ = (
+        "id", "client_id", "account", "symbol", "side", "order_type", "price", "quantity",
+        "quote_quantity", "executed", "executed_quote", "time_in_force", "post_only",
+        "status", "created_at", "locked"
+    )
+
+    def __init__(self, order_id, account, symbol, side, order_type, price, quantity,
+                 quote_quantity=None, time_in_force="GTC", post_only=False, client_id=None):
+        self.id = order_id
+        self.client_id = client_id
+        self.account = account
+        self.symbol = symbol
+        self.side = side
+        self.order_type = order_type
+        self.price = price
+        self.quantity = quantity
+        self.quote_quantity = quote_quantity
+        self.executed = ZERO
+        self.executed_quote = ZERO
+        self.time_in_force = time_in_force
+        self.post_only = post_only
+        self.status = "New"
+        self.created_at = _now_ms()
+        self.locked = ZERO          # 當前凍結的資產數量（買單為報價資產，賣單為基礎資產）
+
+    @property
+    def remaining(self) -> Decimal:
+        return self.quantity - self.executed if self.quantity is not None else None
+
+    def to_dict(self) -> Dict:
+        return {
+            "id": self.id,
+            "clientId": self.client_id,
+            "createdAt": self.created_at,
+            "executedQuantity": _fmt(self.executed),
+            "executedQuoteQuantity": _fmt(self.executed_quote),
+            "orderType": self.order_type,
+            "postOnly": self.post_only,
+            "price": _fmt(self.price) if self.price is not None else None,
+            "quantity": _fmt(self.quantity) if self.quantity is not None else None,
+            "quoteQuantity": _fmt(self.quote_quantity) if self.quote_quantity is not None else None,
+            "selfTradePrevention": "RejectTaker",
+            "side": self.side,
+            "status": self.status,
+            "symbol": self.symbol,
+            "timeInForce": self.time_in_force,
+            "triggerPrice": None,
+        }
+
+
+class BookSide:
+    """訂單簿的一側：有序價格列表 + 每檔的 FIFO 隊列"""
+
+    def __init__(self, descending: bool):
+        self.descending = descending
+        self._keys: List[Decimal] = []          # 升序排列；買側取反存儲使最優價在前
+        self.levels: Dict[Decimal, deque] = {}
+        self.sizes: Dict[Decimal, Decimal] = {}
+
+    def _key(self, price: Decimal) -> Decimal:
+        return -price if self.descending else price
+
+    def best(self) -> Optional[Decimal]:
+        if not self._keys:
+            return None
+        return self._key(self._keys[0])
+
+    def add(self, order: MockOrder):
+        price = order.price
+        queue = self.levels.get(price)
+        if queue is None:
+            queue = self.levels[price] = deque()
+            self.sizes[price] = ZERO
+            bisect.insort(self._keys, self._key(price))
+        queue.append(order)
+        self.sizes[price] += order.remaining
+
+    def reduce(self, price: Decimal, quantity: Decimal):
+        self.sizes[price] -= quantity
+
+    def remove(self, order: MockOrder):
+        queue = self.levels.get(order.price)
+        if queue is None:
+            return
+        try:
+            queue.remove(order)
+        except ValueError:
+            return
+        self.sizes[order.price] -= order.remaining
+        if not queue:
+            self._drop_level(order.price)
+
+    def pop_front(self, price: Decimal):
+        queue = self.levels[price]
+        queue.popleft()
+        if not queue:
+            self._drop_level(price)
+
+    def _drop_level(self, price: Decimal):
+        del self.levels[price]
+        del self.sizes[price]
+        index = bisect.bisect_left(self._keys, self._key(price))
+        del self._keys[index]
+
+    def prices(self, limit: Optional[int] = None) -> List[Decimal]:
+        keys = self._keys if limit is None else self._keys[:limit]
+        return [self._key(k) for k in keys]
+
+
+class OrderBook:
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.bids = BookSide(descending=True)
+        self.asks = BookSide(descending=False)
+        self.sequence = 0
+
+    def side(self, side: str) -> BookSide:
+        return self.bids if side == "Bid" else self.asks
+
+    def opposite(self, side: str) -> BookSide:
+        return self.asks if side == "Bid" else self.bids
+
+
+class Account:
+    def __init__(self, api_key: str, balances: Dict[str, str]):
+        self.api_key = api_key
+        self.available: Dict[str, Decimal] = {asset: Decimal(str(v)) for asset, v in balances.items()}
+        self.locked: Dict[str, Decimal] = {asset: ZERO for asset in balances}
+        self.fills: deque = deque(maxlen=MAX_HISTORY)           # (成交時間毫秒, 成交記錄)
+        self.order_history: deque = deque(maxlen=MAX_HISTORY)
+
+    def lock(self, asset: str, amount: Decimal):
+        if self.available.get(asset, ZERO) < amount:
+            raise ExchangeError("INSUFFICIENT_FUNDS", f"Insufficient {asset} balance")
+        self.available[asset] = self.available.get(asset, ZERO) - amount
+        self.locked[asset] = self.locked.get(asset, ZERO) + amount
+
+    def unlock(self, asset: str, amount: Decimal):
+        self.locked[asset] = self.locked.get(asset, ZERO) - amount
+        self.available[asset] = self.available.get(asset, ZERO) + amount
+
+    def credit(self, asset: str, amount: Decimal):
+        self.available[asset] = self.available.get(asset, ZERO) + amount
+
+    def debit_locked(self, asset: str, amount: Decimal):
+        self.locked[asset] = self.locked.get(asset, ZERO) - amount
+
+    def capital(self) -> Dict[str, Dict[str, str]]:
+        assets = set(self.available) | set(self.locked)
+        return {
+            asset: {
+                "available": _fmt(self.available.get(asset, ZERO)),
+                "locked": _fmt(self.locked.get(asset, ZERO)),
+                "staked": "0"
+            }
+            for asset in sorted(assets)
+        }
+
+
+class MatchingEngine:
+    """
+    撮合引擎
+
+    Args:
+        markets: 交易對配置，默認 DEFAULT_MARKETS
+        default_balances: 新賬戶的初始餘額
+        maker_fee / taker_fee: 手續費率
+    """
+
+    def __init__(self, markets: Optional[Dict[str, Dict]] = None, default_balances: Optional[Dict[str, str]] = None,
+                 maker_fee: str = "0.0002", taker_fee: str = "0.0005"):
+        self.markets = {symbol: dict(cfg) for symbol, cfg in (markets or DEFAULT_MARKETS).items()}
+        for cfg in self.markets.values():
+            cfg["tick"] = Decimal(cfg["tick_size"])
+            cfg["step"] = Decimal(cfg["step_size"])
+            cfg["min"] = Decimal(cfg["min_quantity"])
+        self.default_balances = dict(default_balances or DEFAULT_BALANCES)
+        self.maker_fee = Decimal(maker_fee)
+        self.taker_fee = Decimal(taker_fee)
+
+        self.books: Dict[str, OrderBook] = {symbol: OrderBook(symbol) for symbol in self.markets}
+        self.accounts: Dict[str, Account] = {}
+        self.orders: Dict[str, MockOrder] = {}
+        self.client_ids: Dict[Tuple[str, int], str] = {}
+        self.trades: Dict[str, deque] = {symbol: deque(maxlen=MAX_HISTORY) for symbol in self.markets}
+        self.last_price: Dict[str, Decimal] = {symbol: Decimal(cfg["price"]) for symbol, cfg in self.markets.items()}
+
+        self._order_ids = itertools.count(int(time.time() * 1000) * 1000)
+        self._trade_ids = itertools.count(1)
+        # 事件回調: (事件類型, 交易對或賬戶, 數據)
+        self.listeners: List[Callable[[str, str, Dict], None]] = []
+
+    # ------------------------------------------------------------------ 賬戶和行情
+
+    def account(self, api_key: str) -> Account:
+        account = self.accounts.get(api_key)
+        if account is None:
+            account = self.accounts[api_key] = Account(api_key, self.default_balances)
+        return account
+
+    def market_info(self, symbol: str) -> Dict:
+        cfg = self.markets[symbol]
+        return {
+            "symbol": symbol,
+            "baseSymbol": cfg["base"],
+            "quoteSymbol": cfg["quote"],
+            "marketType": "SPOT",
+            "orderBookState": "Open",
+            "createdAt": "2024-01-01T00:00:00",
+            "filters": {
+                "price": {"tickSize": cfg["tick_size"], "minPrice": cfg["tick_size"], "maxPrice": None},
+                "quantity": {"stepSize": cfg["step_size"], "minQuantity": cfg["min_quantity"], "maxQuantity": None},
+            },
+        }
+
+    def depth(self, symbol: str, limit: Optional[int] = None) -> Dict:
+        book = self._book(symbol)
+        bids = [[_fmt(p), _fmt(book.bids.sizes[p])] for p in book.bids.prices(limit)]
+        asks = [[_fmt(p), _fmt(book.asks.sizes[p])] for p in book.asks.prices(limit)]
+        # 與交易所一致：兩側都按價格升序返回
+        bids.reverse()
+        return {"asks": asks, "bids": bids, "lastUpdateId": str(book.sequence), "timestamp": _now_ms()}
+
+    def book_ticker(self, symbol: str) -> Dict:
+        book = self._book(symbol)
+        best_bid, best_ask = book.bids.best(), book.asks.best()
+        return {
+            "e": "bookTicker",
+            "E": _now_ms() * 1000,
+            "s": symbol,
+            "a": _fmt(best_ask) if best_ask is not None else None,
+            "A": _fmt(book.asks.sizes[best_ask]) if best_ask is not None else "0",
+            "b": _fmt(best_bid) if best_bid is not None else None,
+            "B": _fmt(book.bids.sizes[best_bid]) if best_bid is not None else "0",
+            "u": book.sequence,
+            "T": _now_ms() * 1000,
+        }
+
+    def ticker(self, symbol: str) -> Dict:
+        self._book(symbol)
+        cutoff = _now_ms() - 86400 * 1000
+        recent = [t for t in self.trades[symbol] if t[0] >= cutoff]
+        last = self.last_price[symbol]
+        first = recent[0][1] if recent else last
+        high = max((t[1] for t in recent), default=last)
+        low = min((t[1] for t in recent), default=last)
+        volume = sum((t[2] for t in recent), ZERO)
+        quote_volume = sum((t[1] * t[2] for t in recent), ZERO)
+        change = last - first
+        return {
+            "symbol": symbol,
+            "firstPrice": _fmt(first),
+            "lastPrice": _fmt(last),
+            "priceChange": _fmt(change),
+            "priceChangePercent": _fmt((change / first).quantize(Decimal("0.000001"))) if first else "0",
+            "high": _fmt(high),
+            "low": _fmt(low),
+            "volume": _fmt(volume),
+            "quoteVolume": _fmt(quote_volume),
+            "trades": str(len(recent)),
+        }
+
+    def klines(self, symbol: str, interval_seconds: int, start: int, end: Optional[int] = None) -> List[Dict]:
+        """按成交記錄聚合K線（start/end 為秒）"""
+        self._book(symbol)
+        end = end or int(time.time())
+        buckets: Dict[int, List] = {}
+        for ts, price, qty in self.trades[symbol]:
+            second = ts // 1000
+            if second < start or second >= end:
+                continue
+            bucket = second - second % interval_seconds
+            candle = buckets.get(bucket)
+            if candle is None:
+                buckets[bucket] = [price, price, price, price, qty, price * qty, 1]
+            else:
+                candle[1] = max(candle[1], price)
+                candle[2] = min(candle[2], price)
+                candle[3] = price
+                candle[4] += qty
+                candle[5] += price * qty
+                candle[6] += 1
+        result = []
+        for bucket in sorted(buckets):
+            o, h, l, c, v, qv, n = buckets[bucket]
+            result.append({
+                "start": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(bucket)),
+                "end": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(bucket + interval_seconds)),
+                "open": _fmt(o), "high": _fmt(h), "low": _fmt(l), "close": _fmt(c),
+                "volume": _fmt(v), "quoteVolume": _fmt(qv), "trades": str(n),
+            })
+        return result
+
+    # ------------------------------------------------------------------ 訂單
+
+    def _book(self, symbol: str) -> OrderBook:
+        book = self.books.get(symbol)
+        if book is None:
+            raise ExchangeError("INVALID_MARKET", f"Market not found: {symbol}", status=404)
+        return book
+
+    def _emit(self, event: str, key: str, data: Dict):
+        for listener in self.listeners:
+            try:
+                listener(event, key, data)
+            except Exception as e:
+                logger.error(f"事件回調異常: {e}")
+
+    def place_order(self, api_key: str, params: Dict) -> Dict:
+        """下單，返回訂單字典；被拒絕時拋出 ExchangeError"""
+        account = self.account(api_key)
+        symbol = str(params.get("symbol", ""))
+        book = self._book(symbol)
+        cfg = self.markets[symbol]
+
+        side = params.get("side")
+        if side not in ("Bid", "Ask"):
+            raise ExchangeError("INVALID_CLIENT_REQUEST", f"Invalid side: {side}")
+        order_type = params.get("orderType")
+        if order_type not in ("Limit", "Market"):
+            raise ExchangeError("INVALID_CLIENT_REQUEST", f"Invalid orderType: {order_type}")
+        time_in_force = params.get("timeInForce") or "GTC"
+        post_only = str(params.get("postOnly", "false")).lower() == "true"
+        client_id = params.get("clientId")
+        if client_id is not None:
+            client_id = int(client_id)
+
+        price = _dec(params["price"], "price") if order_type == "Limit" and params.get("price") is not None else None
+        quantity = _dec(params["quantity"], "quantity") if params.get("quantity") is not None else None
+        quote_quantity = _dec(params["quoteQuantity"], "quoteQuantity") if params.get("quoteQuantity") is not None else None
+
+        if order_type == "Limit":
+            if price is None or quantity is None:
+                raise ExchangeError("INVALID_CLIENT_REQUEST", "Limit orders require price and quantity")
+            if price <= 0 or price % cfg["tick"] != 0:
+                raise ExchangeError("INVALID_PRICE", f"Price {price} does not match tick size {cfg['tick_size']}")
+        elif quantity is None and quote_quantity is None:
+            raise ExchangeError("INVALID_CLIENT_REQUEST", "Market orders require quantity or quoteQuantity")
+
+        if quantity is not None:
+            if quantity < cfg["min"]:
+                raise ExchangeError("INVALID_QUANTITY", f"Quantity below minimum {cfg['min_quantity']}")
+            if quantity % cfg["step"] != 0:
+                raise ExchangeError("INVALID_QUANTITY", f"Quantity {quantity} does not match step size {cfg['step_size']}")
+
+        opposite = book.opposite(side)
+        best = opposite.best()
+        crosses = best is not None and (price is None or (price >= best if side == "Bid" else price <= best))
+        if post_only and crosses:
+            raise ExchangeError("INVALID_ORDER", "POST_ONLY_TAKER: Order would immediately match and take")
+
+        order = MockOrder(
+            str(next(self._order_ids)), api_key, symbol, side, order_type, price, quantity,
+            quote_quantity=quote_quantity, time_in_force=time_in_force, post_only=post_only, client_id=client_id
+        )
+
+        if time_in_force == "FOK" and not self._can_fill(book, order):
+            raise ExchangeError("INVALID_ORDER", "FOK order could not be filled")
+
+        # 凍結資金
+        if side == "Bid":
+            if price is not None:
+                order.locked = price * quantity
+            elif quote_quantity is not None:
+                order.locked = quote_quantity
+            else:
+                # 市價買單按數量下單時，按當前最優賣價的 2 倍預估凍結額
+                order.locked = (best or self.last_price[symbol]) * quantity * 2
+            account.lock(cfg["quote"], order.locked)
+        else:
+            if quantity is None:
+                raise ExchangeError("INVALID_CLIENT_REQUEST", "Market sell orders require quantity")
+            order.locked = quantity
+            account.lock(cfg["base"], order.locked)
+
+        self.orders[order.id] = order
+        if client_id is not None:
+            self.client_ids[(api_key, client_id)] = order.id
+        self._emit("orderUpdate", api_key, self._order_event("orderAccepted", order))
+
+        changed = set()
+        if crosses:
+            self._match(book, order, changed)
+
+        if order.status not in ("Filled",):
+            if order.order_type == "Limit" and order.time_in_force == "GTC":
+                book.side(side).add(order)
+                changed.add((side, order.price))
+            else:
+                self._finish(order, "Cancelled" if order.executed == 0 or order.order_type == "Limit" else "Filled")
+
+        if changed:
+            self._publish_depth(book, changed)
+        return order.to_dict()
+
+    def _can_fill(self, book: OrderBook, order: MockOrder) -> bool:
+        needed = order.quantity
+        opposite = book.opposite(order.side)
+        for level in opposite.prices():
+            if order.price is not None and (level > order.price if order.side == "Bid" else level < order.price):
+                break
+            needed -= opposite.sizes[level]
+            if needed <= 0:
+                return True
+        return False
+
+    def _match(self, book: OrderBook, taker: MockOrder, changed: set):
+        cfg = self.markets[book.symbol]
+        opposite = book.opposite(taker.side)
+        while True:
+            level = opposite.best()
+            if level is None:
+                break
+            if taker.price is not None and (level > taker.price if taker.side == "Bid" else level < taker.price):
+                break
+
+            maker = opposite.levels[level][0]
+            remaining = taker.remaining
+            if remaining is None:
+                # 按報價金額下的市價買單
+                budget = taker.quote_quantity - taker.executed_quote
+                remaining = (budget / level).quantize(cfg["step"], rounding="ROUND_DOWN")
+            if remaining <= 0:
+                break
+
+            quantity = min(remaining, maker.remaining)
+            self._fill(book, maker, taker, level, quantity)
+            opposite.reduce(level, quantity)
+            changed.add((maker.side, level))
+            if maker.remaining <= 0:
+                opposite.pop_front(level)
+                self._finish(maker, "Filled")
+            if taker.remaining is not None and taker.remaining <= 0:
+                self._finish(taker, "Filled")
+                break
+
+        if taker.status != "Filled" and taker.executed > 0:
+            taker.status = "PartiallyFilled"
+
+    def _fill(self, book: OrderBook, maker: MockOrder, taker: MockOrder, price: Decimal, quantity: Decimal):
+        cfg = self.markets[book.symbol]
+        base, quote = cfg["base"], cfg["quote"]
+        notional = price * quantity
+        trade_id = next(self._trade_ids)
+        now = _now_ms()
+
+        for order, is_maker in ((maker, True), (taker, False)):
+            account = self.account(order.account)
+            fee_rate = self.maker_fee if is_maker else self.taker_fee
+            order.executed += quantity
+            order.executed_quote += notional
+            if order.side == "Bid":
+                spent = notional
+                account.debit_locked(quote, spent)
+                order.locked -= spent
+                fee = quantity * fee_rate
+                account.credit(base, quantity - fee)
+                fee_symbol = base
+            else:
+                account.debit_locked(base, quantity)
+                order.locked -= quantity
+                fee = notional * fee_rate
+                account.credit(quote, notional - fee)
+                fee_symbol = quote
+            if order.status == "New":
+                order.status = "PartiallyFilled"
+
+            fill = {
+                "clientId": str(order.client_id) if order.client_id is not None else None,
+                "fee": _fmt(fee),
+                "feeSymbol": fee_symbol,
+                "isMaker": is_maker,
+                "orderId": order.id,
+                "price": _fmt(price),
+                "quantity": _fmt(quantity),
+                "side": order.side,
+                "symbol": book.symbol,
+                "systemOrderType": None,
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(now / 1000)) + f".{now % 1000:03d}",
+                "tradeId": trade_id,
+            }
+            account.fills.append((now, fill))
+            event = self._order_event("orderFill", order)
+            event.update({
+                "l": _fmt(quantity), "L": _fmt(price), "m": is_maker, "n": _fmt(fee), "N": fee_symbol, "t": trade_id
+            })
+            self._emit("orderUpdate", order.account, event)
+
+        self.trades[book.symbol].append((now, price, quantity))
+        self.last_price[book.symbol] = price
+        self._emit("trade", book.symbol, {
+            "e": "trade", "E": now * 1000, "s": book.symbol, "p": _fmt(price), "q": _fmt(quantity),
+            "b": maker.id if maker.side == "Bid" else taker.id,
+            "a": maker.id if maker.side == "Ask" else taker.id,
+            "t": trade_id, "T": now * 1000, "m": maker.side == "Bid",
+        })
+
+    def _finish(self, order: MockOrder, status: str):
+        """訂單結束（成交或撤銷），釋放剩餘凍結資金"""
+        order.status = status
+        if order.locked > 0:
+            cfg = self.markets[order.symbol]
+            self.account(order.account).unlock(cfg["quote"] if order.side == "Bid" else cfg["base"], order.locked)
+            order.locked = ZERO
+        account = self.account(order.account)
+        account.order_history.append(order.to_dict())
+        self.orders.pop(order.id, None)
+        if order.client_id is not None:
+            self.client_ids.pop((order.account, order.client_id), None)
+        if status == "Cancelled":
+            self._emit("orderUpdate", order.account, self._order_event("orderCancelled", order))
+
+    def _resolve(self, api_key: str, order_id=None, client_id=None) -> Optional[MockOrder]:
+        if order_id is None and client_id is not None:
+            order_id = self.client_ids.get((api_key, int(client_id)))
+        order = self.orders.get(str(order_id)) if order_id is not None else None
+        if order is None or order.account != api_key:
+            return None
+        return order
+
+    def get_order(self, api_key: str, symbol: str, order_id=None, client_id=None) -> Optional[Dict]:
+        order = self._resolve(api_key, order_id, client_id)
+        if order is None or order.symbol != symbol:
+            return None
+        return order.to_dict()
+
+    def cancel_order(self, api_key: str, symbol: str, order_id=None, client_id=None) -> Dict:
+        book = self._book(symbol)
+        order = self._resolve(api_key, order_id, client_id)
+        if order is None or order.symbol != symbol:
+            raise ExchangeError("RESOURCE_NOT_FOUND", "Order not found", status=404)
+        book.side(order.side).remove(order)
+        self._finish(order, "Cancelled")
+        self._publish_depth(book, {(order.side, order.price)})
+        return order.to_dict()
+
+    def cancel_all(self, api_key: str, symbol: str) -> List[Dict]:
+        book = self._book(symbol)
+        cancelled = []
+        changed = set()
+        for order in [o for o in self.orders.values() if o.account == api_key and o.symbol == symbol]:
+            book.side(order.side).remove(order)
+            self._finish(order, "Cancelled")
+            changed.add((order.side, order.price))
+            cancelled.append(order.to_dict())
+        if changed:
+            self._publish_depth(book, changed)
+        return cancelled
+
+    def open_orders(self, api_key: str, symbol: Optional[str] = None) -> List[Dict]:
+        return [
+            o.to_dict() for o in self.orders.values()
+            if o.account == api_key and (symbol is None or o.symbol == symbol)
+        ]
+
+    def fills(self, api_key: str, symbol: Optional[str] = None, order_id=None,
+              limit: int = 100, offset: int = 0, from_ms: Optional[int] = None, to_ms: Optional[int] = None) -> List[Dict]:
+        """成交歷史，按時間倒序"""
+        result = []
+        for ts, fill in reversed(self.account(api_key).fills):
+            if symbol and fill["symbol"] != symbol:
+                continue
+            if order_id and fill["orderId"] != str(order_id):
+                continue
+            if from_ms is not None and ts < from_ms:
+                continue
+            if to_ms is not None and ts >= to_ms:
+                continue
+            result.append(fill)
+        return result[offset:offset + limit]
+
+    def order_history(self, api_key: str, symbol: Optional[str] = None, limit: int = 100, offset: int = 0) -> List[Dict]:
+        history = [o for o in reversed(self.account(api_key).order_history) if symbol is None or o["symbol"] == symbol]
+        return history[offset:offset + limit]
+
+    # ------------------------------------------------------------------ 事件
+
+    def _order_event(self, event: str, order: MockOrder) -> Dict:
+        return {
+            "e": event,
+            "E": _now_ms() * 1000,
+            "s": order.symbol,
+            "c": order.client_id,
+            "S": order.side,
+            "o": order.order_type.upper(),
+            "f": order.time_in_force,
+            "q": _fmt(order.quantity) if order.quantity is not None else None,
+            "Q": _fmt(order.quote_quantity) if order.quote_quantity is not None else None,
+            "p": _fmt(order.price) if order.price is not None else None,
+            "X": order.status,
+            "i": order.id,
+            "z": _fmt(order.executed),
+            "Z": _fmt(order.executed_quote),
+            "T": _now_ms() * 1000,
+        }
+
+    def _publish_depth(self, book: OrderBook, changed: set):
+        """把本次操作改變的價格檔位（絕對數量，0 表示刪除）作為一條 depth 增量發出"""
+        first = book.sequence + 1
+        book.sequence += 1
+        asks, bids = [], []
+        for side, price in sorted(changed, key=lambda item: (item[0], item[1])):
+            size = book.side(side).sizes.get(price, ZERO)
+            (bids if side == "Bid" else asks).append([_fmt(price), _fmt(size)])
+        now = _now_ms() * 1000
+        self._emit("depth", book.symbol, {
+            "e": "depth", "E": now, "s": book.symbol, "a": asks, "b": bids, "U": first, "u": book.sequence, "T": now
+        })
+        self._emit("bookTicker", book.symbol, self.book_ticker(book.symbol))
@@ -0,0 +1,494 @@
+"""
+模擬交易所服務器：REST 路由、WebSocket 數據流、簽名驗證和故障注入
+"""
+import asyncio
+import base64
+import json
+import random
+import time
+from typing import Dict, List, Optional, Set
+
+import nacl.exceptions
+import nacl.signing
+from aiohttp import WSMsgType, web
+
+from api.loop_thread import EventLoopThread
+from logger import setup_logger
+from mock_exchange.engine import ExchangeError, MatchingEngine
+from mock_exchange.simulator import MarketSimulator
+
+logger = setup_logger("mock_exchange.server")
+
+KLINE_INTERVALS = {
+    "1m": 60, "3m": 180, "5m": 300, "15m": 900, "30m": 1800,
+    "1h": 3600, "2h": 7200, "4h": 14400, "6h": 21600, "8h": 28800, "12h": 43200,
+    "1d": 86400, "3d": 259200, "1w": 604800, "1month": 2592000
+}
+
+
+class FaultConfig:
+    """
+    故障注入配置
+
+    Args:
+        latency_ms: REST 響應的固定延遲
+        jitter_ms: 在固定延遲上疊加的均勻隨機延遲
+        error_rate: 返回 503 的概率
+        rate_limit_rate: 返回 429 的概率
+        timeout_rate: 掛起請求 timeout_seconds 秒後返回 504 的概率（用於觸發客戶端超時）
+        timeout_seconds: 掛起時長
+        route_latency_ms: 按路徑覆蓋固定延遲，例如 {"/api/v1/order": 80}
+        ws_latency_ms: WebSocket 每條推送的延遲
+        ws_drop_rate: 每秒主動斷開每個 WebSocket 連接的概率
+        ws_stall_rate: 每秒讓每個 WebSocket 連接靜默的概率（連接保持打開，但不再推送也不回應 ping，模擬半開連接）
+        clock_skew_ms: 服務器時鐘相對本地時鐘的偏移（用於驗證時鐘同步）
+    """
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0,
+                 rate_limit_rate: float = 0, timeout_rate: float = 0, timeout_seconds: float = 30,
+                 route_latency_ms: Optional[Dict[str, float]] = None, ws_latency_ms: float = 0,
+                 ws_drop_rate: float = 0, clock_skew_ms: float = 0, ws_stall_rate: float = 0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.timeout_rate = timeout_rate
+        self.timeout_seconds = timeout_seconds
+        self.route_latency_ms = dict(route_latency_ms or {})
+        self.ws_latency_ms = ws_latency_ms
+        self.ws_drop_rate = ws_drop_rate
+        self.ws_stall_rate = ws_stall_rate
+        self.clock_skew_ms = clock_skew_ms
+
+    def latency_for(self, path: str) -> float:
+        """某個路徑本次請求應注入的延遲（秒）"""
+        base = self.route_latency_ms.get(path, self.latency_ms)
+        jitter = random.uniform(0, self.jitter_ms) if self.jitter_ms else 0
+        return (base + jitter) / 1000.0
+
+
+def _canonical(params: Dict) -> str:
+    """按鍵排序拼接參數（布爾值轉小寫），與交易所簽名規則一致"""
+    parts = []
+    for key in sorted(params):
+        value = params[key]
+        if isinstance(value, bool):
+            value = "true" if value else "false"
+        parts.append(f"{key}={value}")
+    return "&".join(parts)
+
+
+class _WsConnection:
+    """單個 WebSocket 連接：訂閱集合 + 帶延遲的發送隊列"""
+
+    def __init__(self, ws: web.WebSocketResponse, latency: float):
+        self.ws = ws
+        self.latency = latency
+        self.streams: Set[str] = set()
+        self.account: Optional[str] = None
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.sender: Optional[asyncio.Task] = None
+        self.stalled = False
+
+    async def run_sender(self):
+        while True:
+            payload = await self.queue.get()
+            if self.latency:
+                await asyncio.sleep(self.latency)
+            if self.ws.closed:
+                return
+            if self.stalled:
+                continue
+            await self.ws.send_str(payload)
+
+
+class MockExchangeServer:
+    """
+    模擬 Backpack 交易所
+
+    REST 路由與交易所一致，私有接口用 X-API-KEY 對應的 ED25519 公鑰驗證簽名；
+    任何合法公鑰首次訪問時都會自動開戶並注入 engine.default_balances。
+    WebSocket 支持 depth.<交易對>、bookTicker.<交易對>、trade.<交易對> 和 account.orderUpdate[.<交易對>]。
+
+    用法:
+        server = MockExchangeServer(port=8765)
+        await server.start()
+        # BACKPACK_API_URL=server.base_url BACKPACK_WS_URL=server.ws_url
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, engine: Optional[MatchingEngine] = None,
+                 faults: Optional[FaultConfig] = None, verify_signatures: bool = True,
+                 simulate: bool = True, simulator_options: Optional[Dict] = None):
+        self.host = host
+        self.port = port
+        self.engine = engine or MatchingEngine()
+        self.faults = faults or FaultConfig()
+        self.verify_signatures = verify_signatures
+        self.simulator = MarketSimulator(self.engine, **(simulator_options or {})) if simulate else None
+
+        self.connections: List[_WsConnection] = []
+        self.request_count = 0
+        self._runner: Optional[web.AppRunner] = None
+        self._background: List[asyncio.Task] = []
+        self._loop_thread: Optional[EventLoopThread] = None
+        self.engine.listeners.append(self._on_engine_event)
+        self.app = self._build_app()
+
+    # ------------------------------------------------------------------ 生命週期
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    @property
+    def ws_url(self) -> str:
+        return f"ws://{self.host}:{self.port}/"
+
+    async def start(self):
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        # 端口為 0 時取系統分配的實際端口
+        self.port = self._runner.addresses[0][1]
+        if self.simulator is not None:
+            self.simulator.start()
+        self._background.append(asyncio.get_running_loop().create_task(self._ws_fault_loop()))
+        logger.info(f"模擬交易所已啟動: {self.base_url} / {self.ws_url}")
+
+    async def stop(self):
+        if self.simulator is not None:
+            await self.simulator.stop()
+        for task in self._background:
+            task.cancel()
+        self._background.clear()
+        for conn in list(self.connections):
+            await conn.ws.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def start_in_background(self) -> "MockExchangeServer":
+        """在獨立的事件循環線程中啟動（供同步壓測腳本使用）"""
+        self._loop_thread = EventLoopThread(name="mock-exchange")
+        self._loop_thread.run(self.start())
+        return self
+
+    def stop_background(self):
+        if self._loop_thread is not None:
+            self._loop_thread.run(self.stop())
+            self._loop_thread.stop()
+            self._loop_thread = None
+
+    # ------------------------------------------------------------------ 應用和中間件
+
+    def _build_app(self) -> web.Application:
+        app = web.Application(middlewares=[self._fault_middleware, self._error_middleware])
+        public = [
+            ("GET", "/api/v1/time", self.handle_time),
+            ("GET", "/api/v1/markets", self.handle_markets),
+            ("GET", "/api/v1/market", self.handle_market),
+            ("GET", "/api/v1/ticker", self.handle_ticker),
+            ("GET", "/api/v1/tickers", self.handle_tickers),
+            ("GET", "/api/v1/depth", self.handle_depth),
+            ("GET", "/api/v1/klines", self.handle_klines),
+            ("GET", "/api/v1/trades", self.handle_trades),
+        ]
+        private = [
+            ("POST", "/api/v1/order", "orderExecute", self.handle_execute),
+            ("GET", "/api/v1/order", "orderQuery", self.handle_get_order),
+            ("DELETE", "/api/v1/order", "orderCancel", self.handle_cancel),
+            ("POST", "/api/v1/orders", "orderExecute", self.handle_execute_batch),
+            ("GET", "/api/v1/orders", "orderQueryAll", self.handle_open_orders),
+            ("DELETE", "/api/v1/orders", "orderCancelAll", self.handle_cancel_all),
+            ("GET", "/api/v1/capital", "balanceQuery", self.handle_capital),
+            ("GET", "/api/v1/balance", "balanceQuery", self.handle_capital),
+            ("GET", "/wapi/v1/history/fills", "fillHistoryQueryAll", self.handle_fills),
+            ("GET", "/api/v1/history/fills", "fillHistoryQueryAll", self.handle_fills),
+            ("GET", "/wapi/v1/history/orders", "orderHistoryQueryAll", self.handle_order_history),
+            ("GET", "/api/v1/orders/history", "orderHistoryQueryAll", self.handle_order_history),
+            ("GET", "/api/v1/order/history", "orderHistoryQuery", self.handle_order_history),
+            ("GET", "/wapi/v1/capital/deposit/address", "depositAddressQuery", self.handle_deposit_address),
+        ]
+        for method, path, handler in public:
+            app.router.add_route(method, path, handler)
+        for method, path, instruction, handler in private:
+            app.router.add_route(method, path, self._private(instruction, handler))
+        app.router.add_get("/", self.handle_ws)
+        app.router.add_get("/ws", self.handle_ws)
+        return app
+
+    @web.middleware
+    async def _fault_middleware(self, request: web.Request, handler):
+        if not request.path.startswith(("/api/", "/wapi/")):
+            return await handler(request)
+        self.request_count += 1
+        delay = self.faults.latency_for(request.path)
+        if delay:
+            await asyncio.sleep(delay)
+
+        roll = random.random()
+        if roll < self.faults.timeout_rate:
+            await asyncio.sleep(self.faults.timeout_seconds)
+            return web.json_response({"code": "TIMEOUT", "message": "Injected timeout"}, status=504)
+        roll -= self.faults.timeout_rate
+        if roll < self.faults.error_rate:
+            return web.json_response({"code": "SERVICE_UNAVAILABLE", "message": "Injected fault"}, status=503)
+        roll -= self.faults.error_rate
+        if roll < self.faults.rate_limit_rate:
+            return web.json_response({"code": "TOO_MANY_REQUESTS", "message": "Injected rate limit"}, status=429)
+        return await handler(request)
+
+    @web.middleware
+    async def _error_middleware(self, request: web.Request, handler):
+        try:
+            return await handler(request)
+        except ExchangeError as e:
+            return web.json_response(e.to_dict(), status=e.status)
+        except web.HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"處理 {request.method} {request.path} 異常: {e}")
+            return web.json_response({"code": "INTERNAL_ERROR", "message": str(e)}, status=500)
+
+    def _now_ms(self) -> int:
+        return int(time.time() * 1000 + self.faults.clock_skew_ms)
+
+    # ------------------------------------------------------------------ 簽名驗證
+
+    def _verify(self, api_key: str, signature: str, message: str) -> bool:
+        try:
+            verify_key = nacl.signing.VerifyKey(base64.b64decode(api_key))
+            verify_key.verify(message.encode("ascii"), base64.b64decode(signature))
+            return True
+        except (nacl.exceptions.BadSignatureError, ValueError, TypeError):
+            return False
+
+    def _check_window(self, timestamp: str, window: str):
+        try:
+            timestamp, window = int(timestamp), int(window or 5000)
+        except (TypeError, ValueError):
+            raise ExchangeError("INVALID_CLIENT_REQUEST", "Invalid timestamp or window")
+        now = self._now_ms()
+        if timestamp + window < now:
+            raise ExchangeError("INVALID_CLIENT_REQUEST", "Request has expired")
+        if timestamp > now + window:
+            raise ExchangeError("INVALID_CLIENT_REQUEST", "Request timestamp is in the future")
+
+    def _private(self, instruction: str, handler):
+        async def wrapped(request: web.Request):
+            api_key = request.headers.get("X-API-KEY")
+            if not api_key:
+                raise ExchangeError("UNAUTHORIZED", "Missing X-API-KEY", status=401)
+
+            body = None
+            if request.can_read_body:
+                try:
+                    body = await request.json()
+                except (json.JSONDecodeError, ValueError):
+                    raise ExchangeError("INVALID_CLIENT_REQUEST", "Invalid JSON body")
+
+            if isinstance(body, list):
+                params_list = body
+            else:
+                params = dict(request.query)
+                if isinstance(body, dict):
+                    params.update(body)
+                params_list = [params]
+
+            if self.verify_signatures:
+                timestamp = request.headers.get("X-TIMESTAMP")
+                window = request.headers.get("X-WINDOW", "5000")
+                self._check_window(timestamp, window)
+                parts = []
+                for params in params_list:
+                    canonical = _canonical(params)
+                    parts.append(f"instruction={instruction}&{canonical}" if canonical else f"instruction={instruction}")
+                message = "&".join(parts) + f"&timestamp={timestamp}&window={window}"
+                if not self._verify(api_key, request.headers.get("X-SIGNATURE", ""), message):
+                    raise ExchangeError("UNAUTHORIZED", "Invalid signature", status=401)
+
+            return await handler(request, api_key, params_list)
+        return wrapped
+
+    # ------------------------------------------------------------------ 公共接口
+
+    async def handle_time(self, request):
+        return web.json_response(self._now_ms())
+
+    async def handle_markets(self, request):
+        return web.json_response([self.engine.market_info(symbol) for symbol in self.engine.markets])
+
+    async def handle_market(self, request):
+        symbol = request.query.get("symbol", "")
+        if symbol not in self.engine.markets:
+            raise ExchangeError("INVALID_MARKET", f"Market not found: {symbol}", status=404)
+        return web.json_response(self.engine.market_info(symbol))
+
+    async def handle_ticker(self, request):
+        return web.json_response(self.engine.ticker(request.query.get("symbol", "")))
+
+    async def handle_tickers(self, request):
+        return web.json_response([self.engine.ticker(symbol) for symbol in self.engine.markets])
+
+    async def handle_depth(self, request):
+        limit = request.query.get("limit")
+        return web.json_response(self.engine.depth(request.query.get("symbol", ""), int(limit) if limit else None))
+
+    async def handle_klines(self, request):
+        interval = request.query.get("interval", "1h")
+        seconds = KLINE_INTERVALS.get(interval)
+        if seconds is None:
+            raise ExchangeError("INVALID_CLIENT_REQUEST", f"Invalid interval: {interval}")
+        start = request.query.get("startTime")
+        if start is None:
+            raise ExchangeError("INVALID_CLIENT_REQUEST", "startTime is required")
+        end = request.query.get("endTime")
+        return web.json_response(self.engine.klines(
+            request.query.get("symbol", ""), seconds, int(start), int(end) if end else None
+        ))
+
+    async def handle_trades(self, request):
+        symbol = request.query.get("symbol", "")
+        self.engine.depth(symbol, 1)
+        limit = int(request.query.get("limit", 100))
+        trades = list(self.engine.trades[symbol])[-limit:]
+        return web.json_response([
+            {"price": str(price), "quantity": str(qty), "timestamp": ts} for ts, price, qty in trades
+        ])
+
+    # ------------------------------------------------------------------ 私有接口
+
+    async def handle_execute(self, request, api_key, params_list):
+        return web.json_response(self.engine.place_order(api_key, params_list[0]))
+
+    async def handle_execute_batch(self, request, api_key, params_list):
+        results = []
+        for params in params_list:
+            try:
+                results.append(self.engine.place_order(api_key, params))
+            except ExchangeError as e:
+                results.append(e.to_dict())
+        return web.json_response(results)
+
+    async def handle_get_order(self, request, api_key, params_list):
+        params = params_list[0]
+        order = self.engine.get_order(api_key, params.get("symbol", ""), params.get("orderId"), params.get("clientId"))
+        if order is None:
+            raise ExchangeError("RESOURCE_NOT_FOUND", "Order not found", status=404)
+        return web.json_response(order)
+
+    async def handle_cancel(self, request, api_key, params_list):
+        params = params_list[0]
+        return web.json_response(self.engine.cancel_order(
+            api_key, params.get("symbol", ""), params.get("orderId"), params.get("clientId")
+        ))
+
+    async def handle_open_orders(self, request, api_key, params_list):
+        return web.json_response(self.engine.open_orders(api_key, params_list[0].get("symbol")))
+
+    async def handle_cancel_all(self, request, api_key, params_list):
+        return web.json_response(self.engine.cancel_all(api_key, params_list[0].get("symbol", "")))
+
+    async def handle_capital(self, request, api_key, params_list):
+        return web.json_response(self.engine.account(api_key).capital())
+
+    async def handle_fills(self, request, api_key, params_list):
+        params = params_list[0]
+        return web.json_response(self.engine.fills(
+            api_key,
+            symbol=params.get("symbol"),
+            order_id=params.get("orderId"),
+            limit=int(params.get("limit", 100)),
+            offset=int(params.get("offset", 0)),
+            from_ms=int(params["from"]) if params.get("from") else None,
+            to_ms=int(params["to"]) if params.get("to") else None,
+        ))
+
+    async def handle_order_history(self, request, api_key, params_list):
+        params = params_list[0]
+        history = self.engine.order_history(
+            api_key, params.get("symbol"), limit=int(params.get("limit", 100)), offset=int(params.get("offset", 0))
+        )
+        if params.get("orderId"):
+            history = [o for o in history if o["id"] == str(params["orderId"])]
+        return web.json_response(history)
+
+    async def handle_deposit_address(self, request, api_key, params_list):
+        blockchain = params_list[0].get("blockchain", "Solana")
+        return web.json_response({"address": f"mock-{blockchain.lower()}-{api_key[:8]}"})
+
+    # ------------------------------------------------------------------ WebSocket
+
+    async def handle_ws(self, request: web.Request):
+        # 自行回應 ping，靜默故障時可以停止回應
+        ws = web.WebSocketResponse(heartbeat=30, autoping=False)
+        await ws.prepare(request)
+        conn = _WsConnection(ws, self.faults.ws_latency_ms / 1000.0)
+        conn.sender = asyncio.get_running_loop().create_task(conn.run_sender())
+        self.connections.append(conn)
+        try:
+            async for msg in ws:
+                if msg.type == WSMsgType.PING:
+                    if not conn.stalled:
+                        await ws.pong(msg.data)
+                    continue
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                try:
+                    self._handle_ws_message(conn, json.loads(msg.data))
+                except (ExchangeError, ValueError, KeyError) as e:
+                    conn.queue.put_nowait(json.dumps({"error": {"code": 400, "message": str(e)}}))
+        finally:
+            conn.sender.cancel()
+            if conn in self.connections:
+                self.connections.remove(conn)
+        return ws
+
+    def _handle_ws_message(self, conn: _WsConnection, message: Dict):
+        method = message.get("method")
+        streams = message.get("params") or []
+        if method == "SUBSCRIBE":
+            private = [s for s in streams if s.startswith("account.")]
+            if private:
+                signature = message.get("signature") or []
+                if len(signature) != 4:
+                    raise ExchangeError("UNAUTHORIZED", "Private streams require a signature")
+                api_key, sig, timestamp, window = signature
+                if self.verify_signatures:
+                    self._check_window(timestamp, window)
+                    if not self._verify(api_key, sig, f"instruction=subscribe&timestamp={timestamp}&window={window}"):
+                        raise ExchangeError("UNAUTHORIZED", "Invalid signature")
+                conn.account = api_key
+            conn.streams.update(streams)
+        elif method == "UNSUBSCRIBE":
+            conn.streams.difference_update(streams)
+
+    def _on_engine_event(self, event: str, key: str, data: Dict):
+        if not self.connections:
+            return
+        if event == "orderUpdate":
+            symbol = data.get("s")
+            targets = [
+                (conn, stream) for conn in self.connections if conn.account == key
+                for stream in (f"account.orderUpdate.{symbol}", "account.orderUpdate") if stream in conn.streams
+            ]
+        else:
+            stream = f"{event}.{key}"
+            targets = [(conn, stream) for conn in self.connections if stream in conn.streams]
+        for conn, stream in targets:
+            conn.queue.put_nowait(json.dumps({"stream": stream, "data": data}))
+
+    async def _ws_fault_loop(self):
+        """按 ws_drop_rate 隨機斷開連接、按 ws_stall_rate 隨機讓連接靜默，模擬網絡抖動和半開連接"""
+        while True:
+            await asyncio.sleep(1)
+            if not self.faults.ws_drop_rate and not self.faults.ws_stall_rate:
+                continue
+            for conn in list(self.connections):
+                if self.faults.ws_drop_rate and random.random() < self.faults.ws_drop_rate:
+                    logger.info("注入故障: 斷開 WebSocket 連接")
+                    await conn.ws.close()
+                elif self.faults.ws_stall_rate and not conn.stalled and random.random() < self.faults.ws_stall_rate:
+                    logger.info("注入故障: WebSocket 連接靜默")
+                    conn.stalled = True
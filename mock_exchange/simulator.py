@@ -0,0 +1,116 @@
+"""
+模擬市場參與者：在參考價格附近持續掛單提供流動性，並隨機發出吃單
+"""
+import asyncio
+import random
+from decimal import Decimal, ROUND_DOWN
+from typing import Iterable, Optional
+
+from logger import setup_logger
+from mock_exchange.engine import ExchangeError, MatchingEngine
+
+logger = setup_logger("mock_exchange.simulator")
+
+HOUSE_ACCOUNT = "__house__"
+HOUSE_BALANCE = Decimal("1000000000000")
+
+
+class MarketSimulator:
+    """
+    做市與吃單模擬器
+
+    每個週期以幾何隨機遊走移動參考價格，撤掉上一輪的流動性後在參考價兩側重新掛出
+    levels 檔訂單；並以 taker_probability 的概率發出一筆小額市價單，使策略的掛單能夠成交。
+
+    Args:
+        engine: 撮合引擎
+        symbols: 模擬的交易對，默認全部
+        interval: 週期（秒）
+        levels: 每側掛單檔數
+        spread_bps: 最優檔相對參考價的距離（基點）
+        volatility_bps: 每週期價格波動的標準差（基點）
+        taker_probability: 每週期發出吃單的概率
+        seed: 隨機種子，便於重放同一場景
+    """
+
+    def __init__(self, engine: MatchingEngine, symbols: Optional[Iterable[str]] = None, interval: float = 0.5,
+                 levels: int = 5, spread_bps: float = 10, volatility_bps: float = 5,
+                 taker_probability: float = 0.3, seed: Optional[int] = None):
+        self.engine = engine
+        self.symbols = list(symbols or engine.markets)
+        self.interval = interval
+        self.levels = levels
+        self.spread_bps = spread_bps
+        self.volatility_bps = volatility_bps
+        self.taker_probability = taker_probability
+        self.random = random.Random(seed)
+        self.reference = {symbol: engine.last_price[symbol] for symbol in self.symbols}
+        self._task: Optional[asyncio.Task] = None
+
+        house = engine.account(HOUSE_ACCOUNT)
+        for cfg in engine.markets.values():
+            house.available[cfg["base"]] = HOUSE_BALANCE
+            house.available[cfg["quote"]] = HOUSE_BALANCE
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            for symbol in self.symbols:
+                try:
+                    self.step(symbol)
+                except Exception as e:
+                    logger.error(f"模擬 {symbol} 行情異常: {e}")
+            await asyncio.sleep(self.interval)
+
+    def _round(self, value: Decimal, unit: Decimal) -> Decimal:
+        return (value / unit).quantize(Decimal("1"), rounding=ROUND_DOWN) * unit
+
+    def step(self, symbol: str):
+        """推進一個週期"""
+        cfg = self.engine.markets[symbol]
+        tick, step = cfg["tick"], cfg["step"]
+
+        shock = Decimal(str(self.random.gauss(0, self.volatility_bps / 10000)))
+        reference = self.reference[symbol] * (1 + shock)
+        self.reference[symbol] = max(reference, tick)
+
+        self.engine.cancel_all(HOUSE_ACCOUNT, symbol)
+        half_spread = self.reference[symbol] * Decimal(str(self.spread_bps / 10000))
+        base_size = max(cfg["min"] * 10, self._round(Decimal("1000") / self.reference[symbol], step))
+
+        for i in range(self.levels):
+            offset = half_spread + tick * i * 2
+            size = self._round(base_size * Decimal(str(self.random.uniform(0.5, 2.0))), step) or cfg["min"]
+            for side, price in (("Bid", self.reference[symbol] - offset), ("Ask", self.reference[symbol] + offset)):
+                price = self._round(price, tick)
+                if price <= 0:
+                    continue
+                try:
+                    self.engine.place_order(HOUSE_ACCOUNT, {
+                        "symbol": symbol, "side": side, "orderType": "Limit",
+                        "price": str(price), "quantity": str(size), "timeInForce": "GTC"
+                    })
+                except ExchangeError as e:
+                    logger.debug(f"模擬掛單被拒絕: {e.message}")
+
+        if self.random.random() < self.taker_probability:
+            side = self.random.choice(("Bid", "Ask"))
+            size = self._round(base_size * Decimal(str(self.random.uniform(0.1, 1.0))), step) or cfg["min"]
+            try:
+                self.engine.place_order(HOUSE_ACCOUNT, {
+                    "symbol": symbol, "side": side, "orderType": "Market", "quantity": str(size)
+                })
+            except ExchangeError as e:
+                logger.debug(f"模擬吃單被拒絕: {e.message}")
@@ -0,0 +1,9 @@
+# models/__init__.py
+"""
+Models 模塊，定義訂單、成交、行情等緊湊的數據記錄類型，在數據進入系統時一次性解析
+"""
+from models.fields import parse_timestamp_ms
+from models.market import BookTicker, DepthDelta, Kline, MarketSnapshot
+from models.trading import Fill, Order
+
+__all__ = ["Order", "Fill", "BookTicker", "DepthDelta", "Kline", "MarketSnapshot", "parse_timestamp_ms"]
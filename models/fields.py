@@ -0,0 +1,36 @@
+"""
+字段解析輔助函數：把交易所返回的字符串數值和時間統一轉換為 float / int / 毫秒時間戳
+"""
+from datetime import datetime, timezone
+from typing import Optional
+
+
+def to_float(value, default: float = 0.0) -> float:
+    """轉換為浮點數，空值返回 default"""
+    if value is None or value == "":
+        return default
+    return float(value)
+
+
+def to_optional_float(value) -> Optional[float]:
+    """轉換為浮點數，空值返回 None（例如市價單沒有價格）"""
+    if value is None or value == "":
+        return None
+    return float(value)
+
+
+def parse_timestamp_ms(value) -> Optional[int]:
+    """把交易所返回的時間（毫秒/微秒整數或 ISO 字符串，UTC）轉換為毫秒時間戳"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (int, float)) or str(value).isdigit():
+        value = int(value)
+        # 微秒時間戳（WebSocket 事件時間）
+        return value // 1000 if value > 10 ** 14 else value
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp() * 1000)
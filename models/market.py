@@ -0,0 +1,182 @@
+"""
+行情記錄：最優報價、深度增量、K線和行情快照
+"""
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+
+from models.fields import parse_timestamp_ms, to_float, to_optional_float
+
+Level = Tuple[float, float]
+
+
+def _levels(raw: Optional[Sequence]) -> List[Level]:
+    """把 [["價格", "數量"], ...] 轉換為 [(價格, 數量), ...]"""
+    if not raw:
+        return []
+    return [(float(price), float(quantity)) for price, quantity in raw]
+
+
+class BookTicker:
+    """最優買賣報價（bookTicker 數據流）"""
+
+    __slots__ = ("symbol", "bid_price", "bid_quantity", "ask_price", "ask_quantity", "update_id", "timestamp")
+
+    def __init__(self, symbol: str, bid_price: Optional[float], bid_quantity: float,
+                 ask_price: Optional[float], ask_quantity: float,
+                 update_id: Optional[int] = None, timestamp: Optional[int] = None):
+        self.symbol = symbol
+        self.bid_price = bid_price
+        self.bid_quantity = bid_quantity
+        self.ask_price = ask_price
+        self.ask_quantity = ask_quantity
+        self.update_id = update_id
+        self.timestamp = timestamp
+
+    @classmethod
+    def from_ws(cls, data: Dict) -> "BookTicker":
+        update_id = data.get("u")
+        return cls(
+            symbol=data.get("s", ""),
+            bid_price=to_optional_float(data.get("b")),
+            bid_quantity=to_float(data.get("B")),
+            ask_price=to_optional_float(data.get("a")),
+            ask_quantity=to_float(data.get("A")),
+            update_id=None if update_id is None else int(update_id),
+            timestamp=parse_timestamp_ms(data.get("E")),
+        )
+
+    @property
+    def mid(self) -> Optional[float]:
+        if self.bid_price is None or self.ask_price is None:
+            return None
+        return (self.bid_price + self.ask_price) / 2
+
+    @property
+    def spread(self) -> Optional[float]:
+        if self.bid_price is None or self.ask_price is None:
+            return None
+        return self.ask_price - self.bid_price
+
+    def __repr__(self):
+        return f"BookTicker({self.symbol} {self.bid_price}/{self.ask_price})"
+
+
+class DepthDelta:
+    """
+    深度增量（depth 數據流）
+
+    first_update_id / last_update_id 對應事件的 U / u，用於檢查增量是否連續；
+    數量為 0 的檔位表示刪除。
+    """
+
+    __slots__ = ("symbol", "first_update_id", "last_update_id", "bids", "asks", "timestamp")
+
+    def __init__(self, symbol: str, first_update_id: int, last_update_id: int,
+                 bids: List[Level], asks: List[Level], timestamp: Optional[int] = None):
+        self.symbol = symbol
+        self.first_update_id = first_update_id
+        self.last_update_id = last_update_id
+        self.bids = bids
+        self.asks = asks
+        self.timestamp = timestamp
+
+    @classmethod
+    def from_ws(cls, data: Dict) -> "DepthDelta":
+        last_update_id = int(data.get("u", 0))
+        return cls(
+            symbol=data.get("s", ""),
+            first_update_id=int(data.get("U", last_update_id)),
+            last_update_id=last_update_id,
+            bids=_levels(data.get("b")),
+            asks=_levels(data.get("a")),
+            timestamp=parse_timestamp_ms(data.get("E")),
+        )
+
+    def __repr__(self):
+        return f"DepthDelta({self.symbol} {self.first_update_id}-{self.last_update_id} b={len(self.bids)} a={len(self.asks)})"
+
+
+class Kline:
+    """K線，start 為開盤時間（毫秒）"""
+
+    __slots__ = ("start", "open", "high", "low", "close", "volume", "quote_volume", "trades", "closed")
+
+    def __init__(self, start: int, open: float, high: float, low: float, close: float,
+                 volume: float = 0.0, quote_volume: float = 0.0, trades: int = 0, closed: bool = True):
+        self.start = start
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+        self.quote_volume = quote_volume
+        self.trades = trades
+        self.closed = closed
+
+    @classmethod
+    def from_rest(cls, data: Union[Dict, Sequence]) -> "Kline":
+        """從 REST K線構造，兼容對象格式和 [開盤時間, 開, 高, 低, 收, 量] 數組格式"""
+        if isinstance(data, dict):
+            return cls(
+                start=parse_timestamp_ms(data.get("start")) or 0,
+                open=to_float(data.get("open")),
+                high=to_float(data.get("high")),
+                low=to_float(data.get("low")),
+                close=to_float(data.get("close")),
+                volume=to_float(data.get("volume")),
+                quote_volume=to_float(data.get("quoteVolume")),
+                trades=int(data.get("trades") or 0),
+            )
+        return cls(
+            start=parse_timestamp_ms(data[0]) or 0,
+            open=float(data[1]),
+            high=float(data[2]),
+            low=float(data[3]),
+            close=float(data[4]),
+            volume=float(data[5]) if len(data) > 5 else 0.0,
+        )
+
+    @classmethod
+    def from_ws(cls, data: Dict) -> "Kline":
+        """從 WebSocket kline 事件構造"""
+        return cls(
+            start=parse_timestamp_ms(data.get("t")) or 0,
+            open=to_float(data.get("o")),
+            high=to_float(data.get("h")),
+            low=to_float(data.get("l")),
+            close=to_float(data.get("c")),
+            volume=to_float(data.get("v")),
+            trades=int(data.get("n") or 0),
+            closed=bool(data.get("X", False)),
+        )
+
+    def __repr__(self):
+        return f"Kline({self.start} o={self.open} h={self.high} l={self.low} c={self.close})"
+
+
+class MarketSnapshot(NamedTuple):
+    """
+    某一時刻的行情快照（不可變）
+
+    由 WebSocket 客戶端在事件循環線程中於最優價、成交價或同步狀態變化時整體替換發布，
+    其他線程讀取引用即得到一份一致的數據，不需要加鎖。
+    """
+
+    symbol: str
+    bid_price: Optional[float] = None
+    ask_price: Optional[float] = None
+    last_price: Optional[float] = None      # 最近成交價（trade 數據流）
+    book_version: int = 0                   # 發布時本地訂單簿的更新ID，未同步時為 0
+    book_synced: bool = False
+    updated_at: float = 0.0                 # 本地發布時間 time.time()
+
+    @property
+    def mid(self) -> Optional[float]:
+        if self.bid_price is None or self.ask_price is None:
+            return None
+        return (self.bid_price + self.ask_price) / 2
+
+    @property
+    def spread(self) -> Optional[float]:
+        if self.bid_price is None or self.ask_price is None:
+            return None
+        return self.ask_price - self.bid_price
@@ -0,0 +1,188 @@
+"""
+訂單和成交記錄
+"""
+from typing import Dict, Optional
+
+from models.fields import parse_timestamp_ms, to_float, to_optional_float
+
+
+class Order:
+    """
+    訂單
+
+    由 REST 響應（from_rest）或 WebSocket 訂單更新事件（from_ws）構造，
+    數值字段在構造時一次性轉換為 float。
+    """
+
+    __slots__ = ("id", "client_id", "symbol", "side", "order_type", "price", "quantity",
+                 "executed_quantity", "executed_quote_quantity", "status", "time_in_force",
+                 "post_only", "created_at")
+
+    def __init__(self, id: str, symbol: str, side: str, order_type: str = "Limit",
+                 price: Optional[float] = None, quantity: float = 0.0, executed_quantity: float = 0.0,
+                 executed_quote_quantity: float = 0.0, status: str = "New", time_in_force: str = "GTC",
+                 post_only: bool = False, client_id: Optional[int] = None, created_at: Optional[int] = None):
+        self.id = id
+        self.client_id = client_id
+        self.symbol = symbol
+        self.side = side
+        self.order_type = order_type
+        self.price = price
+        self.quantity = quantity
+        self.executed_quantity = executed_quantity
+        self.executed_quote_quantity = executed_quote_quantity
+        self.status = status
+        self.time_in_force = time_in_force
+        self.post_only = post_only
+        self.created_at = created_at
+
+    @classmethod
+    def from_rest(cls, data: Dict) -> "Order":
+        """從 REST 訂單響應構造"""
+        return cls(
+            id=str(data.get("id", "")),
+            client_id=data.get("clientId"),
+            symbol=data.get("symbol", ""),
+            side=data.get("side", ""),
+            order_type=data.get("orderType", "Limit"),
+            price=to_optional_float(data.get("price")),
+            quantity=to_float(data.get("quantity")),
+            executed_quantity=to_float(data.get("executedQuantity")),
+            executed_quote_quantity=to_float(data.get("executedQuoteQuantity")),
+            status=data.get("status", "New"),
+            time_in_force=data.get("timeInForce", "GTC"),
+            post_only=bool(data.get("postOnly", False)),
+            created_at=parse_timestamp_ms(data.get("createdAt")),
+        )
+
+    @classmethod
+    def from_ws(cls, data: Dict) -> "Order":
+        """從 WebSocket 訂單更新事件（account.orderUpdate）構造"""
+        return cls(
+            id=str(data.get("i", "")),
+            client_id=data.get("c"),
+            symbol=data.get("s", ""),
+            side=data.get("S", ""),
+            order_type=data.get("o", "Limit").capitalize(),
+            price=to_optional_float(data.get("p")),
+            quantity=to_float(data.get("q")),
+            executed_quantity=to_float(data.get("z")),
+            executed_quote_quantity=to_float(data.get("Z")),
+            status=data.get("X", "New"),
+            time_in_force=data.get("f", "GTC"),
+            post_only=bool(data.get("P", False)),
+            created_at=parse_timestamp_ms(data.get("E")),
+        )
+
+    @property
+    def remaining(self) -> float:
+        return max(0.0, self.quantity - self.executed_quantity)
+
+    @property
+    def is_bid(self) -> bool:
+        return self.side == "Bid"
+
+    def to_dict(self) -> Dict:
+        """轉換回 REST 響應格式（用於日誌和舊接口）"""
+        return {
+            "id": self.id,
+            "clientId": self.client_id,
+            "symbol": self.symbol,
+            "side": self.side,
+            "orderType": self.order_type,
+            "price": None if self.price is None else str(self.price),
+            "quantity": str(self.quantity),
+            "executedQuantity": str(self.executed_quantity),
+            "executedQuoteQuantity": str(self.executed_quote_quantity),
+            "status": self.status,
+            "timeInForce": self.time_in_force,
+            "postOnly": self.post_only,
+            "createdAt": self.created_at,
+        }
+
+    def __repr__(self):
+        return f"Order({self.id} {self.side} {self.quantity}@{self.price} {self.status})"
+
+
+class Fill:
+    """
+    成交
+
+    由成交歷史（from_rest）或 WebSocket orderFill 事件（from_ws）構造，timestamp 為毫秒。
+    """
+
+    __slots__ = ("trade_id", "order_id", "client_id", "symbol", "side", "price", "quantity",
+                 "fee", "fee_asset", "maker", "timestamp")
+
+    def __init__(self, trade_id: Optional[str], order_id: str, symbol: str, side: str, price: float,
+                 quantity: float, fee: float = 0.0, fee_asset: str = "", maker: bool = False,
+                 timestamp: Optional[int] = None, client_id: Optional[int] = None):
+        self.trade_id = trade_id
+        self.order_id = order_id
+        self.client_id = client_id
+        self.symbol = symbol
+        self.side = side
+        self.price = price
+        self.quantity = quantity
+        self.fee = fee
+        self.fee_asset = fee_asset
+        self.maker = maker
+        self.timestamp = timestamp
+
+    @classmethod
+    def from_rest(cls, data: Dict, symbol: str = "") -> "Fill":
+        """從成交歷史記錄構造"""
+        trade_id = data.get("tradeId")
+        return cls(
+            trade_id=None if trade_id is None else str(trade_id),
+            order_id=str(data.get("orderId", "")),
+            client_id=data.get("clientId"),
+            symbol=data.get("symbol") or symbol,
+            side=data.get("side", ""),
+            price=to_float(data.get("price")),
+            quantity=to_float(data.get("quantity")),
+            fee=to_float(data.get("fee")),
+            fee_asset=data.get("feeSymbol", data.get("feeAsset", "")),
+            maker=bool(data.get("isMaker", data.get("maker", False))),
+            timestamp=parse_timestamp_ms(data.get("timestamp")),
+        )
+
+    @classmethod
+    def from_ws(cls, data: Dict) -> "Fill":
+        """從 WebSocket orderFill 事件構造"""
+        trade_id = data.get("t")
+        return cls(
+            trade_id=None if trade_id is None else str(trade_id),
+            order_id=str(data.get("i", "")),
+            client_id=data.get("c"),
+            symbol=data.get("s", ""),
+            side=data.get("S", ""),
+            price=to_float(data.get("L")),
+            quantity=to_float(data.get("l")),
+            fee=to_float(data.get("n")),
+            fee_asset=data.get("N", ""),
+            maker=bool(data.get("m", False)),
+            timestamp=parse_timestamp_ms(data.get("T", data.get("E"))),
+        )
+
+    @property
+    def notional(self) -> float:
+        return self.price * self.quantity
+
+    def to_dict(self) -> Dict:
+        return {
+            "trade_id": self.trade_id,
+            "order_id": self.order_id,
+            "client_id": self.client_id,
+            "symbol": self.symbol,
+            "side": self.side,
+            "price": self.price,
+            "quantity": self.quantity,
+            "fee": self.fee,
+            "fee_asset": self.fee_asset,
+            "maker": self.maker,
+            "timestamp": self.timestamp,
+        }
+
+    def __repr__(self):
+        return f"Fill({self.trade_id} {self.side} {self.quantity}@{self.price} maker={self.maker})"
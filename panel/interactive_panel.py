@@ -950,8 +950,9 @@ class InteractivePanel:
         # 顯示活躍買單
         self.add_log(f"活躍買單 ({len(self.market_maker.active_buy_orders)}):", "SYSTEM")
         for i, order in enumerate(self.market_maker.active_buy_orders[:5]):  # 只顯示前5個
-            price = float(order.get('price', 0))
-            quantity = float(order.get('quantity', 0))
+            # 活躍訂單是 models.trading.Order（__slots__），不是 dict
+            price = order.price or 0.0
+            quantity = order.quantity
             self.add_log(f"{i+1}. 買入 {quantity} @ {price}", "SYSTEM")
         
         if len(self.market_maker.active_buy_orders) > 5:
@@ -960,8 +961,8 @@ class InteractivePanel:
         # 顯示活躍賣單
         self.add_log(f"活躍賣單 ({len(self.market_maker.active_sell_orders)}):", "SYSTEM")
         for i, order in enumerate(self.market_maker.active_sell_orders[:5]):  # 只顯示前5個
-            price = float(order.get('price', 0))
-            quantity = float(order.get('quantity', 0))
+            price = order.price or 0.0
+            quantity = order.quantity
             self.add_log(f"{i+1}. 賣出 {quantity} @ {price}", "SYSTEM")
         
         if len(self.market_maker.active_sell_orders) > 5:
@@ -1048,7 +1049,7 @@ class InteractivePanel:
             # 檢查WebSocket連接
             if not hasattr(self.market_maker, 'ws') or not self.market_maker.ws:
                 self.add_log("診斷問題: WebSocket連接不可用", "ERROR")
-            elif not getattr(self.market_maker.ws, '_thread', None) or not self.market_maker.ws._thread.is_alive():
+            elif not getattr(self.market_maker.ws, 'thread', None) or not self.market_maker.ws.thread.is_alive():
                 self.add_log("診斷問題: WebSocket線程未運行", "ERROR")
             else:
                 self.add_log("WebSocket連接正常", "SYSTEM")
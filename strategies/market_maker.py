@@ -2,6 +2,7 @@
 做市策略模塊
 """
 import time
+import asyncio
 import threading
 from datetime import datetime, timedelta
 from typing import Dict, List, Tuple, Optional, Union, Any
@@ -9,15 +10,21 @@ from concurrent.futures import ThreadPoolExecutor
 
 from api.client import (
     get_balance, execute_order, get_open_orders, cancel_all_orders, 
-    cancel_order, get_market_limits, get_klines, get_ticker, get_order_book
+    cancel_order, get_market_limits, get_klines, get_ticker, get_order_book,
+    get_client, run_sync, DEFAULT_FACADE_TIMEOUT
 )
+from api.history import backfill_fills, BACKFILL_TIMEOUT
+from api.loop_thread import get_loop_thread
 from ws_client.client import BackpackWebSocket
 from database.db import Database
+from models import Fill
 from utils.helpers import round_to_precision, round_to_tick_size, calculate_volatility
 from logger import setup_logger
 
 logger = setup_logger("market_maker")
 
+FLOW_WINDOW = 60        # 報價時參考的成交流窗口（秒），須是 TradeFlow 配置的窗口之一
+
 class MarketMaker:
     def __init__(
         self, 
@@ -28,7 +35,8 @@ class MarketMaker:
         base_spread_percentage=0.2, 
         order_quantity=None, 
         max_orders=3, 
-        rebalance_threshold=15.0
+        rebalance_threshold=15.0,
+        flow_skew=0.0
     ):
         self.api_key = api_key
         self.secret_key = secret_key
@@ -37,6 +45,8 @@ class MarketMaker:
         self.order_quantity = order_quantity
         self.max_orders = max_orders
         self.rebalance_threshold = rebalance_threshold
+        # 成交流偏移係數：中間價向主動成交方向偏移 不平衡度 × flow_skew × 半價差，0 表示只記錄不偏移
+        self.flow_skew = flow_skew
         
         # 初始化數據庫
         self.db = db_instance if db_instance else Database()
@@ -71,7 +81,8 @@ class MarketMaker:
         self.total_fees = 0
         
         # 建立WebSocket連接
-        self.ws = BackpackWebSocket(api_key, secret_key, symbol, self.on_ws_message, auto_reconnect=True)
+        self.ws = BackpackWebSocket(api_key, secret_key, symbol, self.on_ws_message, auto_reconnect=True,
+                                    on_stale=self.on_ws_stale)
         self.ws.connect()
         
         # 跟蹤活躍訂單
@@ -95,6 +106,10 @@ class MarketMaker:
         # 執行緒池用於後台任務
         self.executor = ThreadPoolExecutor(max_workers=3)
         
+        # 共享異步客戶端，撤單、下單和查詢在後台事件循環上並發執行
+        self.client = get_client(api_key, secret_key)
+        self.loop_thread = get_loop_thread()
+        
         # 等待WebSocket連接建立並進行初始化訂閲
         self._initialize_websocket()
         
@@ -126,6 +141,7 @@ class MarketMaker:
             if orderbook_initialized:
                 depth_subscribed = self.ws.subscribe_depth()
                 ticker_subscribed = self.ws.subscribe_bookTicker()
+                self.ws.subscribe_trades()
                 
                 if depth_subscribed and ticker_subscribed:
                     logger.info("數據流訂閲成功!")
@@ -170,26 +186,7 @@ class MarketMaker:
             
             if trades_count > 0:
                 for side, quantity, price, maker, fee in trades:
-                    quantity = float(quantity)
-                    price = float(price)
-                    fee = float(fee)
-                    
-                    if side == 'Bid':  # 買入
-                        self.buy_trades.append((price, quantity))
-                        self.total_bought += quantity
-                        if maker:
-                            self.maker_buy_volume += quantity
-                        else:
-                            self.taker_buy_volume += quantity
-                    elif side == 'Ask':  # 賣出
-                        self.sell_trades.append((price, quantity))
-                        self.total_sold += quantity
-                        if maker:
-                            self.maker_sell_volume += quantity
-                        else:
-                            self.taker_sell_volume += quantity
-                    
-                    self.total_fees += fee
+                    self._record_loaded_trade(side, quantity, price, maker, fee)
                 
                 logger.info(f"已從數據庫載入 {trades_count} 條歷史成交記錄")
                 logger.info(f"總買入: {self.total_bought} {self.base_asset}, 總賣出: {self.total_sold} {self.base_asset}")
@@ -209,95 +206,73 @@ class MarketMaker:
             import traceback
             traceback.print_exc()
     
-    def _load_trades_from_api(self):
-        """從API加載歷史成交記錄"""
-        from api.client import get_fill_history
+    def _record_loaded_trade(self, side, quantity, price, maker, fee):
+        """把一條歷史成交累加到內存統計"""
+        quantity = float(quantity)
+        price = float(price)
+        fee = float(fee)
+        
+        if side == 'Bid':  # 買入
+            self.buy_trades.append((price, quantity))
+            self.total_bought += quantity
+            if maker:
+                self.maker_buy_volume += quantity
+            else:
+                self.taker_buy_volume += quantity
+        elif side == 'Ask':  # 賣出
+            self.sell_trades.append((price, quantity))
+            self.total_sold += quantity
+            if maker:
+                self.maker_sell_volume += quantity
+            else:
+                self.taker_sell_volume += quantity
         
-        fill_history = get_fill_history(self.api_key, self.secret_key, self.symbol, 100)
+        self.total_fees += fee
+    
+    def _load_trades_from_api(self):
+        """從API分頁回填歷史成交記錄，逐頁寫入數據庫並累加統計"""
+        def on_fill(fill):
+            self._record_loaded_trade(fill.side, fill.quantity, fill.price, fill.maker, fill.fee)
         
-        if isinstance(fill_history, dict) and "error" in fill_history:
-            logger.error(f"載入成交記錄失敗: {fill_history['error']}")
+        try:
+            loaded = run_sync(backfill_fills(self.client, self.db, self.symbol, on_fill=on_fill), BACKFILL_TIMEOUT)
+        except Exception as e:
+            logger.error(f"載入成交記錄失敗: {e}")
             return
-            
-        if not fill_history:
+        
+        if not loaded:
             logger.info("沒有找到歷史成交記錄")
             return
         
-        # 批量插入準備
-        for fill in fill_history:
-            price = float(fill.get('price', 0))
-            quantity = float(fill.get('quantity', 0))
-            side = fill.get('side')
-            maker = fill.get('maker', False)
-            fee = float(fill.get('fee', 0))
-            fee_asset = fill.get('feeAsset', '')
-            order_id = fill.get('orderId', '')
-            
-            # 準備訂單數據
-            order_data = {
-                'order_id': order_id,
-                'symbol': self.symbol,
-                'side': side,
-                'quantity': quantity,
-                'price': price,
-                'maker': maker,
-                'fee': fee,
-                'fee_asset': fee_asset,
-                'trade_type': 'manual'
-            }
-            
-            # 插入數據庫
-            self.db.insert_order(order_data)
-            
-            if side == 'Bid':  # 買入
-                self.buy_trades.append((price, quantity))
-                self.total_bought += quantity
-                if maker:
-                    self.maker_buy_volume += quantity
-                else:
-                    self.taker_buy_volume += quantity
-            elif side == 'Ask':  # 賣出
-                self.sell_trades.append((price, quantity))
-                self.total_sold += quantity
-                if maker:
-                    self.maker_sell_volume += quantity
-                else:
-                    self.taker_sell_volume += quantity
-            
-            self.total_fees += fee
+        logger.info(f"已從API載入並存儲 {loaded} 條歷史成交記錄")
         
-        if fill_history:
-            logger.info(f"已從API載入並存儲 {len(fill_history)} 條歷史成交記錄")
-            
-            # 更新總計
-            logger.info(f"總買入: {self.total_bought} {self.base_asset}, 總賣出: {self.total_sold} {self.base_asset}")
-            logger.info(f"Maker買入: {self.maker_buy_volume} {self.base_asset}, Maker賣出: {self.maker_sell_volume} {self.base_asset}")
-            logger.info(f"Taker買入: {self.taker_buy_volume} {self.base_asset}, Taker賣出: {self.taker_sell_volume} {self.base_asset}")
-            
-            # 計算精確利潤
-            self.total_profit = self._calculate_db_profit()
-            logger.info(f"計算得出已實現利潤: {self.total_profit:.8f} {self.quote_asset}")
-            logger.info(f"總手續費: {self.total_fees:.8f} {self.quote_asset}")
+        # 更新總計
+        logger.info(f"總買入: {self.total_bought} {self.base_asset}, 總賣出: {self.total_sold} {self.base_asset}")
+        logger.info(f"Maker買入: {self.maker_buy_volume} {self.base_asset}, Maker賣出: {self.maker_sell_volume} {self.base_asset}")
+        logger.info(f"Taker買入: {self.taker_buy_volume} {self.base_asset}, Taker賣出: {self.taker_sell_volume} {self.base_asset}")
+        
+        # 計算精確利潤
+        self.total_profit = self._calculate_db_profit()
+        logger.info(f"計算得出已實現利潤: {self.total_profit:.8f} {self.quote_asset}")
+        logger.info(f"總手續費: {self.total_fees:.8f} {self.quote_asset}")
     
     def check_ws_connection(self):
         """檢查並恢復WebSocket連接"""
         ws_connected = self.ws and self.ws.is_connected()
         
+        if not ws_connected and self.ws and getattr(self.ws, 'reconnecting', False):
+            # 連接自身的重連管理器正在重連並恢復訂閱，不重建連接
+            logger.info("WebSocket正在自動重連，等待恢復")
+            return False
+        
         if not ws_connected:
             logger.warning("WebSocket連接已斷開或不可用，嘗試重新連接...")
             
             # 嘗試關閉現有連接
             if self.ws:
                 try:
-                    if hasattr(self.ws, 'running') and self.ws.running:
-                        self.ws.running = False
-                    if hasattr(self.ws, 'ws') and self.ws.ws:
-                        try:
-                            self.ws.ws.close()
-                        except:
-                            pass
+                    # close() 在事件循環線程中關閉底層連接並停止自動重連，返回時已關閉
                     self.ws.close()
-                    time.sleep(0.5)
                 except Exception as e:
                     logger.error(f"關閉現有WebSocket時出錯: {e}")
             
@@ -309,7 +284,8 @@ class MarketMaker:
                     self.secret_key, 
                     self.symbol, 
                     self.on_ws_message, 
-                    auto_reconnect=True
+                    auto_reconnect=True,
+                    on_stale=self.on_ws_stale
                 )
                 self.ws.connect()
                 
@@ -327,6 +303,7 @@ class MarketMaker:
                     self.ws.initialize_orderbook()
                     self.ws.subscribe_depth()
                     self.ws.subscribe_bookTicker()
+                    self.ws.subscribe_trades()
                     self.subscribe_order_updates()
                 else:
                     logger.warning("WebSocket重新連接嘗試中，將在下次迭代再次檢查")
@@ -337,6 +314,15 @@ class MarketMaker:
         
         return self.ws and self.ws.is_connected()
     
+    def on_ws_stale(self, event):
+        """行情數據失效/恢復回調（投遞線程）：失效時立即撤銷掛單暫停報價，恢復後由下一次迭代重新報價"""
+        if event["stale"]:
+            logger.warning(f"行情數據失效（{event['reason']}），暫停報價並撤銷所有掛單")
+            # 只提交撤單；活躍訂單列表由策略線程在下一次 place_limit_orders 中清空
+            self.loop_thread.submit(self._cancel_existing_orders_async())
+        else:
+            logger.info(f"行情數據已恢復（{event['reason']}），下一次迭代恢復報價")
+    
     def on_ws_message(self, stream, data):
         """處理WebSocket消息回調"""
         if stream.startswith("account.orderUpdate."):
@@ -345,13 +331,13 @@ class MarketMaker:
             # 「訂單成交」事件
             if event_type == 'orderFill':
                 try:
-                    side = data.get('S')
-                    quantity = float(data.get('l', '0'))  # 此次成交數量
-                    price = float(data.get('L', '0'))     # 此次成交價格
-                    order_id = data.get('i')             # 訂單 ID
-                    maker = data.get('m', False)         # 是否是 Maker
-                    fee = float(data.get('n', '0'))      # 手續費
-                    fee_asset = data.get('N', '')        # 手續費資產
+                    fill = Fill.from_ws(data)
+                    side = fill.side
+                    quantity = fill.quantity             # 此次成交數量
+                    price = fill.price                   # 此次成交價格
+                    order_id = fill.order_id             # 訂單 ID
+                    maker = fill.maker                   # 是否是 Maker
+                    fee = fill.fee                       # 手續費
 
                     logger.info(f"訂單成交: ID={order_id}, 方向={side}, 數量={quantity}, 價格={price}, Maker={maker}, 手續費={fee:.8f}")
                     
@@ -366,23 +352,12 @@ class MarketMaker:
                     except Exception as db_err:
                         logger.error(f"檢查重平衡訂單時出錯: {db_err}")
                     
-                    # 準備訂單數據
-                    order_data = {
-                        'order_id': order_id,
-                        'symbol': self.symbol,
-                        'side': side,
-                        'quantity': quantity,
-                        'price': price,
-                        'maker': maker,
-                        'fee': fee,
-                        'fee_asset': fee_asset,
-                        'trade_type': trade_type
-                    }
+                    fill.symbol = self.symbol
                     
-                    # 安全地插入數據庫
+                    # 安全地插入數據庫（按成交 ID 與歷史回填去重）
                     def safe_insert_order():
                         try:
-                            self.db.insert_order(order_data)
+                            self.db.insert_fills([fill], trade_type)
                         except Exception as db_err:
                             logger.error(f"插入訂單數據時出錯: {db_err}")
                     
@@ -524,7 +499,10 @@ class MarketMaker:
             
             # 計算額外指標
             volatility = 0
-            if self.ws and hasattr(self.ws, 'historical_prices'):
+            if self.ws and hasattr(self.ws, 'price_history'):
+                # 增量維護的滑動窗口波動率，沿用 calculate_volatility 默認的日線口徑年化
+                volatility = self.ws.price_history.volatility(periods_per_year=252)
+            elif self.ws and hasattr(self.ws, 'historical_prices'):
                 volatility = calculate_volatility(self.ws.historical_prices)
             
             # 計算平均價差
@@ -697,6 +675,16 @@ class MarketMaker:
         
         return bid_price, ask_price
     
+    def get_trade_flow(self, window=FLOW_WINDOW):
+        """最近 window 秒的成交流統計（VWAP、主動買賣量、筆數），WebSocket 不可用時返回 None"""
+        if not self.ws or not hasattr(self.ws, 'get_trade_flow'):
+            return None
+        try:
+            return self.ws.get_trade_flow(window)
+        except Exception as e:
+            logger.error(f"獲取成交流統計出錯: {e}")
+            return None
+    
     def calculate_dynamic_spread(self):
         """計算動態價差基於市場情況"""
         base_spread = self.base_spread_percentage
@@ -707,9 +695,13 @@ class MarketMaker:
     def calculate_prices(self):
         """計算買賣訂單價格"""
         try:
+            flow = self.get_trade_flow()
             bid_price, ask_price = self.get_market_depth()
             if bid_price is None or ask_price is None:
                 current_price = self.get_current_price()
+                if current_price is None and flow is not None and flow.vwap is not None:
+                    logger.info(f"無盤口價格，使用最近 {flow.window} 秒成交 VWAP")
+                    current_price = flow.vwap
                 if current_price is None:
                     logger.error("無法獲取價格信息，無法設置訂單")
                     return None, None
@@ -719,6 +711,14 @@ class MarketMaker:
             
             logger.info(f"市場中間價: {mid_price}")
             
+            if flow is not None and flow.count:
+                logger.info(f"成交流({flow.window}秒): VWAP {flow.vwap:.6f}, {flow.count} 筆, "
+                            f"主動買 {flow.buy_volume:.4f} / 主動賣 {flow.sell_volume:.4f}, 不平衡度 {flow.imbalance:+.2f}")
+                if self.flow_skew:
+                    # 主動買入佔優時上移報價，減少被單邊吃掉的掛單
+                    mid_price += flow.imbalance * self.flow_skew * mid_price * self.base_spread_percentage / 200
+                    logger.info(f"按成交流偏移後的中間價: {mid_price}")
+            
             # 使用基礎價差
             spread_percentage = self.base_spread_percentage
             exact_spread = mid_price * (spread_percentage / 100)
@@ -935,18 +935,43 @@ class MarketMaker:
             return True
     
     def place_limit_orders(self):
-        """下限價單"""
+        """
+        下限價單
+        
+        撤單和餘額查詢提交到後台事件循環並發執行，當前線程同時計算報價；
+        提交新梯度時並行確認舊訂單已撤銷。
+        """
         self.check_ws_connection()
-        self.cancel_existing_orders()
+        if self.ws and self.ws.data_stale:
+            # 本地訂單簿和最優報價已停止更新，按舊價格報價容易被吃單
+            logger.warning(f"行情數據失效 {self.ws.stale_streams}，暫停報價")
+            self.cancel_existing_orders()
+            return
+        cancel_future = self.loop_thread.submit(self._cancel_existing_orders_async())
+        balance_future = None
+        if self.order_quantity is None:
+            balance_future = self.loop_thread.submit(self.client.get_balance())
         
         buy_prices, sell_prices = self.calculate_prices()
+        try:
+            cancelled_ids = cancel_future.result(DEFAULT_FACADE_TIMEOUT)
+        except Exception as e:
+            cancel_future.cancel()
+            # 舊訂單是否已撤銷未知，本輪不再下新單，避免重複掛單
+            logger.error(f"撤銷現有訂單失敗: {str(e) or type(e).__name__}，跳過本輪下單")
+            return
+        self.active_buy_orders = []
+        self.active_sell_orders = []
         if buy_prices is None or sell_prices is None:
             logger.error("無法計算訂單價格，跳過下單")
             return
         
         # 處理訂單數量
-        if self.order_quantity is None:
-            balances = get_balance(self.api_key, self.secret_key)
+        if balance_future is not None:
+            try:
+                balances = balance_future.result(DEFAULT_FACADE_TIMEOUT)
+            except Exception as e:
+                balances = {"error": str(e)}
             if isinstance(balances, dict) and "error" in balances:
                 logger.error(f"獲取餘額失敗: {balances['error']}")
                 return
@@ -976,186 +1001,181 @@ class MarketMaker:
             buy_quantity = max(self.min_order_size, round_to_precision(self.order_quantity, self.base_precision))
             sell_quantity = max(self.min_order_size, round_to_precision(self.order_quantity, self.base_precision))
         
-        # 下買單
-        buy_order_count = 0
-        for price in buy_prices:
+        # 構建整個買賣梯度，一次批量提交
+        ladder = []
+        for price in buy_prices[:self.max_orders]:
             # 根據市場情況動態調整訂單數量
             adjusted_quantity = self._adjust_quantity_by_market(buy_quantity, 'buy')
-            
-            order_details = {
-                "orderType": "Limit",
-                "price": str(price),
-                "quantity": str(adjusted_quantity),
-                "side": "Bid",
-                "symbol": self.symbol,
-                "timeInForce": "GTC",
-                "postOnly": True
-            }
-            
-            result = execute_order(self.api_key, self.secret_key, order_details)
-            
-            if isinstance(result, dict) and "error" in result:
-                logger.error(f"買單失敗: {result['error']}")
-                if "POST_ONLY_TAKER" in str(result['error']):
-                    logger.info("調整買單價格並重試...")
-                    adjusted_price = round_to_tick_size(price - self.tick_size, self.tick_size)
-                    order_details["price"] = str(adjusted_price)
-                    result = execute_order(self.api_key, self.secret_key, order_details)
-                    if isinstance(result, dict) and "error" in result:
-                        logger.error(f"調整後買單仍然失敗: {result['error']}")
-                    else:
-                        logger.info(f"買單成功: 價格 {adjusted_price}, 數量 {adjusted_quantity} (調整後)")
-                        self.active_buy_orders.append(result)
-                        self.orders_placed += 1
-                        buy_order_count += 1
-            else:
-                logger.info(f"買單成功: 價格 {price}, 數量 {adjusted_quantity}")
-                self.active_buy_orders.append(result)
-                self.orders_placed += 1
-                buy_order_count += 1
-                
-            # 限制訂單數量
-            if buy_order_count >= self.max_orders:
-                break
+            ladder.append(('Bid', price, adjusted_quantity))
+        for price in sell_prices[:self.max_orders]:
+            adjusted_quantity = self._adjust_quantity_by_market(sell_quantity, 'sell')
+            ladder.append(('Ask', price, adjusted_quantity))
+        
+        orders = [self._build_limit_order(side, price, quantity) for side, price, quantity in ladder]
+        try:
+            results = run_sync(self._submit_ladder(orders, cancelled_ids))
+        except Exception as e:
+            logger.error(f"批量下單失敗: {str(e)}")
+            results = [{"error": str(e)} for _ in orders]
         
-        # 下賣單
+        buy_order_count = 0
         sell_order_count = 0
-        for price in sell_prices:
-            # 根據市場情況動態調整訂單數量
-            adjusted_quantity = self._adjust_quantity_by_market(sell_quantity, 'sell')
-            
-            order_details = {
-                "orderType": "Limit",
-                "price": str(price),
-                "quantity": str(adjusted_quantity),
-                "side": "Ask",
-                "symbol": self.symbol,
-                "timeInForce": "GTC",
-                "postOnly": True
-            }
-            
-            result = execute_order(self.api_key, self.secret_key, order_details)
-            
+        retry_ladder = []
+        for (side, price, quantity), result in zip(ladder, results):
+            side_name = "買單" if side == 'Bid' else "賣單"
             if isinstance(result, dict) and "error" in result:
-                logger.error(f"賣單失敗: {result['error']}")
+                logger.error(f"{side_name}失敗: {result['error']}")
                 if "POST_ONLY_TAKER" in str(result['error']):
-                    logger.info("調整賣單價格並重試...")
-                    adjusted_price = round_to_tick_size(price + self.tick_size, self.tick_size)
-                    order_details["price"] = str(adjusted_price)
-                    result = execute_order(self.api_key, self.secret_key, order_details)
-                    if isinstance(result, dict) and "error" in result:
-                        logger.error(f"調整後賣單仍然失敗: {result['error']}")
-                    else:
-                        logger.info(f"賣單成功: 價格 {adjusted_price}, 數量 {adjusted_quantity} (調整後)")
-                        self.active_sell_orders.append(result)
-                        self.orders_placed += 1
-                        sell_order_count += 1
+                    # 買單下調一個tick，賣單上調一個tick後重試
+                    step = -self.tick_size if side == 'Bid' else self.tick_size
+                    adjusted_price = round_to_tick_size(price + step, self.tick_size)
+                    retry_ladder.append((side, adjusted_price, quantity))
+                continue
+            
+            logger.info(f"{side_name}成功: 價格 {price}, 數量 {quantity}")
+            if side == 'Bid':
+                self.active_buy_orders.append(result)
+                buy_order_count += 1
             else:
-                logger.info(f"賣單成功: 價格 {price}, 數量 {adjusted_quantity}")
                 self.active_sell_orders.append(result)
-                self.orders_placed += 1
                 sell_order_count += 1
+            self.orders_placed += 1
+        
+        # 因會立即成交而被拒絕的訂單，調整價格後再批量提交一次
+        if retry_ladder:
+            logger.info(f"調整 {len(retry_ladder)} 個訂單價格並重試...")
+            retry_orders = [self._build_limit_order(side, price, quantity) for side, price, quantity in retry_ladder]
+            try:
+                retry_results = run_sync(self.client.execute_orders(retry_orders, typed=True))
+            except Exception as e:
+                logger.error(f"重試下單失敗: {str(e)}")
+                retry_results = [{"error": str(e)} for _ in retry_orders]
+            for (side, price, quantity), result in zip(retry_ladder, retry_results):
+                side_name = "買單" if side == 'Bid' else "賣單"
+                if isinstance(result, dict) and "error" in result:
+                    logger.error(f"調整後{side_name}仍然失敗: {result['error']}")
+                    continue
                 
-            # 限制訂單數量
-            if sell_order_count >= self.max_orders:
-                break
+                logger.info(f"{side_name}成功: 價格 {price}, 數量 {quantity} (調整後)")
+                if side == 'Bid':
+                    self.active_buy_orders.append(result)
+                    buy_order_count += 1
+                else:
+                    self.active_sell_orders.append(result)
+                    sell_order_count += 1
+                self.orders_placed += 1
             
         logger.info(f"共下單: {buy_order_count} 個買單, {sell_order_count} 個賣單")
     
+    async def _submit_ladder(self, orders, cancelled_ids):
+        """提交整個梯度，同時確認上一輪的訂單已撤銷"""
+        results, _ = await asyncio.gather(
+            self.client.execute_orders(orders, typed=True),
+            self._verify_cancelled(cancelled_ids)
+        )
+        return results
+    
+    def _build_limit_order(self, side, price, quantity):
+        """構建postOnly限價單參數"""
+        return {
+            "orderType": "Limit",
+            "price": str(price),
+            "quantity": str(quantity),
+            "side": side,
+            "symbol": self.symbol,
+            "timeInForce": "GTC",
+            "postOnly": True
+        }
+    
     def _adjust_quantity_by_market(self, base_quantity, side):
         """根據市場情況動態調整訂單數量"""
         # 直接返回基本數量，不進行任何調整
         return max(self.min_order_size, round_to_precision(base_quantity, self.base_precision))
     
     def cancel_existing_orders(self):
-        """取消所有現有訂單"""
-        open_orders = get_open_orders(self.api_key, self.secret_key, self.symbol)
+        """取消所有現有訂單並確認撤銷結果"""
+        async def _cancel_and_verify():
+            cancelled_ids = await self._cancel_existing_orders_async()
+            await self._verify_cancelled(cancelled_ids)
+        
+        try:
+            run_sync(_cancel_and_verify())
+        except Exception as e:
+            logger.error(f"取消訂單過程中發生錯誤: {str(e)}")
+            return
+        self.active_buy_orders = []
+        self.active_sell_orders = []
+    
+    async def _cancel_existing_orders_async(self):
+        """
+        取消所有現有訂單
+        
+        在事件循環線程中執行，不修改 active_buy_orders / active_sell_orders
+        （策略線程同時在追加），由調用方所在的策略線程在撤銷完成後清空。
+        
+        Returns:
+            本次嘗試取消的訂單ID集合
+        """
+        open_orders = await self.client.get_open_orders(self.symbol, typed=True)
         
         if isinstance(open_orders, dict) and "error" in open_orders:
             logger.error(f"獲取訂單失敗: {open_orders['error']}")
-            return
+            return set()
         
         if not open_orders:
             logger.info("沒有需要取消的現有訂單")
-            self.active_buy_orders = []
-            self.active_sell_orders = []
-            return
+            return set()
         
         logger.info(f"正在取消 {len(open_orders)} 個現有訂單")
+        order_ids = [order.id for order in open_orders if order.id]
         
         try:
             # 嘗試批量取消
-            result = cancel_all_orders(self.api_key, self.secret_key, self.symbol)
+            result = await self.client.cancel_all_orders(self.symbol)
             
-            if isinstance(result, dict) and "error" in result:
-                logger.error(f"批量取消訂單失敗: {result['error']}")
+            if result is None or (isinstance(result, dict) and "error" in result):
+                logger.error(f"批量取消訂單失敗: {result.get('error') if isinstance(result, dict) else result}")
                 logger.info("嘗試逐個取消...")
                 
-                # 初始化線程池
-                with ThreadPoolExecutor(max_workers=5) as executor:
-                    cancel_futures = []
-                    
-                    # 提交取消訂單任務
-                    for order in open_orders:
-                        order_id = order.get('id')
-                        if not order_id:
-                            continue
-                        
-                        future = executor.submit(
-                            cancel_order, 
-                            self.api_key, 
-                            self.secret_key, 
-                            order_id, 
-                            self.symbol
-                        )
-                        cancel_futures.append((order_id, future))
-                    
-                    # 處理結果
-                    for order_id, future in cancel_futures:
-                        try:
-                            res = future.result()
-                            if isinstance(res, dict) and "error" in res:
-                                logger.error(f"取消訂單 {order_id} 失敗: {res['error']}")
-                            else:
-                                logger.info(f"取消訂單 {order_id} 成功")
-                                self.orders_cancelled += 1
-                        except Exception as e:
-                            logger.error(f"取消訂單 {order_id} 時出錯: {e}")
+                # 在同一事件循環上並發逐個取消
+                results = await self.client.cancel_orders(order_ids, self.symbol)
+                for order_id, res in zip(order_ids, results):
+                    if res is None or (isinstance(res, dict) and "error" in res):
+                        logger.error(f"取消訂單 {order_id} 失敗: {res.get('error') if isinstance(res, dict) else res}")
+                    else:
+                        logger.info(f"取消訂單 {order_id} 成功")
+                        self.orders_cancelled += 1
             else:
                 logger.info("批量取消訂單成功")
                 self.orders_cancelled += len(open_orders)
         except Exception as e:
             logger.error(f"取消訂單過程中發生錯誤: {str(e)}")
         
-        # 等待一下確保訂單已取消
-        time.sleep(1)
-        
-        # 檢查是否還有未取消的訂單
-        remaining_orders = get_open_orders(self.api_key, self.secret_key, self.symbol)
-        if remaining_orders and len(remaining_orders) > 0:
-            logger.warning(f"警告: 仍有 {len(remaining_orders)} 個未取消的訂單")
+        return set(order_ids)
+    
+    async def _verify_cancelled(self, order_ids):
+        """檢查已撤銷的訂單是否仍在未成交列表中（只看舊訂單，不受本輪新訂單影響）"""
+        if not order_ids:
+            return
+        remaining_orders = await self.client.get_open_orders(self.symbol, typed=True)
+        if not isinstance(remaining_orders, list):
+            return
+        still_open = [order for order in remaining_orders if order.id in order_ids]
+        if still_open:
+            logger.warning(f"警告: 仍有 {len(still_open)} 個未取消的訂單")
         else:
             logger.info("所有訂單已成功取消")
-        
-        # 重置活躍訂單列表
-        self.active_buy_orders = []
-        self.active_sell_orders = []
     
     def check_order_fills(self):
         """檢查訂單成交情況"""
-        open_orders = get_open_orders(self.api_key, self.secret_key, self.symbol)
+        open_orders = get_open_orders(self.api_key, self.secret_key, self.symbol, typed=True)
         
         if isinstance(open_orders, dict) and "error" in open_orders:
             logger.error(f"獲取訂單失敗: {open_orders['error']}")
             return
         
         # 獲取當前所有訂單ID
-        current_order_ids = set()
-        if open_orders:
-            for order in open_orders:
-                order_id = order.get('id')
-                if order_id:
-                    current_order_ids.add(order_id)
+        current_order_ids = {order.id for order in open_orders if order.id} if open_orders else set()
         
         # 記錄更新前的訂單數量
         prev_buy_orders = len(self.active_buy_orders)
@@ -1167,29 +1187,23 @@ class MarketMaker:
         
         if open_orders:
             for order in open_orders:
-                if order.get('side') == 'Bid':
+                if order.side == 'Bid':
                     active_buy_orders.append(order)
-                elif order.get('side') == 'Ask':
+                elif order.side == 'Ask':
                     active_sell_orders.append(order)
         
         # 檢查買單成交
         filled_buy_orders = []
         for order in self.active_buy_orders:
-            order_id = order.get('id')
-            if order_id and order_id not in current_order_ids:
-                price = float(order.get('price', 0))
-                quantity = float(order.get('quantity', 0))
-                logger.info(f"買單已成交: {price} x {quantity}")
+            if order.id and order.id not in current_order_ids:
+                logger.info(f"買單已成交: {order.price} x {order.quantity}")
                 filled_buy_orders.append(order)
         
         # 檢查賣單成交
         filled_sell_orders = []
         for order in self.active_sell_orders:
-            order_id = order.get('id')
-            if order_id and order_id not in current_order_ids:
-                price = float(order.get('price', 0))
-                quantity = float(order.get('quantity', 0))
-                logger.info(f"賣單已成交: {price} x {quantity}")
+            if order.id and order.id not in current_order_ids:
+                logger.info(f"賣單已成交: {order.price} x {order.quantity}")
                 filled_sell_orders.append(order)
         
         # 更新活躍訂單列表
@@ -1208,10 +1222,8 @@ class MarketMaker:
         avg_buy_price = 0
         total_buy_quantity = 0
         for order in self.active_buy_orders:
-            price = float(order.get('price', 0))
-            quantity = float(order.get('quantity', 0))
-            avg_buy_price += price * quantity
-            total_buy_quantity += quantity
+            avg_buy_price += (order.price or 0) * order.quantity
+            total_buy_quantity += order.quantity
         
         if total_buy_quantity > 0:
             avg_buy_price /= total_buy_quantity
@@ -1219,10 +1231,8 @@ class MarketMaker:
         avg_sell_price = 0
         total_sell_quantity = 0
         for order in self.active_sell_orders:
-            price = float(order.get('price', 0))
-            quantity = float(order.get('quantity', 0))
-            avg_sell_price += price * quantity
-            total_sell_quantity += quantity
+            avg_sell_price += (order.price or 0) * order.quantity
+            total_sell_quantity += order.quantity
         
         if total_sell_quantity > 0:
             avg_sell_price /= total_sell_quantity
@@ -1388,6 +1398,11 @@ class MarketMaker:
             logger.info("重新訂閲行情數據...")
             self.ws.subscribe_bookTicker()
         
+        # 檢查成交流訂閲
+        if "trade" not in self.ws.subscriptions:
+            logger.info("重新訂閲成交流...")
+            self.ws.subscribe_trades()
+        
         # 檢查私有訂單更新流
         if f"account.orderUpdate.{self.symbol}" not in self.ws.subscriptions:
             logger.info("重新訂閲私有訂單更新流...")
@@ -1426,6 +1441,8 @@ class MarketMaker:
                     self.ws.subscribe_depth()
                 if "bookTicker" not in self.ws.subscriptions:
                     self.ws.subscribe_bookTicker()
+                if "trade" not in self.ws.subscriptions:
+                    self.ws.subscribe_trades()
                 if f"account.orderUpdate.{self.symbol}" not in self.ws.subscriptions:
                     self.subscribe_order_updates()
             
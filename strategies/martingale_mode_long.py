@@ -19,6 +19,7 @@ from api.client import (
 )
 from ws_client.client import BackpackWebSocket
 from database.db import Database
+from models import Fill
 from utils.helpers import round_to_precision, round_to_tick_size, calculate_volatility
 from strategies.volatility import calculate_historical_volatility
 from logger import setup_logger
@@ -29,6 +30,8 @@ print(f"execute_order: {execute_order}, type: {type(execute_order)}, from: {insp
 
 logger = setup_logger("martingale_long")
 
+ENTRY_FLOW_WINDOW = 10      # offset/market 入場優先參考最近多少秒的成交 VWAP，須是 TradeFlow 配置的窗口之一
+
 
 
 class MartingaleLongTrader:
@@ -147,6 +150,7 @@ class MartingaleLongTrader:
         """等待WebSocket連接建立並進行初始化訂閲"""
         logger.info("WebSocket連接已建立，初始化行情和訂單更新...")
         self.ws.subscribe_bookTicker()
+        self.ws.subscribe_trades()
         success = self.ws.private_subscribe(f"account.orderUpdate.{self.symbol}")
         if not success:            
             logger.warning("訂閲訂單更新失敗，嘗試重試... (1/3)")
@@ -163,21 +167,19 @@ class MartingaleLongTrader:
         """檢查並恢復WebSocket連接"""
         ws_connected = self.ws and self.ws.is_connected()
         
+        if not ws_connected and self.ws and getattr(self.ws, 'reconnecting', False):
+            # 連接自身的重連管理器正在重連並恢復訂閱，不重建連接
+            logger.info("WebSocket正在自動重連，等待恢復")
+            return False
+        
         if not ws_connected:
             logger.warning("WebSocket連接已斷開或不可用，嘗試重新連接...")
             
             # 嘗試關閉現有連接
             if self.ws:
                 try:
-                    if hasattr(self.ws, 'running') and self.ws.running:
-                        self.ws.running = False
-                    if hasattr(self.ws, 'ws') and self.ws.ws:
-                        try:
-                            self.ws.ws.close()
-                        except:
-                            pass
+                    # close() 在事件循環線程中關閉底層連接並停止自動重連，返回時已關閉
                     self.ws.close()
-                    time.sleep(0.5)
                 except Exception as e:
                     logger.error(f"關閉現有WebSocket時出錯: {e}")
             
@@ -207,6 +209,7 @@ class MartingaleLongTrader:
                     
                     
                     self.ws.subscribe_bookTicker()
+                    self.ws.subscribe_trades()
                     self.subscribe_order_updates()
                 else:
                     logger.warning("WebSocket重新連接嘗試中，將在下次迭代再次檢查")
@@ -243,13 +246,14 @@ class MartingaleLongTrader:
             # 「訂單成交」事件
             if event_type == 'orderFill':
                 try:
-                    side = data.get('S')
-                    quantity = float(data.get('l', '0'))  # 此次成交數量
-                    price = float(data.get('L', '0'))     # 此次成交價格
-                    order_id = data.get('i')             # 訂單 ID
-                    maker = data.get('m', False)         # 是否是 Maker
-                    fee = float(data.get('n', '0'))      # 手續費
-                    fee_asset = data.get('N', '')        # 手續費資產
+                    fill = Fill.from_ws(data)
+                    side = fill.side
+                    quantity = fill.quantity             # 此次成交數量
+                    price = fill.price                   # 此次成交價格
+                    order_id = fill.order_id             # 訂單 ID
+                    maker = fill.maker                   # 是否是 Maker
+                    fee = fill.fee                       # 手續費
+                    fee_asset = fill.fee_asset           # 手續費資產
 
                     logger.info(f"訂單成交: ID={order_id}, 方向={side}, 數量={quantity}, 價格={price}, Maker={maker}, 手續費={fee:.8f}")
                     
@@ -455,6 +459,16 @@ class MartingaleLongTrader:
             return float(ticker['lastPrice'])
         return price
     
+    def get_trade_flow(self, window=ENTRY_FLOW_WINDOW):
+        """最近 window 秒的成交流統計（VWAP、主動買賣量、筆數），WebSocket 不可用時返回 None"""
+        if not self.ws or not hasattr(self.ws, 'get_trade_flow'):
+            return None
+        try:
+            return self.ws.get_trade_flow(window)
+        except Exception as e:
+            logger.error(f"獲取成交流統計出錯: {e}")
+            return None
+    
     def calculate_quantity(self, price, level=0):
         base_qty = self.total_capital / price
         multiplier = self.multiplier ** level
@@ -640,9 +654,10 @@ class MartingaleLongTrader:
     def on_order_update(self, data: dict):
         """處理WebSocket訂單更新"""
         if data.get('e') == 'orderFill':
-            order_id = data.get('i')
-            filled_qty = float(data.get('l', '0'))
-            price = float(data.get('L', '0'))
+            fill = Fill.from_ws(data)
+            order_id = fill.order_id
+            filled_qty = fill.quantity
+            price = fill.price
             
             # 更新持倉與均價
             self.total_bought += filled_qty
@@ -742,7 +757,7 @@ class MartingaleLongTrader:
 
     def cancel_existing_orders(self):
         """取消所有現有訂單"""
-        open_orders = get_open_orders(self.api_key, self.secret_key, self.symbol)
+        open_orders = get_open_orders(self.api_key, self.secret_key, self.symbol, typed=True)
         
         if isinstance(open_orders, dict) and "error" in open_orders:
             logger.error(f"獲取訂單失敗: {open_orders['error']}")
@@ -770,7 +785,7 @@ class MartingaleLongTrader:
                     
                     # 提交取消訂單任務
                     for order in open_orders:
-                        order_id = order_response.get("order_id")
+                        order_id = order.id
                         if not order_id:
                             continue
                         
@@ -816,7 +831,7 @@ class MartingaleLongTrader:
     
     def check_order_fills(self):
         """檢查訂單成交情況"""
-        open_orders = get_open_orders(self.api_key, self.secret_key, self.symbol)
+        open_orders = get_open_orders(self.api_key, self.secret_key, self.symbol, typed=True)
         
         if isinstance(open_orders, dict) and "error" in open_orders:
             logger.error(f"獲取訂單失敗: {open_orders['error']}")
@@ -826,9 +841,8 @@ class MartingaleLongTrader:
         current_order_ids = set()
         if open_orders:
             for order in open_orders:
-                order_id = order_response.get("order_id")
-                if order_id:
-                    current_order_ids.add(order_id)
+                if order.id:
+                    current_order_ids.add(order.id)
         
         # 記錄更新前的訂單數量
         prev_buy_orders = len(self.active_buy_orders)
@@ -840,28 +854,26 @@ class MartingaleLongTrader:
         
         if open_orders:
             for order in open_orders:
-                if order.get('side') == 'Bid':
+                if order.side == 'Bid':
                     active_buy_orders.append(order)
-                elif order.get('side') == 'Ask':
+                elif order.side == 'Ask':
                     active_sell_orders.append(order)
         
         # 檢查買單成交
         filled_buy_orders = []
         for order in self.active_buy_orders:
-            order_id = order_response.get("order_id")
-            if order_id and order_id not in current_order_ids:
-                price = float(order.get('price', 0))
-                quantity = float(order.get('quantity', 0))
+            if order.id and order.id not in current_order_ids:
+                price = order.price or 0.0
+                quantity = order.quantity
                 logger.info(f"買單已成交: {price} x {quantity}")
                 filled_buy_orders.append(order)
         
         # 檢查賣單成交
         filled_sell_orders = []
         for order in self.active_sell_orders:
-            order_id = order_response.get("order_id")
-            if order_id and order_id not in current_order_ids:
-                price = float(order.get('price', 0))
-                quantity = float(order.get('quantity', 0))
+            if order.id and order.id not in current_order_ids:
+                price = order.price or 0.0
+                quantity = order.quantity
                 logger.info(f"賣單已成交: {price} x {quantity}")
                 filled_sell_orders.append(order)
         
@@ -884,6 +896,11 @@ class MartingaleLongTrader:
             logger.info("重新訂閲行情數據...")
             self.ws.subscribe_bookTicker()
         
+        # 檢查成交流訂閲
+        if "trade" not in self.ws.subscriptions:
+            logger.info("重新訂閲成交流...")
+            self.ws.subscribe_trades()
+        
         # 檢查私有訂單更新流
         if f"account.orderUpdate.{self.symbol}" not in self.ws.subscriptions:
             logger.info("重新訂閲私有訂單更新流...")
@@ -915,13 +932,20 @@ class MartingaleLongTrader:
         # 初始化 entry_price
         try:
             if self.entry_type in ("offset", "market"):
-                ticker = get_ticker(self.symbol)  # 自動 fallback
-                if "lastPrice" in ticker:
-                    self.entry_price = float(ticker["lastPrice"])
-                elif "price" in ticker:
-                    self.entry_price = float(ticker["price"])
+                flow = self.get_trade_flow()
+                if flow is not None and flow.vwap is not None:
+                    # 最近成交的 VWAP 比單筆最新成交價更不易受單筆大單影響
+                    self.entry_price = flow.vwap
+                    logger.info(f"[{self.entry_type}] 使用最近 {flow.window} 秒 {flow.count} 筆成交的 VWAP 作為 entry_price = {self.entry_price}"
+                                f"（主動買 {flow.buy_volume:.4f} / 主動賣 {flow.sell_volume:.4f}）")
                 else:
-                    raise ValueError(f"ticker 資料中缺少價格欄位: {ticker}")
+                    ticker = get_ticker(self.symbol)  # 自動 fallback
+                    if "lastPrice" in ticker:
+                        self.entry_price = float(ticker["lastPrice"])
+                    elif "price" in ticker:
+                        self.entry_price = float(ticker["price"])
+                    else:
+                        raise ValueError(f"ticker 資料中缺少價格欄位: {ticker}")
             
             elif self.entry_type == "manual":
                 if self.entry_price is None:
@@ -953,6 +977,12 @@ class MartingaleLongTrader:
                 self.reconnect_ws()
                 self._ensure_data_streams()
 
+            # 行情數據失效時價格不可靠，暫停加碼和出場判斷
+            if self.ws and self.ws.data_stale:
+                logger.warning(f"行情數據失效 {self.ws.stale_streams}，跳過本次判斷")
+                await asyncio.sleep(interval_seconds)
+                continue
+
             # 取得當前市場價格
             price = self.get_current_price()
             logger.info(f"當前市場價格: {price}")
@@ -1,32 +1,23 @@
 # strategies/volatility.py
-import requests
-from utils.helpers import get_headers
+import numpy as np
+
+from api.kline_store import get_kline_store
 
 def calculate_historical_volatility(symbol, period=24):
     """
-    根據過去 24 小時的價格資料計算歷史波動率（標準差）
+    根據過去 period 根 1 小時K線的收盤價計算歷史波動率（標準差 / 均價）
+    
+    K線從本地K線存儲讀取，只補拉缺失的尾部。
     """
     try:
-        url = f"https://api.backpack.exchange/api/v1/klines?symbol={symbol}&interval=1h&limit={period}"
-        headers = {"Content-Type": "application/json"}
-        
-        response = requests.get(url, headers=headers)
-
-        if response.status_code != 200:
-            print(f"無法取得K線資料: {response.status_code}")
-            return 0.01  # fallback 波動率
-
-        klines = response.json()
-        closes = [float(kline[4]) for kline in klines]  # 收盤價在第5個欄位
+        closes = np.asarray(get_kline_store().load(symbol, "1h", bars=period).close, dtype=float)
 
         if len(closes) < 2:
-            return 0.01
+            return 0.01  # fallback 波動率
 
-        avg_price = sum(closes) / len(closes)
-        squared_diffs = [(p - avg_price) ** 2 for p in closes]
-        variance = sum(squared_diffs) / (len(closes) - 1)
-        volatility = variance ** 0.5
-        return round(volatility / avg_price, 4)
+        avg_price = closes.mean()
+        volatility = closes.std(ddof=1)
+        return round(float(volatility / avg_price), 4)
 
     except Exception as e:
         print(f"計算波動率錯誤: {e}")
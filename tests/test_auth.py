@@ -0,0 +1,44 @@
+"""
+簽名器回歸測試
+"""
+import base64
+
+import nacl.signing
+
+from api.auth import RequestSigner
+
+
+def _verify(secret_key, message, signature):
+    verify_key = nacl.signing.SigningKey(base64.b64decode(secret_key)).verify_key
+    verify_key.verify(message.encode("ascii"), base64.b64decode(signature))
+
+
+def test_equal_values_of_different_types_do_not_share_cached_prefix():
+    secret_key = base64.b64encode(nacl.signing.SigningKey.generate().encode()).decode()
+    signer = RequestSigner(secret_key)
+
+    for quantity, text in ((1.0, "1.0"), (1, "1"), (True, "true")):
+        params = {"symbol": "SOL_USDC", "quantity": quantity}
+        assert signer.canonical_params(params) == f"quantity={text}&symbol=SOL_USDC"
+        signed = signer.sign("orderExecute", params, timestamp=1700000000000, window=5000)
+        _verify(secret_key,
+                f"instruction=orderExecute&quantity={text}&symbol=SOL_USDC&timestamp=1700000000000&window=5000",
+                signed["signature"])
+
+
+def test_orders_with_client_id_bypass_prefix_cache():
+    secret_key = base64.b64encode(nacl.signing.SigningKey.generate().encode()).decode()
+    signer = RequestSigner(secret_key)
+
+    for client_id in range(3):
+        params = {"symbol": "SOL_USDC", "side": "Bid", "quantity": "1", "clientId": client_id}
+        signed = signer.sign("orderExecute", params, timestamp=1700000000000, window=5000)
+        _verify(secret_key,
+                f"instruction=orderExecute&clientId={client_id}&quantity=1&side=Bid&symbol=SOL_USDC"
+                f"&timestamp=1700000000000&window=5000",
+                signed["signature"])
+    assert not signer._param_cache
+
+    signer.sign("balanceQuery", None, timestamp=1700000000000, window=5000)
+    signer.sign("orderQueryAll", {"symbol": "SOL_USDC"}, timestamp=1700000000000, window=5000)
+    assert len(signer._param_cache) == 2
@@ -0,0 +1,98 @@
+"""
+投遞隊列策略測試：合併、保留和丟棄
+"""
+import threading
+
+from ws_client.delivery import DeliveryQueue
+
+TIMEOUT = 5
+
+
+class _BlockingConsumer:
+    """第一條消息阻塞投遞線程，直到 release()，以便在隊列中堆積後續消息"""
+
+    def __init__(self):
+        self.delivered = []
+        self.started = threading.Event()
+        self._gate = threading.Event()
+
+    def __call__(self, route, stream, payload):
+        self.delivered.append((stream, payload))
+        self.started.set()
+        assert self._gate.wait(TIMEOUT)
+
+    def release(self):
+        self._gate.set()
+
+
+def _blocked_queue(capacity=100):
+    consumer = _BlockingConsumer()
+    queue = DeliveryQueue(consumer, capacity=capacity, name="test-delivery")
+    queue.put("account.orderUpdate", "account.orderUpdate.SOL_USDC", "first")
+    assert consumer.started.wait(TIMEOUT)
+    return queue, consumer
+
+
+def test_conflate_keeps_latest_payload_in_original_position():
+    queue, consumer = _blocked_queue()
+    try:
+        queue.put("depth", "depth.SOL_USDC", 1)
+        queue.put("trade", "trade.SOL_USDC", "t1")
+        queue.put("depth", "depth.SOL_USDC", 2)
+        queue.put("depth", "depth.SOL_USDC", 3)
+        queue.put("depth", "depth.BTC_USDC", "b1")
+        assert len(queue) == 3
+
+        consumer.release()
+        assert queue.join(TIMEOUT)
+        assert consumer.delivered == [
+            ("account.orderUpdate.SOL_USDC", "first"),
+            ("depth.SOL_USDC", 3),
+            ("trade.SOL_USDC", "t1"),
+            ("depth.BTC_USDC", "b1"),
+        ]
+        depth = queue.stats()["routes"]["depth"]
+        assert depth["enqueued"] == 2 and depth["conflated"] == 2 and depth["delivered"] == 2
+
+        # 已投遞的條目不再被合併
+        queue.put("depth", "depth.SOL_USDC", 4)
+        assert queue.join(TIMEOUT)
+        assert consumer.delivered[-1] == ("depth.SOL_USDC", 4)
+    finally:
+        consumer.release()
+        queue.stop()
+
+
+def test_keep_delivers_everything_in_order_beyond_capacity():
+    queue, consumer = _blocked_queue(capacity=2)
+    try:
+        for i in range(5):
+            assert queue.put("account.orderUpdate", "account.orderUpdate.SOL_USDC", i)
+        assert len(queue) == 5
+
+        consumer.release()
+        assert queue.join(TIMEOUT)
+        assert [payload for _, payload in consumer.delivered] == ["first", 0, 1, 2, 3, 4]
+        counters = queue.stats()["routes"]["account.orderUpdate"]
+        assert counters["enqueued"] == counters["delivered"] == 6
+        assert counters["dropped"] == counters["conflated"] == 0
+    finally:
+        consumer.release()
+        queue.stop()
+
+
+def test_drop_rejects_new_messages_at_capacity():
+    queue, consumer = _blocked_queue(capacity=2)
+    try:
+        assert queue.put("trade", "trade.SOL_USDC", 1)
+        assert queue.put("trade", "trade.SOL_USDC", 2)
+        assert not queue.put("trade", "trade.SOL_USDC", 3)
+
+        consumer.release()
+        assert queue.join(TIMEOUT)
+        assert consumer.delivered[1:] == [("trade.SOL_USDC", 1), ("trade.SOL_USDC", 2)]
+        counters = queue.stats()["routes"]["trade"]
+        assert counters["enqueued"] == 2 and counters["dropped"] == 1
+    finally:
+        consumer.release()
+        queue.stop()
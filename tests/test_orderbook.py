@@ -0,0 +1,106 @@
+"""
+訂單簿同步回歸測試：快照與緩存增量的銜接、缺口、過期增量和買賣價交叉
+"""
+from models import DepthDelta
+from ws_client.orderbook import OrderBook
+
+SYMBOL = "SOL_USDC"
+
+
+def _delta(first, last, bids=(), asks=()):
+    return DepthDelta(SYMBOL, first, last, list(bids), list(asks))
+
+
+def _snapshot(last_id, bids=(("100", "1"),), asks=(("101", "1"),)):
+    return {"lastUpdateId": last_id, "bids": [list(level) for level in bids], "asks": [list(level) for level in asks]}
+
+
+def _synced_book(last_id=10):
+    book = OrderBook(SYMBOL)
+    book.auto_resync = False
+    assert book.apply_snapshot(_snapshot(last_id))
+    return book
+
+
+def test_snapshot_replays_buffered_deltas_after_its_update_id():
+    book = OrderBook(SYMBOL)
+    book.auto_resync = False
+    assert not book.apply_delta(_delta(8, 9, bids=[(99.0, 5.0)]))      # 早於快照，丟棄
+    assert not book.apply_delta(_delta(10, 12, bids=[(100.5, 2.0)]))   # 跨過快照，應用
+    assert not book.apply_delta(_delta(13, 13, asks=[(101.0, 0.0), (102.0, 3.0)]))
+    assert book.stats()["buffered"] == 3
+
+    assert book.apply_snapshot(_snapshot(11))
+    stats = book.stats()
+    assert stats["synced"] and stats["buffered"] == 0
+    assert stats["last_update_id"] == 13
+    assert book.get_bid_ask() == (100.5, 102.0)
+    bids, asks = book.get_levels()
+    assert bids == [(100.5, 2.0), (100.0, 1.0)]
+    assert asks == [(102.0, 3.0)]
+
+    assert book.apply_delta(_delta(14, 14, bids=[(100.5, 0.0)]))
+    assert book.get_bid_ask() == (100.0, 102.0)
+
+
+def test_snapshot_older_than_buffered_deltas_is_rejected():
+    book = OrderBook(SYMBOL)
+    book.auto_resync = False
+    book.apply_delta(_delta(20, 21, bids=[(100.5, 2.0)]))
+
+    assert not book.apply_snapshot(_snapshot(10))
+    assert not book.synced
+    assert book.stats()["buffered"] == 1
+    assert book.get_bid_ask() == (None, None)
+
+    assert book.apply_snapshot(_snapshot(19))
+    assert book.stats()["last_update_id"] == 21
+
+
+def test_gap_inside_buffer_discards_through_the_gap():
+    book = OrderBook(SYMBOL)
+    book.auto_resync = False
+    book.apply_delta(_delta(11, 11, bids=[(100.5, 2.0)]))
+    book.apply_delta(_delta(13, 14, bids=[(100.6, 2.0)]))
+
+    assert not book.apply_snapshot(_snapshot(10))
+    assert not book.synced
+    assert book.stats()["buffered"] == 1
+
+    assert book.apply_snapshot(_snapshot(12))
+    assert book.get_bid_ask() == (100.6, 101.0)
+
+
+def test_stale_delta_is_ignored():
+    book = _synced_book(10)
+    assert not book.apply_delta(_delta(5, 10, bids=[(100.9, 1.0)]))
+    stats = book.stats()
+    assert stats["stale"] == 1 and stats["synced"]
+    assert book.get_bid_ask() == (100.0, 101.0)
+
+
+def test_gap_unsyncs_and_keeps_the_gap_delta_for_the_next_snapshot():
+    book = _synced_book(10)
+    assert not book.apply_delta(_delta(12, 13, bids=[(100.5, 2.0)]))
+    stats = book.stats()
+    assert stats["gaps"] == 1 and not stats["synced"]
+    assert stats["buffered"] == 1
+    assert book.get_bid_ask() == (None, None)
+
+    assert not book.apply_delta(_delta(14, 14, asks=[(100.8, 1.0)]))
+    assert book.apply_snapshot(_snapshot(11))
+    assert book.stats()["last_update_id"] == 14
+    assert book.get_bid_ask() == (100.5, 100.8)
+
+
+def test_crossed_book_is_invalidated():
+    book = _synced_book(10)
+    assert not book.apply_delta(_delta(11, 11, bids=[(101.5, 1.0)]))
+    stats = book.stats()
+    assert stats["crossed"] == 1 and not stats["synced"]
+    assert stats["buffered"] == 0
+    assert book.get_bid_ask() == (None, None)
+
+    # 交叉後的增量只進入緩存，等待新的快照
+    assert not book.apply_delta(_delta(12, 12, asks=[(103.0, 1.0)]))
+    assert book.stats()["buffered"] == 1
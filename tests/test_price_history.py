@@ -0,0 +1,61 @@
+"""
+滑動窗口統計測試：增量加入和移出的結果與直接計算一致
+"""
+import math
+
+import numpy as np
+import pytest
+
+from utils.price_history import PriceSeries, RollingStats
+
+
+def test_rolling_stats_window_removal_matches_direct_computation():
+    rng = np.random.default_rng(7)
+    values = rng.normal(100.0, 5.0, 500)
+    window = 20
+    stats = RollingStats(window)
+    for i, value in enumerate(values):
+        stats.add(value)
+        if i >= window:
+            stats.remove(values[i - window])
+        recent = values[max(0, i - window + 1):i + 1]
+        assert stats.count == len(recent)
+        assert stats.mean == pytest.approx(recent.mean(), rel=1e-9)
+        assert stats.variance == pytest.approx(recent.var(), rel=1e-6, abs=1e-9)
+
+    for value in values[-window:]:
+        stats.remove(value)
+    assert stats.count == 0 and stats.variance == 0.0
+
+
+def test_price_series_volatility_is_std_of_recent_log_returns():
+    rng = np.random.default_rng(11)
+    prices = 100.0 * np.exp(np.cumsum(rng.normal(0.0, 0.002, 300)))
+    series = PriceSeries(capacity=64, windows=(10, 50))
+
+    for i, price in enumerate(prices[:10]):
+        series.update(float(price), timestamp_ms=i)
+    assert series.volatility(10) == 0.0             # 只有 9 個收益率
+
+    for i, price in enumerate(prices[10:], start=10):
+        series.update(float(price), timestamp_ms=i)
+    returns = np.diff(np.log(prices))
+    for window in (10, 50):
+        expected = returns[-window:].std() * 100
+        assert series.volatility(window) == pytest.approx(expected, rel=1e-6)
+        assert series.mean_return(window) == pytest.approx(returns[-window:].mean(), rel=1e-6, abs=1e-12)
+    assert series.volatility(10, periods_per_year=365) == pytest.approx(
+        returns[-10:].std() * 100 * math.sqrt(365), rel=1e-6)
+    assert series.last_timestamp == len(prices) - 1
+    assert len(series) == 64
+
+
+def test_price_series_ignores_non_positive_prices_and_rejects_oversized_windows():
+    series = PriceSeries(capacity=16, windows=(4,))
+    series.update(0)
+    series.update(-1.0)
+    series.update(None)
+    assert len(series) == 0 and series.last is None
+
+    with pytest.raises(ValueError):
+        PriceSeries(capacity=16, windows=(16,))
@@ -0,0 +1,76 @@
+"""
+行情磁帶測試：錄製後讀取的記錄與寫入一致，時間範圍和路由過濾、分段切換及不完整的末尾記錄
+"""
+import json
+import os
+
+from ws_client.tape import INDEX_FILE, KIND_NAMES, SNAPSHOT_KIND, TapeReader, TapeRecorder
+
+BASE_NS = 1_700_000_000_000_000_000
+
+
+def _record_sample(directory, segment_bytes=1024 * 1024):
+    recorder = TapeRecorder(str(directory), segment_bytes=segment_bytes)
+    written = []
+    for i in range(20):
+        ns = BASE_NS + i * 1000
+        if i == 0:
+            snapshot = {"lastUpdateId": 1, "bids": [["100", "1"]], "asks": [["101", "1"]]}
+            recorder.record_snapshot(snapshot, ns)
+            written.append((ns, "depthSnapshot", json.dumps(snapshot, separators=(",", ":"))))
+            continue
+        stream = "depth.SOL_USDC" if i % 2 else "trade.SOL_USDC"
+        message = json.dumps({"stream": stream, "data": {"i": i, "note": "成交"}}, ensure_ascii=False)
+        recorder.record(stream, message, ns)
+        written.append((ns, stream.partition(".")[0], message))
+    recorder.record("ticker.SOL_USDC", "{}", BASE_NS + 99_000)         # 不在錄製範圍內
+    return recorder, written
+
+
+def _decoded(records):
+    return [(ns, KIND_NAMES[kind], payload.decode("utf-8")) for ns, kind, payload in records]
+
+
+def test_round_trip_preserves_records_and_order(tmp_path):
+    recorder, written = _record_sample(tmp_path)
+    recorder.close()
+    assert recorder.stats()["records"] == len(written)
+
+    reader = TapeReader(str(tmp_path))
+    assert _decoded(reader.records()) == written
+    summary = reader.summary()
+    assert summary["segments"] == summary["indexed"] == 1
+    assert summary["records"] == 20
+    assert summary["kinds"] == {"depthSnapshot": 1, "depth": 10, "trade": 9}
+    assert (summary["first_ns"], summary["last_ns"]) == (written[0][0], written[-1][0])
+
+
+def test_time_range_and_route_filters(tmp_path):
+    recorder, written = _record_sample(tmp_path)
+    recorder.close()
+    reader = TapeReader(str(tmp_path))
+
+    start, end = BASE_NS + 5000, BASE_NS + 12000
+    assert _decoded(reader.records(start, end)) == [record for record in written if start <= record[0] <= end]
+
+    trades = _decoded(reader.records(routes=["trade"]))
+    assert trades == [record for record in written if record[1] == "trade"]
+    depth = list(reader.records(routes=["depth"]))
+    assert depth[0][1] == SNAPSHOT_KIND and len(depth) == 11
+
+
+def test_segments_roll_over_and_truncated_tail_is_ignored(tmp_path):
+    recorder, written = _record_sample(tmp_path, segment_bytes=400)
+    # 不調用 close()：最後一段沒有索引，模擬錄製中斷
+    recorder._file.flush()
+    segment = recorder.stats()["segment"]
+    with open(os.path.join(tmp_path, segment), "ab") as f:
+        f.write(b"\x01\x02\x03")
+
+    reader = TapeReader(str(tmp_path))
+    assert len(reader.segments) > 2
+    with open(os.path.join(tmp_path, INDEX_FILE), encoding="utf-8") as f:
+        assert sum(1 for _ in f) == len(reader.segments) - 1
+    assert _decoded(reader.records()) == written
+    assert _decoded(reader.records(BASE_NS + 15000)) == written[15:]
+    recorder.close()
@@ -0,0 +1,56 @@
+"""
+成交流統計測試：窗口過期、VWAP 和主動買賣量
+"""
+import pytest
+
+from utils.trade_flow import TradeFlow
+
+
+def _flow():
+    flow = TradeFlow(windows=(10, 60), bucket_size=5.0)
+    flow.update(100.0, 1.0, is_buyer_maker=False, timestamp_ms=0)       # 主動買入
+    flow.update(110.0, 3.0, is_buyer_maker=True, timestamp_ms=5000)     # 主動賣出
+    flow.update(105.0, 2.0, is_buyer_maker=False, timestamp_ms=12000)   # 主動買入
+    return flow
+
+
+def test_new_trades_expire_old_ones_from_short_windows():
+    flow = _flow()
+    short = flow.stats(10)
+    assert short.count == 2
+    assert short.volume == pytest.approx(5.0)
+    assert short.vwap == pytest.approx((110.0 * 3 + 105.0 * 2) / 5)
+    assert (short.buy_volume, short.sell_volume) == (2.0, 3.0)
+    assert (short.buy_count, short.sell_count) == (1, 1)
+    assert short.imbalance == pytest.approx(-0.2)
+    assert (short.first_timestamp, short.last_timestamp) == (5000, 12000)
+
+    long = flow.stats(60)
+    assert long.count == 3
+    assert long.vwap == pytest.approx((100.0 + 330.0 + 210.0) / 6)
+    assert long.net_flow == pytest.approx(0.0)
+
+
+def test_reads_with_now_expire_trades_without_new_updates():
+    flow = _flow()
+    assert flow.trade_count(10, now_ms=16000) == 1
+    assert flow.volume_profile(10) == [(105.0, 2.0)]
+
+    empty = flow.stats(10, now_ms=30000)
+    assert empty.count == 0 and empty.volume == 0.0 and empty.vwap is None
+    assert flow.point_of_control(10) is None
+    assert flow.trade_count(60) == 3
+
+    flow.expire(now_ms=72000)
+    assert flow.summary()[60].count == 0
+    assert flow.total_trades == 3 and flow.last_price == 105.0
+
+
+def test_invalid_trades_and_unknown_windows():
+    flow = TradeFlow(windows=(10,))
+    flow.update(0.0, 1.0, False, timestamp_ms=0)
+    flow.update(100.0, 0.0, False, timestamp_ms=0)
+    assert flow.total_trades == 0
+
+    with pytest.raises(ValueError):
+        flow.stats(60)
@@ -9,6 +9,17 @@ import time
 import hmac
 import hashlib
 import base64
+import re
+from urllib.parse import urlsplit
+
+def url_namespace(url: str) -> str:
+    """
+    由服務地址生成可作文件名的命名空間，例如 https://api.backpack.exchange -> api.backpack.exchange，
+    http://127.0.0.1:8765 -> 127.0.0.1_8765；不同交易所（例如本地模擬交易所）的磁盤緩存據此分開存放
+    """
+    parts = urlsplit(url)
+    name = parts.netloc or parts.path or "default"
+    return re.sub(r"[^A-Za-z0-9._-]", "_", name)
 
 def get_headers():
     api_key = os.getenv("API_KEY")
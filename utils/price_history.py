@@ -0,0 +1,251 @@
+"""
+價格歷史模塊：定長環形緩衝區保存帶時間戳的中間價和成交價，
+並以 Welford 滑動窗口和 EWMA 增量維護收益率的均值與方差，每次更新 O(1)，內存不隨運行時間增長
+"""
+import math
+import threading
+import time
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+DEFAULT_CAPACITY = 4096                 # 每個序列保留的最近價格數
+DEFAULT_WINDOWS = (20, 100, 500)        # 滑動窗口（收益率個數）
+DEFAULT_EWMA_HALFLIFE = 50              # EWMA 半衰期（收益率個數）
+RECOMPUTE_INTERVAL = 10000              # 每隔多少次更新從緩衝區重算一次滑動窗口統計，消除浮點累積誤差
+
+
+class RingBuffer:
+    """
+    定長環形緩衝區
+
+    寫入 O(1)，寫滿後覆蓋最早的元素；values() 按時間順序返回 numpy 副本。
+    底層用 Python 列表：每條行情消息都要寫入，列表的單元素讀寫比 numpy 標量快數倍，
+    只在讀取（頻率低得多）時轉換成數組。
+    """
+
+    __slots__ = ("capacity", "dtype", "_data", "_next", "_count")
+
+    def __init__(self, capacity: int, dtype=np.float64):
+        self.capacity = capacity
+        self.dtype = dtype
+        self._data = [0] * capacity
+        self._next = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, value):
+        self._data[self._next] = value
+        self._next = (self._next + 1) % self.capacity
+        if self._count < self.capacity:
+            self._count += 1
+
+    def ago(self, n: int):
+        """倒數第 n+1 個元素（ago(0) 為最新），超出範圍時拋出 IndexError"""
+        if n < 0 or n >= self._count:
+            raise IndexError(n)
+        return self._data[(self._next - 1 - n) % self.capacity]
+
+    def values(self, n: Optional[int] = None) -> np.ndarray:
+        """最近 n 個元素（默認全部），按時間從早到晚"""
+        n = self._count if n is None else min(n, self._count)
+        if n == 0:
+            return np.empty(0, dtype=self.dtype)
+        start = (self._next - n) % self.capacity
+        if start + n <= self.capacity:
+            return np.array(self._data[start:start + n], dtype=self.dtype)
+        return np.array(self._data[start:] + self._data[:self._next], dtype=self.dtype)
+
+    def clear(self):
+        self._next = 0
+        self._count = 0
+
+
+class RollingStats:
+    """滑動窗口的均值和總體方差（Welford 算法，支持移出最早的樣本）"""
+
+    __slots__ = ("window", "count", "mean", "_m2")
+
+    def __init__(self, window: int):
+        self.window = window
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+
+    def remove(self, value: float):
+        if self.count <= 1:
+            self.reset()
+            return
+        delta = value - self.mean
+        self.count -= 1
+        self.mean -= delta / self.count
+        self._m2 -= delta * (value - self.mean)
+
+    def reset(self, values: Optional[np.ndarray] = None):
+        """清空，或用一組樣本重新初始化"""
+        if values is None or not len(values):
+            self.count, self.mean, self._m2 = 0, 0.0, 0.0
+            return
+        self.count = len(values)
+        self.mean = float(values.mean())
+        self._m2 = float(((values - self.mean) ** 2).sum())
+
+    @property
+    def variance(self) -> float:
+        return max(self._m2, 0.0) / self.count if self.count else 0.0
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+
+class EwmaStats:
+    """指數加權均值和方差"""
+
+    __slots__ = ("alpha", "count", "mean", "variance")
+
+    def __init__(self, halflife: float):
+        self.alpha = 1 - math.exp(math.log(0.5) / halflife)
+        self.count = 0
+        self.mean = 0.0
+        self.variance = 0.0
+
+    def add(self, value: float):
+        if self.count == 0:
+            self.mean = value
+        else:
+            delta = value - self.mean
+            increment = self.alpha * delta
+            self.mean += increment
+            self.variance = (1 - self.alpha) * (self.variance + delta * increment)
+        self.count += 1
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.variance)
+
+
+class PriceSeries:
+    """
+    單個價格序列（中間價或成交價）
+
+    保存最近 capacity 個 (時間戳, 價格) 和對數收益率；每個窗口的統計在新收益率進入時加入，
+    同時移出恰好滑出窗口的那個收益率。update() 在事件循環線程調用，讀取可在任意線程，讀寫都加鎖。
+    """
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, windows: Sequence[int] = DEFAULT_WINDOWS,
+                 ewma_halflife: float = DEFAULT_EWMA_HALFLIFE):
+        windows = tuple(sorted(set(windows)))
+        if windows and windows[-1] >= capacity:
+            raise ValueError("窗口必須小於緩衝區容量")
+        self.timestamps = RingBuffer(capacity, np.int64)
+        self.prices = RingBuffer(capacity)
+        self.returns = RingBuffer(capacity)
+        self.windows: Dict[int, RollingStats] = {window: RollingStats(window) for window in windows}
+        self.ewma = EwmaStats(ewma_halflife)
+        self._last: Optional[float] = None
+        self._updates = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    @property
+    def last(self) -> Optional[float]:
+        return self._last
+
+    @property
+    def last_timestamp(self) -> Optional[int]:
+        with self._lock:
+            return int(self.timestamps.ago(0)) if len(self.timestamps) else None
+
+    def update(self, price: float, timestamp_ms: Optional[int] = None):
+        """加入一個價格，非正數價格忽略"""
+        if price is None or price <= 0:
+            return
+        with self._lock:
+            self._update(price, timestamp_ms)
+
+    def _update(self, price: float, timestamp_ms: Optional[int]):
+        previous = self._last
+        self._last = price
+        self.timestamps.append(int(time.time() * 1000) if timestamp_ms is None else timestamp_ms)
+        self.prices.append(price)
+        if previous is None:
+            return
+
+        value = math.log(price / previous)
+        returns = self.returns
+        returns.append(value)
+        available = len(returns)
+        # 直接按下標讀取滑出窗口的收益率，避免 ago() 的邊界檢查
+        data, newest, capacity = returns._data, returns._next - 1, returns.capacity
+        for window, stats in self.windows.items():
+            stats.add(value)
+            if available > window:
+                stats.remove(data[(newest - window) % capacity])
+        self.ewma.add(value)
+
+        self._updates += 1
+        if self._updates % RECOMPUTE_INTERVAL == 0:
+            for window, stats in self.windows.items():
+                stats.reset(self.returns.values(window))
+
+    def volatility(self, window: int = DEFAULT_WINDOWS[0], periods_per_year: Optional[float] = None) -> float:
+        """
+        最近 window 個收益率的標準差（百分比）
+
+        Args:
+            window: 必須是構造時指定的窗口之一
+            periods_per_year: 指定時按 sqrt(periods_per_year) 年化
+        """
+        stats = self.windows[window]
+        with self._lock:
+            if stats.count < window:
+                return 0.0
+            std = stats.std
+        if periods_per_year:
+            std *= math.sqrt(periods_per_year)
+        return std * 100
+
+    def ewma_volatility(self) -> float:
+        """EWMA 收益率標準差（百分比）"""
+        with self._lock:
+            return self.ewma.std * 100 if self.ewma.count > 1 else 0.0
+
+    def mean_return(self, window: int = DEFAULT_WINDOWS[0]) -> float:
+        stats = self.windows[window]
+        with self._lock:
+            return stats.mean
+
+    def values(self, n: Optional[int] = None) -> np.ndarray:
+        with self._lock:
+            return self.prices.values(n)
+
+
+class PriceHistory:
+    """中間價和成交價兩個序列（各自加鎖，可在事件循環線程更新、在策略線程讀取）"""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, windows: Sequence[int] = DEFAULT_WINDOWS,
+                 ewma_halflife: float = DEFAULT_EWMA_HALFLIFE):
+        self.mid = PriceSeries(capacity, windows, ewma_halflife)
+        self.trade = PriceSeries(capacity, windows, ewma_halflife)
+
+    def update_mid(self, price: Optional[float], timestamp_ms: Optional[int] = None):
+        self.mid.update(price, timestamp_ms)
+
+    def update_trade(self, price: Optional[float], timestamp_ms: Optional[int] = None):
+        self.trade.update(price, timestamp_ms)
+
+    def volatility(self, window: int = DEFAULT_WINDOWS[0], periods_per_year: Optional[float] = None,
+                   source: str = "mid") -> float:
+        """指定序列的滑動窗口波動率（百分比），見 PriceSeries.volatility"""
+        return getattr(self, source).volatility(window, periods_per_year)
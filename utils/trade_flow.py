@@ -0,0 +1,266 @@
+"""
+成交流模塊：消費公共成交流，按多個時間窗口增量維護 VWAP、主動買賣量（帶符號的成交流）、
+成交筆數和按價格分桶的成交量分布；每筆成交更新攤銷 O(1)，讀取 VWAP、成交流和筆數 O(1)
+"""
+import threading
+import time
+from collections import deque
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+DEFAULT_WINDOWS = (10, 60, 300)         # 時間窗口（秒）
+MAX_TRADES = 100000                     # 每個窗口最多保留的成交筆數，超出時提前移出最早的成交
+RECOMPUTE_INTERVAL = 10000              # 至少每隔多少筆成交從窗口內的成交重算一次累計值，消除浮點累積誤差
+
+
+class FlowStats(NamedTuple):
+    """單個窗口的成交流統計（不可變），成交量以基礎資產計"""
+    window: int
+    count: int = 0
+    volume: float = 0.0
+    notional: float = 0.0
+    vwap: Optional[float] = None
+    buy_volume: float = 0.0             # 主動買入（吃賣單）的成交量
+    sell_volume: float = 0.0            # 主動賣出（吃買單）的成交量
+    buy_count: int = 0
+    sell_count: int = 0
+    first_timestamp: Optional[int] = None
+    last_timestamp: Optional[int] = None
+
+    @property
+    def net_flow(self) -> float:
+        """主動買入量減主動賣出量"""
+        return self.buy_volume - self.sell_volume
+
+    @property
+    def imbalance(self) -> float:
+        """成交流不平衡度，-1（全是主動賣出）到 1（全是主動買入），沒有成交時為 0"""
+        return (self.buy_volume - self.sell_volume) / self.volume if self.volume > 0 else 0.0
+
+
+class FlowWindow:
+    """
+    單個時間窗口
+
+    每筆成交進入時累加，時間戳早於 (最新時間 - 窗口長度) 的成交從隊首移出時扣減，
+    每筆成交恰好進出一次。
+    """
+
+    __slots__ = ("seconds", "span_ms", "bucket_size", "max_trades", "_trades", "volume", "notional",
+                 "buy_volume", "sell_volume", "buy_count", "profile", "_profile_counts", "_adds")
+
+    def __init__(self, seconds: int, bucket_size: Optional[float] = None, max_trades: int = MAX_TRADES):
+        self.seconds = seconds
+        self.span_ms = int(seconds * 1000)
+        self.bucket_size = bucket_size
+        self.max_trades = max_trades
+        # (時間戳 ms, 價格, 數量, 是否主動買入, 價格桶)
+        self._trades: deque = deque()
+        self.volume = 0.0
+        self.notional = 0.0
+        self.buy_volume = 0.0
+        self.sell_volume = 0.0
+        self.buy_count = 0
+        self.profile: Dict[float, float] = {}           # 價格桶 -> 成交量
+        self._profile_counts: Dict[float, int] = {}     # 價格桶 -> 成交筆數，歸零時刪除該桶
+        self._adds = 0
+
+    def __len__(self) -> int:
+        return len(self._trades)
+
+    def bucket(self, price: float) -> float:
+        """價格所屬的桶（桶的下沿）；未指定桶寬時每個價格一個桶"""
+        size = self.bucket_size
+        if not size:
+            return price
+        return round((price // size) * size, 12)
+
+    def add(self, timestamp_ms: int, price: float, quantity: float, is_buy: bool):
+        bucket = self.bucket(price)
+        self._trades.append((timestamp_ms, price, quantity, is_buy, bucket))
+        self.volume += quantity
+        self.notional += price * quantity
+        if is_buy:
+            self.buy_volume += quantity
+            self.buy_count += 1
+        else:
+            self.sell_volume += quantity
+        self.profile[bucket] = self.profile.get(bucket, 0.0) + quantity
+        self._profile_counts[bucket] = self._profile_counts.get(bucket, 0) + 1
+
+        self.expire(timestamp_ms)
+        while len(self._trades) > self.max_trades:
+            self._remove(self._trades.popleft())
+
+        # 重算間隔不小於窗口內成交數，重算成本攤到每筆成交上仍為 O(1)
+        self._adds += 1
+        if self._adds >= RECOMPUTE_INTERVAL and self._adds >= len(self._trades):
+            self._recompute()
+
+    def expire(self, now_ms: int):
+        """移出時間戳不晚於 now_ms - 窗口長度 的成交"""
+        cutoff = now_ms - self.span_ms
+        trades = self._trades
+        while trades and trades[0][0] <= cutoff:
+            self._remove(trades.popleft())
+
+    def _remove(self, trade: Tuple):
+        _, price, quantity, is_buy, bucket = trade
+        if not self._trades:
+            self._reset_sums()
+            return
+        self.volume -= quantity
+        self.notional -= price * quantity
+        if is_buy:
+            self.buy_volume -= quantity
+            self.buy_count -= 1
+        else:
+            self.sell_volume -= quantity
+        count = self._profile_counts[bucket] - 1
+        if count:
+            self._profile_counts[bucket] = count
+            self.profile[bucket] -= quantity
+        else:
+            del self._profile_counts[bucket]
+            del self.profile[bucket]
+
+    def _reset_sums(self):
+        self.volume = self.notional = self.buy_volume = self.sell_volume = 0.0
+        self.buy_count = 0
+        self.profile.clear()
+        self._profile_counts.clear()
+
+    def _recompute(self):
+        self._adds = 0
+        self._reset_sums()
+        for _, price, quantity, is_buy, bucket in self._trades:
+            self.volume += quantity
+            self.notional += price * quantity
+            if is_buy:
+                self.buy_volume += quantity
+                self.buy_count += 1
+            else:
+                self.sell_volume += quantity
+            self.profile[bucket] = self.profile.get(bucket, 0.0) + quantity
+            self._profile_counts[bucket] = self._profile_counts.get(bucket, 0) + 1
+
+    def stats(self) -> FlowStats:
+        trades = self._trades
+        count = len(trades)
+        if not count:
+            return FlowStats(self.seconds)
+        volume = self.volume
+        return FlowStats(
+            self.seconds, count, volume, self.notional,
+            self.notional / volume if volume > 0 else None,
+            self.buy_volume, self.sell_volume, self.buy_count, count - self.buy_count,
+            trades[0][0], trades[-1][0],
+        )
+
+    def clear(self):
+        self._trades.clear()
+        self._reset_sums()
+
+
+class TradeFlow:
+    """
+    多窗口成交流統計
+
+    update() 在事件循環線程中逐筆調用，策略線程通過 stats()/vwap()/imbalance() 讀取；
+    兩邊共用一把鎖，讀取時傳入 now_ms 會先移出已過期的成交（成交稀疏時統計不會停留在舊數據上）。
+
+    Args:
+        windows: 時間窗口（秒）
+        bucket_size: 成交量分布的價格桶寬度，默認每個成交價一個桶
+    """
+
+    def __init__(self, windows: Sequence[int] = DEFAULT_WINDOWS, bucket_size: Optional[float] = None,
+                 max_trades: int = MAX_TRADES):
+        self.windows: Dict[int, FlowWindow] = {
+            seconds: FlowWindow(seconds, bucket_size, max_trades) for seconds in sorted(set(windows))
+        }
+        self.total_trades = 0
+        self.last_price: Optional[float] = None
+        self.last_timestamp: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def update(self, price: float, quantity: float, is_buyer_maker: bool, timestamp_ms: Optional[int] = None):
+        """
+        加入一筆成交，價格或數量非正時忽略
+
+        Args:
+            is_buyer_maker: 買方是掛單方（成交事件的 m 字段），即主動方是賣方
+        """
+        if price is None or quantity is None or price <= 0 or quantity <= 0:
+            return
+        if timestamp_ms is None:
+            timestamp_ms = int(time.time() * 1000)
+        is_buy = not is_buyer_maker
+        with self._lock:
+            for window in self.windows.values():
+                window.add(timestamp_ms, price, quantity, is_buy)
+            self.total_trades += 1
+            self.last_price = price
+            self.last_timestamp = timestamp_ms
+
+    def expire(self, now_ms: Optional[int] = None):
+        """按當前時間移出所有窗口中已過期的成交"""
+        if now_ms is None:
+            now_ms = int(time.time() * 1000)
+        with self._lock:
+            for window in self.windows.values():
+                window.expire(now_ms)
+
+    def _window(self, window: int) -> FlowWindow:
+        try:
+            return self.windows[window]
+        except KeyError:
+            raise ValueError(f"未配置的成交流窗口: {window}，可用窗口 {tuple(self.windows)}") from None
+
+    def stats(self, window: int = DEFAULT_WINDOWS[1], now_ms: Optional[int] = None) -> FlowStats:
+        """指定窗口的統計快照；now_ms 不為空時先移出該窗口已過期的成交"""
+        target = self._window(window)
+        with self._lock:
+            if now_ms is not None:
+                target.expire(now_ms)
+            return target.stats()
+
+    def vwap(self, window: int = DEFAULT_WINDOWS[1], now_ms: Optional[int] = None) -> Optional[float]:
+        """窗口內的成交量加權平均價，沒有成交時為 None"""
+        return self.stats(window, now_ms).vwap
+
+    def net_flow(self, window: int = DEFAULT_WINDOWS[1], now_ms: Optional[int] = None) -> float:
+        return self.stats(window, now_ms).net_flow
+
+    def imbalance(self, window: int = DEFAULT_WINDOWS[1], now_ms: Optional[int] = None) -> float:
+        return self.stats(window, now_ms).imbalance
+
+    def trade_count(self, window: int = DEFAULT_WINDOWS[1], now_ms: Optional[int] = None) -> int:
+        return self.stats(window, now_ms).count
+
+    def volume_profile(self, window: int = DEFAULT_WINDOWS[1], now_ms: Optional[int] = None) -> List[Tuple[float, float]]:
+        """窗口內按價格桶從低到高的 [(價格桶, 成交量), ...]（複製並排序，O(桶數)）"""
+        target = self._window(window)
+        with self._lock:
+            if now_ms is not None:
+                target.expire(now_ms)
+            return sorted(target.profile.items())
+
+    def point_of_control(self, window: int = DEFAULT_WINDOWS[1], now_ms: Optional[int] = None) -> Optional[float]:
+        """窗口內成交量最大的價格桶（O(桶數)），沒有成交時為 None"""
+        profile = self.volume_profile(window, now_ms)
+        return max(profile, key=lambda item: item[1])[0] if profile else None
+
+    def summary(self, now_ms: Optional[int] = None) -> Dict[int, FlowStats]:
+        """所有窗口的統計快照"""
+        with self._lock:
+            if now_ms is not None:
+                for window in self.windows.values():
+                    window.expire(now_ms)
+            return {seconds: window.stats() for seconds, window in self.windows.items()}
+
+    def clear(self):
+        with self._lock:
+            for window in self.windows.values():
+                window.clear()
+            self.last_price = None
+            self.last_timestamp = None
@@ -9,34 +9,91 @@ import websockets
 import threading
 from typing import List, Dict, Any, Callable, Optional
 
+from api.auth import get_signer
+from api.clock import get_clock
+from api.loop_thread import get_loop_thread
+from config import TAPE_DIR, WS_SHARED_FEED, WS_STALE_AFTER, WS_URL
+from models import BookTicker, DepthDelta, MarketSnapshot
+from models.fields import parse_timestamp_ms
+from ws_client.delivery import DeliveryQueue
+from ws_client.depth_view import DEFAULT_LIQUIDITY_PCT
+from ws_client.dispatch import StreamRouter, route_key
+from ws_client.liveness import LIVENESS_ROUTE, LivenessMonitor
+from ws_client.orderbook import OrderBook
+from ws_client.reconnect import ReconnectManager
+from ws_client.tape import DEFAULT_ROUTES, TapeRecorder
+from utils.price_history import PriceHistory
+from utils.trade_flow import TradeFlow
 
-logging.getLogger("backpack_ws").setLevel(logging.DEBUG)
 
 class BackpackWebSocketClient:
-    def __init__(self, api_key, secret_key, symbol, logger=None):
+    def __init__(self, api_key, secret_key, symbol, logger=None, stale_after=None):
         self.api_key = api_key
         self.secret_key = secret_key
         self.symbol = symbol
-        self.ws_url = "wss://ws.backpack.exchange" # Backpack WebSocket URL
+        self.ws_url = WS_URL # Backpack WebSocket URL
         self.ws = None
         self.connected = False
         self.subscriptions = []
+        # 完整數據流名稱 -> 是否需要簽名，重連後按此重新訂閱
+        self.stream_subscriptions: Dict[str, bool] = {}
+        # 所有數據流消息的統一入口 (stream, data)，在投遞線程中調用；與回調一樣經投遞隊列，
+        # 深度和最優報價只收到排隊期間的最新一條（需要每條深度增量時使用 FeedManager 的處理函數）
+        self.stream_handler: Optional[Callable[[str, Dict], None]] = None
+        # 預編譯的數據流路由和類型化解碼器；路由名 -> 更新本地狀態的內部處理函數
+        self.router = StreamRouter()
+        self._state_updaters = {
+            "bookTicker": self._update_book_ticker,
+            "depth": self._update_orderbook,
+            "trade": self._update_trade_price,
+            "account.orderUpdate": self._log_order_update,
+        }
         self.logger = logger or logging.getLogger("backpack_ws")
-        self.reconnect_attempts = 0
-        self.max_reconnect_attempts = 10
-        self.reconnect_delay = 5  # 初始重連延遲（秒）
+        self.running = False
+        # 斷線後由重連管理器自動重連並恢復訂閱；主動 disconnect 後不再重連
+        self.auto_reconnect = True
+        self.reconnector = ReconnectManager(self)
+        # 各數據流的靜默時間和 ping 往返時間：pong 超時時觸發重連，數據失效和恢復時通知策略
+        self.liveness = LivenessMonitor(self, stale_after=stale_after, on_change=self._on_liveness_change)
+        self._stale_notified = False
+        self.heartbeat_task = None
+        # 回調和 stream_handler 經有界隊列在投遞線程中執行，不阻塞讀取循環
+        self.delivery = DeliveryQueue(self._deliver, name=f"ws-delivery-{symbol or 'shared'}")
+        self._loop = None
         self.callbacks = {}
+        self.book_ticker: Optional[BookTicker] = None  # 最近一次最優報價
+        # 本地訂單簿，由深度流增量維護，initialize_orderbook 完成首次同步
+        self.orderbook = OrderBook(symbol, on_update=self._publish_snapshot)
+        # 最新行情快照（不可變），最優價、成交價或同步狀態變化時整體替換，其他線程直接讀取
+        self.snapshot = MarketSnapshot(symbol or "")
+        self._last_trade_price: Optional[float] = None
+        # 行情磁帶錄製器，start_recording 後原始消息連同接收時間寫入磁帶
+        self.recorder: Optional[TapeRecorder] = None
+        # 定長的中間價和成交價歷史，增量維護滑動窗口波動率
+        self.price_history = PriceHistory()
+        # 成交流的多窗口 VWAP、主動買賣量和成交量分布，訂閱 trade 流後逐筆增量更新
+        self.trade_flow = TradeFlow()
+        # 共享時鐘同步服務，私有訂閱的簽名時間戳與REST請求一致
+        self._clock = None
         
+    @property
+    def clock(self):
+        """共享時鐘同步服務，首次簽名私有訂閱時才初始化（只處理公共流或回放時不觸發網絡請求）"""
+        if self._clock is None:
+            self._clock = get_clock()
+        return self._clock
+    
     async def connect(self):
         """建立WebSocket連接"""
         try:
             self.ws = await websockets.connect(self.ws_url)
             self.connected = True
-            self.reconnect_attempts = 0
+            self.running = True
             self.logger.info(f"WebSocket連接成功: {self.ws_url}")
             
-            # 啟動心跳檢測 - 使用asyncio.create_task而不是threading
-            self.heartbeat_task = asyncio.create_task(self._heartbeat())
+            # 心跳任務跨越重連運行，只在首次連接（或主動斷開後再連接）時啟動
+            if self.heartbeat_task is None or self.heartbeat_task.done():
+                self.heartbeat_task = asyncio.create_task(self._heartbeat())
             
             # 啟動訊息處理循環
             self.message_task = asyncio.create_task(self._message_handler())
@@ -47,79 +104,144 @@ class BackpackWebSocketClient:
             return False
     
     async def _heartbeat(self):
-        """心跳檢測（不發送任何消息）"""
-        if not hasattr(self, 'running'):
-            self.running = True
-        while self.connected and self.running:
-            # 不發送任何心跳消息，只是保持任務運行
-            await asyncio.sleep(30)
-        self.logger.debug("心跳任務結束")
+        """心跳檢測：定期 ping 測量往返時間並檢查各數據流是否靜默（見 LivenessMonitor）"""
+        await self.liveness.run()
         
-    async def _reconnect(self):
-        """重新連接WebSocket"""
-        if self.reconnect_attempts >= self.max_reconnect_attempts:
-            self.logger.error(f"達到最大重連嘗試次數({self.max_reconnect_attempts})，停止重連")
-            return False
-        
-        self.reconnect_attempts += 1
-        delay = self.reconnect_delay * (2 ** (self.reconnect_attempts - 1))  # 指數退避
-        self.logger.info(f"嘗試重連 ({self.reconnect_attempts}/{self.max_reconnect_attempts})，等待 {delay} 秒")
-        
-        await asyncio.sleep(delay)
-        
-        try:
-            await self.disconnect()
-            success = await self.connect()
-            if success:
-                # 重新訂閱之前的頻道
-                for sub in self.subscriptions:
-                    await self.subscribe(sub["channel"], sub["symbols"])
-                return True
-        except Exception as e:
-            self.logger.error(f"重連失敗: {e}")
+    async def _replay_subscriptions(self):
+        """重連後重新訂閱之前的數據流（公共流和需要簽名的私有流分開發送）"""
+        # 斷線期間的增量已丟失，訂單簿重新走快照流程
+        self.orderbook.reset()
+        for signed in (False, True):
+            streams = [stream for stream, is_signed in self.stream_subscriptions.items() if is_signed == signed]
+            if streams:
+                await self.subscribe_streams(streams, signed=signed)
+    
+    async def _close_transport(self):
+        """關閉底層連接並取消消息處理任務（不影響當前正在執行的任務；心跳任務跨越重連繼續運行）"""
+        if self.ws:
+            # 關閉期間讀取循環必須繼續運行：讀取停止後接收緩衝區寫滿，收不到對方的關閉幀，close() 會一直等到超時
+            try:
+                await self.ws.close()
+            except Exception as e:
+                self.logger.debug("關閉舊連接出錯: %s", e)
+        self.connected = False
+        task = getattr(self, 'message_task', None)
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+    
+    def get_reconnect_stats(self):
+        """斷線、重連次數和重連後恢復數據所用的時間"""
+        return self.reconnector.stats()
+    
+    @property
+    def reconnecting(self):
+        return self.reconnector.reconnecting
+    
+    def get_liveness_stats(self):
+        """各數據流的靜默時間、失效數據流和 ping 往返時間"""
+        return self.liveness.stats()
+    
+    @property
+    def data_stale(self):
+        """是否有需要持續推送的數據流（深度、最優報價）靜默超過閾值且連接沒有回應 ping"""
+        return self.liveness.is_stale()
+    
+    @property
+    def stale_streams(self):
+        """已判定失效的數據流"""
+        return list(self.liveness.stale_streams)
+    
+    @property
+    def rtt(self):
+        """最近一次 ping 往返時間（秒），尚未測量時為 None"""
+        return self.liveness.rtt
+    
+    def _on_liveness_change(self, event):
+        """
+        失效數據流集合變化時調用（事件循環線程）
         
-        return False
+        只在本客戶端訂閱的數據流由全部正常變為有失效、或反之時，把通知放入投遞隊列，在投遞線程中調用 liveness 回調。
+        """
+        streams = [stream for stream in event["streams"] if stream in self.stream_subscriptions]
+        self._notify_stale(streams, event["reason"])
+    
+    def _notify_stale(self, streams, reason):
+        stale = bool(streams)
+        if stale == self._stale_notified:
+            return
+        self._stale_notified = stale
+        if LIVENESS_ROUTE in self.callbacks:
+            if self._loop is None:
+                self._loop = asyncio.get_running_loop()
+            event = {"stale": stale, "streams": streams, "reason": reason}
+            self.delivery.put(LIVENESS_ROUTE, LIVENESS_ROUTE, (event, event))
     
     async def disconnect(self):
-        """關閉WebSocket連接"""
+        """關閉WebSocket連接（主動關閉，不再自動重連）"""
+        self.running = False
+        self.reconnector.stop()
+        self.delivery.stop()
+        self.stop_recording()
+        if self.heartbeat_task is not None and self.heartbeat_task is not asyncio.current_task():
+            self.heartbeat_task.cancel()
         if self.ws:
-            # 取消所有任務
-            if hasattr(self, 'heartbeat_task') and self.heartbeat_task:
-                self.heartbeat_task.cancel()
-            if hasattr(self, 'message_task') and self.message_task:
-                self.message_task.cancel()
-                
-            # 設置running為False
-            self.running = False
-            
-            # 關閉連接
-            await self.ws.close()
-            self.connected = False
+            await self._close_transport()
             self.logger.info("WebSocket連接已關閉")
     
     async def subscribe(self, channel, symbols=None):
         """訂閱特定頻道的數據（最簡化版）"""
-        if not self.connected:
-            await self.connect()
-        
         symbols = symbols or [self.symbol]
+        if not await self.subscribe_streams([f"{channel}.{symbol}" for symbol in symbols]):
+            return False
+        self.subscriptions.append({"channel": channel, "symbols": symbols})
+        self.logger.info(f"已訂閱: {channel} - {symbols}")
+        return True
+    
+    def _subscription_signature(self):
+        """私有數據流訂閱所需的簽名 [api_key, 簽名, 時間戳, 窗口]"""
+        # 使用共享簽名器，私鑰只解碼一次
+        sig_data = get_signer(self.secret_key).sign("subscribe", timestamp=self.clock.now_ms(),
+                                                     window=self.clock.recommended_window())
+        return [self.api_key, sig_data["signature"], sig_data["timestamp"], sig_data["window"]]
+    
+    async def subscribe_streams(self, streams, signed=False):
+        """
+        訂閱一組完整的數據流名稱，例如 depth.SOL_USDC、account.orderUpdate
+        
+        signed 為 True 時附帶簽名（私有數據流）。訂閱記錄在 stream_subscriptions 中，重連後自動恢復。
+        """
+        if not self.connected:
+            if not await self.connect():
+                self.logger.error("WebSocket連接失敗，無法訂閱")
+                return False
         
+        subscription_data = {"method": "SUBSCRIBE", "params": list(streams)}
         try:
-            # 最簡單的訂閱格式
-            subscription_data = {
-            "method": "SUBSCRIBE",
-            "params": [f"{channel}.{symbol}" for symbol in symbols]
-        }
-            
-            self.logger.debug(f"訂閱數據: {json.dumps(subscription_data)}")
-            
+            if signed:
+                subscription_data["signature"] = self._subscription_signature()
+            self.logger.debug(f"訂閱數據流: {subscription_data['params']}")
             await self.ws.send(json.dumps(subscription_data))
-            self.subscriptions.append({"channel": channel, "symbols": symbols})
-            self.logger.info(f"已訂閱: {channel} - {symbols}")
-            return True
         except Exception as e:
             self.logger.error(f"訂閱失敗: {e}", exc_info=True)
             return False
+        for stream in streams:
+            self.stream_subscriptions[stream] = signed
+            self.liveness.watch(stream)
+        return True
+    
+    async def unsubscribe_streams(self, streams):
+        """取消訂閱一組數據流"""
+        for stream in streams:
+            self.stream_subscriptions.pop(stream, None)
+            self.liveness.unwatch(stream)
+        if not self.connected or not self.ws:
+            return True
+        try:
+            await self.ws.send(json.dumps({"method": "UNSUBSCRIBE", "params": list(streams)}))
+            return True
+        except Exception as e:
+            self.logger.error(f"取消訂閱失敗: {e}")
+            return False
     
     async def _message_handler(self):
         """處理接收到的WebSocket訊息"""
@@ -127,112 +249,459 @@ class BackpackWebSocketClient:
             try:
                 if self.ws:
                     message = await self.ws.recv()
-                    self.logger.debug(f"收到原始消息: {message}")
-                    
-                    try:
-                        data = json.loads(message)
-                    except json.JSONDecodeError as e:
-                        self.logger.error(f"解析JSON失敗: {e}, 原始消息: {message}")
-                        continue
-                    
-                    # 處理ping消息
-                    if isinstance(data, dict) and "ping" in data:
-                        pong_message = {"pong": data["ping"]}
-                        await self.ws.send(json.dumps(pong_message))
-                        self.logger.debug(f"回應ping: {pong_message}")
-                        continue
-                    
-                    # 處理訂閱確認
-                    if "result" in data and data["result"] == "subscribed":
-                        self.logger.info(f"訂閱確認: {data}")
-                        continue
-                    
-                    # 處理錯誤消息
-                    if "error" in data:
-                        error_code = data.get("error", {}).get("code")
-                        error_msg = data.get("error", {}).get("message")
-                        self.logger.error(f"WebSocket錯誤: 代碼={error_code}, 消息={error_msg}, 完整消息: {data}")
-                        continue
-                    
-                    # 處理訂單更新
-                    if "stream" in data and "data" in data:
-                        stream = data["stream"]
-                        event_data = data["data"]
-                        
-                        # 訂單更新數據流
-                        if stream.startswith("account.orderUpdate"):
-                            self.logger.info(f"收到訂單更新: {event_data}")
-                            
-                            # 調用回調函數
-                            if "account.orderUpdate" in self.callbacks:
-                                await self.callbacks["account.orderUpdate"](event_data)
-                    else:
-                        self.logger.debug(f"收到未處理的訊息: {data}")
-            except websockets.exceptions.ConnectionClosed:
-                self.logger.warning("WebSocket連接已關閉，嘗試重連")
-                await self._reconnect()
+                    await self._process_message(message, time.time_ns())
+            except websockets.exceptions.ConnectionClosed as e:
+                self.connected = False
+                if self.running:
+                    self.logger.warning("WebSocket連接已關閉，嘗試重連")
+                    self.reconnector.on_disconnect(f"連接關閉: {e}")
                 break
             except Exception as e:
                 self.logger.error(f"處理訊息時出錯: {e}", exc_info=True)
                 await asyncio.sleep(1)
+    
+    async def _process_message(self, message, received_ns=None):
+        """
+        處理一條原始消息
+        
+        數據流消息按路由表一次查找到類型化解碼器，解碼結果在這裡更新本地狀態（訂單簿、最優報價），
+        回調則放入投遞隊列後立即返回；ping 總是在讀取循環中直接回應。日誌只在對應級別開啟時才格式化。
+        """
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug("收到原始消息: %s", message)
+        
+        try:
+            data = json.loads(message)
+        except json.JSONDecodeError as e:
+            self.logger.error("解析JSON失敗: %s, 原始消息: %s", e, message)
+            return
+        if not isinstance(data, dict):
+            return
+        
+        stream = data.get("stream")
+        if stream is not None and "data" in data:
+            if self.recorder is not None:
+                self.recorder.record(stream, message, received_ns or time.time_ns())
+            self._dispatch_stream(stream, data["data"], len(message))
+            return
+        
+        # 處理ping消息
+        if "ping" in data:
+            await self.ws.send(json.dumps({"pong": data["ping"]}))
+            self.logger.debug("回應ping: %s", data["ping"])
+        # 處理訂閱確認
+        elif data.get("result") == "subscribed":
+            self.logger.info("訂閱確認: %s", data)
+        # 處理錯誤消息
+        elif "error" in data:
+            error = data["error"] if isinstance(data["error"], dict) else {"message": data["error"]}
+            self.logger.error("WebSocket錯誤: 代碼=%s, 消息=%s, 完整消息: %s",
+                              error.get("code"), error.get("message"), data)
+        else:
+            self.logger.debug("收到未處理的訊息: %s", data)
+    
+    def _dispatch_stream(self, stream, event_data, size=0):
+        """記錄數據流存活狀態，然後按路由解碼並分發一條數據流消息"""
+        self.liveness.on_message(stream)
+        if self.reconnector.awaiting_data:
+            self.reconnector.on_data(stream)
+        self._handle_stream(stream, event_data, size)
+    
+    def _handle_stream(self, stream, event_data, size=0):
+        """解碼、更新本地狀態並放入投遞隊列（事件循環線程，不阻塞）"""
+        route = self.router.route(stream)
+        if route is None:
+            if self.stream_handler is not None:
+                self.delivery.put(route_key(stream), stream, (event_data, event_data))
+            else:
+                self.logger.debug("收到未註冊路由的數據流: %s", stream)
+            return
+        
+        timing = self.router.timing
+        if timing:
+            started = time.perf_counter()
+        try:
+            event = route.decode(event_data)
+        except (KeyError, TypeError, ValueError) as e:
+            self.logger.error("解碼 %s 消息失敗: %s, 數據: %s", stream, e, event_data)
+            return
+        if timing:
+            decoded = time.perf_counter()
+        
+        updater = self._state_updaters.get(route.name)
+        if updater is not None:
+            updater(event)
+        if self.stream_handler is not None or route.name in self.callbacks:
+            if self._loop is None:
+                self._loop = asyncio.get_running_loop()
+            self.delivery.put(route.name, stream, (event, event_data))
+        
+        route.messages += 1
+        route.bytes += size
+        if timing:
+            route.decode_seconds += decoded - started
+            route.handle_seconds += time.perf_counter() - decoded
+    
+    def _deliver(self, name, stream, payload):
+        """投遞線程：依次調用 stream_handler 和該路由的回調"""
+        event, raw = payload
+        if self.stream_handler is not None and name != LIVENESS_ROUTE:
+            try:
+                self.stream_handler(stream, raw)
+            except Exception as e:
+                self.logger.error("處理 %s 消息出錯: %s", stream, e, exc_info=True)
+        callback = self.callbacks.get(name)
+        if callback is None:
+            return
+        try:
+            result = callback(event)
+            if asyncio.iscoroutine(result):
+                # 協程回調在事件循環中執行，投遞線程等待其完成以保持消息順序
+                asyncio.run_coroutine_threadsafe(result, self._loop).result()
+        except Exception as e:
+            self.logger.error("%s 回調出錯: %s", name, e, exc_info=True)
+    
+    def start_recording(self, directory=TAPE_DIR, routes=DEFAULT_ROUTES):
+        """開始把原始消息和訂單簿快照錄製到磁帶目錄（在事件循環線程或連接前調用）"""
+        self.stop_recording()
+        self.recorder = TapeRecorder(directory, routes)
+        self.orderbook.on_snapshot = self.recorder.record_snapshot
+        self.logger.info(f"開始錄製行情磁帶: {directory}")
+        return self.recorder
+    
+    def stop_recording(self):
+        """停止錄製並封閉當前分段"""
+        recorder, self.recorder = self.recorder, None
+        if recorder is not None:
+            self.orderbook.on_snapshot = None
+            recorder.close()
+            self.logger.info(f"行情磁帶錄製結束: {recorder.stats()}")
+    
+    def get_delivery_stats(self):
+        """投遞隊列長度、回調延遲和各路由的合併、丟棄數"""
+        return self.delivery.stats()
+    
+    def _update_book_ticker(self, ticker):
+        previous = self.book_ticker
+        self.book_ticker = ticker
+        # 大部分最優報價消息只改變掛單數量：不產生新的中間價樣本，也不需要發布新快照
+        if previous is not None and previous.bid_price == ticker.bid_price and previous.ask_price == ticker.ask_price:
+            return
+        self.price_history.update_mid(ticker.mid, ticker.timestamp)
+        self._publish_snapshot()
+    
+    def _update_trade_price(self, event):
+        try:
+            price = float(event["p"])
+            quantity = float(event["q"])
+        except (KeyError, TypeError, ValueError):
+            return
+        self._last_trade_price = price
+        timestamp = parse_timestamp_ms(event.get("E"))
+        self.price_history.update_trade(price, timestamp)
+        self.trade_flow.update(price, quantity, bool(event.get("m")), parse_timestamp_ms(event.get("T")) or timestamp)
+        if price != self.snapshot.last_price:
+            self._publish_snapshot()
+    
+    def _publish_snapshot(self, *_):
+        """
+        發布新的行情快照：最優價優先取本地訂單簿，未同步時取最近的 bookTicker
 
+        最優價、成交價和同步狀態都沒有變化時保留當前快照，不分配新對象（深度增量大多不觸及最優檔位）。
+        """
+        book = self.orderbook
+        bid, ask = book.get_bid_ask()
+        if (bid is None or ask is None) and self.book_ticker is not None:
+            bid, ask = self.book_ticker.bid_price, self.book_ticker.ask_price
+        synced = book.synced
+        current = self.snapshot
+        if bid == current.bid_price and ask == current.ask_price and synced == current.book_synced \
+                and self._last_trade_price == current.last_price:
+            return
+        self.snapshot = MarketSnapshot(book.symbol or "", bid, ask, self._last_trade_price,
+                                       book.last_update_id if synced else 0, synced, time.time())
+    
+    @property
+    def historical_prices(self):
+        """最近的中間價（numpy 數組，長度受 PriceHistory 容量限制）"""
+        return self.price_history.mid.values()
+    
+    def _log_order_update(self, event):
+        self.logger.info("收到訂單更新: %s", event)
+    
+    def _update_orderbook(self, delta):
+        # 應用成功時由訂單簿的 on_update 發布快照；失效（缺口、交叉）時在這裡發布
+        if delta.symbol == self.orderbook.symbol and not self.orderbook.on_delta(delta):
+            self._publish_snapshot()
+    
+    def get_stream_stats(self):
+        """各路由的消息數、字節數，開啟 router.timing 時另有解碼和處理耗時"""
+        return self.router.stats()
+    
     async def subscribe_account_updates(self):
         """訂閱賬戶更新（專門方法）"""
         try:
-            # 檢查WebSocket連接狀態
-            if not self.ws:
-                self.logger.warning("WebSocket未連接，嘗試連接")
-                connected = await self.connect()
-                if not connected:
-                    self.logger.error("WebSocket連接失敗，無法訂閱")
-                    return False
-            
-            # 生成簽名
-            timestamp = str(int(time.time() * 1000))
-            window = "5000"  # 使用字符串
-            
-            # 構建簽名消息 - 使用與成功代碼相同的格式
-            message_to_sign = f"instruction=subscribe&timestamp={timestamp}&window={window}"
-            
-            # 使用ED25519簽名
-            private_key_bytes = base64.b64decode(self.secret_key)
-            signing_key = nacl.signing.SigningKey(private_key_bytes)
-            
-            # 簽名
-            signed = signing_key.sign(message_to_sign.encode('ascii'))
-            signature = base64.b64encode(signed.signature).decode()
-            
-            # 使用正確的訂閱格式
-            subscription_data = {
-                "method": "SUBSCRIBE",
-                "params": ["account.orderUpdate"],  # 不包含交易對
-                "signature": [
-                    self.api_key,
-                    signature,
-                    timestamp,
-                    window
-                ]
-            }
-            
-            self.logger.debug(f"訂閱數據: {json.dumps({**subscription_data, 'signature': [self.api_key, 'SIGNATURE', timestamp, window]})}")
-            
-            if self.ws:
-                await self.ws.send(json.dumps(subscription_data))
-                self.subscriptions.append({"channel": "account.orderUpdate", "symbols": [self.symbol]})
-                self.logger.info(f"已訂閱: account.orderUpdate")
-                return True
-            else:
-                self.logger.error("WebSocket未連接，無法發送訂閱請求")
+            if not await self.subscribe_streams(["account.orderUpdate"], signed=True):
                 return False
+            self.subscriptions.append({"channel": "account.orderUpdate", "symbols": [self.symbol]})
+            self.logger.info(f"已訂閱: account.orderUpdate")
+            return True
         except Exception as e:
             self.logger.error(f"訂閱賬戶更新失敗: {e}", exc_info=True)
             return False
     
+    async def initialize_orderbook(self, timeout=10):
+        """訂閱深度流並完成本地訂單簿的首次同步（快照 + 重放增量）"""
+        if not any(sub["channel"] == "depth" for sub in self.subscriptions):
+            if not await self.subscribe("depth"):
+                return False
+        try:
+            return await asyncio.wait_for(self.orderbook.sync(), timeout)
+        except asyncio.TimeoutError:
+            # 後續增量到達時會繼續在後台同步
+            self.logger.warning(f"訂單簿同步超時: {self.symbol}")
+            return False
+    
+    def get_bid_ask(self):
+        """最優買賣價：優先使用本地訂單簿，未同步時使用最近的 bookTicker"""
+        bid, ask = self.orderbook.get_bid_ask()
+        if (bid is None or ask is None) and self.book_ticker is not None:
+            return self.book_ticker.bid_price, self.book_ticker.ask_price
+        return bid, ask
+    
+    def get_liquidity_profile(self, pct=DEFAULT_LIQUIDITY_PCT):
+        """基於本地訂單簿的流動性概況（買賣量、失衡度），未同步時返回 None"""
+        return self.orderbook.get_liquidity_profile(pct)
+    
     def on(self, channel, callback):
-        """註冊頻道數據的回調函數"""
+        """
+        註冊頻道數據的回調函數
+        
+        回調在投遞線程中按順序執行（協程回調提交到事件循環並等待完成）；
+        深度和最優報價回調只收到排隊期間的最新一條，訂單更新不會丟棄。
+        """
         self.callbacks[channel] = callback
         self.logger.info(f"已註冊 {channel} 頻道的回調函數")
         
     def is_connected(self):
         """檢查WebSocket是否已連接"""
-        return self.connected and self.ws and self.ws.open
+        return bool(self.connected and self.ws and self.ws.state.name == "OPEN")
+
+
+class BackpackWebSocket:
+    """
+    供同步策略和面板使用的 WebSocket 運行時
+    
+    BackpackWebSocketClient 運行在共享的後台事件循環線程上（與 REST 客戶端共用同一個循環和會話）。
+    shared 為 True（默認，見 config.WS_SHARED_FEED）時不單獨建立連接：行情狀態由 FeedClient 維護，
+    數據流經 FeedManager 的共享公共/私有連接按引用計數訂閱，多個交易對和策略共用同一對連接；
+    連接狀態、重連和存活檢測都是共享連接的。本類的方法可以在任意線程調用：
+    - 連接、訂閱和發送提交到事件循環線程並等待結果，超時或出錯時返回 False
+    - 行情讀取（get_current_price、get_bid_ask、bid_price 等）只讀取客戶端發布的不可變快照，
+      不加鎖，也不訪問網絡
+    - on_message(stream, data) 在投遞線程中調用，其中可以調用本類的任何方法
+    - on_stale({"stale", "streams", "reason"}) 在行情數據失效和恢復時於投遞線程中調用，策略據此暫停報價；
+      行情清淡時數據流靜默但連接仍回應 ping 不算失效。stale_after 按路由或完整數據流名稱覆蓋
+      config.WS_STALE_AFTER 中的靜默閾值，例如 {"depth.SOL_USDC": 30}
+    """
+    
+    DEFAULT_TIMEOUT = 10            # 同步調用等待事件循環結果的最長時間（秒）
+    ORDERBOOK_LEVELS = 50           # orderbook / get_orderbook 返回的檔數
+    
+    def __init__(self, api_key, secret_key, symbol, on_message=None, auto_reconnect=True,
+                 strategy=None, loop_thread=None, on_stale=None, stale_after=None, shared=WS_SHARED_FEED):
+        self.symbol = symbol
+        self.loop_thread = loop_thread or get_loop_thread()
+        if shared:
+            # feed_manager 依賴本模塊，在這裡導入；共享連接總是自動重連
+            from ws_client.feed_manager import FeedClient, get_feed_manager
+            self.client = FeedClient(get_feed_manager(api_key, secret_key), symbol, stale_after=stale_after)
+        else:
+            if stale_after is not None:
+                stale_after = {**WS_STALE_AFTER, **stale_after}
+            self.client = BackpackWebSocketClient(api_key, secret_key, symbol, stale_after=stale_after)
+            self.client.auto_reconnect = auto_reconnect
+        if on_message is None and strategy is not None:
+            on_message = getattr(strategy, "on_ws_message", None)
+        self.client.stream_handler = on_message
+        if on_stale is None and strategy is not None:
+            on_stale = getattr(strategy, "on_ws_stale", None)
+        if on_stale is not None:
+            self.client.on(LIVENESS_ROUTE, on_stale)
+        self.running = False
+    
+    def _run(self, coro, timeout=None, default=False):
+        if self.loop_thread.in_loop_thread():
+            coro.close()
+            raise RuntimeError("事件循環線程中請直接使用 BackpackWebSocketClient 的異步接口")
+        try:
+            return self.loop_thread.run(coro, timeout or self.DEFAULT_TIMEOUT)
+        except Exception as e:
+            self.client.logger.error(f"WebSocket操作失敗: {str(e) or type(e).__name__}")
+            return default
+    
+    # ------------------------------------------------------------------ 連接和訂閱（阻塞，任意線程）
+    
+    def connect(self, timeout=None):
+        """建立連接，已連接時直接返回 True"""
+        if self.client.is_connected():
+            return True
+        self.running = bool(self._run(self.client.connect(), timeout))
+        return self.running
+    
+    def close(self, timeout=None):
+        """關閉連接並停止自動重連（共享連接時只取消本實例的訂閱）"""
+        self.running = False
+        if self.client.ws is not None or self.client.running:
+            self._run(self.client.disconnect(), timeout, default=None)
+    
+    def initialize_orderbook(self, timeout=None):
+        """訂閱深度流並完成本地訂單簿的首次同步"""
+        timeout = timeout or self.DEFAULT_TIMEOUT
+        return self._run(self.client.initialize_orderbook(timeout), timeout + 1)
+    
+    def _subscribe_channel(self, channel):
+        if channel in self.subscriptions:
+            return True
+        return self._run(self.client.subscribe(channel))
+    
+    def subscribe_depth(self):
+        return self._subscribe_channel("depth")
+    
+    def subscribe_bookTicker(self):
+        return self._subscribe_channel("bookTicker")
+    
+    def subscribe_trades(self):
+        return self._subscribe_channel("trade")
+    
+    def private_subscribe(self, stream):
+        """訂閱需要簽名的私有數據流，例如 account.orderUpdate.SOL_USDC"""
+        return self._run(self.client.subscribe_streams([stream], signed=True))
+    
+    def send(self, payload):
+        """在事件循環線程中發送一條 JSON 消息"""
+        return self._run(self._send(payload))
+    
+    async def _send(self, payload):
+        if not self.client.is_connected():
+            return False
+        await self.client.ws.send(json.dumps(payload))
+        return True
+    
+    def on(self, channel, callback):
+        self.client.on(channel, callback)
+    
+    def start_recording(self, directory=TAPE_DIR):
+        """開始錄製行情磁帶（在事件循環線程中切換錄製器）"""
+        return self._run(self._call_in_loop(self.client.start_recording, directory), default=None)
+    
+    def stop_recording(self):
+        return self._run(self._call_in_loop(self.client.stop_recording), default=None)
+    
+    @staticmethod
+    async def _call_in_loop(func, *args):
+        return func(*args)
+    
+    # ------------------------------------------------------------------ 狀態和行情（不阻塞）
+    
+    @property
+    def connected(self):
+        return self.client.connected
+    
+    def is_connected(self):
+        return self.client.is_connected()
+    
+    @property
+    def thread(self):
+        """運行事件循環的線程"""
+        return self.loop_thread._thread
+    
+    @property
+    def ws(self):
+        return self.client.ws
+    
+    @property
+    def subscriptions(self):
+        """已訂閱的數據流：本交易對的公共流只保留頻道名（depth、bookTicker），私有流保留完整名稱"""
+        suffix = f".{self.symbol}"
+        return [
+            stream[:-len(suffix)] if not signed and stream.endswith(suffix) else stream
+            for stream, signed in list(self.client.stream_subscriptions.items())
+        ]
+    
+    @property
+    def snapshot(self) -> MarketSnapshot:
+        return self.client.snapshot
+    
+    @property
+    def bid_price(self):
+        return self.client.snapshot.bid_price
+    
+    @property
+    def ask_price(self):
+        return self.client.snapshot.ask_price
+    
+    @property
+    def last_price(self):
+        return self.client.snapshot.last_price
+    
+    def get_current_price(self):
+        """當前價格：中間價，沒有買賣價時取最近成交價；都沒有時返回 None"""
+        snapshot = self.client.snapshot
+        mid = snapshot.mid
+        return mid if mid is not None else snapshot.last_price
+    
+    def get_bid_ask(self):
+        snapshot = self.client.snapshot
+        return snapshot.bid_price, snapshot.ask_price
+    
+    def get_liquidity_profile(self, pct=DEFAULT_LIQUIDITY_PCT):
+        return self.client.get_liquidity_profile(pct)
+    
+    def get_orderbook(self):
+        """本地訂單簿前 ORDERBOOK_LEVELS 檔 {"bids": [[價格, 數量], ...], "asks": [...]}，未同步時為空"""
+        if not self.client.orderbook.synced:
+            return {"bids": [], "asks": []}
+        bids, asks = self.client.orderbook.get_levels(self.ORDERBOOK_LEVELS)
+        return {"bids": [list(level) for level in bids], "asks": [list(level) for level in asks]}
+    
+    @property
+    def orderbook(self):
+        return self.get_orderbook()
+    
+    @property
+    def price_history(self):
+        return self.client.price_history
+    
+    @property
+    def historical_prices(self):
+        return self.client.historical_prices
+    
+    @property
+    def trade_flow(self):
+        return self.client.trade_flow
+    
+    def get_trade_flow(self, window=60):
+        """指定窗口（秒）的成交流統計 FlowStats，先按當前時間移出過期成交"""
+        return self.client.trade_flow.stats(window, int(time.time() * 1000))
+    
+    @property
+    def reconnecting(self):
+        return self.client.reconnecting
+    
+    @property
+    def data_stale(self):
+        """深度或最優報價流是否已靜默超過閾值（此時快照中的價格不再可靠）"""
+        return self.client.data_stale
+    
+    @property
+    def stale_streams(self):
+        return self.client.stale_streams
+    
+    @property
+    def rtt(self):
+        """最近一次 ping 往返時間（秒），尚未測量時為 None"""
+        return self.client.rtt
+    
+    def get_liveness_stats(self):
+        return self.client.get_liveness_stats()
@@ -0,0 +1,208 @@
+"""
+消息投遞模塊：WebSocket 讀取循環和策略回調之間的有界隊列
+
+讀取循環只負責解析、回應 ping 和更新本地狀態（訂單簿、最優報價），然後把消息放入隊列立即返回；
+回調在獨立的投遞線程中按順序執行，慢回調（例如寫 SQLite）不會拖慢 recv() 和心跳回應。
+"""
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+
+from config import WS_DELIVERY_LAG_WARNING, WS_DELIVERY_QUEUE_SIZE
+from logger import setup_logger
+
+logger = setup_logger("ws_client.delivery")
+
+# 每條路由的隊列策略
+KEEP = "keep"           # 從不丟棄（訂單和成交更新），隊列滿時仍接收並告警
+CONFLATE = "conflate"   # 同一數據流只保留最新一條（深度、最優報價等狀態類數據）
+DROP = "drop"           # 隊列滿時丟棄新消息
+
+DEFAULT_POLICIES: Dict[str, str] = {
+    "account.orderUpdate": KEEP,
+    "depth": CONFLATE,
+    "bookTicker": CONFLATE,
+    "ticker": CONFLATE,
+    "kline": CONFLATE,
+    "trade": DROP,
+    "liveness": KEEP,
+}
+DEFAULT_POLICY = DROP
+LAG_WARNING_INTERVAL = 10.0     # 延遲告警的最短間隔（秒）
+
+
+class _Entry:
+    __slots__ = ("route", "stream", "payload", "enqueued", "merged", "counters", "taken", "sent")
+
+    def __init__(self, route: str, stream: str, payload: Any, enqueued: float, counters: Dict[str, int]):
+        self.route = route
+        self.stream = stream
+        self.payload = payload
+        self.enqueued = enqueued
+        self.merged = 0
+        self.counters = counters
+        self.taken = False      # 投遞線程已取出（在鎖內先標記再讀取負載）
+        self.sent = None        # 取出時的負載
+
+
+class DeliveryQueue:
+    """
+    有界投遞隊列
+
+    put() 在事件循環線程調用，不阻塞；deliver(route, stream, payload) 在投遞線程中逐條調用。
+    合併策略的數據流在隊列中最多佔一個位置：新消息覆蓋尚未投遞的舊消息，保留原來的排隊位置，
+    因此與其他數據流的相對順序不變。capacity 只限制可丟棄的消息，KEEP 消息總是接收。
+    覆蓋尚未取出的條目不需要取鎖，繁忙數據流的大部分消息走這條路徑。
+    """
+
+    def __init__(self, deliver: Callable[[str, str, Any], None], capacity: int = WS_DELIVERY_QUEUE_SIZE,
+                 policies: Optional[Dict[str, str]] = None, name: str = "ws-delivery"):
+        self._deliver = deliver
+        self.capacity = capacity
+        self.policies = dict(DEFAULT_POLICIES if policies is None else policies)
+        self.name = name
+        self._queue: deque = deque()
+        self._pending: Dict[str, _Entry] = {}     # 合併策略：數據流 -> 隊列中尚未投遞的條目
+        self._cond = threading.Condition(threading.Lock())
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._active = False
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self._max_depth = 0
+        self._overflowing = False
+        self._lag_last = 0.0
+        self._lag_max = 0.0
+        self._lag_total = 0.0
+        self._delivered = 0
+        self._last_lag_warning = 0.0
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def _route_counters(self, route: str) -> Dict[str, int]:
+        counters = self._counters.get(route)
+        if counters is None:
+            counters = self._counters[route] = {"enqueued": 0, "delivered": 0, "conflated": 0, "dropped": 0}
+        return counters
+
+    def put(self, route: str, stream: str, payload: Any) -> bool:
+        """放入一條消息，被丟棄時返回 False"""
+        policy = self.policies.get(route, DEFAULT_POLICY)
+        if policy == CONFLATE:
+            entry = self._pending.get(stream)
+            if entry is not None:
+                # 不取鎖直接覆蓋：寫入後條目仍未被取出，則投遞線程之後讀到的一定是新負載
+                entry.payload = payload
+                if not entry.taken:
+                    entry.merged += 1
+                    entry.counters["conflated"] += 1
+                    return True
+                with self._cond:
+                    if entry.sent is payload:
+                        # 投遞線程取出時已經讀到新負載
+                        entry.counters["conflated"] += 1
+                        return True
+        with self._cond:
+            counters = self._route_counters(route)
+            if policy == CONFLATE:
+                entry = self._pending.get(stream)
+                if entry is not None:
+                    entry.payload = payload
+                    entry.merged += 1
+                    counters["conflated"] += 1
+                    return True
+            elif policy == DROP and len(self._queue) >= self.capacity:
+                counters["dropped"] += 1
+                return False
+
+            entry = _Entry(route, stream, payload, time.monotonic(), counters)
+            self._queue.append(entry)
+            if policy == CONFLATE:
+                self._pending[stream] = entry
+            counters["enqueued"] += 1
+            depth = len(self._queue)
+            if depth > self._max_depth:
+                self._max_depth = depth
+            if depth > self.capacity and not self._overflowing:
+                self._overflowing = True
+                logger.warning(f"{self.name} 隊列超過容量 {self.capacity}（保留不可丟棄的消息），回調處理過慢")
+            if self._thread is None or not self._thread.is_alive():
+                self._start()
+            self._cond.notify()
+        return True
+
+    def _start(self):
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._stopping:
+                    self._cond.wait()
+                if not self._queue:
+                    self._thread = None
+                    self._cond.notify_all()
+                    return
+                entry = self._queue.popleft()
+                if self._pending.get(entry.stream) is entry:
+                    del self._pending[entry.stream]
+                entry.taken = True
+                payload = entry.sent = entry.payload
+                if self._overflowing and len(self._queue) <= self.capacity:
+                    self._overflowing = False
+                self._active = True
+
+            lag = time.monotonic() - entry.enqueued
+            self._record_lag(lag, entry)
+            try:
+                self._deliver(entry.route, entry.stream, payload)
+            except Exception as e:
+                logger.error(f"投遞 {entry.stream} 消息出錯: {e}", exc_info=True)
+            finally:
+                with self._cond:
+                    self._active = False
+                    entry.counters["delivered"] += 1
+                    self._cond.notify_all()
+
+    def _record_lag(self, lag: float, entry: _Entry):
+        self._lag_last = lag
+        self._lag_total += lag
+        self._delivered += 1
+        if lag > self._lag_max:
+            self._lag_max = lag
+        if lag > WS_DELIVERY_LAG_WARNING:
+            now = time.monotonic()
+            if now - self._last_lag_warning > LAG_WARNING_INTERVAL:
+                self._last_lag_warning = now
+                logger.warning(f"{self.name} 回調延遲 {lag:.2f} 秒 ({entry.stream})，隊列長度 {len(self._queue)}")
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """等待隊列清空且當前回調執行完畢，超時返回 False（不能在投遞線程中調用）"""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._queue and not self._active, timeout)
+
+    def stop(self):
+        """投遞完剩餘消息後結束投遞線程；之後再 put 會重新啟動"""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+
+    def stats(self) -> Dict:
+        """隊列長度、回調延遲（毫秒）和各路由的入隊、投遞、合併、丟棄數"""
+        with self._cond:
+            delivered = self._delivered
+            return {
+                "depth": len(self._queue),
+                "max_depth": self._max_depth,
+                "capacity": self.capacity,
+                "delivering": self._active,
+                "lag_ms": {
+                    "last": self._lag_last * 1000,
+                    "avg": self._lag_total / delivered * 1000 if delivered else 0.0,
+                    "max": self._lag_max * 1000,
+                },
+                "routes": {route: dict(counters) for route, counters in self._counters.items()},
+            }
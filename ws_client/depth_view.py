@@ -0,0 +1,161 @@
+"""
+深度視圖模塊：訂單簿前 N 檔的 numpy 數組視圖，以及基於它的向量化流動性指標
+"""
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_VIEW_LEVELS = 50            # 數組視圖保留的檔數
+DEFAULT_IMBALANCE_DEPTHS = (1, 5, 10)
+DEFAULT_LIQUIDITY_PCT = 1.0         # 流動性統計的默認價格範圍（中間價的百分比）
+
+
+class DepthView:
+    """
+    訂單簿前 levels 檔的定長數組
+
+    價格和數量各一個 float64 數組，下標 0 為最優價，*_count 之後的元素無效。
+    由 OrderBook 在每次更新後只重寫發生變化的檔位及其之後的部分；
+    讀取方通過 OrderBook.get_depth_view() 拿到一份副本，可以在任意線程使用。
+    """
+
+    __slots__ = ("levels", "bid_prices", "bid_sizes", "ask_prices", "ask_sizes", "bid_count", "ask_count")
+
+    def __init__(self, levels: int = DEFAULT_VIEW_LEVELS):
+        self.levels = levels
+        self.bid_prices = np.zeros(levels)
+        self.bid_sizes = np.zeros(levels)
+        self.ask_prices = np.zeros(levels)
+        self.ask_sizes = np.zeros(levels)
+        self.bid_count = 0
+        self.ask_count = 0
+
+    def write(self, is_bid: bool, start: int, rows: Sequence[Tuple[float, float]], total: int):
+        """
+        從第 start 檔開始寫入 rows
+
+        Args:
+            is_bid: 買側還是賣側
+            start: 第一個發生變化的檔位
+            rows: 從 start 開始的檔位（最多寫到 levels）
+            total: 該側的總檔數
+        """
+        prices, sizes = (self.bid_prices, self.bid_sizes) if is_bid else (self.ask_prices, self.ask_sizes)
+        end = start + len(rows)
+        if rows:
+            block = np.asarray(rows, dtype=np.float64)
+            prices[start:end] = block[:, 0]
+            sizes[start:end] = block[:, 1]
+        count = min(total, self.levels)
+        if end < count:
+            raise ValueError("深度視圖寫入的檔位不完整")
+        previous = self.bid_count if is_bid else self.ask_count
+        if previous > count:
+            prices[count:previous] = 0.0
+            sizes[count:previous] = 0.0
+        if is_bid:
+            self.bid_count = count
+        else:
+            self.ask_count = count
+
+    def clear(self):
+        self.write(True, 0, [], 0)
+        self.write(False, 0, [], 0)
+
+    def copy(self) -> "DepthView":
+        view = DepthView.__new__(DepthView)
+        view.levels = self.levels
+        view.bid_prices = self.bid_prices[:self.bid_count].copy()
+        view.bid_sizes = self.bid_sizes[:self.bid_count].copy()
+        view.ask_prices = self.ask_prices[:self.ask_count].copy()
+        view.ask_sizes = self.ask_sizes[:self.ask_count].copy()
+        view.bid_count = self.bid_count
+        view.ask_count = self.ask_count
+        return view
+
+    @property
+    def mid(self) -> Optional[float]:
+        if not self.bid_count or not self.ask_count:
+            return None
+        return (self.bid_prices[0] + self.ask_prices[0]) / 2
+
+
+def cumulative_depth(view: DepthView) -> Tuple[np.ndarray, np.ndarray]:
+    """買賣兩側從最優價開始的累計數量"""
+    return np.cumsum(view.bid_sizes[:view.bid_count]), np.cumsum(view.ask_sizes[:view.ask_count])
+
+
+def volume_within(view: DepthView, pct: float = DEFAULT_LIQUIDITY_PCT) -> Tuple[float, float]:
+    """價格在中間價 ±pct% 以內的買單量和賣單量"""
+    mid = view.mid
+    if mid is None:
+        return 0.0, 0.0
+    bid_prices = view.bid_prices[:view.bid_count]
+    ask_prices = view.ask_prices[:view.ask_count]
+    # 檔位按價格有序，用 searchsorted 找邊界
+    bid_cut = np.searchsorted(-bid_prices, -mid * (1 - pct / 100), side="right")
+    ask_cut = np.searchsorted(ask_prices, mid * (1 + pct / 100), side="right")
+    return float(view.bid_sizes[:bid_cut].sum()), float(view.ask_sizes[:ask_cut].sum())
+
+
+def imbalance(view: DepthView, depths: Sequence[int] = DEFAULT_IMBALANCE_DEPTHS) -> Dict[int, float]:
+    """前 depth 檔的買賣失衡 (買量 - 賣量) / (買量 + 賣量)，範圍 [-1, 1]"""
+    bid_cum, ask_cum = cumulative_depth(view)
+    result = {}
+    for depth in depths:
+        bid = bid_cum[min(depth, len(bid_cum)) - 1] if len(bid_cum) else 0.0
+        ask = ask_cum[min(depth, len(ask_cum)) - 1] if len(ask_cum) else 0.0
+        total = bid + ask
+        result[depth] = float((bid - ask) / total) if total > 0 else 0.0
+    return result
+
+
+def vwap_for_size(view: DepthView, side: str, size: float) -> Optional[float]:
+    """
+    市價成交 size 數量的平均價格
+
+    Args:
+        side: "Bid" 表示買入（吃賣單），"Ask" 表示賣出（吃買單）
+        size: 成交數量
+
+    Returns:
+        平均成交價；視圖內的深度不足時返回 None
+    """
+    if side == "Bid":
+        prices, sizes = view.ask_prices[:view.ask_count], view.ask_sizes[:view.ask_count]
+    else:
+        prices, sizes = view.bid_prices[:view.bid_count], view.bid_sizes[:view.bid_count]
+    if size <= 0 or not len(sizes):
+        return None
+    cumulative = np.cumsum(sizes)
+    if cumulative[-1] < size:
+        return None
+    last = int(np.searchsorted(cumulative, size, side="left"))
+    filled = sizes[:last + 1].copy()
+    filled[last] -= cumulative[last] - size
+    return float(np.dot(prices[:last + 1], filled) / size)
+
+
+def liquidity_profile(view: DepthView, pct: float = DEFAULT_LIQUIDITY_PCT,
+                      depths: Sequence[int] = DEFAULT_IMBALANCE_DEPTHS) -> Optional[Dict]:
+    """
+    流動性概況
+
+    Returns:
+        bid_volume / ask_volume 為中間價 ±pct% 內的買賣量，imbalance 為二者的失衡度；
+        imbalance_by_depth 為前 N 檔的失衡度。買賣任一側為空時返回 None
+    """
+    mid = view.mid
+    if mid is None:
+        return None
+    bid_volume, ask_volume = volume_within(view, pct)
+    total = bid_volume + ask_volume
+    return {
+        "mid_price": float(mid),
+        "spread": float(view.ask_prices[0] - view.bid_prices[0]),
+        "bid_volume": bid_volume,
+        "ask_volume": ask_volume,
+        "imbalance": (bid_volume - ask_volume) / total if total > 0 else 0.0,
+        "imbalance_by_depth": imbalance(view, depths),
+        "within_pct": pct,
+    }
@@ -0,0 +1,105 @@
+"""
+消息分發模塊：按數據流前綴預編譯路由，每種數據流一個類型化解碼器，並統計各路由的吞吐量
+"""
+import time
+from typing import Any, Callable, Dict, Optional
+
+from config import WS_DISPATCH_TIMING
+from models import BookTicker, DepthDelta, Kline
+
+Decoder = Optional[Callable[[Dict], Any]]
+
+# 路由名 -> 解碼器（None 表示直接傳遞原始字典）
+DEFAULT_DECODERS: Dict[str, Decoder] = {
+    "depth": DepthDelta.from_ws,
+    "bookTicker": BookTicker.from_ws,
+    "kline": Kline.from_ws,
+    "trade": None,
+    "ticker": None,
+    "account.orderUpdate": None,
+}
+
+
+def route_key(stream: str) -> str:
+    """
+    數據流名稱對應的路由名
+
+    depth.SOL_USDC -> depth，kline.1m.SOL_USDC -> kline，
+    account.orderUpdate.SOL_USDC -> account.orderUpdate
+    """
+    head, _, rest = stream.partition(".")
+    if head == "account":
+        return f"account.{rest.partition('.')[0]}"
+    return head
+
+
+class Route:
+    """一條路由：名稱、解碼器和吞吐量計數"""
+
+    __slots__ = ("name", "decoder", "messages", "bytes", "decode_seconds", "handle_seconds")
+
+    def __init__(self, name: str, decoder: Decoder):
+        self.name = name
+        self.decoder = decoder
+        self.messages = 0
+        self.bytes = 0
+        self.decode_seconds = 0.0
+        self.handle_seconds = 0.0
+
+    def decode(self, data: Dict):
+        return data if self.decoder is None else self.decoder(data)
+
+
+class StreamRouter:
+    """
+    數據流路由表
+
+    每個完整的數據流名稱第一次出現時解析一次路由並緩存，之後每條消息只需一次字典查找，
+    不再逐個做 startswith 判斷。未知的數據流緩存為 None。
+    timing 為 True 時分發方額外統計解碼和處理耗時。
+    """
+
+    def __init__(self, decoders: Optional[Dict[str, Decoder]] = None, timing: bool = WS_DISPATCH_TIMING):
+        self.routes: Dict[str, Route] = {
+            name: Route(name, decoder) for name, decoder in (decoders or DEFAULT_DECODERS).items()
+        }
+        self.timing = timing
+        self._by_stream: Dict[str, Optional[Route]] = {}
+        self._started = time.monotonic()
+
+    def register(self, name: str, decoder: Decoder = None) -> Route:
+        """新增或替換一條路由"""
+        route = Route(name, decoder)
+        self.routes[name] = route
+        self._by_stream.clear()
+        return route
+
+    def route(self, stream: str) -> Optional[Route]:
+        try:
+            return self._by_stream[stream]
+        except KeyError:
+            route = self._by_stream[stream] = self.routes.get(route_key(stream))
+            return route
+
+    def stats(self) -> Dict:
+        """各路由的消息數、字節數和消息速率；開啟計時時另有平均解碼/處理耗時（微秒）"""
+        elapsed = max(time.monotonic() - self._started, 1e-9)
+        routes = {}
+        for name, route in self.routes.items():
+            if not route.messages:
+                continue
+            routes[name] = {
+                "messages": route.messages,
+                "bytes": route.bytes,
+                "per_second": route.messages / elapsed,
+            }
+            if self.timing:
+                routes[name]["decode_us"] = route.decode_seconds / route.messages * 1e6
+                routes[name]["handle_us"] = route.handle_seconds / route.messages * 1e6
+        return {"routes": routes}
+
+    def reset_stats(self):
+        for route in self.routes.values():
+            route.messages = route.bytes = 0
+            route.decode_seconds = route.handle_seconds = 0.0
+        self._started = time.monotonic()
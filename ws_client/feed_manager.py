@@ -0,0 +1,414 @@
+"""
+數據流多路復用模塊：一個公共連接和一個私有連接服務所有交易對和策略，按引用計數訂閱數據流
+"""
+import asyncio
+import json
+import threading
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from api.loop_thread import get_loop_thread
+from logger import setup_logger
+from ws_client.client import BackpackWebSocketClient
+from ws_client.dispatch import route_key
+
+logger = setup_logger("ws_client.feed_manager")
+
+DEFAULT_SUBSCRIBE_TIMEOUT = 10      # 同步訂閱接口等待連接和訂閱完成的最長時間（秒）
+PRIVATE_PREFIX = "account."         # 私有數據流前綴，需要簽名並走私有連接
+
+Handler = Callable[[str, Dict], Union[None, Awaitable[None]]]
+
+
+class Subscription:
+    """一次訂閱的句柄，用於取消訂閱"""
+
+    __slots__ = ("stream", "handler", "is_async")
+
+    def __init__(self, stream: str, handler: Handler):
+        self.stream = stream
+        self.handler = handler
+        self.is_async = asyncio.iscoroutinefunction(handler)
+
+    def __repr__(self):
+        return f"Subscription({self.stream} -> {getattr(self.handler, '__qualname__', self.handler)})"
+
+
+class _SharedConnection(BackpackWebSocketClient):
+    """
+    FeedManager 持有的公共或私有連接
+
+    數據流消息在讀取循環中直接交給管理器分發：本連接不解碼，也不經投遞隊列，因此處理函數收到每一條
+    深度增量（投遞隊列會合併深度消息，本地訂單簿不能跳過增量）。重連恢復訂閱和存活檢測的通知轉給
+    管理器上的各 FeedClient。
+    """
+
+    def __init__(self, manager: "FeedManager", private: bool):
+        super().__init__(manager.api_key, manager.secret_key, None)
+        self.manager = manager
+        self.private = private
+
+    def _dispatch_stream(self, stream, event_data, size=0):
+        self.liveness.on_message(stream)
+        if self.reconnector.awaiting_data:
+            self.reconnector.on_data(stream)
+        self.manager._dispatch(stream, event_data)
+
+    async def _replay_subscriptions(self):
+        await super()._replay_subscriptions()
+        for client in self.manager.clients():
+            client._on_feed_reconnected(self.private)
+
+    def _on_liveness_change(self, event):
+        for client in self.manager.clients():
+            client._on_liveness_change(event)
+
+
+class FeedManager:
+    """
+    共享的數據流管理器
+
+    每個數據流（例如 depth.SOL_USDC、account.orderUpdate）只在交易所訂閱一次：
+    第一個處理函數註冊時發送 SUBSCRIBE，最後一個取消時發送 UNSUBSCRIBE。
+    收到的消息按數據流名稱查表分發給所有處理函數 handler(stream, data)：
+    同步處理函數在共享連接的讀取循環中（事件循環線程）直接調用，每條消息都會收到、不合併，
+    因此必須是不阻塞的輕量處理（FeedClient 只解碼和更新本地狀態，策略回調經其自身的投遞隊列執行）；
+    協程處理函數提交到事件循環執行。
+
+    所有連接都運行在共享的後台事件循環上，subscribe / unsubscribe 可以在任意線程調用。
+    """
+
+    def __init__(self, api_key: Optional[str] = None, secret_key: Optional[str] = None, loop_thread=None):
+        self.api_key = api_key
+        self.secret_key = secret_key
+        self.loop_thread = loop_thread or get_loop_thread()
+        self._connections: Dict[bool, BackpackWebSocketClient] = {}
+        self._connecting: Dict[bool, asyncio.Future] = {}
+        # 數據流 -> 處理函數元組；分發時直接遍歷元組，註冊和取消時整體替換
+        self._handlers: Dict[str, Tuple[Subscription, ...]] = {}
+        # 正在向交易所訂閱的數據流，同時註冊的其他處理函數等待其結果
+        self._subscribing: Dict[str, asyncio.Future] = {}
+        self._dispatched: Dict[str, int] = {}
+        # 使用共享連接的 FeedClient，接收重連和數據失效通知
+        self._clients: Dict[int, "FeedClient"] = {}
+
+    @staticmethod
+    def is_private(stream: str) -> bool:
+        return stream.startswith(PRIVATE_PREFIX)
+
+    async def _connection(self, private: bool) -> Optional[BackpackWebSocketClient]:
+        """獲取（必要時建立）公共或私有連接，並發調用只建立一次"""
+        conn = self._connections.get(private)
+        if conn is not None and (conn.is_connected() or conn.reconnecting):
+            # 已建立的連接斷線時由其自身的重連邏輯恢復
+            return conn
+        pending = self._connecting.get(private)
+        if pending is not None:
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._connecting[private] = future
+        try:
+            if conn is not None:
+                # 重連管理器已放棄：重新建立連接並恢復全部訂閱，失敗時由下一次調用再試
+                logger.warning(f"{'私有' if private else '公共'}數據流連接已斷開且不在重連，重新建立")
+                await conn._close_transport()
+                if await conn.connect():
+                    await conn._replay_subscriptions()
+            else:
+                if private and not (self.api_key and self.secret_key):
+                    raise ValueError("私有數據流需要 API 密鑰")
+                conn = _SharedConnection(self, private)
+                if not await conn.connect():
+                    conn = None
+                else:
+                    self._connections[private] = conn
+                    logger.info(f"{'私有' if private else '公共'}數據流連接已建立")
+            future.set_result(conn)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            self._connecting.pop(private, None)
+        return conn
+
+    def connection(self, private: bool = False) -> Optional[BackpackWebSocketClient]:
+        """已建立的公共或私有連接，尚未建立時為 None"""
+        return self._connections.get(private)
+
+    def attach(self, client: "FeedClient"):
+        self._clients[id(client)] = client
+
+    def detach(self, client: "FeedClient"):
+        self._clients.pop(id(client), None)
+
+    def clients(self) -> List["FeedClient"]:
+        return list(self._clients.values())
+
+    def _dispatch(self, stream: str, data: Dict):
+        handlers = self._handlers.get(stream)
+        if not handlers:
+            return
+        self._dispatched[stream] = self._dispatched.get(stream, 0) + 1
+        for sub in handlers:
+            try:
+                if sub.is_async:
+                    self.loop_thread.submit(sub.handler(stream, data))
+                else:
+                    sub.handler(stream, data)
+            except Exception as e:
+                logger.error(f"處理 {stream} 消息出錯 ({sub}): {e}", exc_info=True)
+
+    # ------------------------------------------------------------------ 異步接口（事件循環線程）
+
+    async def connect_async(self, private: bool = False) -> Optional[BackpackWebSocketClient]:
+        """建立（或獲取）公共或私有連接，失敗返回 None"""
+        try:
+            return await self._connection(private)
+        except Exception as e:
+            logger.error(f"建立{'私有' if private else '公共'}數據流連接失敗: {e}")
+            return None
+
+    async def subscribe_async(self, stream: str, handler: Handler,
+                              stale_after: Optional[float] = None) -> Optional[Subscription]:
+        """
+        註冊處理函數，數據流尚未訂閱時向交易所訂閱；失敗返回 None
+
+        stale_after 不為空時設置該數據流在共享連接上的靜默閾值（秒）。
+        """
+        sub = Subscription(stream, handler)
+        existing = self._handlers.get(stream, ())
+        self._handlers[stream] = existing + (sub,)
+        if existing:
+            pending = self._subscribing.get(stream)
+            if pending is not None and not await asyncio.shield(pending):
+                self._remove(sub)
+                return None
+            conn = self._connections.get(self.is_private(stream))
+            if conn is not None and stale_after is not None:
+                conn.liveness.set_threshold(stream, stale_after)
+            return sub
+
+        future = asyncio.get_running_loop().create_future()
+        self._subscribing[stream] = future
+        private = self.is_private(stream)
+        try:
+            conn = await self._connection(private)
+            if conn is not None and stale_after is not None:
+                conn.liveness.set_threshold(stream, stale_after)
+            ok = conn is not None and await conn.subscribe_streams([stream], signed=private)
+        except Exception as e:
+            logger.error(f"訂閱 {stream} 失敗: {e}")
+            ok = False
+        finally:
+            self._subscribing.pop(stream, None)
+        future.set_result(ok)
+        if not ok:
+            self._remove(sub)
+            return None
+        logger.info(f"已訂閱數據流: {stream}")
+        return sub
+
+    async def unsubscribe_async(self, sub: Subscription):
+        """取消一個處理函數，數據流沒有其他處理函數時向交易所取消訂閱"""
+        if not self._remove(sub) or sub.stream in self._handlers:
+            return
+        conn = self._connections.get(self.is_private(sub.stream))
+        if conn is not None:
+            await conn.unsubscribe_streams([sub.stream])
+        logger.info(f"已取消訂閱數據流: {sub.stream}")
+
+    def _remove(self, sub: Subscription) -> bool:
+        handlers = self._handlers.get(sub.stream, ())
+        if sub not in handlers:
+            return False
+        remaining = tuple(h for h in handlers if h is not sub)
+        if remaining:
+            self._handlers[sub.stream] = remaining
+        else:
+            del self._handlers[sub.stream]
+        return True
+
+    async def close_async(self):
+        self._handlers.clear()
+        self._clients.clear()
+        for conn in list(self._connections.values()):
+            await conn.disconnect()
+        self._connections.clear()
+
+    # ------------------------------------------------------------------ 同步接口（任意線程）
+
+    def _run(self, coro, timeout: float):
+        if self.loop_thread.in_loop_thread():
+            raise RuntimeError("事件循環線程中請使用異步接口")
+        return self.loop_thread.run(coro, timeout)
+
+    def subscribe(self, stream: str, handler: Handler,
+                  timeout: float = DEFAULT_SUBSCRIBE_TIMEOUT) -> Optional[Subscription]:
+        return self._run(self.subscribe_async(stream, handler), timeout)
+
+    def unsubscribe(self, sub: Subscription, timeout: float = DEFAULT_SUBSCRIBE_TIMEOUT):
+        return self._run(self.unsubscribe_async(sub), timeout)
+
+    def close(self, timeout: float = DEFAULT_SUBSCRIBE_TIMEOUT):
+        return self._run(self.close_async(), timeout)
+
+    def stats(self) -> Dict:
+        """各數據流的處理函數數和已分發消息數，以及連接狀態"""
+        return {
+            "streams": {
+                stream: {"handlers": len(handlers), "dispatched": self._dispatched.get(stream, 0)}
+                for stream, handlers in list(self._handlers.items())
+            },
+            "connections": {
+                ("private" if private else "public"): conn.connected
+                for private, conn in list(self._connections.items())
+            },
+            "clients": len(self._clients),
+        }
+
+
+class FeedClient(BackpackWebSocketClient):
+    """
+    單個交易對在 FeedManager 共享連接上的行情客戶端
+
+    訂單簿、最優報價、快照、價格歷史和成交流與 BackpackWebSocketClient 相同，只是不持有連接：
+    subscribe_streams 向管理器註冊處理函數（按引用計數訂閱），共享連接在讀取循環中把本實例數據流的
+    每一條消息交給 _handle_stream；回調和 stream_handler 照常經本實例的投遞隊列執行。
+    connected / ws、重連和存活檢測反映共享連接的狀態，disconnect 只取消本實例的訂閱。
+    stale_after 按完整數據流名稱或路由給出本實例數據流的靜默閾值，設置在共享連接的存活檢測上。
+    """
+
+    def __init__(self, manager: FeedManager, symbol: str, logger=None, stale_after: Optional[Dict[str, float]] = None):
+        self.manager = manager
+        super().__init__(manager.api_key, manager.secret_key, symbol, logger=logger)
+        self.stale_overrides = dict(stale_after or {})
+        self._feed_subscriptions: Dict[str, Subscription] = {}
+
+    # 連接由管理器持有，基類初始化時對 ws / connected 的賦值忽略
+    @property
+    def ws(self):
+        conn = self.manager.connection(False)
+        return conn.ws if conn is not None else None
+
+    @ws.setter
+    def ws(self, value):
+        pass
+
+    @property
+    def connected(self):
+        conn = self.manager.connection(False)
+        return conn is not None and conn.connected
+
+    @connected.setter
+    def connected(self, value):
+        pass
+
+    def _shared_connections(self) -> List[BackpackWebSocketClient]:
+        return [conn for conn in (self.manager.connection(False), self.manager.connection(True)) if conn is not None]
+
+    @property
+    def reconnecting(self):
+        return any(conn.reconnecting for conn in self._shared_connections())
+
+    def get_reconnect_stats(self):
+        conn = self.manager.connection(False)
+        return conn.get_reconnect_stats() if conn is not None else self.reconnector.stats()
+
+    def get_liveness_stats(self):
+        conn = self.manager.connection(False)
+        return conn.get_liveness_stats() if conn is not None else self.liveness.stats()
+
+    @property
+    def data_stale(self):
+        streams = list(self.stream_subscriptions)
+        return any(conn.liveness.is_stale(streams=streams) for conn in self._shared_connections())
+
+    @property
+    def stale_streams(self):
+        mine = self.stream_subscriptions
+        return [stream for conn in self._shared_connections()
+                for stream in list(conn.liveness.stale_streams) if stream in mine]
+
+    @property
+    def rtt(self):
+        conn = self.manager.connection(False)
+        return conn.liveness.rtt if conn is not None else None
+
+    def _on_liveness_change(self, event):
+        # 公共和私有連接的通知都會到達，按兩個連接上本實例的失效數據流合併判斷
+        self._notify_stale(self.stale_streams, event["reason"])
+
+    async def connect(self):
+        """確保共享公共連接已建立"""
+        self.running = True
+        self.manager.attach(self)
+        return await self.manager.connect_async(False) is not None
+
+    async def disconnect(self):
+        """取消本實例的全部訂閱，共享連接保持打開"""
+        self.running = False
+        self.delivery.stop()
+        self.stop_recording()
+        for sub in list(self._feed_subscriptions.values()):
+            await self.manager.unsubscribe_async(sub)
+        self._feed_subscriptions.clear()
+        self.stream_subscriptions.clear()
+        self.manager.detach(self)
+
+    def _threshold(self, stream: str) -> Optional[float]:
+        threshold = self.stale_overrides.get(stream)
+        if threshold is None:
+            threshold = self.stale_overrides.get(route_key(stream))
+        return threshold
+
+    async def subscribe_streams(self, streams, signed=False):
+        """向管理器註冊本實例的數據流（私有數據流由管理器走私有連接並簽名，signed 參數不再需要）"""
+        self.running = True
+        self.manager.attach(self)
+        for stream in streams:
+            if stream in self._feed_subscriptions:
+                continue
+            sub = await self.manager.subscribe_async(stream, self._on_feed_message, self._threshold(stream))
+            if sub is None:
+                self.logger.error(f"訂閱失敗: {stream}")
+                return False
+            self._feed_subscriptions[stream] = sub
+            self.stream_subscriptions[stream] = self.manager.is_private(stream)
+        return True
+
+    async def unsubscribe_streams(self, streams):
+        for stream in streams:
+            self.stream_subscriptions.pop(stream, None)
+            sub = self._feed_subscriptions.pop(stream, None)
+            if sub is not None:
+                await self.manager.unsubscribe_async(sub)
+        return True
+
+    def _on_feed_message(self, stream: str, data: Dict):
+        """共享連接的讀取循環中調用，收到本實例數據流的每一條消息"""
+        if self.recorder is not None:
+            self.recorder.record(stream, json.dumps({"stream": stream, "data": data}), time.time_ns())
+        self._handle_stream(stream, data)
+
+    def _on_feed_reconnected(self, private: bool):
+        """共享連接重連並恢復訂閱後調用：斷線期間的深度增量已丟失，訂單簿重新走快照流程"""
+        if not private and f"depth.{self.symbol}" in self.stream_subscriptions:
+            self.orderbook.reset()
+            self.orderbook.request_resync()
+
+
+_feed_managers: Dict[Optional[str], FeedManager] = {}
+_feed_managers_lock = threading.Lock()
+
+
+def get_feed_manager(api_key: Optional[str] = None, secret_key: Optional[str] = None) -> FeedManager:
+    """獲取進程內共享的數據流管理器（每個 API 密鑰一個，只用公共流時不需要密鑰）"""
+    manager = _feed_managers.get(api_key)
+    if manager is None:
+        with _feed_managers_lock:
+            manager = _feed_managers.get(api_key)
+            if manager is None:
+                manager = FeedManager(api_key, secret_key)
+                _feed_managers[api_key] = manager
+    return manager
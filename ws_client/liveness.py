@@ -0,0 +1,260 @@
+"""
+存活檢測模塊：記錄每個數據流最後一條消息的時間，定期 ping 測量應用層往返時間；
+只有 pong 超時才判定連接失效並觸發重連，數據流靜默時先用 ping 確認連接，確認不了才判定數據失效
+"""
+import asyncio
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+
+from config import WS_LIVENESS_INTERVAL, WS_PING_INTERVAL, WS_PING_TIMEOUT, WS_STALE_AFTER
+from logger import setup_logger
+from ws_client.dispatch import route_key
+
+logger = setup_logger("ws_client.liveness")
+
+LIVENESS_ROUTE = "liveness"         # 數據失效/恢復通知在投遞隊列和回調中使用的路由名
+RTT_SMOOTHING = 0.2                 # 往返時間指數平均的權重
+
+
+class LivenessMonitor:
+    """
+    單個 BackpackWebSocketClient 的存活檢測
+
+    Backpack 的深度和最優報價只在變化時推送，行情清淡時數據流長時間靜默是正常的，
+    靜默本身不能說明連接已失效。因此：
+    1. 數據流的靜默時間從最後一條消息和最後一次 pong 中較晚的一個算起（pong 證明連接在此刻仍然正常，
+       之前沒有收到的只是沒有發生的變化）
+    2. 靜默超過閾值時立即發送一次 ping；收到 pong 即重新計時，數據不算失效
+    3. 靜默超過 閾值 + ping_timeout 仍未得到 pong 時判定數據失效，通知策略暫停報價
+    4. 只有 pong 超時才中止底層連接交給重連管理器；仍能回應 ping 的連接不會因為靜默被斷開
+    失效的數據流收到新消息或連接回應 pong 後恢復。
+    失效集合每次變化時調用 on_change({"stale", "streams", "reason"})，streams 為當前全部失效的數據流；
+    共享連接上各訂閱方只關心自己的數據流，由訂閱方自行判斷是否由正常變為失效或反之。
+
+    閾值按路由（"depth"）或完整數據流名稱（"depth.SOL_USDC"，優先）配置，見 config.WS_STALE_AFTER。
+    on_message 在讀取循環中對每條數據流消息調用，只記錄時間；run() 作為客戶端的心跳任務運行
+    （跨越重連，直到主動斷開）。
+    """
+
+    def __init__(self, client, stale_after: Optional[Dict[str, float]] = None,
+                 check_interval: float = WS_LIVENESS_INTERVAL, ping_interval: float = WS_PING_INTERVAL,
+                 ping_timeout: float = WS_PING_TIMEOUT, on_change: Optional[Callable[[Dict], None]] = None):
+        self.client = client
+        self.stale_after = dict(WS_STALE_AFTER if stale_after is None else stale_after)
+        self.check_interval = check_interval
+        self.ping_interval = ping_interval
+        self.ping_timeout = ping_timeout
+        self.on_change = on_change
+        self.last_seen: Dict[str, float] = {}           # 數據流 -> 最後一條消息（或訂閱）的 monotonic 時間
+        self.last_message: Optional[float] = None
+        self.last_pong: Optional[float] = None          # 最近一次收到 pong 的 monotonic 時間
+        self._watched: Dict[str, float] = {}            # 有靜默閾值的數據流 -> 閾值（秒）
+        self.stale_streams: Dict[str, float] = {}       # 已判定失效的數據流 -> 判定時間
+        self.rtt: Optional[float] = None                # 最近一次往返時間（秒）
+        self.rtt_avg: Optional[float] = None
+        self.rtt_max = 0.0
+        self._last_ping: Optional[float] = None
+        self._ping_task: Optional[asyncio.Task] = None
+        self._stats = {"pings": 0, "ping_timeouts": 0, "silence_probes": 0, "stale_events": 0,
+                       "recoveries": 0, "reconnects_triggered": 0}
+
+    def threshold(self, stream: str) -> Optional[float]:
+        """數據流的靜默閾值：完整數據流名稱的配置優先，其次是路由的配置；沒有配置時為 None（不判定）"""
+        threshold = self.stale_after.get(stream)
+        if threshold is None:
+            threshold = self.stale_after.get(route_key(stream))
+        return threshold or None
+
+    # ------------------------------------------------------------------ 事件循環線程
+
+    def set_threshold(self, stream: str, seconds: float):
+        """為單個數據流設置靜默閾值（覆蓋路由的配置），已訂閱的數據流立即生效"""
+        self.stale_after[stream] = seconds
+        if stream in self.last_seen:
+            if seconds:
+                self._watched[stream] = seconds
+            else:
+                self._watched.pop(stream, None)
+
+    def watch(self, stream: str):
+        """訂閱（或重新訂閱）數據流時調用，從此刻開始計算靜默時間"""
+        self.last_seen[stream] = time.monotonic()
+        threshold = self.threshold(stream)
+        if threshold:
+            self._watched[stream] = threshold
+
+    def unwatch(self, stream: str):
+        self._watched.pop(stream, None)
+        self.last_seen.pop(stream, None)
+        if self.stale_streams.pop(stream, None) is not None:
+            self._notify(f"取消訂閱 {stream}")
+
+    def on_message(self, stream: str):
+        now = time.monotonic()
+        self.last_seen[stream] = now
+        self.last_message = now
+        if self.stale_streams and stream in self.stale_streams:
+            since = self.stale_streams.pop(stream)
+            self._stats["recoveries"] += 1
+            logger.info(f"{stream} 恢復推送，失效 {now - since:.2f} 秒")
+            self._notify(f"{stream} 恢復推送")
+
+    async def run(self):
+        """心跳循環，客戶端 running 為 False 時結束"""
+        client = self.client
+        try:
+            while client.running:
+                await asyncio.sleep(self.check_interval)
+                now = time.monotonic()
+                self.check(now)
+                if not client.connected or client.reconnecting or not self.ping_interval:
+                    continue
+                if self._ping_task is not None and not self._ping_task.done():
+                    continue
+                silent = self.silent(now)
+                if silent:
+                    # 靜默的數據流先確認連接：收到 pong 說明只是沒有變化
+                    self._stats["silence_probes"] += 1
+                    logger.debug("數據流靜默 %s，發送 ping 確認連接", silent)
+                elif self._last_ping is not None and now - self._last_ping < self.ping_interval:
+                    continue
+                # 等待 pong 期間靜默檢查照常進行
+                self._last_ping = now
+                self._ping_task = asyncio.get_running_loop().create_task(self._probe())
+        finally:
+            if self._ping_task is not None:
+                self._ping_task.cancel()
+            logger.debug("心跳任務結束")
+
+    async def _probe(self):
+        client = self.client
+        ws = client.ws
+        if await self.ping():
+            self._recover_on_pong()
+        elif client.ws is ws and client.connected and not client.reconnecting:
+            self._trigger_reconnect(f"{self.ping_timeout} 秒內未收到 pong")
+
+    def _silence(self, stream: str, now: float) -> float:
+        seen = self.last_seen.get(stream, now)
+        last_pong = self.last_pong
+        return now - (seen if last_pong is None or seen > last_pong else last_pong)
+
+    def silent(self, now: Optional[float] = None) -> List[str]:
+        """自最後一條消息和最後一次 pong 起靜默已超過閾值的數據流"""
+        now = time.monotonic() if now is None else now
+        return [stream for stream, threshold in self._watched.items() if self._silence(stream, now) > threshold]
+
+    def check(self, now: Optional[float] = None) -> List[str]:
+        """判定靜默超過 閾值 + ping_timeout（期間沒有得到 pong）的數據流為失效，返回本次新判定的數據流"""
+        now = time.monotonic() if now is None else now
+        newly_stale = [
+            stream for stream, threshold in self._watched.items()
+            if stream not in self.stale_streams and self._silence(stream, now) > threshold + self.ping_timeout
+        ]
+        if newly_stale:
+            for stream in newly_stale:
+                self.stale_streams[stream] = now
+            self._stats["stale_events"] += len(newly_stale)
+            logger.warning(f"數據流失效（靜默且連接未回應 ping）: {newly_stale}")
+            self._notify(f"數據流靜默: {', '.join(newly_stale)}")
+        return newly_stale
+
+    def _recover_on_pong(self):
+        """連接回應了 pong：已失效的數據流只是沒有變化，恢復"""
+        if not self.stale_streams:
+            return
+        recovered = list(self.stale_streams)
+        self.stale_streams.clear()
+        self._stats["recoveries"] += len(recovered)
+        logger.info(f"連接回應 pong，數據流恢復: {recovered}")
+        self._notify("連接回應 pong")
+
+    async def ping(self) -> bool:
+        """發送一次 ping 並等待 pong，記錄往返時間；超時或連接不可用時返回 False"""
+        ws = self.client.ws
+        if ws is None or ws.state.name != "OPEN":
+            return False
+        started = time.monotonic()
+        try:
+            waiter = await ws.ping()
+            await asyncio.wait_for(waiter, self.ping_timeout)
+        except asyncio.TimeoutError:
+            self._stats["ping_timeouts"] += 1
+            logger.warning(f"ping 超時（{self.ping_timeout} 秒）")
+            return False
+        except Exception as e:
+            logger.debug("ping 失敗: %s", e)
+            return False
+        now = time.monotonic()
+        rtt = now - started
+        self.last_pong = now
+        self._stats["pings"] += 1
+        self.rtt = rtt
+        self.rtt_avg = rtt if self.rtt_avg is None else self.rtt_avg + RTT_SMOOTHING * (rtt - self.rtt_avg)
+        if rtt > self.rtt_max:
+            self.rtt_max = rtt
+        return True
+
+    def _trigger_reconnect(self, reason: str):
+        """中止底層連接（不等待關閉握手，失效的連接上握手可能永遠收不到回應）並交給重連管理器"""
+        client = self.client
+        if not client.auto_reconnect:
+            return
+        self._stats["reconnects_triggered"] += 1
+        logger.warning(f"存活檢測觸發重連: {reason}")
+        client.reconnector.on_disconnect(reason)
+        transport = getattr(client.ws, "transport", None)
+        if transport is not None:
+            transport.abort()
+
+    def _notify(self, reason: str):
+        if self.on_change is None:
+            return
+        try:
+            self.on_change({"stale": bool(self.stale_streams), "streams": list(self.stale_streams), "reason": reason})
+        except Exception as e:
+            logger.error(f"數據失效通知出錯: {e}", exc_info=True)
+
+    # ------------------------------------------------------------------ 任意線程（只讀）
+
+    def is_stale(self, now: Optional[float] = None, streams: Optional[Iterable[str]] = None) -> bool:
+        """
+        是否有數據流已失效，或靜默已超過 閾值 + ping_timeout（斷線期間檢查任務未判定時也按時間計算）
+
+        streams 不為空時只看其中的數據流（共享連接上的單個訂閱方）。
+        """
+        now = time.monotonic() if now is None else now
+        timeout = self.ping_timeout
+        if streams is None:
+            if self.stale_streams:
+                return True
+            watched = list(self._watched.items())
+        else:
+            streams = list(streams)
+            if any(stream in self.stale_streams for stream in streams):
+                return True
+            thresholds = self._watched
+            watched = [(stream, thresholds.get(stream)) for stream in streams]
+            watched = [(stream, threshold) for stream, threshold in watched if threshold]
+        return any(self._silence(stream, now) > threshold + timeout for stream, threshold in watched)
+
+    def ages(self) -> Dict[str, float]:
+        """各數據流距最後一條消息（或訂閱）的秒數"""
+        now = time.monotonic()
+        return {stream: now - seen for stream, seen in list(self.last_seen.items())}
+
+    def stats(self) -> Dict:
+        """各數據流靜默時間、失效數據流、往返時間（毫秒）和計數"""
+        now = time.monotonic()
+        return {
+            **self._stats,
+            "stale": self.is_stale(now),
+            "stale_streams": list(self.stale_streams),
+            "ages": self.ages(),
+            "last_pong_age": now - self.last_pong if self.last_pong is not None else None,
+            "rtt_ms": {
+                "last": self.rtt * 1000 if self.rtt is not None else None,
+                "avg": self.rtt_avg * 1000 if self.rtt_avg is not None else None,
+                "max": self.rtt_max * 1000,
+            },
+        }
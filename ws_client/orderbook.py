@@ -0,0 +1,336 @@
+"""
+本地訂單簿模塊：REST 快照 + 緩存的深度增量，按更新ID檢查連續性，出現缺口時自動重新同步
+"""
+import asyncio
+import bisect
+import threading
+from collections import deque
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from api.client import get_client
+from logger import setup_logger
+from models import DepthDelta
+from ws_client.depth_view import DEFAULT_LIQUIDITY_PCT, DEFAULT_VIEW_LEVELS, DepthView, liquidity_profile
+
+logger = setup_logger("ws_client.orderbook")
+
+Level = Tuple[float, float]
+
+MAX_BUFFERED_DELTAS = 2000      # 未同步期間緩存的增量上限，超出時丟棄最早的（快照會覆蓋它們）
+RESYNC_DELAY = 0.5              # 快照仍早於緩存增量或請求失敗時的首次重試等待（秒）
+MAX_RESYNC_DELAY = 10.0         # 重試等待上限（秒）
+
+
+class BookSide:
+    """
+    訂單簿的一側：有序價格列表 + 價格到數量的映射
+
+    價格以升序鍵存儲，買側取反，使下標 0 總是最優價；檔位查找為二分查找。
+    """
+
+    __slots__ = ("descending", "_keys", "sizes")
+
+    def __init__(self, descending: bool):
+        self.descending = descending
+        self._keys: List[float] = []
+        self.sizes: Dict[float, float] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def clear(self):
+        self._keys.clear()
+        self.sizes.clear()
+
+    def load(self, levels: Sequence[Level]):
+        """用快照替換整側"""
+        self.sizes = {price: quantity for price, quantity in levels if quantity > 0}
+        self._keys = sorted(-price if self.descending else price for price in self.sizes)
+
+    def set(self, price: float, quantity: float) -> Optional[int]:
+        """
+        設置某檔的絕對數量，0 表示刪除
+
+        Returns:
+            發生變化的檔位序號（0 為最優價）；刪除不存在的檔位時返回 None
+        """
+        key = -price if self.descending else price
+        if quantity > 0:
+            index = bisect.bisect_left(self._keys, key)
+            if price not in self.sizes:
+                self._keys.insert(index, key)
+            self.sizes[price] = quantity
+            return index
+        if self.sizes.pop(price, None) is not None:
+            index = bisect.bisect_left(self._keys, key)
+            del self._keys[index]
+            return index
+        return None
+
+    def best(self) -> Optional[Level]:
+        if not self._keys:
+            return None
+        price = -self._keys[0] if self.descending else self._keys[0]
+        return price, self.sizes[price]
+
+    def levels(self, depth: Optional[int] = None, start: int = 0) -> List[Level]:
+        """第 start 檔到第 depth 檔（不含），默認從最優價開始"""
+        keys = self._keys[start:] if depth is None else self._keys[start:depth]
+        sign = -1 if self.descending else 1
+        return [(sign * key, self.sizes[sign * key]) for key in keys]
+
+
+class OrderBook:
+    """
+    L2 本地訂單簿
+
+    同步流程：先訂閱深度流，增量進入緩存；再拉取 REST 快照，丟棄早於快照的增量，
+    其餘增量按順序應用。之後每條增量的首個更新ID必須緊接上一條的最後ID，
+    出現缺口或買賣價交叉時標記為未同步並在後台重新拉取快照。
+
+    寫入在事件循環線程，讀取可以在任意線程：最優買賣價在每次更新後作為一個元組整體替換，
+    get_bid_ask 無需加鎖；讀取多檔時持有鎖。
+
+    同時維護前 view_levels 檔的 numpy 視圖（DepthView），每次更新只重寫
+    從變化的最優檔位開始的部分，變化全部在視圖之外時不重寫。
+    """
+
+    def __init__(self, symbol: str, client=None, on_update: Optional[Callable[["OrderBook"], None]] = None,
+                 view_levels: int = DEFAULT_VIEW_LEVELS):
+        self.symbol = symbol
+        self._client = client
+        self.on_update = on_update
+        # 每份拉取到的快照在應用前交給此回調（行情磁帶錄製用）
+        self.on_snapshot: Optional[Callable[[Dict], None]] = None
+        # 為 False 時不自動拉取快照（回放磁帶時快照來自錄製內容）
+        self.auto_resync = True
+        self.bids = BookSide(descending=True)
+        self.asks = BookSide(descending=False)
+        self.depth_view = DepthView(view_levels)
+        self.last_update_id = 0
+        self.synced = False
+        self._buffer: deque = deque(maxlen=MAX_BUFFERED_DELTAS)
+        self._top: Tuple[Optional[float], Optional[float]] = (None, None)
+        self._lock = threading.Lock()
+        self._resync_task: Optional[asyncio.Task] = None
+        self._closed = False
+        self._stats = {"updates": 0, "stale": 0, "gaps": 0, "crossed": 0, "resyncs": 0}
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = get_client()
+        return self._client
+
+    # ------------------------------------------------------------------ 寫入（事件循環線程）
+
+    def apply_snapshot(self, snapshot: Dict) -> bool:
+        """
+        應用 REST 深度快照並重放緩存的增量
+
+        Returns:
+            是否完成同步；快照早於緩存中最早的增量時返回 False，需要重新拉取
+        """
+        last_id = int(snapshot.get("lastUpdateId") or 0)
+        bids = [(float(price), float(quantity)) for price, quantity in snapshot.get("bids", [])]
+        asks = [(float(price), float(quantity)) for price, quantity in snapshot.get("asks", [])]
+
+        with self._lock:
+            pending = [delta for delta in self._buffer if delta.last_update_id > last_id]
+            if pending and pending[0].first_update_id > last_id + 1:
+                logger.debug(f"{self.symbol} 快照 {last_id} 早於緩存增量 {pending[0].first_update_id}，重新拉取")
+                return False
+
+            self.bids.load(bids)
+            self.asks.load(asks)
+            self.last_update_id = last_id
+            for delta in pending:
+                if delta.first_update_id > self.last_update_id + 1:
+                    # 緩存內部有缺口（消息丟失），丟棄到缺口為止，等待更新的快照
+                    self._discard_buffer_through(delta.first_update_id - 1)
+                    return False
+                self._apply_levels(delta)
+            self._buffer.clear()
+            self.synced = True
+            self._stats["resyncs"] += 1
+            self._refresh_top()
+            self._refresh_view(0, 0)
+        logger.info(f"{self.symbol} 訂單簿已同步: 更新ID {self.last_update_id}, "
+                    f"買 {len(self.bids)} 檔, 賣 {len(self.asks)} 檔, 重放 {len(pending)} 條增量")
+        self._notify()
+        return True
+
+    def apply_delta(self, delta: DepthDelta) -> bool:
+        """
+        應用一條深度增量
+
+        Returns:
+            增量是否已應用到訂單簿；未同步、過期或出現缺口時返回 False
+        """
+        with self._lock:
+            if not self.synced:
+                self._buffer.append(delta)
+                return False
+            if delta.last_update_id <= self.last_update_id:
+                self._stats["stale"] += 1
+                return False
+            if delta.first_update_id > self.last_update_id + 1:
+                self._stats["gaps"] += 1
+                logger.warning(f"{self.symbol} 深度增量出現缺口: 期望 {self.last_update_id + 1}，"
+                               f"收到 {delta.first_update_id}-{delta.last_update_id}，重新同步")
+                self._invalidate(delta)
+                return False
+
+            bid_rank, ask_rank = self._apply_levels(delta)
+            self._stats["updates"] += 1
+            bid, ask = self._refresh_top()
+            if bid is not None and ask is not None and bid >= ask:
+                self._stats["crossed"] += 1
+                logger.warning(f"{self.symbol} 訂單簿買賣價交叉 ({bid} >= {ask})，重新同步")
+                self._invalidate(None)
+                return False
+            self._refresh_view(bid_rank, ask_rank)
+        self._notify()
+        return True
+
+    def on_delta(self, delta: DepthDelta) -> bool:
+        """深度流回調入口：應用增量，未同步時確保後台重新同步任務在運行"""
+        applied = self.apply_delta(delta)
+        if not self.synced:
+            self.request_resync()
+        return applied
+
+    def _apply_levels(self, delta: DepthDelta) -> Tuple[Optional[int], Optional[int]]:
+        """應用增量中的檔位，返回買賣兩側發生變化的最靠前檔位序號"""
+        bid_rank = ask_rank = None
+        for price, quantity in delta.bids:
+            rank = self.bids.set(price, quantity)
+            if rank is not None and (bid_rank is None or rank < bid_rank):
+                bid_rank = rank
+        for price, quantity in delta.asks:
+            rank = self.asks.set(price, quantity)
+            if rank is not None and (ask_rank is None or rank < ask_rank):
+                ask_rank = rank
+        self.last_update_id = delta.last_update_id
+        return bid_rank, ask_rank
+
+    def _refresh_view(self, bid_rank: Optional[int], ask_rank: Optional[int]):
+        """從變化的檔位開始重寫數組視圖（調用方持有鎖）"""
+        levels = self.depth_view.levels
+        for is_bid, side, rank in ((True, self.bids, bid_rank), (False, self.asks, ask_rank)):
+            if rank is None or rank >= levels:
+                continue
+            self.depth_view.write(is_bid, rank, side.levels(levels, start=rank), len(side))
+
+    def _invalidate(self, delta: Optional[DepthDelta]):
+        """標記未同步（調用方持有鎖），觸發缺口的增量留在緩存中等待快照"""
+        self.synced = False
+        self._buffer.clear()
+        if delta is not None:
+            self._buffer.append(delta)
+        self._top = (None, None)
+        self.depth_view.clear()
+
+    def _discard_buffer_through(self, update_id: int):
+        while self._buffer and self._buffer[0].last_update_id <= update_id:
+            self._buffer.popleft()
+
+    def _refresh_top(self) -> Tuple[Optional[float], Optional[float]]:
+        best_bid = self.bids.best()
+        best_ask = self.asks.best()
+        self._top = (best_bid[0] if best_bid else None, best_ask[0] if best_ask else None)
+        return self._top
+
+    def _notify(self):
+        if self.on_update is not None:
+            try:
+                self.on_update(self)
+            except Exception as e:
+                logger.error(f"訂單簿更新回調出錯: {e}")
+
+    # ------------------------------------------------------------------ 同步
+
+    async def fetch_snapshot(self) -> Optional[Dict]:
+        """拉取 REST 深度快照（不經過公共行情緩存）"""
+        return await self.client._public_request("depth", {"symbol": self.symbol})
+
+    async def sync(self) -> bool:
+        """拉取快照直到同步成功（或訂單簿被關閉），失敗時指數退避"""
+        delay = RESYNC_DELAY
+        while not self._closed:
+            snapshot = await self.fetch_snapshot()
+            if isinstance(snapshot, dict) and self.on_snapshot is not None:
+                self.on_snapshot(snapshot)
+            if isinstance(snapshot, dict) and self.apply_snapshot(snapshot):
+                return True
+            if not isinstance(snapshot, dict):
+                logger.warning(f"{self.symbol} 獲取深度快照失敗，{delay:.1f} 秒後重試")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RESYNC_DELAY)
+        return False
+
+    def request_resync(self) -> Optional[asyncio.Task]:
+        """在當前事件循環中啟動後台同步（已在進行時不重複啟動），返回同步任務"""
+        if self._closed or not self.auto_resync:
+            return None
+        if self._resync_task is not None and not self._resync_task.done():
+            return self._resync_task
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return None
+        self._resync_task = loop.create_task(self.sync())
+        return self._resync_task
+
+    def reset(self):
+        """連接斷開後調用：清空緩存並標記未同步，重連後重新走快照流程"""
+        with self._lock:
+            self._invalidate(None)
+
+    def close(self):
+        self._closed = True
+        if self._resync_task is not None:
+            self._resync_task.cancel()
+
+    # ------------------------------------------------------------------ 讀取（任意線程）
+
+    def get_bid_ask(self) -> Tuple[Optional[float], Optional[float]]:
+        """最優買價和賣價，未同步時為 (None, None)"""
+        return self._top
+
+    def get_mid_price(self) -> Optional[float]:
+        bid, ask = self._top
+        if bid is None or ask is None:
+            return None
+        return (bid + ask) / 2
+
+    def get_levels(self, depth: Optional[int] = None) -> Tuple[List[Level], List[Level]]:
+        """前 depth 檔買單和賣單（從最優價開始）"""
+        with self._lock:
+            return self.bids.levels(depth), self.asks.levels(depth)
+
+    def get_depth_view(self) -> DepthView:
+        """前 N 檔數組視圖的副本（未同步時為空）"""
+        with self._lock:
+            return self.depth_view.copy()
+
+    def get_liquidity_profile(self, pct: float = DEFAULT_LIQUIDITY_PCT) -> Optional[Dict]:
+        """中間價 ±pct% 內的買賣量、失衡度等，見 depth_view.liquidity_profile"""
+        if not self.synced:
+            return None
+        return liquidity_profile(self.get_depth_view(), pct)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "synced": self.synced,
+                "last_update_id": self.last_update_id,
+                "bid_levels": len(self.bids),
+                "ask_levels": len(self.asks),
+                "buffered": len(self._buffer),
+                **self._stats,
+            }
+
+    def __repr__(self):
+        bid, ask = self._top
+        return f"OrderBook({self.symbol} {bid}/{ask} id={self.last_update_id} synced={self.synced})"
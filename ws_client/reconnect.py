@@ -0,0 +1,153 @@
+"""
+重連管理模塊：斷線後以帶抖動、有上限的指數退避快速重連，恢復訂閱並重新同步訂單簿，
+統計每次斷線到收到新數據所用的時間
+"""
+import asyncio
+import random
+import time
+from collections import deque
+from typing import Dict, Optional
+
+from config import WS_RECONNECT_INITIAL_DELAY, WS_RECONNECT_MAX_ATTEMPTS, WS_RECONNECT_MAX_DELAY
+from logger import setup_logger
+
+logger = setup_logger("ws_client.reconnect")
+
+BOOK_RESYNC_TIMEOUT = 10.0      # 重連後等待訂單簿同步完成的最長時間（秒），超時後同步在後台繼續
+HISTORY_SIZE = 50               # 保留最近多少次重連的記錄
+
+
+class Backoff:
+    """
+    帶抖動的指數退避
+
+    第 n 次等待在 [0.5, 1] × min(initial × 2^(n-1), maximum) 之間隨機取值，
+    避免多個連接在同一時刻一起重連。
+    """
+
+    def __init__(self, initial: float = WS_RECONNECT_INITIAL_DELAY, maximum: float = WS_RECONNECT_MAX_DELAY,
+                 factor: float = 2.0, rng: Optional[random.Random] = None):
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self.attempts = 0
+        self._rng = rng or random.Random()
+
+    def next_delay(self) -> float:
+        ceiling = min(self.initial * self.factor ** self.attempts, self.maximum)
+        self.attempts += 1
+        return ceiling * (0.5 + 0.5 * self._rng.random())
+
+    def reset(self):
+        self.attempts = 0
+
+
+class ReconnectManager:
+    """
+    單個 BackpackWebSocketClient 的重連管理器
+
+    連接斷開時 on_disconnect 在獨立任務中循環重連（不佔用消息處理任務），成功後：
+    1. 按 stream_subscriptions 重新訂閱公共流和私有流
+    2. 訂閱了深度流時立即重新拉取快照同步訂單簿，不等第一條增量觸發
+    3. 第一條數據流消息到達時記錄 time_to_fresh_data（從發現斷線算起）
+    """
+
+    def __init__(self, client, backoff: Optional[Backoff] = None, max_attempts: int = WS_RECONNECT_MAX_ATTEMPTS):
+        self.client = client
+        self.backoff = backoff or Backoff()
+        self.max_attempts = max_attempts            # 0 表示不限次數
+        # 重連成功後、第一條數據到達前為 True，消息處理路徑只檢查這一個屬性
+        self.awaiting_data = False
+        self._task: Optional[asyncio.Task] = None
+        self._current: Optional[Dict] = None
+        self.history: deque = deque(maxlen=HISTORY_SIZE)
+        self._stats = {"disconnects": 0, "reconnects": 0, "failed_attempts": 0, "gave_up": 0}
+
+    @property
+    def reconnecting(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def on_disconnect(self, reason: str = ""):
+        """連接斷開時調用（事件循環線程），已在重連時忽略"""
+        if self.reconnecting or not self.client.auto_reconnect or not self.client.running:
+            return
+        self._stats["disconnects"] += 1
+        self.awaiting_data = False
+        self._current = {
+            "reason": reason,
+            "disconnected_at": time.time(),
+            "_started": time.monotonic(),
+        }
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        """停止正在進行的重連（主動斷開連接時調用）"""
+        self.awaiting_data = False
+        if self.reconnecting and self._task is not asyncio.current_task():
+            self._task.cancel()
+
+    async def _run(self) -> bool:
+        client = self.client
+        record = self._current
+        while client.running:
+            if self.max_attempts and self.backoff.attempts >= self.max_attempts:
+                self._stats["gave_up"] += 1
+                logger.error(f"達到最大重連嘗試次數({self.max_attempts})，停止重連")
+                return False
+            delay = self.backoff.next_delay()
+            logger.info(f"嘗試重連 ({self.backoff.attempts}"
+                        f"{'/' + str(self.max_attempts) if self.max_attempts else ''})，等待 {delay:.2f} 秒")
+            await asyncio.sleep(delay)
+            await client._close_transport()
+            if await client.connect():
+                break
+            self._stats["failed_attempts"] += 1
+        else:
+            return False
+
+        record["attempts"] = self.backoff.attempts
+        record["downtime"] = time.monotonic() - record["_started"]
+        self.backoff.reset()
+        self._stats["reconnects"] += 1
+        self.awaiting_data = True
+        await client._replay_subscriptions()
+        logger.info(f"重連成功，斷線 {record['downtime']:.3f} 秒，已恢復 {len(client.stream_subscriptions)} 個數據流")
+
+        book = client.orderbook
+        if f"depth.{book.symbol}" in client.stream_subscriptions:
+            book.reset()
+            task = book.request_resync()
+            if task is not None:
+                done, _ = await asyncio.wait({task}, timeout=BOOK_RESYNC_TIMEOUT)
+                if task in done and not task.cancelled() and task.result():
+                    record["book_resync"] = time.monotonic() - record["_started"]
+                else:
+                    logger.warning(f"{book.symbol} 重連後訂單簿同步未在 {BOOK_RESYNC_TIMEOUT} 秒內完成，繼續在後台同步")
+        record["_done"] = True
+        if "time_to_fresh_data" in record:
+            self.history.append(record)
+        return True
+
+    def on_data(self, stream: str):
+        """重連後第一條數據流消息到達時調用"""
+        self.awaiting_data = False
+        record = self._current
+        if record is not None and "time_to_fresh_data" not in record:
+            record["time_to_fresh_data"] = time.monotonic() - record["_started"]
+            record["first_stream"] = stream
+            logger.info(f"重連後收到首條數據 ({stream})，距斷線 {record['time_to_fresh_data']:.3f} 秒")
+            # 重連流程（含訂單簿同步）已結束時歸檔，否則由重連任務結束時歸檔
+            if record.get("_done"):
+                self.history.append(record)
+
+    def stats(self) -> Dict:
+        """斷線和重連次數、是否正在重連，以及最近重連的恢復耗時（秒）"""
+        records = [{k: v for k, v in r.items() if not k.startswith("_")} for r in self.history]
+        fresh = [r["time_to_fresh_data"] for r in records]
+        return {
+            **self._stats,
+            "reconnecting": self.reconnecting,
+            "last": records[-1] if records else None,
+            "avg_time_to_fresh_data": sum(fresh) / len(fresh) if fresh else None,
+            "max_time_to_fresh_data": max(fresh) if fresh else None,
+        }
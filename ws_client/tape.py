@@ -0,0 +1,285 @@
+"""
+行情磁帶模塊：把 WebSocket 原始消息連同本地接收時間錄製到只追加的分段文件，
+並按原始節奏、N 倍速或盡可能快地回放到 BackpackWebSocketClient 的處理流程中
+
+文件布局（一個目錄一盤磁帶）：
+    000001.seg, 000002.seg, ...   記錄依次為 [接收時間 ns: int64][類型: uint8][長度: uint32][原始消息 UTF-8]
+    index.jsonl                   每個已封閉的分段一行：時間範圍、記錄數、各類型計數和稀疏的 (時間, 偏移) 標記
+錄製時訂單簿從 REST 拉取的深度快照也作為一條記錄寫入，回放時按原順序應用，不再訪問網絡。
+"""
+import asyncio
+import json
+import os
+import struct
+import time
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from config import TAPE_DIR, TAPE_FLUSH_INTERVAL, TAPE_INDEX_EVERY, TAPE_SEGMENT_BYTES
+from logger import setup_logger
+from ws_client.dispatch import route_key
+
+logger = setup_logger("ws_client.tape")
+
+HEADER = struct.Struct("<qBI")
+INDEX_FILE = "index.jsonl"
+SEGMENT_SUFFIX = ".seg"
+
+# 記錄類型：錄製的路由 -> 類型碼
+RECORD_KINDS: Dict[str, int] = {
+    "depth": 1,
+    "bookTicker": 2,
+    "trade": 3,
+    "account.orderUpdate": 4,
+}
+SNAPSHOT_KIND = 100                 # 訂單簿深度快照（REST）
+KIND_NAMES = {**{kind: name for name, kind in RECORD_KINDS.items()}, SNAPSHOT_KIND: "depthSnapshot"}
+DEFAULT_ROUTES = tuple(RECORD_KINDS)
+YIELD_EVERY = 1000                  # 全速回放時每隔多少條記錄讓出一次事件循環
+
+
+class TapeRecorder:
+    """
+    磁帶錄製器
+
+    record() 在事件循環線程中調用：寫入帶緩衝的文件，按 TAPE_FLUSH_INTERVAL 刷新到磁盤，
+    分段超過 TAPE_SEGMENT_BYTES 時封閉並在索引中追加一行。
+    """
+
+    def __init__(self, directory: str = TAPE_DIR, routes: Sequence[str] = DEFAULT_ROUTES,
+                 segment_bytes: int = TAPE_SEGMENT_BYTES):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self._kinds = {route: RECORD_KINDS[route] for route in routes}
+        self._stream_kinds: Dict[str, Optional[int]] = {}
+        os.makedirs(directory, exist_ok=True)
+        existing = [name for name in os.listdir(directory) if name.endswith(SEGMENT_SUFFIX)]
+        self._next_segment = max((int(name[:-len(SEGMENT_SUFFIX)]) for name in existing), default=0) + 1
+        self._file = None
+        self._segment: Optional[Dict] = None
+        self._last_flush = time.monotonic()
+        self.records = 0
+        self.bytes = 0
+
+    def _kind_for(self, stream: str) -> Optional[int]:
+        try:
+            return self._stream_kinds[stream]
+        except KeyError:
+            kind = self._stream_kinds[stream] = self._kinds.get(route_key(stream))
+            return kind
+
+    def record(self, stream: str, message: str, received_ns: int):
+        """錄製一條數據流消息（不在錄製範圍內的數據流直接忽略）"""
+        kind = self._kind_for(stream)
+        if kind is not None:
+            self._write(kind, message, received_ns)
+
+    def record_snapshot(self, snapshot: Dict, received_ns: Optional[int] = None):
+        """錄製一份訂單簿深度快照"""
+        self._write(SNAPSHOT_KIND, json.dumps(snapshot, separators=(",", ":")),
+                    time.time_ns() if received_ns is None else received_ns)
+
+    def _write(self, kind: int, message: str, received_ns: int):
+        payload = message.encode("utf-8")
+        if self._file is None:
+            self._open_segment()
+        segment = self._segment
+        if segment["records"] % TAPE_INDEX_EVERY == 0:
+            segment["marks"].append([received_ns, segment["bytes"]])
+        self._file.write(HEADER.pack(received_ns, kind, len(payload)))
+        self._file.write(payload)
+        size = HEADER.size + len(payload)
+        if segment["first_ns"] is None:
+            segment["first_ns"] = received_ns
+        segment["last_ns"] = received_ns
+        segment["records"] += 1
+        segment["bytes"] += size
+        name = KIND_NAMES[kind]
+        segment["kinds"][name] = segment["kinds"].get(name, 0) + 1
+        self.records += 1
+        self.bytes += size
+
+        if segment["bytes"] >= self.segment_bytes:
+            self._close_segment()
+        else:
+            now = time.monotonic()
+            if now - self._last_flush >= TAPE_FLUSH_INTERVAL:
+                self._file.flush()
+                self._last_flush = now
+
+    def _open_segment(self):
+        name = f"{self._next_segment:06d}{SEGMENT_SUFFIX}"
+        self._next_segment += 1
+        self._file = open(os.path.join(self.directory, name), "ab", buffering=1024 * 1024)
+        self._segment = {"segment": name, "first_ns": None, "last_ns": None, "records": 0, "bytes": 0,
+                         "kinds": {}, "marks": []}
+
+    def _close_segment(self):
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        with open(os.path.join(self.directory, INDEX_FILE), "a", encoding="utf-8") as f:
+            f.write(json.dumps(self._segment, separators=(",", ":")) + "\n")
+        self._segment = None
+
+    def close(self):
+        """封閉當前分段並寫入索引"""
+        self._close_segment()
+
+    def stats(self) -> Dict:
+        return {"directory": self.directory, "records": self.records, "bytes": self.bytes,
+                "segment": self._segment["segment"] if self._segment else None}
+
+
+class TapeReader:
+    """
+    磁帶讀取器
+
+    按分段編號順序讀取記錄；有索引的分段按時間範圍跳過或定位，沒有索引的分段（錄製中斷時的最後一段）
+    從頭掃描，末尾不完整的記錄忽略。
+    """
+
+    def __init__(self, directory: str = TAPE_DIR):
+        self.directory = directory
+        self.index: Dict[str, Dict] = {}
+        index_path = os.path.join(directory, INDEX_FILE)
+        if os.path.exists(index_path):
+            with open(index_path, encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        entry = json.loads(line)
+                        self.index[entry["segment"]] = entry
+        self.segments: List[str] = sorted(
+            name for name in os.listdir(directory) if name.endswith(SEGMENT_SUFFIX)
+        ) if os.path.isdir(directory) else []
+
+    def summary(self) -> Dict:
+        """已索引分段的時間範圍、記錄數和各類型計數"""
+        entries = [self.index[name] for name in self.segments if name in self.index]
+        kinds: Dict[str, int] = {}
+        for entry in entries:
+            for name, count in entry["kinds"].items():
+                kinds[name] = kinds.get(name, 0) + count
+        return {
+            "segments": len(self.segments),
+            "indexed": len(entries),
+            "first_ns": entries[0]["first_ns"] if entries else None,
+            "last_ns": entries[-1]["last_ns"] if entries else None,
+            "records": sum(entry["records"] for entry in entries),
+            "kinds": kinds,
+        }
+
+    def records(self, start_ns: Optional[int] = None, end_ns: Optional[int] = None,
+                routes: Optional[Sequence[str]] = None) -> Iterator[Tuple[int, int, bytes]]:
+        """
+        按時間順序產出 (接收時間 ns, 類型碼, 原始消息字節)
+
+        Args:
+            start_ns / end_ns: 只讀取該時間範圍內的記錄
+            routes: 只讀取這些路由（深度快照隨 depth 一起讀取）；默認全部
+        """
+        kinds = None
+        if routes is not None:
+            kinds = {RECORD_KINDS[route] for route in routes}
+            if "depth" in routes:
+                kinds.add(SNAPSHOT_KIND)
+        for name in self.segments:
+            entry = self.index.get(name)
+            offset = 0
+            if entry is not None:
+                if (start_ns is not None and entry["last_ns"] < start_ns) or \
+                        (end_ns is not None and entry["first_ns"] > end_ns):
+                    continue
+                if start_ns is not None:
+                    for mark_ns, mark_offset in entry["marks"]:
+                        if mark_ns > start_ns:
+                            break
+                        offset = mark_offset
+            for received_ns, kind, payload in self._read_segment(name, offset):
+                if start_ns is not None and received_ns < start_ns:
+                    continue
+                if end_ns is not None and received_ns > end_ns:
+                    return
+                if kinds is None or kind in kinds:
+                    yield received_ns, kind, payload
+
+    def _read_segment(self, name: str, offset: int) -> Iterator[Tuple[int, int, bytes]]:
+        header_size = HEADER.size
+        with open(os.path.join(self.directory, name), "rb") as f:
+            f.seek(offset)
+            while True:
+                header = f.read(header_size)
+                if len(header) < header_size:
+                    return
+                received_ns, kind, length = HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length:
+                    logger.warning(f"{name} 末尾記錄不完整，已忽略")
+                    return
+                yield received_ns, kind, payload
+
+
+class TapeReplayer:
+    """
+    把磁帶回放到 BackpackWebSocketClient
+
+    數據流消息走客戶端完整的處理流程（路由、解碼、本地狀態、投遞隊列和回調），
+    深度快照直接應用到訂單簿；回放期間關閉訂單簿的自動 REST 重新同步，結果只取決於磁帶內容。
+
+    Args:
+        speed: 1.0 按原始節奏，N 為 N 倍速，None 或 0 為盡可能快
+    """
+
+    def __init__(self, reader: TapeReader, client, speed: Optional[float] = 1.0):
+        self.reader = reader
+        self.client = client
+        self.speed = speed
+
+    async def run(self, start_ns: Optional[int] = None, end_ns: Optional[int] = None,
+                  routes: Optional[Sequence[str]] = None) -> Dict:
+        """
+        回放並返回統計：記錄數、快照數、耗時、每秒記錄數、磁帶時長和最大落後時間（毫秒）
+        """
+        client = self.client
+        book = client.orderbook
+        auto_resync = book.auto_resync
+        book.auto_resync = False
+        speed = self.speed or None
+        records = snapshots = 0
+        max_behind = 0.0
+        first_ns = last_ns = None
+        started = time.perf_counter()
+        try:
+            for received_ns, kind, payload in self.reader.records(start_ns, end_ns, routes):
+                if first_ns is None:
+                    first_ns = received_ns
+                last_ns = received_ns
+                if speed is not None:
+                    due = started + (received_ns - first_ns) / 1e9 / speed
+                    delay = due - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                    elif -delay > max_behind:
+                        max_behind = -delay
+                elif records % YIELD_EVERY == 0:
+                    await asyncio.sleep(0)
+
+                if kind == SNAPSHOT_KIND:
+                    snapshots += 1
+                    book.apply_snapshot(json.loads(payload))
+                else:
+                    await client._process_message(payload.decode("utf-8"))
+                records += 1
+        finally:
+            book.auto_resync = auto_resync
+
+        elapsed = time.perf_counter() - started
+        return {
+            "records": records,
+            "snapshots": snapshots,
+            "elapsed": elapsed,
+            "per_second": records / elapsed if elapsed > 0 else 0.0,
+            "tape_seconds": (last_ns - first_ns) / 1e9 if records else 0.0,
+            "max_behind_ms": max_behind * 1000,
+        }